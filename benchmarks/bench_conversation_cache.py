@@ -0,0 +1,108 @@
+# 
+# This file is part of the C1_llm_email_replier distribution (https://github.com/VALAWAI/C1_llm_email_replier).
+# Copyright (c) 2022-2026 VALAWAI (https://valawai.eu/).
+# 
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+# 
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+# 
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+
+"""Benchmark of the prefill time of the e-mails of multi-turn conversations, prefilling
+the whole prompt of each turn or reusing the KV cache of the previous turns.
+
+It uses a randomly initialized model with the shape of a small Llama, so nothing is
+downloaded, and synthetic conversations whose turns add an e-mail and its reply to
+the system prompt. The time of the prefill of each turn and the memory of the KV
+cache that is kept for each conversation are reported.
+
+Run it with:
+
+    PYTHONPATH=src python benchmarks/bench_conversation_cache.py
+"""
+
+import random
+import time
+from typing import List, Optional
+
+import torch
+from transformers import LlamaConfig, LlamaForCausalLM
+
+from c1_llm_email_replier.conversation_cache import ConversationState, cache_bytes
+
+TURNS = 5
+CONVERSATIONS = 5
+SYSTEM_PROMPT_TOKENS = 300
+E_MAIL_TOKENS = 150
+REPLY_TOKENS = 120
+VOCABULARY = 32000
+
+
+def tokens(count: int) -> List[int]:
+    """Create the tokens of a synthetic text."""
+
+    return [random.randrange(1, VOCABULARY) for _ in range(count)]
+
+
+def prefill(model: LlamaForCausalLM, token_ids: List[int], state: Optional[ConversationState] = None):
+    """Prefill a prompt, reusing the cache of a conversation if it is provided, and return the cache and the seconds."""
+
+    # The copy of the cache of the conversation is part of the cost
+    start = time.perf_counter()
+    past_key_values, reused = state.reusable_cache(token_ids) if state is not None else (None, 0)
+    with torch.no_grad():
+        output = model(input_ids=torch.tensor([token_ids[reused:]]), past_key_values=past_key_values, use_cache=True)
+    return output.past_key_values, time.perf_counter() - start
+
+
+def main():
+    torch.manual_seed(0)
+    random.seed(0)
+    model = LlamaForCausalLM(LlamaConfig(
+        vocab_size=VOCABULARY, hidden_size=512, intermediate_size=1376, num_hidden_layers=8,
+        num_attention_heads=8, num_key_value_heads=4, max_position_embeddings=4096
+    )).eval()
+    # Warm up the kernels
+    prefill(model, tokens(64))
+
+    full = [0.0] * TURNS
+    cached = [0.0] * TURNS
+    prompt_tokens = [0] * TURNS
+    memory = 0
+    for _ in range(CONVERSATIONS):
+        token_ids = tokens(SYSTEM_PROMPT_TOKENS)
+        state = None
+        for turn in range(TURNS):
+            token_ids = token_ids + tokens(E_MAIL_TOKENS)
+            prompt_tokens[turn] = len(token_ids)
+            _, seconds = prefill(model, token_ids)
+            full[turn] += seconds / CONVERSATIONS
+            past_key_values, seconds = prefill(model, token_ids, state)
+            cached[turn] += seconds / CONVERSATIONS
+
+            # The reply is added to the conversation as if it had been generated
+            reply = tokens(REPLY_TOKENS)
+            with torch.no_grad():
+                past_key_values = model(input_ids=torch.tensor([reply]), past_key_values=past_key_values, use_cache=True).past_key_values
+            token_ids = token_ids + reply
+            state = ConversationState(model_id="random", messages=[], token_ids=list(token_ids), past_key_values=past_key_values)
+
+        memory = max(memory, cache_bytes(state.past_key_values))
+
+    print(f"{'turn':>4} {'prompt tokens':>13} {'full prefill ms':>15} {'cached prefill ms':>17} {'speedup':>7}")
+    for turn in range(TURNS):
+        print(f"{turn + 1:>4} {prompt_tokens[turn]:>13} {full[turn] * 1000:>15.1f} {cached[turn] * 1000:>17.1f} {full[turn] / cached[turn]:>6.1f}x")
+
+    print(f"KV cache kept by conversation after {TURNS} turns: {memory / 1048576:.1f} MB")
+
+
+if __name__ == '__main__':
+    main()
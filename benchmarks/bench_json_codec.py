@@ -0,0 +1,108 @@
+# 
+# This file is part of the C1_llm_email_replier distribution (https://github.com/VALAWAI/C1_llm_email_replier).
+# Copyright (c) 2022-2026 VALAWAI (https://valawai.eu/).
+# 
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+# 
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+# 
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+
+
+"""Micro-benchmarks of the JSON codec used to decode the received e-mails and
+to encode the replies and the log messages sent to the MOV.
+
+Run it with:
+
+    PYTHONPATH=src python benchmarks/bench_json_codec.py
+"""
+
+import json
+import timeit
+
+from c1_llm_email_replier import json_codec
+from c1_llm_email_replier.received_e_mail_payload import ReceivedEMailPayload
+from c1_llm_email_replier.reply_e_mail_payload import ReplyEMailPayload
+
+SIZES = [1024, 10 * 1024, 100 * 1024, 1024 * 1024]
+
+
+def e_mail_body(size: int) -> bytes:
+    """Create the JSON of a received e-mail with a content of the specified size."""
+
+    line = "Dear customer, the order \"#1234\" has been delayed.\n"
+    content = (line * (size // len(line) + 1))[:size]
+    e_mail = {
+        'subject': "Order delayed",
+        'content': content,
+        'mime_type': "text/plain",
+        'addresses': [{'type': 'FROM', 'address': 'from@valawai.eu'}]
+    }
+    return json.dumps(e_mail).encode('utf-8')
+
+
+def previous_decode(body: bytes) -> ReceivedEMailPayload:
+    """How the received e-mails were decoded before the codec."""
+
+    try:
+        return ReceivedEMailPayload.model_validate_json(body)
+    except Exception:
+        data = json.loads(body)
+        if isinstance(data, str):
+            data = json.loads(data)
+        return ReceivedEMailPayload.model_validate(data)
+
+
+def previous_reply(reply: ReplyEMailPayload) -> None:
+    """How the reply and its log message were encoded before the codec."""
+
+    json.dumps({"level": "INFO", "message": "Sent e-mail reply", "payload": reply.model_dump_json()})
+    reply.model_dump_json()
+
+
+def codec_reply(reply: ReplyEMailPayload) -> None:
+    """How the reply and its log message are encoded with the codec."""
+
+    reply_json = json_codec.encode_model(reply)
+    json_codec.dumps({"level": "INFO", "message": "Sent e-mail reply", "payload": json_codec.payload_to_str(reply_json)})
+    json_codec.dumps(reply_json)
+
+
+def measure(statement, number: int) -> float:
+    """Return the best time in microseconds of a statement."""
+
+    return min(timeit.repeat(statement, number=number, repeat=5)) / number * 1_000_000
+
+
+def main():
+    """Run the benchmarks."""
+
+    print(f"Backend: {'orjson' if json_codec.USE_ORJSON else 'json'}")
+    print(f"{'size':>8} | {'case':<24} | {'previous (us)':>13} | {'codec (us)':>10} | {'speedup':>7}")
+    for size in SIZES:
+        body = e_mail_body(size)
+        double_encoded = json.dumps(body.decode('utf-8')).encode('utf-8')
+        e_mail = ReceivedEMailPayload.model_validate_json(body)
+        reply = ReplyEMailPayload(subject=e_mail.subject, content=e_mail.content, addresses=[{'type': 'TO', 'address': 'from@valawai.eu'}])
+        number = max(10, 20_000_000 // (size * 10))
+        cases = [
+            ("decode", lambda: previous_decode(body), lambda: json_codec.decode_model(ReceivedEMailPayload, body)),
+            ("decode double-encoded", lambda: previous_decode(double_encoded), lambda: json_codec.decode_model(ReceivedEMailPayload, double_encoded)),
+            ("encode reply and log", lambda: previous_reply(reply), lambda: codec_reply(reply)),
+        ]
+        for name, previous, codec in cases:
+            previous_time = measure(previous, number)
+            codec_time = measure(codec, number)
+            print(f"{size // 1024:>6}KB | {name:<24} | {previous_time:>13.1f} | {codec_time:>10.1f} | {previous_time / codec_time:>6.2f}x")
+
+
+if __name__ == "__main__":
+    main()
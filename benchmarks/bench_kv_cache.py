@@ -0,0 +1,93 @@
+# 
+# This file is part of the C1_llm_email_replier distribution (https://github.com/VALAWAI/C1_llm_email_replier).
+# Copyright (c) 2022-2026 VALAWAI (https://valawai.eu/).
+# 
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+# 
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+# 
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+
+"""Benchmark of the memory of the KV cache of each sequence and of the throughput of the
+generation at several batch sizes, with the dynamic cache and with the quantized ones.
+
+It uses a randomly initialized model with the shape of a small Llama, so nothing is
+downloaded, and synthetic prompts of the same length whose replies have the same
+tokens. The memory by sequence includes the last tokens that the quantized caches keep
+in full precision. The offloaded cache is only benchmarked when there is a GPU, because
+on the CPU it is the dynamic one.
+
+Run it with:
+
+    PYTHONPATH=src python benchmarks/bench_kv_cache.py
+"""
+
+import random
+import time
+from typing import Any, Dict, List, Tuple
+
+import torch
+from transformers import LlamaConfig, LlamaForCausalLM
+
+from c1_llm_email_replier.conversation_cache import cache_bytes
+from c1_llm_email_replier.quantized_kv_cache import QuantizedKVCache
+
+BATCH_SIZES = (1, 2, 4, 8)
+PROMPT_TOKENS = 512
+NEW_TOKENS = 128
+VOCABULARY = 32000
+MEGABYTE = 1048576
+
+
+def generate(model: LlamaForCausalLM, input_ids: torch.Tensor, arguments: Dict[str, Any]) -> Tuple[Any, float]:
+    """Generate the tokens of a batch and return the output and the seconds."""
+
+    start = time.perf_counter()
+    with torch.no_grad():
+        output = model.generate(
+            input_ids=input_ids, attention_mask=torch.ones_like(input_ids), max_new_tokens=NEW_TOKENS,
+            min_new_tokens=NEW_TOKENS, do_sample=False, pad_token_id=0, return_dict_in_generate=True, **arguments
+        )
+    return output, time.perf_counter() - start
+
+
+def main():
+    torch.manual_seed(0)
+    random.seed(0)
+    device = 'cuda' if torch.cuda.is_available() else 'cpu'
+    config = LlamaConfig(
+        vocab_size=VOCABULARY, hidden_size=512, intermediate_size=1376, num_hidden_layers=8,
+        num_attention_heads=8, num_key_value_heads=4, max_position_embeddings=4096
+    )
+    model = LlamaForCausalLM(config).to(device).eval()
+    caches: List[Tuple[str, Any]] = [
+        ("dynamic", lambda: {}),
+        ("quantized 8 bits", lambda: {'past_key_values': QuantizedKVCache(config, nbits=8)}),
+        ("quantized 4 bits", lambda: {'past_key_values': QuantizedKVCache(config, nbits=4)}),
+        ("quantized 2 bits", lambda: {'past_key_values': QuantizedKVCache(config, nbits=2)})
+    ]
+    if device != 'cpu':
+        caches.append(("offloaded", lambda: {'cache_implementation': 'offloaded'}))
+
+    # Warm up the kernels
+    generate(model, torch.randint(1, VOCABULARY, (1, 64), device=device), {})
+
+    print(f"{'cache':<16} {'batch':>5} {'KV MB by sequence':>17} {'tokens/s':>8}")
+    for batch_size in BATCH_SIZES:
+        input_ids = torch.tensor([[random.randrange(1, VOCABULARY) for _ in range(PROMPT_TOKENS)] for _ in range(batch_size)], device=device)
+        for name, arguments in caches:
+            output, seconds = generate(model, input_ids, arguments())
+            memory = cache_bytes(output.past_key_values) / batch_size / MEGABYTE
+            print(f"{name:<16} {batch_size:>5} {memory:>17.2f} {batch_size * NEW_TOKENS / seconds:>8.1f}")
+
+
+if __name__ == '__main__':
+    main()
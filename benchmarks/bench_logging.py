@@ -0,0 +1,80 @@
+# 
+# This file is part of the C1_llm_email_replier distribution (https://github.com/VALAWAI/C1_llm_email_replier).
+# Copyright (c) 2022-2026 VALAWAI (https://valawai.eu/).
+# 
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+# 
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+# 
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+
+
+"""Micro-benchmark of the cost that the logging has on the threads that process the messages,
+writing synchronously into a rotating file or through the queue of the background writer.
+
+Run it with:
+
+    PYTHONPATH=src python benchmarks/bench_logging.py
+"""
+
+import logging
+import logging.handlers
+import os
+import tempfile
+import time
+
+from c1_llm_email_replier.queue_logging import RepeatedMessageFilter, start_queue_logging
+
+MESSAGES = 20000
+
+
+def file_handler(log_dir: str) -> logging.Handler:
+    """Create the handler that the component uses to write into a file."""
+
+    handler = logging.handlers.RotatingFileHandler(os.path.join(log_dir, "bench.txt"), maxBytes=1000000, backupCount=5)
+    handler.setFormatter(logging.Formatter('%(name)s: %(asctime)s | %(levelname)s | %(filename)s:%(lineno)s | %(process)d >>> %(message)s'))
+    return handler
+
+
+def log_messages() -> float:
+    """Log the messages and return the microseconds spent by message."""
+
+    start = time.perf_counter()
+    for i in range(MESSAGES):
+        logging.debug("Publish message to the queue %s with %d bytes", "valawai/log/add", i)
+    return (time.perf_counter() - start) / MESSAGES * 1_000_000
+
+
+def main():
+    """Run the benchmark."""
+
+    root = logging.getLogger()
+    root.setLevel(logging.DEBUG)
+    with tempfile.TemporaryDirectory() as log_dir:
+        handler = file_handler(log_dir)
+        root.addHandler(handler)
+        synchronous = log_messages()
+        root.removeHandler(handler)
+        handler.close()
+
+        root.addHandler(file_handler(log_dir))
+        listener = start_queue_logging(RepeatedMessageFilter())
+        queued = log_messages()
+        start = time.perf_counter()
+        listener.stop()
+        drain = (time.perf_counter() - start) * 1000
+
+    print(f"Synchronous rotating file: {synchronous:.2f} us by message")
+    print(f"Queue with background writer: {queued:.2f} us by message ({synchronous / queued:.1f}x), {drain:.0f} ms to write the pending records")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,143 @@
+# 
+# This file is part of the C1_llm_email_replier distribution (https://github.com/VALAWAI/C1_llm_email_replier).
+# Copyright (c) 2022-2026 VALAWAI (https://valawai.eu/).
+# 
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+# 
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+# 
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+
+"""Replay benchmark of the policies of the scheduler of the replies.
+
+It replays a synthetic trace of e-mails through the scheduler with a simulated clock
+and a single generator whose service time grows with the tokens of the prompt and of
+the reply, and it reports the percentiles of the time from the arrival to the reply,
+the 95 percentile of the senders that are not in a mail loop, that sends a fifth of
+the e-mails, the replies sent after the SLA and the jobs served by the starvation protection.
+
+Run it with:
+
+    PYTHONPATH=src python benchmarks/bench_scheduler.py
+"""
+
+import random
+from typing import Dict, List, Tuple
+
+from c1_llm_email_replier.reply_scheduler import POLICIES, ReplyScheduler
+
+E_MAILS = 5000
+UTILIZATION = 0.95
+SLA = 600.0
+MAX_WAIT = 900.0
+# Seconds to process each token of the prompt and to generate the reply
+PROMPT_TOKEN_TIME = 0.002
+REPLY_TIME = 4.0
+
+
+class SimulatedClock:
+    """The clock of the simulation."""
+
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+LOOP_SENDER = "loop@valawai.eu"
+
+
+def trace(seed: int = 42) -> List[Tuple[float, float, int, str]]:
+    """Create the arrival time, the time when it was received, the tokens and the sender of each e-mail."""
+
+    rng = random.Random(seed)
+    e_mails = []
+    costs = [int(rng.lognormvariate(5.5, 1.0)) for _i in range(E_MAILS)]
+    mean_service = sum(service_time(cost) for cost in costs) / E_MAILS
+    arrival = 0.0
+    for cost in costs:
+        arrival += rng.expovariate(UTILIZATION / mean_service)
+        # Most e-mails are received just before, but some have been waiting for hours on the mailbox
+        age = rng.uniform(0, 60) if rng.random() < 0.9 else rng.uniform(3600, 4 * 3600)
+        sender = LOOP_SENDER if rng.random() < 0.2 else f"user{rng.randrange(500)}@valawai.eu"
+        e_mails.append((arrival, arrival - age, cost, sender))
+
+    return e_mails
+
+
+def service_time(cost: int) -> float:
+    """Return the seconds to reply an e-mail."""
+
+    return REPLY_TIME + cost * PROMPT_TOKEN_TIME
+
+
+def replay(policy: str, e_mails: List[Tuple[float, float, int, str]]) -> Dict[str, float]:
+    """Replay the e-mails with a policy and return its metrics."""
+
+    clock = SimulatedClock()
+    scheduler = ReplyScheduler(policy=policy, sla=SLA, max_wait=MAX_WAIT, clock=clock)
+    latencies = []
+    others = []
+    late = 0
+    pending = list(e_mails)
+    pending.reverse()
+    busy_until = 0.0
+    while pending or len(scheduler) > 0:
+        # Advance to the next arrival or to the end of the current reply
+        next_arrival = pending[-1][0] if pending else float('inf')
+        if len(scheduler) == 0 or next_arrival <= busy_until:
+            clock.now = next_arrival
+            _arrival, received_at, cost, sender = pending.pop()
+            scheduler.put(service_time, cost, received_at=received_at, cost=cost, sender=sender)
+            continue
+
+        clock.now = max(clock.now, busy_until)
+        job = scheduler.pop()
+        busy_until = clock.now + job.function(*job.args)
+        latencies.append(busy_until - job.enqueued_at)
+        if job.sender != LOOP_SENDER:
+            others.append(busy_until - job.enqueued_at)
+        if busy_until > job.deadline:
+            late += 1
+
+    latencies.sort()
+    others.sort()
+    return {
+        "p50": percentile(latencies, 0.50),
+        "p95": percentile(latencies, 0.95),
+        "p99": percentile(latencies, 0.99),
+        "max": latencies[-1],
+        "others p95": percentile(others, 0.95),
+        "late": late / len(latencies) * 100,
+        "starved": scheduler.starved
+    }
+
+
+def percentile(values: List[float], rate: float) -> float:
+    """Return a percentile of some sorted values."""
+
+    return values[min(len(values) - 1, int(rate * len(values)))]
+
+
+def main():
+    """Run the benchmark."""
+
+    e_mails = trace()
+    print(f"{E_MAILS} e-mails at {UTILIZATION:.0%} utilization, SLA {SLA:.0f} s, maximum wait {MAX_WAIT:.0f} s")
+    print(f"{'policy':>8} {'p50 (s)':>10} {'p95 (s)':>10} {'p99 (s)':>10} {'max (s)':>10} {'others p95':>11} {'late (%)':>10} {'starved':>8}")
+    for policy in POLICIES:
+        metrics = replay(policy, e_mails)
+        print(f"{policy:>8} {metrics['p50']:>10.1f} {metrics['p95']:>10.1f} {metrics['p99']:>10.1f} {metrics['max']:>10.1f} {metrics['others p95']:>11.1f} {metrics['late']:>10.1f} {metrics['starved']:>8}")
+
+
+if __name__ == "__main__":
+    main()
@@ -21,10 +21,19 @@ import logging
 import logging.config
 import os
 import signal
+from logging.handlers import QueueListener
+from typing import Optional
 
+from c1_llm_email_replier.async_change_parameters_handler import AsyncChangeParametersHandler
+from c1_llm_email_replier.async_message_service import AsyncMessageService
+from c1_llm_email_replier.async_mov import AsyncMOV
+from c1_llm_email_replier.async_received_e_mail_handler import AsyncReceivedEMailHandler
 from c1_llm_email_replier.change_parameters_handler import ChangeParametersHandler
+from c1_llm_email_replier.component_config import ConfigStore
 from c1_llm_email_replier.message_service import MessageService
+from c1_llm_email_replier.model_switcher import ModelSwitcher
 from c1_llm_email_replier.mov import MOV
+from c1_llm_email_replier.queue_logging import RepeatedMessageFilter, start_queue_logging
 from c1_llm_email_replier.received_e_mail_handler import ReceivedEMailHandler
 
 
@@ -35,6 +44,8 @@ class App:
         """Initialize the application"""
         self.message_service = None
         self.mov = None
+        self.received_e_mail_handler = None
+        self.model_switcher = None
 
         # Capture when the docker container is stopped
         signal.signal(signal.SIGINT, self.exit_gracefully)
@@ -47,8 +58,13 @@ class App:
     def stop(self):
         """Finalize the component."""
         try:
+            if self.model_switcher:
+                self.model_switcher.close()
+            if self.received_e_mail_handler:
+                self.received_e_mail_handler.stop()
             if self.mov:
                 self.mov.unregister_component()
+                self.mov.close()
             if self.message_service:
                 self.message_service.close()
             logging.info("Finished C1 LLM E-Mail Replier")
@@ -58,13 +74,26 @@ class App:
     def start(self):
         """Initialize the component"""
         try:
-            # Create connection to RabbitMQ
-            self.message_service = MessageService()
-            self.mov = MOV(self.message_service)
-
-            # Create the handlers for the events
-            ReceivedEMailHandler(self.message_service, self.mov)
-            ChangeParametersHandler(self.message_service, self.mov)
+            # Restore the parameters before any handler loads the model
+            ConfigStore.default().restore()
+
+            if os.getenv("MESSAGE_SERVICE_MODE", "blocking").lower() == "asyncio":
+                # Process the events on a single asyncio event loop
+                self.message_service = AsyncMessageService()
+                self.mov = AsyncMOV(self.message_service)
+                self.received_e_mail_handler = AsyncReceivedEMailHandler(self.message_service, self.mov)
+                self.model_switcher = ModelSwitcher(self.received_e_mail_handler.generator, self.mov)
+                AsyncChangeParametersHandler(self.message_service, self.mov, model_switcher=self.model_switcher)
+
+            else:
+                # Create connection to RabbitMQ
+                self.message_service = MessageService()
+                self.mov = MOV(self.message_service)
+
+                # Create the handlers for the events
+                self.received_e_mail_handler = ReceivedEMailHandler(self.message_service, self.mov)
+                self.model_switcher = ModelSwitcher(self.received_e_mail_handler.generator, self.mov)
+                ChangeParametersHandler(self.message_service, self.mov, model_switcher=self.model_switcher)
 
             # Register the component
             self.mov.register_component()
@@ -78,8 +107,17 @@ class App:
 
 
 
-def configure_log():
-    """Configure the logging system"""
+def configure_log() -> Optional[QueueListener]:
+    """Configure the logging system.
+
+    The records are written by a background thread, so the threads that process
+    the messages do not wait for the file I/O.
+
+    Returns
+    -------
+    QueueListener, optional
+        The listener that writes the records, that must be stopped to write the pending ones.
+    """
 
     try:
 
@@ -93,6 +131,9 @@ def configure_log():
             os.makedirs(log_dir)
         log_file_name=os.path.join(log_dir,os.getenv("LOG_FILE_NAME","c1_llm_email_replier.txt"))
 
+        # The records that no handler writes are discarded before being created
+        root_level = min(console_level, file_level)
+
         logging.config.dictConfig(
             {
                 'version': 1,
@@ -124,27 +165,32 @@ def configure_log():
                 'loggers': {
                     '': {
                         'handlers': ['console','file'],
-                        'level': 'DEBUG',
+                        'level': root_level,
                         'propagate': True
                     }
                 }
             }
         )
 
+        return start_queue_logging(RepeatedMessageFilter())
+
     except BaseException:
 
         logging.basicConfig(level=logging.INFO)
         logging.exception("Could not configure the logging")
+        return None
        
 
 
 def main():
     """The function to launch the C1 LLM E-mail replier component"""
 
-    configure_log()
+    log_listener = configure_log()
     app = App()
     app.start()
     app.stop()
+    if log_listener is not None:
+        log_listener.stop()
         
 
 
@@ -0,0 +1,258 @@
+# 
+# This file is part of the C1_llm_email_replier distribution (https://github.com/VALAWAI/C1_llm_email_replier).
+# Copyright (c) 2022-2026 VALAWAI (https://valawai.eu/).
+# 
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+# 
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+# 
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+
+import logging
+import os
+import threading
+import weakref
+from collections import Counter, OrderedDict
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Mapping, Optional, Sequence
+
+from c1_llm_email_replier import json_codec
+
+try:
+    import peft
+except ImportError:  # pragma: no cover - peft is optional
+    peft = None
+
+# The name that peft uses for the base model on the batches with several adapters
+BASE_ADAPTER = "__base__"
+
+
+def _sources(value: str) -> Mapping[str, str]:
+    """Convert the JSON with the source of each adapter."""
+
+    try:
+        return {str(name): str(source) for name, source in json_codec.loads(value).items()}
+
+    except (AttributeError, TypeError, ValueError):
+        logging.warning("Ignored the bad adapters %s", value)
+        return {}
+
+
+class _AdapterState:
+    """The adapters loaded on the model of a pipeline."""
+
+    def __init__(self, base_model: Any):
+        self.base_model = base_model
+        self.model: Optional[Any] = None
+        self.loaded: OrderedDict = OrderedDict()
+        self.active: Optional[str] = None
+        self.loading: Optional[str] = None
+        self.running_active = 0
+        self.in_use: Counter = Counter()
+
+
+class AdapterManager:
+    """Load LoRA adapters on top of the models and activate the ones that each generation needs.
+
+    The adapters are defined in ADAPTERS as a JSON object with the Hugging Face identifier
+    or the path of each one. They are loaded the first time that a generation uses them,
+    and the least recently used ones are unloaded when more than ADAPTER_CACHE_SIZE are
+    loaded on a model. The batches whose prompts use the same adapter activate it, which
+    only takes some milliseconds, and the batches that mix adapters, or the base model,
+    select the adapter of each prompt. It requires peft, otherwise the adapters are ignored.
+    """
+
+    def __init__(
+        self,
+        adapters: str = os.getenv('ADAPTERS', "{}"),
+        cache_size: int = int(os.getenv('ADAPTER_CACHE_SIZE', "4")),
+        mov: Optional[Any] = None
+    ):
+        """Initialize the manager
+
+        Parameters
+        ----------
+        adapters : str
+            The JSON object with the Hugging Face identifier, or the path, of each adapter by name.
+        cache_size : int
+            The maximum adapters to keep loaded on each model.
+        mov : MOV, optional
+            The service to send the adapters that are loaded and unloaded.
+        """
+        self.sources = _sources(adapters)
+        self.cache_size = max(1, cache_size)
+        self.mov = mov
+        self.loads = 0
+        self.evictions = 0
+        self.switches = 0
+        self.mixed_batches = 0
+        self._states: weakref.WeakKeyDictionary = weakref.WeakKeyDictionary()
+        self._condition = threading.Condition()
+        self._warned = False
+
+    @property
+    def enabled(self) -> bool:
+        """Check if the adapters can be used."""
+
+        return peft is not None and len(self.sources) > 0
+
+    @contextmanager
+    def use(self, pipe: Any, names: Sequence[Optional[str]]) -> Iterator[Dict[str, Any]]:
+        """Activate the adapters of the prompts of a batch while it is generated.
+
+        Parameters
+        ----------
+        pipe : Pipeline
+            The text-generation pipeline, whose model is wrapped with the adapters the first time one is used.
+        names : sequence of str
+            The adapter of each prompt of the batch, or None for the base model.
+
+        Yields
+        ------
+        dict
+            The arguments to add to the generation, to select the adapter of each prompt.
+        """
+        names = [self._known(name) for name in names]
+        if not self.enabled or (not any(names) and pipe not in self._states):
+            # Nothing to activate, the model has never been wrapped with the adapters
+            yield {}
+            return
+
+        with self._condition:
+            state = self._state(pipe)
+            # The adapters of the batch are not unloaded while the lock is released to load the others
+            state.in_use.update(name for name in names if name)
+            try:
+                for name in dict.fromkeys(name for name in names if name):
+                    self._load(pipe, state, name)
+
+            except BaseException:
+                state.in_use.subtract(name for name in names if name)
+                raise
+
+            uniform = names[0] if len(set(names)) == 1 else None
+            if uniform is not None:
+                # Wait for the generations that use another active adapter
+                while state.running_active > 0 and state.active != uniform:
+                    self._condition.wait()
+
+                if state.active != uniform:
+                    state.model.set_adapter(uniform)
+                    state.active = uniform
+                    self.switches += 1
+                state.running_active += 1
+                arguments: Dict[str, Any] = {}
+
+            else:
+                self.mixed_batches += 1
+                arguments = {'adapter_names': [name or BASE_ADAPTER for name in names]}
+
+        try:
+            yield arguments
+
+        finally:
+            with self._condition:
+                if uniform is not None:
+                    state.running_active -= 1
+                state.in_use.subtract(name for name in names if name)
+                if state.loading is None:
+                    # The adapters loaded while the cache was full of adapters in use
+                    self._evict(state, self.cache_size)
+                self._condition.notify_all()
+
+    def _known(self, name: Optional[str]) -> Optional[str]:
+        """Return the name of an adapter if it is defined, or None to use the base model."""
+
+        if not name:
+            return None
+
+        if name not in self.sources or peft is None:
+            if not self._warned:
+                self._warned = True
+                logging.warning("Ignored the adapter %s, because it is not defined or peft is not installed", name)
+            return None
+
+        return name
+
+    def _state(self, pipe: Any) -> _AdapterState:
+        """Return the adapters of the model of a pipeline, forgetting them if the model has changed."""
+
+        state = self._states.get(pipe)
+        if state is None or pipe.model not in (state.base_model, state.model):
+            state = _AdapterState(pipe.model)
+            self._states[pipe] = state
+
+        return state
+
+    def _load(self, pipe: Any, state: _AdapterState, name: str) -> None:
+        """Load an adapter on a model, unloading the least recently used ones that are not in use.
+
+        It is called holding the lock, that is released while the adapter is read, so the
+        generations with the adapters that are already loaded do not wait for it. Only one
+        adapter is loaded at a time on each model.
+        """
+        while name not in state.loaded and state.loading is not None:
+            # Another generation may be loading the same adapter
+            self._condition.wait()
+
+        if name in state.loaded:
+            state.loaded.move_to_end(name)
+            return
+
+        self._evict(state, self.cache_size - 1)
+        state.loading = name
+        self._condition.release()
+        try:
+            if state.model is None:
+                model = peft.PeftModel.from_pretrained(state.base_model, self.sources[name], adapter_name=name)
+
+            else:
+                model = None
+                state.model.load_adapter(self.sources[name], adapter_name=name)
+
+        finally:
+            self._condition.acquire()
+            state.loading = None
+            self._condition.notify_all()
+
+        if model is not None:
+            state.model = model
+            state.active = name
+            pipe.model = model
+
+        state.loaded[name] = True
+        self.loads += 1
+        logging.info("Loaded the adapter %s", name)
+        if self.mov is not None:
+            self.mov.debug(f"Loaded the adapter {name}", self.metrics())
+
+    def _evict(self, state: _AdapterState, size: int) -> None:
+        """Unload the least recently used adapters that are not in use until only size remain loaded."""
+
+        for evicted in [loaded for loaded in state.loaded if state.in_use[loaded] <= 0 and loaded != state.active]:
+            if len(state.loaded) <= size:
+                break
+            state.model.delete_adapter(evicted)
+            del state.loaded[evicted]
+            self.evictions += 1
+            logging.info("Unloaded the adapter %s", evicted)
+
+    def metrics(self) -> Dict[str, Any]:
+        """Return the adapters that are loaded and how many times they have been loaded, unloaded and switched."""
+
+        loaded: List[str] = [name for state in list(self._states.values()) for name in state.loaded]
+        return {
+            "loaded": loaded,
+            "loads": self.loads,
+            "evictions": self.evictions,
+            "switches": self.switches,
+            "mixed_batches": self.mixed_batches
+        }
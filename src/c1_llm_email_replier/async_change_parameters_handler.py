@@ -0,0 +1,33 @@
+# 
+# This file is part of the C1_llm_email_replier distribution (https://github.com/VALAWAI/C1_llm_email_replier).
+# Copyright (c) 2022-2026 VALAWAI (https://valawai.eu/).
+# 
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+# 
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+# 
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+
+import asyncio
+
+from c1_llm_email_replier.change_parameters_handler import ChangeParametersHandler
+
+
+class AsyncChangeParametersHandler(ChangeParametersHandler):
+    """The component that manage the changes of the component parameters from an asyncio event loop."""
+
+    async def handle_message(self, ch, method, properties, body: bytes) -> None:
+        """Manage the received messages on the channel valawai/c1/llm_email_replier/control/parameters.
+
+        The parameters are persisted to a file and the new models are staged, so the change
+        runs on a worker thread to not block the event loop that serves the other consumers.
+        """
+        await asyncio.to_thread(super().handle_message, ch, method, properties, body)
@@ -0,0 +1,510 @@
+#
+# This file is part of the C1_llm_email_replier distribution (https://github.com/VALAWAI/C1_llm_email_replier).
+# Copyright (c) 2022-2026 VALAWAI (https://valawai.eu/).
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+
+import asyncio
+import inspect
+import logging
+import os
+import threading
+from threading import Thread
+from typing import Any, Callable, Optional
+
+import pika
+from pika.adapters.asyncio_connection import AsyncioConnection
+
+from c1_llm_email_replier import json_codec
+from c1_llm_email_replier.pending_messages import PendingMessages
+
+
+class AsyncMessageService:
+    """The service to send and receive messages from the RabbitMQ using an asyncio event loop.
+
+    It offers the same interface as the MessageService, but all the I/O with the RabbitMQ
+    is done by a single event loop that runs on its own thread since the service is created.
+    The listeners can be coroutine functions, in this case each received message is processed
+    in its own task, so thousands of messages can be in-flight at the same time.
+    """
+
+    def __init__(
+        self,
+        host: str = os.getenv('RABBITMQ_HOST', 'mov-mq'),
+        port: int = int(os.getenv('RABBITMQ_PORT', "5672")),
+        username: str = os.getenv('RABBITMQ_USERNAME', 'mov'),
+        password: str = os.getenv('RABBITMQ_PASSWORD', 'password'),
+        max_retries: int = int(os.getenv('RABBITMQ_MAX_RETRIES', "100")),
+        retry_sleep_seconds: int = int(os.getenv('RABBITMQ_RETRY_SLEEP', "3")),
+        max_in_flight: int = int(os.getenv('ASYNC_MAX_IN_FLIGHT', "1000")),
+        heartbeat: int = int(os.getenv('RABBITMQ_HEARTBEAT', "10")),
+        max_pending_messages: int = int(os.getenv('RABBITMQ_MAX_PENDING_MESSAGES', "10000")),
+        operation_timeout: float = float(os.getenv('RABBITMQ_OPERATION_TIMEOUT', "30")),
+    ):
+        """Initialize the connection to the RabbitMQ
+
+        Parameters
+        ----------
+        host : str
+            The RabbitMQ server host name. By default uses the environment variable RABBITMQ_HOST
+            and if it is not defined uses 'mov-mq'.
+        port : int
+            The RabbitMQ server port. By default uses the environment variable RABBITMQ_PORT
+            and if it is not defined uses '5672'.
+        username : str
+            The user name of the credential to connect to the RabbitMQ serve. By default uses the environment
+            variable RABBITMQ_USERNAME and if it is not defined uses 'mov'.
+        password : str
+            The password of the credential to connect to the RabbitMQ serve. By default uses the environment
+            variable RABBITMQ_PASSWORD and if it is not defined uses 'password'.
+        max_retries : int
+            The number maximum of tries to create a connection with the RabbitMQ server. By default uses
+            the environment variable RABBITMQ_MAX_RETRIES and if it is not defined uses '100'.
+        retry_sleep_seconds : int
+            The seconds to wait between the tries for create a connection with the RabbitMQ server.
+            By default uses the environment variable RABBITMQ_RETRY_SLEEP and if it is not defined uses '3'.
+        max_in_flight : int
+            The maximum number of messages that are processed at the same time by the coroutine listeners.
+            By default uses the environment variable ASYNC_MAX_IN_FLIGHT and if it is not defined uses '1000'.
+        heartbeat : int
+            The seconds of the heartbeat timeout negotiated with the RabbitMQ server. By default uses
+            the environment variable RABBITMQ_HEARTBEAT and if it is not defined uses '10'.
+        max_pending_messages : int
+            The maximum number of messages to publish that are kept while the connection is recovered.
+            By default uses the environment variable RABBITMQ_MAX_PENDING_MESSAGES and if it is not defined uses '10000'.
+        operation_timeout : float
+            The seconds to wait for the broker to open a channel or to declare a queue. By default uses
+            the environment variable RABBITMQ_OPERATION_TIMEOUT and if it is not defined uses '30'.
+        """
+        self.credentials = pika.PlainCredentials(username=username, password=password)
+        self.host = host
+        self.port = port
+        self.connection_params = pika.ConnectionParameters(
+            host=self.host,
+            port=self.port,
+            credentials=self.credentials,
+            heartbeat=heartbeat
+        )
+        self.max_retries = max_retries
+        self.retry_sleep_seconds = retry_sleep_seconds
+        self.max_in_flight = max(1, max_in_flight)
+        self.max_pending_messages = max_pending_messages
+        self.operation_timeout = operation_timeout
+        self._pending_messages = PendingMessages(max_pending_messages)
+        self.listeners: list[tuple[str, Callable, dict[str, Any]]] = []
+        self.loop = asyncio.new_event_loop()
+        self.connection: Optional[AsyncioConnection] = None
+        self.listen_channels: dict[str, Any] = {}
+        self.publish_channel: Any = None
+        self._in_flight: Optional[asyncio.Semaphore] = None
+        self._closed: Optional[asyncio.Future] = None
+        self._tasks: set[asyncio.Task] = set()
+        self._stopping = False
+
+        self._loop_thread = Thread(target=self._run_loop, name="rabbitmq-asyncio", daemon=True)
+        self._loop_thread.start()
+        try:
+            asyncio.run_coroutine_threadsafe(self.connect(), self.loop).result()
+
+        except ValueError:
+            self._stop_loop()
+            raise
+
+        self._consumer = asyncio.run_coroutine_threadsafe(self.consume(), self.loop)
+
+    def _run_loop(self) -> None:
+        """Run the event loop until the service is closed."""
+        asyncio.set_event_loop(self.loop)
+        try:
+            self.loop.run_forever()
+        finally:
+            self.loop.close()
+
+    def _stop_loop(self) -> None:
+        """Stop the event loop and wait until its thread finishes."""
+        if not self.loop.is_closed():
+            self.loop.call_soon_threadsafe(self.loop.stop)
+        if threading.current_thread() is not self._loop_thread:
+            self._loop_thread.join(timeout=self.retry_sleep_seconds)
+
+    def _on_loop_thread(self) -> bool:
+        """Check if the current thread is the one that runs the event loop."""
+        return threading.current_thread() is self._loop_thread
+
+    async def connect(self) -> None:
+        """Establish the connection to RabbitMQ with retries."""
+        for attempt in range(self.max_retries):
+            try:
+                if self.connection is not None and self.connection.is_open:
+                    return
+
+                self.connection = await self._open_connection()
+                self.listen_channels = {}
+                self.publish_channel = await self._open_channel()
+
+                # Re-apply listeners if any, the ones with more priority first
+                for queue, callback, options in sorted(self.listeners, key=lambda listener: -listener[2]['priority']):
+                    await self._apply_listener(queue, callback, **options)
+
+                logging.info(f"Connected to RabbitMQ at {self.host}:{self.port}")
+                self._publish_pending_messages()
+                return
+            except (OSError, pika.exceptions.AMQPError) as error:
+                if self.connection is not None and self.connection.is_open:
+                    self.connection.close()
+                if self._stopping:
+                    return
+                logging.warning(f"Cannot connect to RabbitMQ (attempt {attempt + 1}/{self.max_retries}) because {error}. Retrying in {self.retry_sleep_seconds}s...")
+                self.connection = None
+                await asyncio.sleep(self.retry_sleep_seconds)
+
+        raise ValueError(f"Cannot connect to RabbitMQ at {self.host}:{self.port} after {self.max_retries} attempts")
+
+    def _open_connection(self) -> asyncio.Future:
+        """Open a connection with the RabbitMQ and return a future with it."""
+        opened = self.loop.create_future()
+        self._closed = self.loop.create_future()
+
+        def on_open(connection):
+            if not opened.done():
+                opened.set_result(connection)
+
+        def on_open_error(_connection, error):
+            if not opened.done():
+                if not isinstance(error, (OSError, pika.exceptions.AMQPError)):
+                    error = pika.exceptions.AMQPConnectionError(error)
+                opened.set_exception(error)
+
+        def on_close(_connection, reason):
+            if self._closed is not None and not self._closed.done():
+                self._closed.set_result(reason)
+
+        AsyncioConnection(
+            self.connection_params,
+            on_open_callback=on_open,
+            on_open_error_callback=on_open_error,
+            on_close_callback=on_close,
+            custom_ioloop=self.loop
+        )
+        return opened
+
+    async def _open_channel(self) -> Any:
+        """Open a channel on the current connection."""
+        opened = self.loop.create_future()
+        channel = self.connection.channel(on_open_callback=lambda channel: opened.done() or opened.set_result(channel))
+        return await self._wait_for(channel, opened, "open a channel")
+
+    async def _wait_for(self, channel: Any, future: asyncio.Future, action: str) -> Any:
+        """Wait until the broker completes an action on a channel.
+
+        Parameters
+        ----------
+        channel : Channel
+            The channel of the action.
+        future : asyncio.Future
+            The future that the callback of the action completes.
+        action : str
+            The description of the action, for the errors.
+
+        Returns
+        -------
+        object
+            The result of the action.
+
+        Raises
+        ------
+        ChannelClosed
+            If the channel, or its connection, is closed before the action is completed.
+        TimeoutError
+            If the broker does not complete the action on time.
+        """
+        def on_close(_channel, reason):
+            if not future.done():
+                future.set_exception(reason if isinstance(reason, pika.exceptions.AMQPError) else pika.exceptions.ChannelClosed(0, str(reason)))
+
+        channel.add_on_close_callback(on_close)
+        try:
+            return await asyncio.wait_for(future, timeout=self.operation_timeout)
+
+        except asyncio.TimeoutError:
+            raise TimeoutError(f"The RabbitMQ has not completed the action to {action} in {self.operation_timeout}s") from None
+
+    def close(self) -> None:
+        """Close the connection."""
+        self._stopping = True
+        try:
+            if self.loop.is_closed():
+                return
+
+            self.loop.call_soon_threadsafe(self._close_connection)
+            if not self._on_loop_thread():
+                self._consumer.result(timeout=self.retry_sleep_seconds + self.connection_params.heartbeat)
+                self._stop_loop()
+
+        except (OSError, pika.exceptions.AMQPError, TimeoutError):
+            logging.exception("Cannot close the connection to RabbitMQ")
+        except BaseException:
+            logging.exception("Unexpected error closing RabbitMQ connection")
+
+    def _close_connection(self) -> None:
+        """Close the connection from the event loop."""
+        if self.connection is not None and self.connection.is_open:
+            self.connection.close()
+        elif self._closed is not None and not self._closed.done():
+            self._closed.set_result(None)
+
+    def listen_for(self, queue: str, callback: Callable, prefetch_count: int = 0, priority: int = 0, auto_ack: bool = True) -> None:
+        """Register a listener on a queue.
+
+        Each queue is consumed by its own channel, so a backlog on a queue does not
+        delay the messages received on the other queues.
+
+        Parameters
+        ----------
+        queue : str
+            The name of the queue to listen.
+        callback: method
+            The method to call when a message is received. If it is a coroutine function
+            it is executed as a task on the event loop.
+        prefetch_count: int
+            The maximum number of messages not acknowledged that the queue can deliver,
+            or 0 if it is not limited. It only has effect if the messages are not auto acknowledged.
+        priority: int
+            The priority of the consumer. The channels with more priority are opened first
+            and the broker delivers to them before the ones with less priority.
+        auto_ack: bool
+            True if the messages are acknowledged when they are received, otherwise the
+            callback must call the method 'ack' when the message has been processed.
+        """
+        options = {"prefetch_count": prefetch_count, "priority": priority, "auto_ack": auto_ack}
+        self.listeners.append((queue, callback, options))
+        if self.connection is None or not self.connection.is_open:
+            # The listeners are applied when the connection is recovered
+            return
+
+        if self._on_loop_thread():
+            self.loop.create_task(self._apply_listener(queue, callback, **options))
+        else:
+            asyncio.run_coroutine_threadsafe(self._apply_listener(queue, callback, **options), self.loop).result()
+
+    async def _apply_listener(self, queue: str, callback: Callable, prefetch_count: int = 0, priority: int = 0, auto_ack: bool = True) -> None:
+        """Actually register the listener on its own channel."""
+        channel = await self._open_channel()
+        declared = self.loop.create_future()
+        channel.queue_declare(queue=queue, durable=True, exclusive=False, auto_delete=False, callback=lambda frame: declared.done() or declared.set_result(frame))
+        await self._wait_for(channel, declared, f"declare the queue {queue}")
+        if prefetch_count > 0:
+            qos = self.loop.create_future()
+            channel.basic_qos(prefetch_count=prefetch_count, callback=lambda frame: qos.done() or qos.set_result(frame))
+            await self._wait_for(channel, qos, f"limit the prefetch of the queue {queue}")
+        arguments = {"x-priority": priority} if priority != 0 else None
+        channel.basic_consume(queue=queue, auto_ack=auto_ack, on_message_callback=self._dispatcher_for(callback), arguments=arguments)
+        self.listen_channels[queue] = channel
+        logging.debug(f"Listen for the queue {queue}")
+
+    def ack(self, channel: Any, delivery_tag: int) -> None:
+        """Acknowledge a message received by a listener that is not auto acknowledged.
+
+        This method can be called from any thread.
+
+        Parameters
+        ----------
+        channel : Channel
+            The channel that has received the message.
+        delivery_tag: int
+            The delivery tag of the message to acknowledge.
+        """
+        def basic_ack():
+            if channel is not None and channel.is_open:
+                channel.basic_ack(delivery_tag=delivery_tag)
+
+        try:
+            if self._on_loop_thread():
+                basic_ack()
+            else:
+                self.loop.call_soon_threadsafe(basic_ack)
+
+        except (RuntimeError, pika.exceptions.AMQPError):
+            # The message will be delivered again when the connection is recovered
+            logging.exception(f"Cannot acknowledge the message {delivery_tag}")
+
+    def nack(self, channel: Any, delivery_tag: int, requeue: bool = True) -> None:
+        """Reject a message received by a listener that is not auto acknowledged.
+
+        This method can be called from any thread.
+
+        Parameters
+        ----------
+        channel : Channel
+            The channel that has received the message.
+        delivery_tag: int
+            The delivery tag of the message to reject.
+        requeue: bool
+            True if the message is returned to its queue to be delivered again.
+        """
+        def basic_nack():
+            if channel is not None and channel.is_open:
+                channel.basic_nack(delivery_tag=delivery_tag, requeue=requeue)
+
+        try:
+            if self._on_loop_thread():
+                basic_nack()
+            else:
+                self.loop.call_soon_threadsafe(basic_nack)
+
+        except (RuntimeError, pika.exceptions.AMQPError):
+            # The message will be delivered again when the connection is recovered
+            logging.exception(f"Cannot reject the message {delivery_tag}")
+
+    def _dispatcher_for(self, callback: Callable) -> Callable:
+        """Return the pika callback that forwards the received messages to a listener."""
+        if not inspect.iscoroutinefunction(callback):
+            return callback
+
+        def dispatch(channel, method, properties, body):
+            task = self.loop.create_task(self._run_listener(callback, channel, method, properties, body))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+        return dispatch
+
+    async def _run_listener(self, callback: Callable, channel, method, properties, body: bytes) -> None:
+        """Execute a coroutine listener limiting the number of messages in-flight."""
+        if self._in_flight is None:
+            self._in_flight = asyncio.Semaphore(self.max_in_flight)
+
+        async with self._in_flight:
+            try:
+                await callback(channel, method, properties, body)
+            except Exception:
+                logging.exception("Unexpected error processing a message")
+
+    def publish_to(self, queue: str, msg: Any, delay: float = 0.0) -> None:
+        """Publish a message to a queue.
+
+        This method can be called from any thread. The message is published using
+        the connection of the event loop, so no connection is created by message.
+
+        Parameters
+        ----------
+        queue : str
+            The name of the queue to publish the event.
+        msg: object
+            The message to send.
+        delay: float
+            The seconds that the broker keeps the message before delivering it to the queue.
+        """
+        try:
+            body = json_codec.dumps(msg)
+
+            if not self._pending_messages.add(queue, body, delay):
+                return
+
+            if self._on_loop_thread():
+                self._publish_pending_messages()
+            else:
+                self.loop.call_soon_threadsafe(self._publish_pending_messages)
+
+        except (TypeError, ValueError):
+            logging.exception("Cannot publish a msg because the message could not be encoded")
+        except RuntimeError:
+            logging.exception(f"Cannot publish a msg in the queue {queue} because the event loop is closed")
+
+    def message_count(self, queue: str) -> int:
+        """Return the number of messages that wait on a queue to be delivered.
+
+        This method can be called from any thread, except the one that runs the event loop.
+
+        Parameters
+        ----------
+        queue : str
+            The name of the queue.
+
+        Returns
+        -------
+        int
+            The messages of the queue that have not been delivered, or 0 if they can not be counted.
+        """
+        if self._on_loop_thread() or self.connection is None or not self.connection.is_open:
+            return 0
+
+        try:
+            return asyncio.run_coroutine_threadsafe(self._message_count(queue), self.loop).result()
+
+        except (RuntimeError, TimeoutError, pika.exceptions.AMQPError):
+            logging.debug(f"Cannot count the messages of the queue {queue}", exc_info=True)
+            return 0
+
+    async def _message_count(self, queue: str) -> int:
+        """Obtain the counters of a queue on its own channel, so a failure does not close the other channels."""
+        channel = await self._open_channel()
+        try:
+            declared = self.loop.create_future()
+            # A passive declaration does not modify the queue, it only obtains its counters
+            channel.queue_declare(queue=queue, passive=True, callback=lambda frame: declared.done() or declared.set_result(frame))
+            frame = await self._wait_for(channel, declared, f"count the messages of the queue {queue}")
+            return frame.method.message_count
+
+        finally:
+            if channel.is_open:
+                channel.close()
+
+    def _publish_pending_messages(self) -> None:
+        """Publish the messages that are waiting. It must be called from the event loop."""
+        if self.publish_channel is None or not self.publish_channel.is_open:
+            # They are published when the connection is recovered
+            return
+
+        try:
+            self._pending_messages.publish(self.publish_channel)
+
+        except pika.exceptions.AMQPError:
+            logging.exception("Cannot publish the pending messages, they are published when the connection is recovered")
+
+    async def consume(self) -> None:
+        """Consume the messages with automatic reconnection until the service is closed."""
+        while not self._stopping:
+            try:
+                await self.connect()
+                logging.info(f"Start listening for events on {self.host}:{self.port}")
+                reason = await self._closed
+                if self._stopping:
+                    break
+                # Reconnect immediately, the retries of connect wait if the server is not ready
+                logging.warning(f"Connection lost to RabbitMQ at {self.host}:{self.port} ({reason!r}). Reconnecting...")
+                self.connection = None
+
+            except Exception as error:
+                if self._stopping:
+                    break
+                logging.exception(f"Consuming messages error from RabbitMQ at {self.host}:{self.port} because {error}. Reconnecting...")
+                self.connection = None
+                await asyncio.sleep(self.retry_sleep_seconds)
+
+        if self._tasks:
+            await asyncio.gather(*self._tasks, return_exceptions=True)
+
+    def start_consuming(self) -> None:
+        """Wait until the service is closed while the event loop consumes the messages."""
+        try:
+            while self._loop_thread.is_alive() and not self._consumer.done():
+                self._loop_thread.join(timeout=1)
+
+        except KeyboardInterrupt:
+            logging.info(f"Stop listening for events on {self.host}:{self.port}")
+            self.close()
+
+    def start_consuming_and_forget(self) -> None:
+        """The messages are consumed by the thread of the event loop, so nothing has to be started."""
@@ -0,0 +1,37 @@
+# 
+# This file is part of the C1_llm_email_replier distribution (https://github.com/VALAWAI/C1_llm_email_replier).
+# Copyright (c) 2022-2026 VALAWAI (https://valawai.eu/).
+# 
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+# 
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+# 
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+
+import asyncio
+import logging
+
+from c1_llm_email_replier import json_codec
+from c1_llm_email_replier.mov import MOV
+
+
+class AsyncMOV(MOV):
+    """The component used to interact with the Master Of VALAWAI (MOV) from an asyncio event loop."""
+
+    async def registered_component(self, _ch, _method, _properties, body: bytes) -> None:
+        """Called when the component has been registered."""
+
+        logging.debug("Received registered component %s", body)
+        msg = json_codec.loads(body)
+        self.component_id = msg['id']
+        logging.info("Register C1 LLM E-Mail replier with the identifier '%s'", self.component_id)
+        # Do not block the event loop with the file I/O
+        await asyncio.to_thread(self._store_component_id, msg)
@@ -0,0 +1,97 @@
+# 
+# This file is part of the C1_llm_email_replier distribution (https://github.com/VALAWAI/C1_llm_email_replier).
+# Copyright (c) 2022-2026 VALAWAI (https://valawai.eu/).
+# 
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+# 
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+# 
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+
+import asyncio
+import time
+from typing import Any, List, Set, Tuple
+
+from c1_llm_email_replier.received_e_mail_handler import ReceivedEMailHandler, _OverQuota
+from c1_llm_email_replier.received_e_mail_payload import ReceivedEMailPayload
+from c1_llm_email_replier.reply_scheduler import estimate_tokens
+
+
+class AsyncReceivedEMailHandler(ReceivedEMailHandler):
+    """The component that handle the messages with the e-mails to reply from an asyncio event loop.
+
+    The decoding and the publication of the messages are done on the event loop,
+    and only the generation of the reply is dispatched to the executor.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # Keep a reference to the replies of the coalesced conversations until they finish
+        self._tasks: Set[asyncio.Future] = set()
+
+    async def handle_message(self, ch, method, properties, body: bytes) -> None:
+        """Manage the received messages on the channel valawai/c1/llm_email_replier/data/received_e_mail
+        """
+
+        if self._is_duplicate(body):
+            self._settle_deliveries([(ch, method, body)])
+            return
+
+        key = self._thread_key(body) if self.coalescer.enabled else None
+        if key is not None:
+            # The message is acknowledged when the reply of its conversation has been generated
+            loop = asyncio.get_running_loop()
+            self.coalescer.add(key, (ch, method, body), lambda deliveries: loop.call_soon_threadsafe(self._start_deliveries, deliveries))
+            return
+
+        await self._handle_deliveries([(ch, method, body)])
+
+    def _start_deliveries(self, deliveries: List[Tuple[Any, Any, bytes]]) -> None:
+        """Start on the event loop the processing of the messages of a conversation."""
+
+        task = asyncio.ensure_future(self._handle_deliveries(deliveries))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _handle_deliveries(self, deliveries: List[Tuple[Any, Any, bytes]]) -> None:
+        """Reply once to the messages of a conversation and acknowledge them."""
+
+        e_mails: List[ReceivedEMailPayload] = []
+        body = deliveries[-1][2]
+        delay = None
+        delayed = self._delay_of([body for _, _, body in deliveries])
+        try:
+            e_mails, e_mail, body = self._coalesce([body for _, _, body in deliveries])
+            reply_addresses = self._accept_e_mail(e_mail) if e_mail is not None else None
+            if reply_addresses is not None:
+                self._change_pending(1)
+                try:
+                    sender = self.fairness.sender_of(e_mail.addresses)
+                    future = self.scheduler.submit(
+                        self._reply_under_load, e_mail, body, time.monotonic(), delayed,
+                        received_at=e_mail.received_at, cost=estimate_tokens(e_mail.subject, e_mail.content),
+                        sender=sender, weight=self.fairness.weight(sender)
+                    )
+                    reply = await asyncio.wrap_future(future)
+                finally:
+                    self._change_pending(-1)
+
+                if reply is not None:
+                    self._send_reply(reply_addresses, *reply)
+
+        except _OverQuota as over_quota:
+            delay = self._defer_e_mails(e_mails, over_quota)
+
+        except Exception as error:
+            self._report_failure(error, body)
+
+        finally:
+            self._settle_deliveries(deliveries, delay)
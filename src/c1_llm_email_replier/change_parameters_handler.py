@@ -16,13 +16,14 @@
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 #
 
-import json
 import logging
-import os
-from typing import Any, Union
+from typing import Optional
 
+from c1_llm_email_replier import json_codec
 from c1_llm_email_replier.change_parameters_payload import ChangeParametersPayload
-from c1_llm_email_replier.message_service import MessageService
+from c1_llm_email_replier.component_config import ConfigStore
+from c1_llm_email_replier.message_service import CONTROL_PRIORITY, MessageService
+from c1_llm_email_replier.model_switcher import ModelSwitcher
 from c1_llm_email_replier.mov import MOV
 
 
@@ -31,7 +32,7 @@ class ChangeParametersHandler:
 
     CONTROL_PARAMETERS_TOPIC = 'valawai/c1/llm_email_replier/control/parameters'
 
-    def __init__(self, message_service: MessageService, mov: MOV):
+    def __init__(self, message_service: MessageService, mov: MOV, config_store: Optional[ConfigStore] = None, model_switcher: Optional[ModelSwitcher] = None):
         """Initialize the handler
 
         Parameters
@@ -40,31 +41,39 @@ class ChangeParametersHandler:
                 The service to receive or send messages thought RabbitMQ
         mov : MOV
                 The service to interact with the MOV
+        config_store : ConfigStore, optional
+                The store where the parameters are published. By default the store shared by the process.
+        model_switcher : ModelSwitcher, optional
+                The switcher that validates the new models before using them. If it is not defined
+                the new models are published as any other parameter.
         """
         self.message_service = message_service
         self.mov = mov
-        self.message_service.listen_for(self.CONTROL_PARAMETERS_TOPIC, self.handle_message)
+        self.config_store = config_store or ConfigStore.default()
+        self.model_switcher = model_switcher
+        self.message_service.listen_for(self.CONTROL_PARAMETERS_TOPIC, self.handle_message, priority=CONTROL_PRIORITY)
 
     def handle_message(self, _ch, _method, _properties, body: bytes) -> None:
         """Manage the received messages on the channel valawai/c1/llm_email_replier/control/parameters."""
 
         try:
-            json_dict = json.loads(body)
+            json_dict = json_codec.loads(body)
 
             try:
                 parameters = ChangeParametersPayload(**json_dict)
-                self._update_parameter(parameters.max_new_tokens, "REPLY_MAX_NEW_TOKENS")
-                self._update_parameter(parameters.min_new_tokens, "REPLY_MIN_NEW_TOKENS")
-                self._update_parameter(parameters.temperature, "REPLY_TEMPERATURE")
-                self._update_parameter(parameters.top_k, "REPLY_TOP_K")
-                self._update_parameter(parameters.top_p, "REPLY_TOP_P")
-                self._update_parameter(parameters.system_prompt, "REPLY_SYSTEM_PROMPT")
-
-                # Added missing parameters if they are present in the payload
-                if hasattr(parameters, 'user_prompt'):
-                    self._update_parameter(parameters.user_prompt, "REPLY_USER_PROMPT")
-                if hasattr(parameters, 'model_id'):
-                    self._update_parameter(parameters.model_id, "LLM_MODEL")
+                changes = parameters.model_dump(exclude_none=True)
+                model_id = None
+                if self.model_switcher is not None:
+                    model_id = changes.pop('model_id', None)
+
+                # All the changes are published at once in a new snapshot of the parameters
+                self.config_store.publish(**changes)
+                # Persist them to be restored if the component restarts
+                self.config_store.save()
+                if model_id is not None:
+                    # The model is only staged when the other changes are valid,
+                    # and it is only published when it has been validated
+                    self.model_switcher.stage(model_id)
 
                 self.mov.info("Changed the component parameters", json_dict)
 
@@ -74,21 +83,3 @@ class ChangeParametersHandler:
 
         except ValueError:
             logging.exception("Unexpected message %s", body)
-
-    def _update_parameter(self, value: Union[float, str, None], env_property_name: str) -> None:
-        """Update a parameter in the environment variables.
-
-        Parameters
-        ----------
-        value: float | str | None
-            The new value for the property.
-        env_property_name: str
-            The name of the property that contains the parameter.
-        """
-
-        if value is not None:
-            if isinstance(value, float):
-                os.environ[env_property_name] = str(value)
-            else:
-                os.environ[env_property_name] = str(value)
-
@@ -17,15 +17,25 @@
 #
 
 
-from pydantic import BaseModel, Field
+from typing import Annotated, Literal
 
+from pydantic import Field
 
-class ChangeParametersPayload(BaseModel):
-	"""The payload of the message to change the parameters of the component."""
+from c1_llm_email_replier.generation_parameters_payload import GenerationParametersPayload
+from c1_llm_email_replier.language_identifier import SAMPLES
+from c1_llm_email_replier.language_profile_payload import LanguageProfilePayload
 
-	max_new_tokens: float | None = Field(default=None, ge=100.0, le=1000.0, title="The maximum of tokens to use in the LLM.")
-	min_new_tokens: float | None = Field(default=None, ge=0.0, le=1000.0, title="The minimum of tokens to use in the LLM.")
-	temperature: float | None = Field(default=None, ge=0.0, le=1.0, title="The temperature of the LLM.")
-	top_k: float | None = Field(default=None, ge=1.0, le=100.0, title="The top K to use in the LLM.")
-	top_p: float | None = Field(default=None, ge=0.0, le=1.0, title="The top P to use in the LLM.")
-	system_prompt: str | None = Field(default=None,min_length=10, max_length=10000, title="The prompt to use in the LLM.")
+
+class ChangeParametersPayload(GenerationParametersPayload):
+	"""The payload of the message to change the parameters of the component.
+
+	The generation parameters are the same, with the same bounds, that an e-mail can override.
+	"""
+
+	model_id: str | None = Field(default=None, min_length=1, max_length=256, title="The LLM model to use (https://huggingface.co).")
+	mov_log_level: Literal['DEBUG', 'INFO', 'WARN', 'ERROR'] | None = Field(default=None, title="The minimum level of the log messages to send to the MOV.")
+	mov_log_sampling: dict[str, Annotated[float, Field(ge=0.0, le=1.0)]] | None = Field(default=None, title="The rate of the log messages, by message or level, to send to the MOV.")
+	mov_log_payload_max_size: int | None = Field(default=None, ge=0, title="The maximum characters of the payloads of the log messages sent to the MOV.")
+	mov_log_payload_mode: Literal['truncate', 'hash'] | None = Field(default=None, title="How to reduce the payloads of the log messages that are too big.")
+	kv_cache: Literal['dynamic', 'offloaded', 'quantized'] | None = Field(default=None, title="The implementation of the KV cache of the generations.")
+	language_profiles: dict[Literal[tuple(SAMPLES)], LanguageProfilePayload] | None = Field(default=None, title="The model and the prompts to reply the e-mails of each language that can be identified, by ISO 639-1 code. They replace the previous ones.")
@@ -0,0 +1,335 @@
+# 
+# This file is part of the C1_llm_email_replier distribution (https://github.com/VALAWAI/C1_llm_email_replier).
+# Copyright (c) 2022-2026 VALAWAI (https://valawai.eu/).
+# 
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+# 
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+# 
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+
+
+import dataclasses
+import json
+import logging
+import os
+import tempfile
+import threading
+from dataclasses import dataclass, field
+from types import MappingProxyType
+from typing import Any, Callable, Dict, Mapping, Optional
+
+from c1_llm_email_replier import json_codec
+from c1_llm_email_replier.language_identifier import SAMPLES
+from c1_llm_email_replier.language_profile_payload import LanguageProfilePayload
+
+
+def _sampling(value: Any) -> Mapping[str, float]:
+    """Convert a value to the read-only rates of the MOV log sampling."""
+
+    if isinstance(value, (str, bytes)):
+        value = json_codec.loads(value)
+
+    return MappingProxyType({str(key): float(rate) for key, rate in value.items()})
+
+
+def _language_profiles(value: Any) -> Mapping[str, Mapping[str, Any]]:
+    """Convert a value to the read-only profiles of the languages, validating them."""
+
+    if isinstance(value, (str, bytes)):
+        value = json_codec.loads(value)
+
+    # The e-mails of the languages without samples are never identified
+    unknown = sorted(str(language).lower() for language in value if str(language).lower() not in SAMPLES)
+    if unknown:
+        raise ValueError(f"The languages {', '.join(unknown)} can not be identified, only {', '.join(SAMPLES)}")
+
+    return MappingProxyType({
+        str(language).lower(): MappingProxyType(LanguageProfilePayload(**dict(profile)).model_dump(exclude_none=True))
+        for language, profile in value.items()
+    })
+
+
+def _plain(value: Any) -> Any:
+    """Convert the read-only mappings of a value to JSON compatible dictionaries."""
+
+    if isinstance(value, Mapping):
+        return {key: _plain(item) for key, item in value.items()}
+
+    return value
+
+
+# The environment property that defines the initial value of each parameter
+ENVIRONMENT_PROPERTIES: Mapping[str, str] = MappingProxyType({
+    'model_id': 'LLM_MODEL',
+    'max_new_tokens': 'REPLY_MAX_NEW_TOKENS',
+    'min_new_tokens': 'REPLY_MIN_NEW_TOKENS',
+    'temperature': 'REPLY_TEMPERATURE',
+    'top_k': 'REPLY_TOP_K',
+    'top_p': 'REPLY_TOP_P',
+    'system_prompt': 'REPLY_SYSTEM_PROMPT',
+    'user_prompt': 'REPLY_USER_PROMPT',
+    'mov_log_level': 'MOV_LOG_LEVEL',
+    'mov_log_sampling': 'MOV_LOG_SAMPLING',
+    'mov_log_payload_max_size': 'MOV_LOG_PAYLOAD_MAX_SIZE',
+    'mov_log_payload_mode': 'MOV_LOG_PAYLOAD_MODE',
+    'language_profiles': 'LANGUAGE_PROFILES',
+    'kv_cache': 'KV_CACHE',
+    'adapter': 'REPLY_ADAPTER'
+})
+
+# How to convert the values of each parameter
+CONVERTERS: Mapping[str, Callable[[Any], Any]] = MappingProxyType({
+    'model_id': str,
+    'max_new_tokens': lambda value: int(float(value)),
+    'min_new_tokens': lambda value: int(float(value)),
+    'temperature': float,
+    'top_k': lambda value: int(float(value)),
+    'top_p': float,
+    'system_prompt': str,
+    'user_prompt': str,
+    'mov_log_level': lambda value: str(value).upper(),
+    'mov_log_sampling': _sampling,
+    'mov_log_payload_max_size': lambda value: int(float(value)),
+    'mov_log_payload_mode': lambda value: str(value).lower(),
+    'language_profiles': _language_profiles,
+    'kv_cache': lambda value: str(value).lower(),
+    'adapter': str
+})
+
+
+def parameters_file_path() -> str:
+    """Return the path of the file where the parameters of the component are persisted."""
+
+    return os.path.join(os.getenv("LOG_DIR", "logs"), os.getenv("PARAMETERS_FILE_NAME", "parameters.json"))
+
+
+@dataclass(frozen=True)
+class ComponentConfig:
+    """An immutable snapshot of the parameters of the component.
+
+    Each time the parameters change a new snapshot is created with a greater version,
+    so the components that use the parameters only have to compare the version of the
+    last snapshot they have seen to know if they must rebuild anything.
+    """
+
+    version: int = 0
+    model_id: str = "HuggingFaceH4/zephyr-7b-beta"
+    max_new_tokens: int = 256
+    min_new_tokens: int = 0
+    temperature: float = 0.7
+    top_k: int = 50
+    top_p: float = 0.95
+    system_prompt: str = "You are a polite chatbot who always tries to provide solutions to the customer's problems"
+    user_prompt: str = "Reply to an e-mail with the subject '{subject}' and the content '{content}'"
+    mov_log_level: str = 'DEBUG'
+    mov_log_sampling: Mapping[str, float] = field(default_factory=lambda: MappingProxyType({}))
+    mov_log_payload_max_size: int = 65536
+    mov_log_payload_mode: str = 'truncate'
+    language_profiles: Mapping[str, Mapping[str, Any]] = field(default_factory=lambda: MappingProxyType({}))
+    kv_cache: str = 'dynamic'
+    adapter: str = ""
+
+    @classmethod
+    def from_env(cls) -> 'ComponentConfig':
+        """Create the first snapshot from the environment properties.
+
+        The properties that are not defined or that are not valid take the default value.
+        """
+
+        values: Dict[str, Any] = {}
+        for name, env_property_name in ENVIRONMENT_PROPERTIES.items():
+            value = os.getenv(env_property_name)
+            if value is not None:
+                try:
+                    values[name] = CONVERTERS[name](value)
+                except (AttributeError, TypeError, ValueError):
+                    logging.warning("Ignored the bad value of %s", env_property_name)
+
+        return cls(**values)
+
+    def with_changes(self, **changes: Any) -> 'ComponentConfig':
+        """Create the next snapshot with some parameters changed.
+
+        Parameters
+        ----------
+        changes : dict
+            The new values of the parameters. The values that are None are ignored.
+
+        Returns
+        -------
+        ComponentConfig
+            The snapshot with the changes and the next version.
+
+        Raises
+        ------
+        ValueError
+            If a parameter is not defined or its value is not valid.
+        """
+        values: Dict[str, Any] = {}
+        for name, value in changes.items():
+            if name not in CONVERTERS:
+                raise ValueError(f"Undefined parameter {name}")
+
+            if value is not None:
+                try:
+                    values[name] = CONVERTERS[name](value)
+                except (AttributeError, TypeError) as error:
+                    raise ValueError(f"Bad value for the parameter {name}") from error
+
+        return dataclasses.replace(self, version=self.version + 1, **values)
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Return the value of each parameter, without the version, as JSON compatible values."""
+
+        values: Dict[str, Any] = {}
+        for name in CONVERTERS:
+            values[name] = _plain(getattr(self, name))
+
+        return values
+
+
+class ConfigStore:
+    """Keep the last snapshot of the parameters of the component.
+
+    The snapshot is replaced atomically, so any thread can obtain the current
+    parameters with a single attribute read of current.
+    """
+
+    _default: Optional['ConfigStore'] = None
+    _default_lock = threading.Lock()
+
+    def __init__(self, config: Optional[ComponentConfig] = None):
+        """Initialize the store
+
+        Parameters
+        ----------
+        config : ComponentConfig, optional
+            The initial snapshot. By default it is created from the environment properties.
+        """
+        self.current: ComponentConfig = config if config is not None else ComponentConfig.from_env()
+        self._lock = threading.Lock()
+        self._save_lock = threading.Lock()
+
+    @classmethod
+    def default(cls) -> 'ConfigStore':
+        """Return the store shared by the components of the process."""
+
+        if cls._default is None:
+            with cls._default_lock:
+                if cls._default is None:
+                    cls._default = ConfigStore()
+
+        return cls._default
+
+    def publish(self, **changes: Any) -> ComponentConfig:
+        """Publish a new snapshot with some parameters changed.
+
+        Parameters
+        ----------
+        changes : dict
+            The new values of the parameters. The values that are None are ignored.
+
+        Returns
+        -------
+        ComponentConfig
+            The published snapshot.
+
+        Raises
+        ------
+        ValueError
+            If a parameter is not defined or its value is not valid.
+        """
+        with self._lock:
+            config = self.current.with_changes(**changes)
+            self.current = config
+
+        logging.debug("Published the version %d of the component parameters", config.version)
+        return config
+
+    def save(self, path: Optional[str] = None) -> bool:
+        """Persist the current parameters, so they can be restored when the component restarts.
+
+        The parameters are written into a temporary file that replaces the previous one,
+        so the file always contains a complete set of parameters even if the process dies
+        while it is written.
+
+        Parameters
+        ----------
+        path : str, optional
+            The file to write. By default the parameters file of the LOG_DIR.
+
+        Returns
+        -------
+        bool
+            True if the parameters have been persisted.
+        """
+        path = path or parameters_file_path()
+        try:
+            directory = os.path.dirname(path) or "."
+            os.makedirs(directory, exist_ok=True)
+            with self._save_lock:
+                # Read the snapshot inside the lock, so a slower save never overwrites a newer one
+                config = self.current
+                file_descriptor, temporal_path = tempfile.mkstemp(prefix=".parameters.", dir=directory)
+                try:
+                    with os.fdopen(file_descriptor, "w") as parameters_file:
+                        json.dump(config.to_dict(), parameters_file, sort_keys=True, indent=2)
+                        parameters_file.flush()
+                        os.fsync(parameters_file.fileno())
+                    os.replace(temporal_path, path)
+
+                except BaseException:
+                    os.unlink(temporal_path)
+                    raise
+
+            logging.debug("Persisted the version %d of the component parameters", config.version)
+            return True
+
+        except (OSError, TypeError, ValueError):
+            logging.exception("Could not persist the component parameters")
+            return False
+
+    def restore(self, path: Optional[str] = None) -> ComponentConfig:
+        """Publish the parameters persisted by a previous execution of the component.
+
+        It must be called before creating the components that use the parameters, so the
+        model defined on the persisted parameters is the only one that is loaded.
+
+        Parameters
+        ----------
+        path : str, optional
+            The file to read. By default the parameters file of the LOG_DIR.
+
+        Returns
+        -------
+        ComponentConfig
+            The current snapshot, that is not changed if there are no persisted parameters.
+        """
+        path = path or parameters_file_path()
+        if not os.path.isfile(path):
+            return self.current
+
+        try:
+            with open(path) as parameters_file:
+                values = json.load(parameters_file)
+
+            for name in [name for name in values if name not in CONVERTERS]:
+                logging.warning("Ignored the undefined persisted parameter %s", name)
+                del values[name]
+
+            config = self.publish(**values)
+            logging.info("Restored the component parameters from %s", path)
+            return config
+
+        except (AttributeError, OSError, TypeError, ValueError):
+            logging.exception("Could not restore the component parameters from %s", path)
+            return self.current
@@ -0,0 +1,174 @@
+# 
+# This file is part of the C1_llm_email_replier distribution (https://github.com/VALAWAI/C1_llm_email_replier).
+# Copyright (c) 2022-2026 VALAWAI (https://valawai.eu/).
+# 
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+# 
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+# 
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Optional
+
+import torch
+
+from c1_llm_email_replier.generation_batcher import GenerationBatcher
+
+
+class ConcurrencyController:
+    """Adapt the concurrency of the generations to the observed latency and throughput.
+
+    It follows an additive increase, multiplicative decrease (AIMD) policy. After each
+    window of generations, if the latency is below the target and the throughput has not
+    dropped, the number of generations that can run at the same time and the batch size
+    are increased by one. Otherwise they are halved. The torch intra-op threads are shared
+    between the generations that run at the same time.
+    """
+
+    def __init__(
+        self,
+        batcher: Optional[GenerationBatcher] = None,
+        min_workers: int = 1,
+        max_workers: int = int(os.getenv('REPLY_MAX_WORKERS', "1")),
+        max_batch_size: int = int(os.getenv('REPLY_BATCH_SIZE', "1")),
+        max_threads: int = int(os.getenv('CONCURRENCY_MAX_THREADS', str(torch.get_num_threads()))),
+        target_latency: float = float(os.getenv('CONCURRENCY_TARGET_LATENCY', "0")),
+        window: int = int(os.getenv('CONCURRENCY_WINDOW', "8")),
+        mov: Optional[Any] = None
+    ):
+        """Initialize the controller
+
+        Parameters
+        ----------
+        batcher : GenerationBatcher, optional
+            The batcher whose batch size is adapted.
+        min_workers : int
+            The minimum number of generations that can run at the same time.
+        max_workers : int
+            The maximum number of generations that can run at the same time.
+        max_batch_size : int
+            The maximum number of e-mails to generate in a batch.
+        max_threads : int
+            The torch intra-op threads to share between the generations.
+        target_latency : float
+            The maximum seconds that a generation should take. If it is 0 only the throughput is considered.
+        window : int
+            The number of generations to observe before adapting the concurrency.
+        mov : MOV, optional
+            The service to send the decisions.
+        """
+        self.batcher = batcher
+        self.max_workers = max(1, max_workers)
+        self.min_workers = min(max(1, min_workers), self.max_workers)
+        self.max_batch_size = max(1, max_batch_size)
+        self.max_threads = max(1, max_threads)
+        self.target_latency = max(0.0, target_latency)
+        self.window = max(1, window)
+        self.mov = mov
+
+        # Start with the minimum concurrency and increase it while it helps
+        self.workers = self.min_workers
+        self.batch_size = 1
+        self.threads = self.max_threads
+        self.active = 0
+        self.throughput: Optional[float] = None
+        self.last_action: Optional[str] = None
+        self._latencies: List[float] = []
+        self._window_start = time.monotonic()
+        self._condition = threading.Condition()
+        self._apply()
+
+    @contextmanager
+    def slot(self) -> Iterator[None]:
+        """Wait until a generation can start and measure how long it takes."""
+
+        with self._condition:
+            while self.active >= self.workers:
+                self._condition.wait()
+            self.active += 1
+
+        start = time.monotonic()
+        try:
+            yield
+
+        finally:
+            latency = time.monotonic() - start
+            with self._condition:
+                self.active -= 1
+                self._record(latency)
+                self._condition.notify_all()
+
+    def _record(self, latency: float) -> None:
+        """Add the latency of a generation and adapt the concurrency when a window is complete."""
+
+        self._latencies.append(latency)
+        if len(self._latencies) < self.window:
+            return
+
+        now = time.monotonic()
+        latency = sum(self._latencies) / len(self._latencies)
+        throughput = len(self._latencies) / max(now - self._window_start, 1e-9)
+        self._latencies = []
+        self._window_start = now
+
+        # The last increase is undone if it has reduced the throughput
+        worse = self.last_action == "increase" and self.throughput is not None and throughput < 0.9 * self.throughput
+        if (self.target_latency > 0 and latency > self.target_latency) or worse:
+            workers = max(self.min_workers, self.workers // 2)
+            batch_size = max(1, self.batch_size // 2)
+            action = "decrease"
+        else:
+            workers = min(self.max_workers, self.workers + 1)
+            batch_size = min(self.max_batch_size, self.batch_size + 1)
+            action = "increase"
+
+        self.throughput = throughput
+        self.last_action = action
+        if (workers, batch_size) != (self.workers, self.batch_size):
+            self.workers = workers
+            self.batch_size = batch_size
+            self._apply()
+            self._log_decision(action, latency, throughput)
+
+    def _apply(self) -> None:
+        """Apply the concurrency to the batcher and to torch."""
+
+        if self.batcher is not None:
+            self.batcher.max_batch_size = self.batch_size
+
+        # Each generation that runs at the same time uses its share of the threads
+        threads = max(1, self.max_threads // self.workers)
+        if threads != torch.get_num_threads():
+            torch.set_num_threads(threads)
+        self.threads = threads
+
+    def _log_decision(self, action: str, latency: float, throughput: float) -> None:
+        """Log a change of the concurrency."""
+
+        decision: Dict[str, Any] = {
+            "action": action,
+            "workers": self.workers,
+            "batch_size": self.batch_size,
+            "threads": self.threads,
+            "latency": latency,
+            "throughput": throughput
+        }
+        logging.info(
+            "Concurrency %s to %d workers, batch size %d and %d threads (latency %.2f s, throughput %.2f replies/s)",
+            action, self.workers, self.batch_size, self.threads, latency, throughput
+        )
+        if self.mov is not None:
+            self.mov.debug("Changed the concurrency of the generations", decision)
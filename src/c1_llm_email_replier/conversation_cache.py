@@ -0,0 +1,232 @@
+# 
+# This file is part of the C1_llm_email_replier distribution (https://github.com/VALAWAI/C1_llm_email_replier).
+# Copyright (c) 2022-2026 VALAWAI (https://valawai.eu/).
+# 
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+# 
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+# 
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+
+import copy
+import os
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Dict, Hashable, Iterator, List, Optional, Tuple
+
+MEGABYTE = 1048576
+
+
+def _cache_tensors(past_key_values: Any) -> Iterator[Any]:
+    """Iterate over the key and value tensors of a KV cache."""
+
+    if hasattr(past_key_values, 'layers'):
+        for layer in past_key_values.layers:
+            for tensor in (getattr(layer, 'keys', None), getattr(layer, 'values', None)):
+                if tensor is not None:
+                    yield tensor
+
+            # The quantized layers keep the older tokens apart, with the parameters of their quantization
+            for quantized in (getattr(layer, '_quantized_keys', None), getattr(layer, '_quantized_values', None)):
+                if isinstance(quantized, tuple):
+                    yield from (tensor for tensor in quantized if hasattr(tensor, 'element_size'))
+
+    elif hasattr(past_key_values, 'key_cache'):
+        yield from past_key_values.key_cache
+        yield from past_key_values.value_cache
+
+    elif isinstance(past_key_values, (list, tuple)):
+        for layer in past_key_values:
+            yield from _cache_tensors(layer) if isinstance(layer, (list, tuple)) else [layer]
+
+
+def cache_bytes(past_key_values: Any) -> int:
+    """Return the memory used by the tensors of a KV cache.
+
+    Parameters
+    ----------
+    past_key_values : Cache or tuple
+        The KV cache returned by the model.
+
+    Returns
+    -------
+    int
+        The bytes of the keys and the values of all the layers.
+    """
+    return sum(tensor.numel() * tensor.element_size() for tensor in _cache_tensors(past_key_values) if hasattr(tensor, 'numel'))
+
+
+@dataclass
+class ConversationState:
+    """The last turn of a conversation and the KV cache of its tokens."""
+
+    model_id: str
+    messages: List[Dict[str, str]]
+    token_ids: List[int]
+    past_key_values: Any
+    size: int = 0
+    adapter: Optional[str] = None
+
+    def prefix_length(self, token_ids: List[int]) -> int:
+        """Return the tokens at the start of a prompt whose keys and values are on the cache.
+
+        At least the last token of the prompt is not reused, so the model has something to prefill.
+        """
+        length = 0
+        for cached, token in zip(self.token_ids, token_ids[:-1]):
+            if cached != token:
+                break
+            length += 1
+
+        return length
+
+    def reusable_cache(self, token_ids: List[int]) -> Tuple[Any, int]:
+        """Return a copy of the cache cropped to the prefix that a prompt shares with the conversation.
+
+        The generation extends the cache that it receives, so the one of the conversation is not modified.
+
+        Parameters
+        ----------
+        token_ids : list of int
+            The tokens of the prompt to generate.
+
+        Returns
+        -------
+        (Cache, int)
+            The cache to pass to the model and the tokens that it has. The cache is None if nothing is reused.
+        """
+        length = self.prefix_length(token_ids)
+        if length == 0 or not hasattr(self.past_key_values, 'crop'):
+            return None, 0
+
+        past_key_values = copy.deepcopy(self.past_key_values)
+        extra = past_key_values.get_seq_length() - length
+        if extra > 0:
+            # A negative value removes the tokens at the end of the cache
+            past_key_values.crop(-extra)
+
+        return past_key_values, length
+
+
+class ConversationCache:
+    """Keep the KV cache of the last turn of the recent conversations to not prefill them again.
+
+    The conversations are identified by their sender and normalized subject. When a follow-up
+    arrives its prompt starts with the system prompt, the previous e-mails and the previous
+    replies of the conversation, so only the tokens of the new e-mail must be prefilled. The
+    least recently used conversations are evicted when the memory of the caches exceeds the limit.
+    """
+
+    def __init__(
+        self,
+        max_memory: float = float(os.getenv('CONVERSATION_CACHE_MEMORY', "0")),
+        max_tokens: int = int(os.getenv('CONVERSATION_MAX_TOKENS', "2048"))
+    ):
+        """Initialize the cache
+
+        Parameters
+        ----------
+        max_memory : float
+            The megabytes that the KV caches of the conversations can use. If it is 0 nothing is cached.
+        max_tokens : int
+            The maximum tokens of the prompt of a conversation. The oldest turns are forgotten to not exceed it.
+        """
+        self.max_memory = max(0, int(max_memory * MEGABYTE))
+        self.max_tokens = max(1, max_tokens)
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.reused_tokens = 0
+        self.prefilled_tokens = 0
+        self._states: OrderedDict = OrderedDict()
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self) -> bool:
+        """Check if the conversations are cached."""
+
+        return self.max_memory > 0
+
+    def get(self, conversation: Hashable) -> Optional[ConversationState]:
+        """Return the last turn of a conversation, marking it as the most recently used."""
+
+        with self._lock:
+            state = self._states.get(conversation)
+            if state is None:
+                self.misses += 1
+                return None
+
+            self.hits += 1
+            self._states.move_to_end(conversation)
+            return state
+
+    def put(self, conversation: Hashable, state: ConversationState) -> bool:
+        """Store the last turn of a conversation, evicting the least recently used ones if the memory is exceeded.
+
+        Parameters
+        ----------
+        conversation : hashable
+            The conversation.
+        state : ConversationState
+            The messages, the tokens and the KV cache of the conversation.
+
+        Returns
+        -------
+        bool
+            True if it has been stored, or False if its cache alone exceeds the memory limit.
+        """
+        state.size = cache_bytes(state.past_key_values)
+        with self._lock:
+            previous = self._states.pop(conversation, None)
+            if previous is not None:
+                self.size -= previous.size
+
+            if state.size > self.max_memory:
+                return False
+
+            while self._states and self.size + state.size > self.max_memory:
+                _, evicted = self._states.popitem(last=False)
+                self.size -= evicted.size
+                self.evictions += 1
+
+            self._states[conversation] = state
+            self.size += state.size
+            return True
+
+    def count_prefill(self, reused: int, prefilled: int) -> None:
+        """Count the prompt tokens that have been reused from the cache and the ones that have been prefilled."""
+
+        with self._lock:
+            self.reused_tokens += reused
+            self.prefilled_tokens += prefilled
+
+    def clear(self) -> None:
+        """Forget all the conversations, to free their memory."""
+
+        with self._lock:
+            self._states.clear()
+            self.size = 0
+
+    def metrics(self) -> Dict[str, Any]:
+        """Return the usage of the cache."""
+
+        with self._lock:
+            return {
+                "conversations": len(self._states),
+                "bytes": self.size,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "reused_tokens": self.reused_tokens,
+                "prefilled_tokens": self.prefilled_tokens
+            }
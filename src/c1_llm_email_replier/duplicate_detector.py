@@ -0,0 +1,205 @@
+# 
+# This file is part of the C1_llm_email_replier distribution (https://github.com/VALAWAI/C1_llm_email_replier).
+# Copyright (c) 2022-2026 VALAWAI (https://valawai.eu/).
+# 
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+# 
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+# 
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+
+import hashlib
+import math
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, List
+
+from c1_llm_email_replier.received_e_mail_payload import ReceivedEMailPayload
+
+
+def e_mail_fingerprint(e_mail: ReceivedEMailPayload) -> bytes:
+    """Return the fingerprint that identifies the deliveries of the same e-mail.
+
+    Parameters
+    ----------
+    e_mail : ReceivedEMailPayload
+        The received e-mail.
+
+    Returns
+    -------
+    bytes
+        The SHA-256 of the addresses, the subject, the content and the time when the e-mail was received.
+    """
+    addresses = sorted(f"{address.address_type.value if address.address_type else ''}:{(address.address or '').strip().lower()}" for address in e_mail.addresses)
+    content = hashlib.sha256((e_mail.content or "").encode('utf-8')).hexdigest()
+    identity = "\n".join(("|".join(addresses), e_mail.subject or "", content, str(e_mail.received_at)))
+    return hashlib.sha256(identity.encode('utf-8')).digest()
+
+
+class _BloomFilter:
+    """A fixed size set of fingerprints that can have false positives, but not false negatives."""
+
+    def __init__(self, bits: int, hashes: int):
+        self.bits = bits
+        self.hashes = hashes
+        self.array = bytearray((bits + 7) // 8)
+        self.count = 0
+
+    def _positions(self, fingerprint: bytes) -> List[int]:
+        """Return the bits of a fingerprint, by double hashing."""
+
+        first = int.from_bytes(fingerprint[:8], 'little')
+        second = int.from_bytes(fingerprint[8:16], 'little') | 1
+        return [(first + index * second) % self.bits for index in range(self.hashes)]
+
+    def add(self, fingerprint: bytes) -> None:
+        for position in self._positions(fingerprint):
+            self.array[position >> 3] |= 1 << (position & 7)
+        self.count += 1
+
+    def clear(self) -> None:
+        self.array[:] = bytes(len(self.array))
+        self.count = 0
+
+    def __contains__(self, fingerprint: bytes) -> bool:
+        return all(self.array[position >> 3] & (1 << (position & 7)) for position in self._positions(fingerprint))
+
+
+class DuplicateDetector:
+    """Detect the e-mails that have been delivered more than once on a time window.
+
+    The last fingerprints are kept exactly on a FIFO set of fixed size, and all the fingerprints
+    of the window are kept on two Bloom filters, the current one and the previous one, that are
+    rotated when the window finishes or the current one reaches its capacity. So the memory is
+    fixed whatever the load, and an e-mail is remembered at least one window from when it was
+    first received, unless the capacity is reached before. While the exact set has all the
+    fingerprints of the filters their hits are confirmed on it, so the false positives of the
+    filters are not dropped.
+    """
+
+    def __init__(
+        self,
+        window: float = float(os.getenv('DUPLICATE_WINDOW', "3600")),
+        capacity: int = int(os.getenv('DUPLICATE_CAPACITY', "100000")),
+        false_positive_rate: float = float(os.getenv('DUPLICATE_FALSE_POSITIVE_RATE', "0.0001")),
+        exact_size: int = int(os.getenv('DUPLICATE_EXACT_SIZE', "10000")),
+        clock: Callable[[], float] = time.monotonic
+    ):
+        """Initialize the detector
+
+        Parameters
+        ----------
+        window : float
+            The seconds to remember an e-mail. If it is 0 the duplicates are not detected.
+        capacity : int
+            The e-mails to remember on each Bloom filter.
+        false_positive_rate : float
+            The probability that a new e-mail is considered a duplicate when the filters are full.
+        exact_size : int
+            The last e-mails to remember exactly.
+        clock : callable
+            The function that returns the current time in seconds.
+        """
+        self.window = max(0.0, window)
+        self.capacity = max(1, capacity)
+        rate = min(0.5, max(1e-12, false_positive_rate))
+        self.bits = max(64, int(math.ceil(-self.capacity * math.log(rate) / (math.log(2) ** 2))))
+        self.hashes = max(1, int(round(self.bits / self.capacity * math.log(2))))
+        self.exact_size = max(0, exact_size)
+        self.clock = clock
+        self.duplicates = 0
+        self._current = _BloomFilter(self.bits, self.hashes)
+        self._previous = _BloomFilter(self.bits, self.hashes)
+        self._rotated_at = clock()
+        self._previous_since = self._rotated_at
+        # When the last fingerprint that did not fit on the exact set was seen
+        self._overflowed_at = float('-inf') if self.exact_size > 0 else float('inf')
+        self._recent: OrderedDict = OrderedDict()
+        self._expected: OrderedDict = OrderedDict()
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self) -> bool:
+        """Check if the duplicates are detected."""
+
+        return self.window > 0
+
+    def seen(self, e_mail: ReceivedEMailPayload) -> bool:
+        """Check if an e-mail has been seen on the window, remembering it otherwise.
+
+        Parameters
+        ----------
+        e_mail : ReceivedEMailPayload
+            The received e-mail.
+
+        Returns
+        -------
+        bool
+            True if the e-mail is a duplicate.
+        """
+        if not self.enabled:
+            return False
+
+        fingerprint = e_mail_fingerprint(e_mail)
+        with self._lock:
+            if self._expected.pop(fingerprint, None) is not None:
+                # The component has published the e-mail again to reply it later
+                return False
+
+            now = self.clock()
+            self._rotate(now)
+            if fingerprint in self._recent:
+                self.duplicates += 1
+                return True
+
+            # The exact set confirms the hits of the filters while it has all their fingerprints
+            if (fingerprint in self._current or fingerprint in self._previous) and self._overflowed_at >= self._previous_since:
+                self.duplicates += 1
+                return True
+
+            self._current.add(fingerprint)
+            if self.exact_size > 0:
+                self._recent[fingerprint] = now
+                while len(self._recent) > self.exact_size:
+                    _, self._overflowed_at = self._recent.popitem(last=False)
+
+            return False
+
+    def expect(self, e_mail: ReceivedEMailPayload) -> None:
+        """Accept the next delivery of an e-mail that the component has published again.
+
+        Parameters
+        ----------
+        e_mail : ReceivedEMailPayload
+            The e-mail that will be delivered again.
+        """
+        if not self.enabled:
+            return
+
+        with self._lock:
+            self._expected[e_mail_fingerprint(e_mail)] = True
+            while len(self._expected) > max(1, self.exact_size):
+                self._expected.popitem(last=False)
+
+    def _rotate(self, now: float) -> None:
+        """Start a new Bloom filter when the window finishes or the current one is full."""
+
+        if now - self._rotated_at >= self.window or self._current.count >= self.capacity:
+            # The arrays are reused, so no memory is allocated
+            self._previous, self._current = self._current, self._previous
+            self._current.clear()
+            self._previous_since, self._rotated_at = self._rotated_at, now
+
+        # The exact fingerprints older than two windows are forgotten, as the Bloom filters do
+        while self._recent and next(iter(self._recent.values())) <= now - 2 * self.window:
+            self._recent.popitem(last=False)
@@ -0,0 +1,234 @@
+# 
+# This file is part of the C1_llm_email_replier distribution (https://github.com/VALAWAI/C1_llm_email_replier).
+# Copyright (c) 2022-2026 VALAWAI (https://valawai.eu/).
+# 
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+# 
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+# 
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+
+import hashlib
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, Dict, Iterable, Optional
+
+from c1_llm_email_replier.subject_normalizer import normalize_subject
+
+# The classes of the e-mails that must not be replied by the LLM
+NO_REPLY_SENDER = 'noreply_sender'
+BOUNCE = 'bounce'
+AUTO_REPLY = 'auto_reply'
+OWN_REPLY = 'own_reply'
+THREAD_LOOP = 'thread_loop'
+AUTOMATED = 'automated'
+
+_QUOTE_MARKS = re.compile(r'^[\s>]+', re.MULTILINE)
+_SPACES = re.compile(r'\s+')
+
+# The phrases that appear on the automatically generated e-mails and their weight
+_AUTOMATED_PHRASES = {
+    "this is an automatically generated": 2.0,
+    "this message was sent automatically": 2.0,
+    "do not reply to this e-mail": 1.5,
+    "do not reply to this email": 1.5,
+    "please do not reply": 1.5,
+    "this mailbox is not monitored": 1.5,
+    "unsubscribe": 1.0,
+    "you are receiving this": 1.0,
+    "view this email in your browser": 1.0,
+    "notification settings": 0.5
+}
+
+
+def _fingerprint(text: Optional[str]) -> Optional[str]:
+    """Return the fingerprint of the beginning of a text, ignoring the quote marks, the spaces and the case."""
+
+    text = _SPACES.sub(' ', _QUOTE_MARKS.sub('', text or '')).strip().lower()
+    if not text:
+        return None
+
+    return hashlib.sha256(text[:256].encode('utf-8')).hexdigest()
+
+
+class EMailClassifier:
+    """Detect, with cheap rules, the e-mails that must not be replied by the LLM.
+
+    It detects the e-mails sent by addresses that do not accept replies, the bounces and
+    the automatic replies by their subject, the e-mails that contain one of the replies
+    sent by the component, the threads where the component has replied too many times in
+    a short time, which indicates a mail loop, and the e-mails whose content has enough
+    phrases of the automatically generated e-mails. It also counts the generation time
+    that has been saved by not replying them.
+    """
+
+    def __init__(
+        self,
+        enabled: bool = os.getenv('CLASSIFIER_ENABLED', "true").lower() == "true",
+        noreply_pattern: str = os.getenv('CLASSIFIER_NOREPLY_PATTERN', r'^(no[-_.]?reply|do[-_.]?not[-_.]?reply|mailer-daemon|postmaster|bounces?)([-+_.].*)?@'),
+        bounce_pattern: str = os.getenv('CLASSIFIER_BOUNCE_PATTERN', r'undeliver|delivery (status notification|has failed|failure)|mail delivery (failed|subsystem)|returned mail|failure notice'),
+        auto_reply_pattern: str = os.getenv('CLASSIFIER_AUTO_REPLY_PATTERN', r'out of (the )?office|auto(matic)?[- ]?(reply|response)|automatische antwort|abwesenheitsnotiz|fuera de la oficina|respuesta autom[aá]tica|r[eé]ponse automatique'),
+        automated_score: float = float(os.getenv('CLASSIFIER_AUTOMATED_SCORE', "2.0")),
+        fingerprints: int = int(os.getenv('CLASSIFIER_FINGERPRINTS', "1024")),
+        loop_max_replies: int = int(os.getenv('CLASSIFIER_LOOP_MAX_REPLIES', "0")),
+        loop_window: float = float(os.getenv('CLASSIFIER_LOOP_WINDOW', "3600")),
+        clock: Callable[[], float] = time.monotonic
+    ):
+        """Initialize the classifier
+
+        Parameters
+        ----------
+        enabled : bool
+            If it is False all the e-mails are replied.
+        noreply_pattern : str
+            The regular expression of the sender addresses that do not accept replies.
+        bounce_pattern : str
+            The regular expression of the subjects of the bounce reports.
+        auto_reply_pattern : str
+            The regular expression of the subjects of the automatic replies. By default only the markers
+            that the mail clients add, so the e-mails that talk about an absence or a vacation are replied.
+        automated_score : float
+            The score of the automatically generated phrases from which an e-mail is automated.
+            If it is 0 the content is not scored.
+        fingerprints : int
+            The number of replies sent by the component to remember.
+        loop_max_replies : int
+            The replies that the component can send to the same thread on the loop window.
+            If it is 0, the default, the loops are not detected, because a person can write many
+            e-mails on a thread.
+        loop_window : float
+            The seconds of the window to count the replies sent to a thread.
+        clock : callable
+            The function that returns the current time in seconds.
+        """
+        self.enabled = enabled
+        self.noreply = re.compile(noreply_pattern, re.IGNORECASE)
+        self.bounce = re.compile(bounce_pattern, re.IGNORECASE)
+        self.auto_reply = re.compile(auto_reply_pattern, re.IGNORECASE)
+        self.automated_score = max(0.0, automated_score)
+        self.max_fingerprints = max(0, fingerprints)
+        self.loop_max_replies = max(0, loop_max_replies)
+        self.loop_window = max(1.0, loop_window)
+        self.clock = clock
+        self.counters: Dict[str, int] = {}
+        self.saved_seconds = 0.0
+        self._fingerprints: OrderedDict = OrderedDict()
+        self._threads: OrderedDict = OrderedDict()
+        self._lock = threading.Lock()
+
+    def classify(self, sender: Optional[str], subject: Optional[str], content: Optional[str]) -> Optional[str]:
+        """Return the class of an e-mail that must not be replied by the LLM.
+
+        Parameters
+        ----------
+        sender : str, optional
+            The FROM address of the e-mail.
+        subject : str, optional
+            The subject of the e-mail.
+        content : str, optional
+            The content of the e-mail.
+
+        Returns
+        -------
+        str, optional
+            The class of the e-mail, or None if it must be replied.
+        """
+        if not self.enabled:
+            return None
+
+        sender = (sender or "").strip().lower()
+        if sender and self.noreply.search(sender):
+            return NO_REPLY_SENDER
+
+        if subject and self.bounce.search(subject):
+            return BOUNCE
+
+        if subject and self.auto_reply.search(subject):
+            return AUTO_REPLY
+
+        with self._lock:
+            fingerprint = _fingerprint(content)
+            if fingerprint is not None and fingerprint in self._fingerprints:
+                return OWN_REPLY
+
+            if self.loop_max_replies > 0 and sender and len(self._replies_to((sender, normalize_subject(subject)))) >= self.loop_max_replies:
+                return THREAD_LOOP
+
+        if self.automated_score > 0 and content:
+            text = content.lower()
+            if sum(weight for phrase, weight in _AUTOMATED_PHRASES.items() if phrase in text) >= self.automated_score:
+                return AUTOMATED
+
+        return None
+
+    def _replies_to(self, thread: tuple) -> list:
+        """Return the times of the replies sent to a thread on the loop window."""
+
+        now = self.clock()
+        # The threads are kept by the time of their last reply, so the old ones are at the beginning
+        while self._threads:
+            oldest = next(iter(self._threads))
+            if self._threads[oldest][-1] > now - self.loop_window:
+                break
+            del self._threads[oldest]
+
+        replies = self._threads.get(thread, [])
+        replies[:] = [sent_at for sent_at in replies if sent_at > now - self.loop_window]
+        return replies
+
+    def remember_reply(self, recipients: Iterable[str], subject: Optional[str], content: Optional[str]) -> None:
+        """Remember a reply sent by the component to detect it if it is received.
+
+        Parameters
+        ----------
+        recipients : iterable of str
+            The addresses that the reply is sent to.
+        subject : str, optional
+            The subject of the reply.
+        content : str, optional
+            The content of the reply.
+        """
+        if not self.enabled:
+            return
+
+        with self._lock:
+            fingerprint = _fingerprint(content)
+            if self.max_fingerprints > 0 and fingerprint is not None:
+                self._fingerprints[fingerprint] = True
+                self._fingerprints.move_to_end(fingerprint)
+                while len(self._fingerprints) > self.max_fingerprints:
+                    self._fingerprints.popitem(last=False)
+
+            if self.loop_max_replies > 0:
+                normalized = normalize_subject(subject)
+                for recipient in recipients:
+                    thread = (recipient.strip().lower(), normalized)
+                    replies = self._replies_to(thread)
+                    replies.append(self.clock())
+                    self._threads[thread] = replies
+                    self._threads.move_to_end(thread)
+
+    def count_skipped(self, e_mail_class: str, generation_seconds: float) -> None:
+        """Count an e-mail that has not been replied by the LLM.
+
+        Parameters
+        ----------
+        e_mail_class : str
+            The class of the e-mail.
+        generation_seconds : float
+            The seconds that the generation of its reply would have taken.
+        """
+        with self._lock:
+            self.counters[e_mail_class] = self.counters.get(e_mail_class, 0) + 1
+            self.saved_seconds += generation_seconds
@@ -16,31 +16,116 @@
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 #
 
-from typing import Optional, Any, Tuple
+from typing import Optional, Any, Dict, Hashable, Iterator, List, Tuple, Union
+import contextlib
+import copy
 import torch
 from transformers import pipeline, AutoConfig
-import os
 import gc
 import logging
+import math
+import threading
 import warnings
 
+from c1_llm_email_replier.adapter_manager import AdapterManager
+from c1_llm_email_replier.component_config import ConfigStore
+from c1_llm_email_replier.conversation_cache import ConversationCache, ConversationState
+from c1_llm_email_replier.generation_parameters_payload import GenerationParametersPayload
+from c1_llm_email_replier.memory_watchdog import MemoryWatchdog
+from c1_llm_email_replier.quantized_kv_cache import QuantizedKVCache
+
+# The minimum number of tokens to generate when a generation is retried because the memory is exhausted
+MIN_RETRY_NEW_TOKENS = 32
+
+
+def is_out_of_memory(error: BaseException) -> bool:
+    """Check if an error has been raised because the memory is exhausted.
+
+    Parameters
+    ----------
+    error : BaseException
+        The error to check.
+
+    Returns
+    -------
+    bool
+        True if the error is a Python, CUDA or CPU allocator out of memory error.
+    """
+    if isinstance(error, (MemoryError, torch.cuda.OutOfMemoryError)):
+        return True
+
+    message = str(error).lower()
+    return isinstance(error, RuntimeError) and ("out of memory" in message or "can't allocate memory" in message)
+
+
+def load_pipeline(model_id: str) -> Any:
+    """Load the text-generation pipeline of a model.
+
+    Parameters
+    ----------
+    model_id : str
+        The LLM model name (https://huggingface.co).
+
+    Returns
+    -------
+    Any
+        The text-generation pipeline of the model.
+    """
+    try:
+        # Suppress upstream warnings from transformers/tokenizers
+        with warnings.catch_warnings():
+            # GPT-2/BPE internal deprecation issue
+            warnings.filterwarnings("ignore", category=DeprecationWarning, message=".*BPE.__init__ will not create from files anymore.*")
+            # OPT/others tied weights warning (occurs even with tie_word_embeddings=False if both weights are in checkpoint)
+            warnings.filterwarnings("ignore", category=UserWarning, message=".*tie_word_embeddings=False.*")
+            # Explicitly load config to set tie_word_embeddings=False and silence warnings
+            config = AutoConfig.from_pretrained(model_id, tie_word_embeddings=False)
+
+            pipe = pipeline(
+                "text-generation",
+                model=model_id,
+                config=config,
+                dtype=torch.bfloat16,
+                device_map="auto",
+                model_kwargs={
+                    "use_cache": True
+                }
+            )
+        logging.info(f"Model {model_id} loaded successfully.")
+        return pipe
+
+    except Exception as e:
+        logging.error(f"Failed to load model {model_id}: {e}")
+        raise
+
+
 class EMailReplierGenerator:
     """The component that generates a reply to an e-mail using LLM.
     """
 
     def __init__(
         self,
-        model_id: str = os.getenv('LLM_MODEL', "HuggingFaceH4/zephyr-7b-beta"),
+        model_id: Optional[str] = None,
         max_new_tokens: Optional[int] = None,
         temperature: Optional[float] = None,
         top_k: Optional[int] = None,
         top_p: Optional[float] = None,
         min_new_tokens: Optional[int] = None,
         system_prompt: Optional[str] = None,
-        user_prompt: Optional[str] = None
+        user_prompt: Optional[str] = None,
+        config_store: Optional[ConfigStore] = None,
+        memory_watchdog: Optional[MemoryWatchdog] = None,
+        conversation_cache: Optional[ConversationCache] = None,
+        adapter: Optional[str] = None,
+        adapters: Optional[AdapterManager] = None,
+        kv_cache: Optional[str] = None,
+        fixed_model: bool = False
     ):
         """Initialize the replier generator
 
+        The parameters that are not provided are obtained from the parameters of the component,
+        that are initialized from the environment variables.
+
         Parameters
         ----------
         model_id : str
@@ -69,24 +154,47 @@ class EMailReplierGenerator:
             The prompt used to pass the e-mail information to generate the reply.
             Supported by environment variable REPLY_USER_PROMPT.
             Expects placeholders {subject} and {content}.
+        config_store: ConfigStore
+            The store with the parameters of the component. By default the store shared by the process.
+        memory_watchdog: MemoryWatchdog
+            The watchdog that admits the generations that fit in memory. By default the memory is not watched.
+        conversation_cache: ConversationCache
+            The cache of the KV of the recent conversations. By default the conversations are not cached.
+        adapter: str
+            The LoRA adapter to use on top of the model, or empty to use the base model.
+            Supported by environment variable REPLY_ADAPTER.
+        adapters: AdapterManager
+            The manager that loads and activates the LoRA adapters. By default the adapters are ignored.
+        kv_cache: str
+            The implementation of the KV cache of the batches, that can be 'dynamic', 'offloaded' or 'quantized'.
+            Supported by environment variable KV_CACHE. Default: 'dynamic'
+        fixed_model: bool
+            If the model must stay the same when the model_id parameter changes, as the ones of
+            the model tiers or of the fallback. By default the model follows the parameter.
         """
-        self.model_id = model_id
-        self.pipe = None  # Lazy loading: pipeline will be initialized on first use
+        self.config_store = config_store or ConfigStore.default()
+        self.memory_watchdog = memory_watchdog
+        self.conversation_cache = conversation_cache
+        self.adapters = adapters
+        self.config = self.config_store.current
+        self.pipe = None
 
-        self.max_new_tokens = max_new_tokens
-        self.temperature = temperature
-        self.top_k = top_k
-        self.top_p = top_p
-        self.min_new_tokens = min_new_tokens
-        self.system_prompt = system_prompt
-        self.user_prompt = user_prompt
+        self.model_id = model_id or self.config.model_id
+        self.max_new_tokens = self.config.max_new_tokens if max_new_tokens is None else max_new_tokens
+        self.temperature = self.config.temperature if temperature is None else temperature
+        self.top_k = self.config.top_k if top_k is None else top_k
+        self.top_p = self.config.top_p if top_p is None else top_p
+        self.min_new_tokens = self.config.min_new_tokens if min_new_tokens is None else min_new_tokens
+        self.system_prompt = system_prompt or self.config.system_prompt
+        self.user_prompt = user_prompt or self.config.user_prompt
+        self.adapter = self.config.adapter if adapter is None else adapter
+        self.kv_cache = kv_cache or self.config.kv_cache
+        self.fixed_model = fixed_model
+        # The parameters are refreshed from the threads that generate, and the model can be replaced meanwhile
+        self._lock = threading.Lock()
+        self._local = threading.local()
 
-        # Initial refresh if parameters weren't explicitly provided
-        self.refresh_parameters()
-
-        # Lazy initialization
-        if self.pipe is None:
-            self._initialize_pipeline()
+        self._initialize_pipeline()
 
     def _initialize_pipeline(self) -> None:
         """Initialize the text-generation pipeline with the current model_id."""
@@ -101,60 +209,150 @@ class EMailReplierGenerator:
             if torch.cuda.is_available():
                 torch.cuda.empty_cache()
 
-        try:
-            # Suppress upstream warnings from transformers/tokenizers
-            with warnings.catch_warnings():
-                # GPT-2/BPE internal deprecation issue
-                warnings.filterwarnings("ignore", category=DeprecationWarning, message=".*BPE.__init__ will not create from files anymore.*")
-                # OPT/others tied weights warning (occurs even with tie_word_embeddings=False if both weights are in checkpoint)
-                warnings.filterwarnings("ignore", category=UserWarning, message=".*tie_word_embeddings=False.*")
-                # Explicitly load config to set tie_word_embeddings=False and silence warnings
-                config = AutoConfig.from_pretrained(self.model_id, tie_word_embeddings=False)
-
-                self.pipe = pipeline(
-                    "text-generation",
-                    model=self.model_id,
-                    config=config,
-                    dtype=torch.bfloat16,
-                    device_map="auto",
-                    model_kwargs={
-                        "use_cache": True
-                    }
-                )
-            logging.info(f"Model {self.model_id} loaded successfully.")
-        except Exception as e:
-            logging.error(f"Failed to load model {self.model_id}: {e}")
-            raise
+        self.pipe = load_pipeline(self.model_id)
+
+    def use_pipeline(self, model_id: str, pipe: Any) -> None:
+        """Replace the model by one that has already been loaded.
+
+        Parameters
+        ----------
+        model_id : str
+            The LLM model name of the pipeline.
+        pipe : Any
+            The text-generation pipeline of the model.
+        """
+        with self._lock:
+            previous = self.pipe
+            self.model_id = model_id
+            self.pipe = pipe
+
+        if previous is not None and previous is not pipe:
+            logging.info("Cleaning up memory from previous model...")
+            del previous
+            gc.collect()
+            if torch.cuda.is_available():
+                torch.cuda.empty_cache()
+
+    def derive(self, config_store: ConfigStore, conversation_cache: Optional[ConversationCache] = None) -> 'EMailReplierGenerator':
+        """Create a generator with other parameters, that shares the model if it is the same.
+
+        Parameters
+        ----------
+        config_store : ConfigStore
+            The store with the parameters of the new generator.
+        conversation_cache : ConversationCache, optional
+            The cache of the conversations of the new generator. By default the conversations are not cached.
+
+        Returns
+        -------
+        EMailReplierGenerator
+            The generator, that only loads a model if the one of its parameters is not the one of this generator,
+            and that only uses the adapters of this generator if it shares its model.
+        """
+        derived = copy.copy(self)
+        derived.config_store = config_store
+        derived.config = config_store.current
+        derived.conversation_cache = conversation_cache
+        derived._lock = threading.Lock()
+        derived._local = threading.local()
+        for name in ('max_new_tokens', 'min_new_tokens', 'temperature', 'top_k', 'top_p', 'system_prompt', 'user_prompt', 'adapter', 'kv_cache'):
+            setattr(derived, name, getattr(derived.config, name))
+
+        if derived.config.model_id != self.model_id:
+            derived.model_id = derived.config.model_id
+            derived.pipe = None
+            # The adapters are trained for the model of this generator
+            derived.adapters = None
+            derived._initialize_pipeline()
+
+        return derived
 
     def refresh_parameters(self) -> None:
-        """Refresh generation parameters from environment variables.
+        """Apply the parameters of the component that have changed since the last refresh.
 
-        This allows updating the configuration without restarting the component.
+        This allows updating the configuration without restarting the component. If the
+        version of the parameters has not changed nothing is done, and otherwise only the
+        parameters that have changed are applied, so the model is only reloaded when it changes.
+        It can be called from several threads, and only one of them reloads the model, while the
+        generations that have already started continue with the previous one.
         """
-        new_model_id = os.getenv('LLM_MODEL', self.model_id)
-        if new_model_id != self.model_id:
-            logging.info(f"Model ID change detected: {self.model_id} -> {new_model_id}")
-            self.model_id = new_model_id
-            # Invalidate the pipeline so it reloads on next generation
-            if self.pipe is not None:
-                # Immediate cleanup if we are switching models
+        if self.config_store.current.version == self.config.version:
+            return
+
+        with self._lock:
+            config = self.config_store.current
+            if config.version == self.config.version:
+                return
+
+            previous, self.config = self.config, config
+            if not self.fixed_model and config.model_id != previous.model_id and config.model_id != self.model_id:
+                logging.info(f"Model ID change detected: {self.model_id} -> {config.model_id}")
+                self.model_id = config.model_id
                 self._initialize_pipeline()
-            else:
-                self.pipe = None
-
-        self.max_new_tokens = int(os.getenv('REPLY_MAX_NEW_TOKENS', self.max_new_tokens or 256))
-        self.min_new_tokens = int(os.getenv('REPLY_MIN_NEW_TOKENS', self.min_new_tokens or 0))
-        self.temperature = float(os.getenv('REPLY_TEMPERATURE', self.temperature or 0.7))
-        self.top_k = int(os.getenv('REPLY_TOP_K', self.top_k or 50))
-        self.top_p = float(os.getenv('REPLY_TOP_P', self.top_p or 0.95))
-        self.system_prompt = os.getenv('REPLY_SYSTEM_PROMPT', self.system_prompt or "You are a polite chatbot who always tries to provide solutions to the customer's problems")
-        self.user_prompt = os.getenv('REPLY_USER_PROMPT', self.user_prompt or "Reply to an e-mail with the subject '{subject}' and the content '{content}'")
-
-    def generate_reply(self, subject: str, content: str) -> Tuple[str, str]:
+
+            for name in ('max_new_tokens', 'min_new_tokens', 'temperature', 'top_k', 'top_p', 'system_prompt', 'user_prompt', 'adapter', 'kv_cache'):
+                value = getattr(config, name)
+                if value != getattr(previous, name):
+                    setattr(self, name, value)
+
+    @property
+    def _pipe(self) -> Any:
+        """Return the pipeline of the generation of the current thread, that is not replaced until it finishes."""
+
+        pipe = getattr(self._local, 'pipe', None)
+        return pipe if pipe is not None else self.pipe
+
+    @contextlib.contextmanager
+    def _pinned_pipe(self) -> Iterator[None]:
+        """Keep the pipeline of the current thread while it generates, even if the model is replaced meanwhile."""
+
+        if getattr(self._local, 'pipe', None) is not None:
+            yield
+            return
+
+        self._local.pipe = self.pipe
+        try:
+            yield
+
+        finally:
+            self._local.pipe = None
+
+    def generation_parameters(self, parameters: Optional[GenerationParametersPayload] = None) -> Dict[str, Any]:
+        """Obtain the parameters to generate a reply, overriding the component ones with the ones of an e-mail.
+
+        Parameters
+        ----------
+        parameters : GenerationParametersPayload, optional
+            The parameters of the e-mail.
+
+        Returns
+        -------
+        dict
+            The parameters of the generation. The e-mails with the same parameters, except
+            the system_prompt, and the adapter if they can be mixed, can be generated in the same batch.
+        """
+        generation = {
+            'max_new_tokens': self.max_new_tokens,
+            'min_new_tokens': self.min_new_tokens,
+            'temperature': self.temperature,
+            'top_k': self.top_k,
+            'top_p': self.top_p,
+            'system_prompt': self.system_prompt,
+            'adapter': self.adapter
+        }
+        if parameters is not None:
+            for name, value in parameters.model_dump(exclude_none=True).items():
+                generation[name] = int(value) if name in ('max_new_tokens', 'min_new_tokens', 'top_k') else value
+
+        return generation
+
+    def generate_reply(
+        self, subject: str, content: str, parameters: Optional[GenerationParametersPayload] = None, conversation: Optional[Hashable] = None
+    ) -> Tuple[str, str]:
         """Generate the reply for an email.
 
         This functions call the LLM  model to obtain a reply for an e-mail.
-        It also refreshes parameters from environment variables.
+        The changes of the parameters are applied by refresh_parameters.
 
         Parameters
         ----------
@@ -162,6 +360,11 @@ class EMailReplierGenerator:
             The subject of the e-mail to reply
         content : str
             The content of the e-mail to reply
+        parameters : GenerationParametersPayload, optional
+            The parameters of the e-mail that override the component ones.
+        conversation : hashable, optional
+            The conversation of the e-mail. If the conversations are cached, the reply is generated
+            after the previous e-mails and replies of the conversation, reusing their KV cache.
 
         Returns
         -------
@@ -170,19 +373,151 @@ class EMailReplierGenerator:
         str
             The content of the reply message
         """
+        with self._pinned_pipe():
+            generation = self.generation_parameters(parameters)
+            system_prompt = generation.pop('system_prompt')
+            if conversation is not None and self.conversation_cache is not None and self.conversation_cache.enabled:
+                try:
+                    return self._generate_in_conversation(conversation, subject, content, system_prompt, generation)
+
+                except Exception as error:
+                    if not is_out_of_memory(error):
+                        raise
+
+                    logging.warning("Out of memory generating on a conversation, forgetting the cached conversations")
+                    self.conversation_cache.clear()
+                    gc.collect()
+
+            prompt = self._prompt(subject, content, system_prompt)
+            outputs = self._generate_within_memory(prompt, generation)
+            return self._extract_reply(subject, outputs[0]["generated_text"])
+
+    def _generate_in_conversation(self, conversation: Hashable, subject: str, content: str, system_prompt: str, generation: Dict[str, Any]) -> Tuple[str, str]:
+        """Generate the reply of an e-mail after the previous turns of its conversation, only prefilling the tokens that are not cached."""
+
+        state = self.conversation_cache.get(conversation)
+        if state is not None and state.model_id == self.model_id and state.adapter == generation['adapter'] and state.messages[0]["content"] == system_prompt:
+            messages = state.messages
+        else:
+            messages, state = [{"role": "system", "content": system_prompt}], None
+
+        messages = messages + [{"role": "user", "content": self.user_prompt.format(subject=subject, content=content)}]
+        token_ids = self._tokenize(self._apply_chat_template(messages))
+        while len(messages) > 2 and len(token_ids) > self.conversation_cache.max_tokens:
+            # Forget the oldest e-mail and reply of the conversation
+            messages = messages[:1] + messages[3:]
+            token_ids = self._tokenize(self._apply_chat_template(messages))
+
+        past_key_values, reused = state.reusable_cache(token_ids) if state is not None else (None, 0)
+        self.conversation_cache.count_prefill(reused, len(token_ids) - reused)
+
+        estimate = 0
+        if self.memory_watchdog is not None and self.memory_watchdog.enabled:
+            estimate = self.kv_cache_bytes_per_token() * (len(token_ids) + generation['max_new_tokens'])
+        with self.memory_watchdog.admit(estimate) if estimate > 0 else contextlib.nullcontext():
+            output = self._generate_tokens(token_ids, past_key_values, generation)
+
+        sequence = output.sequences[0]
+        reply = self._extract_reply(subject, self._pipe.tokenizer.decode(sequence[len(token_ids):], skip_special_tokens=True))
+
+        # The cache has the keys and the values of all the tokens except the last generated one
+        cached = output.past_key_values.get_seq_length()
+        self.conversation_cache.put(conversation, ConversationState(
+            model_id=self.model_id,
+            messages=messages + [{"role": "assistant", "content": reply[1]}],
+            token_ids=sequence[:cached].tolist(),
+            past_key_values=output.past_key_values,
+            adapter=generation['adapter']
+        ))
+        return reply
+
+    def _generate_tokens(self, token_ids: List[int], past_key_values: Any, generation: Dict[str, Any]) -> Any:
+        """Call the model with the tokens of a prompt, whose first ones can be on a KV cache."""
+
+        input_ids = torch.tensor([token_ids], device=self._pipe.model.device)
+        with self._adapters([generation['adapter']]) as adapter_arguments:
+            return self._pipe.model.generate(
+                input_ids=input_ids,
+                attention_mask=torch.ones_like(input_ids),
+                past_key_values=past_key_values,
+                max_new_tokens=generation['max_new_tokens'],
+                min_new_tokens=generation['min_new_tokens'],
+                do_sample=True,
+                temperature=generation['temperature'],
+                top_k=generation['top_k'],
+                top_p=generation['top_p'],
+                pad_token_id=self._pipe.tokenizer.eos_token_id,
+                use_cache=True,
+                return_dict_in_generate=True,
+                **adapter_arguments
+            )
+
+    def _tokenize(self, prompt: str) -> List[int]:
+        """Return the tokens of a prompt, that already has the special tokens of the chat template."""
+
+        return list(self._pipe.tokenizer(prompt, add_special_tokens=False)["input_ids"])
+
+    def generate_replies(self, e_mails: List[Tuple[str, str, Optional[GenerationParametersPayload]]]) -> List[Tuple[str, str]]:
+        """Generate the replies for several e-mails.
+
+        The e-mails that are generated with the same parameters are passed to the
+        LLM in the same batch. If the adapters can be mixed, the e-mails that only
+        differ on the adapter are also generated in the same batch.
+
+        Parameters
+        ----------
+        e_mails : list of (str, str, GenerationParametersPayload)
+            The subject, the content and the parameters of each e-mail to reply.
+
+        Returns
+        -------
+        list of (str, str)
+            The subject and the content of the reply of each e-mail, in the same order.
+        """
+        with self._pinned_pipe():
+            mixed = self.adapters is not None and self.adapters.enabled
+            groups: Dict[Tuple, List[Tuple[int, str, Optional[str]]]] = {}
+            for index, (subject, content, parameters) in enumerate(e_mails):
+                generation = self.generation_parameters(parameters)
+                prompt = self._prompt(subject, content, generation.pop('system_prompt'))
+                adapter = generation.pop('adapter') if mixed else generation['adapter']
+                groups.setdefault(tuple(sorted(generation.items())), []).append((index, prompt, adapter))
+
+            replies: List[Optional[Tuple[str, str]]] = [None] * len(e_mails)
+            for key, group in groups.items():
+                prompts = [prompt for _index, prompt, _adapter in group]
+                generation = dict(key)
+                if mixed:
+                    generation['adapter'] = tuple(adapter for _index, _prompt, adapter in group) if len(group) > 1 else group[0][2]
+                outputs = self._generate_within_memory(prompts if len(prompts) > 1 else prompts[0], generation)
+                if len(prompts) == 1:
+                    outputs = [outputs]
+
+                for (index, _prompt, _adapter), output in zip(group, outputs):
+                    replies[index] = self._extract_reply(e_mails[index][0], output[0]["generated_text"])
+
+            return replies
+
+    def _prompt(self, subject: str, content: str, system_prompt: str) -> str:
+        """Create the prompt to generate the reply of an e-mail."""
+
         messages = [
             {
                 "role": "system",
-                "content": self.system_prompt
+                "content": system_prompt
             },
             {
                 "role": "user",
                 "content": self.user_prompt.format(subject=subject, content=content)
             }
         ]
+        return self._apply_chat_template(messages)
+
+    def _apply_chat_template(self, messages: List[Dict[str, str]]) -> str:
+        """Convert the messages of a chat into the prompt of the model."""
 
         # Use a fallback template if the tokenizer doesn't have one
-        chat_template = self.pipe.tokenizer.chat_template
+        chat_template = self._pipe.tokenizer.chat_template
         if not chat_template:
             # Simple ChatML-style template as fallback
             chat_template = (
@@ -194,28 +529,175 @@ class EMailReplierGenerator:
                 "{% endif %}"
             )
 
-        prompt = self.pipe.tokenizer.apply_chat_template(
+        return self._pipe.tokenizer.apply_chat_template(
             messages,
             chat_template=chat_template,
             tokenize=False,
             add_generation_prompt=True
         )
 
-        outputs = self.pipe(
-            prompt,
-            max_new_tokens=self.max_new_tokens,
-            min_new_tokens=self.min_new_tokens,
+    def kv_cache_bytes(self, prompts: Union[str, List[str]], max_new_tokens: int) -> int:
+        """Estimate the memory that the KV cache needs to generate the replies of some prompts.
+
+        Parameters
+        ----------
+        prompts : str or list of str
+            The prompts to generate.
+        max_new_tokens : int
+            The maximum number of tokens to generate for each prompt.
+
+        Returns
+        -------
+        int
+            The estimated bytes, or 0 if the model does not provide its dimensions.
+        """
+        bytes_per_token = self.kv_cache_bytes_per_token()
+        if bytes_per_token == 0:
+            return 0
+
+        if self.kv_cache == 'quantized' and QuantizedKVCache.available:
+            element_size = torch.empty((), dtype=self._pipe.model.dtype).element_size()
+            bytes_per_token = math.ceil(bytes_per_token * QuantizedKVCache.compression(element_size))
+
+        try:
+            prompts = prompts if isinstance(prompts, list) else [prompts]
+            # The batch is padded to the longest prompt
+            prompt_tokens = max(len(ids) for ids in self._pipe.tokenizer(prompts)["input_ids"])
+
+        except (AttributeError, KeyError, TypeError, ValueError):
+            return 0
+
+        return bytes_per_token * (prompt_tokens + max_new_tokens) * len(prompts)
+
+    def kv_cache_bytes_per_token(self) -> int:
+        """Return the memory that the KV cache needs for each token of a sequence, or 0 if the model does not provide its dimensions."""
+
+        try:
+            config = self._pipe.model.config
+            layers = int(config.num_hidden_layers)
+            heads = int(config.num_attention_heads)
+            kv_heads = int(getattr(config, 'num_key_value_heads', None) or heads)
+            head_dim = int(getattr(config, 'head_dim', None) or config.hidden_size // heads)
+            element_size = torch.empty((), dtype=self._pipe.model.dtype).element_size()
+
+        except (AttributeError, KeyError, TypeError, ValueError):
+            return 0
+
+        # The keys and the values of each layer
+        return 2 * layers * kv_heads * head_dim * element_size
+
+    def _generate_within_memory(self, prompts: Union[str, List[str]], generation: Dict[str, Any]) -> List[Any]:
+        """Generate when the memory allows it, retrying with a smaller batch or budget if the memory is exhausted."""
+
+        estimate = self.kv_cache_bytes(prompts, generation['max_new_tokens']) if self.memory_watchdog is not None and self.memory_watchdog.enabled else 0
+        try:
+            if estimate > 0:
+                with self.memory_watchdog.admit(estimate):
+                    return self._generate(prompts, generation)
+
+            return self._generate(prompts, generation)
+
+        except Exception as error:
+            if not is_out_of_memory(error):
+                raise
+
+            gc.collect()
+            if torch.cuda.is_available():
+                torch.cuda.empty_cache()
+
+            if isinstance(prompts, list) and len(prompts) > 1:
+                half = len(prompts) // 2
+                logging.warning("Out of memory generating %d replies, retrying in batches of %d", len(prompts), half)
+                adapters = generation.get('adapter')
+                outputs = []
+                for start, end in ((0, half), (half, len(prompts))):
+                    part = prompts[start:end]
+                    part_generation = generation
+                    if isinstance(adapters, tuple):
+                        part_generation = dict(generation, adapter=adapters[start:end] if len(part) > 1 else adapters[start])
+                    part_outputs = self._generate_within_memory(part if len(part) > 1 else part[0], part_generation)
+                    outputs.extend(part_outputs if len(part) > 1 else [part_outputs])
+                return outputs
+
+            max_new_tokens = generation['max_new_tokens'] // 2
+            if max_new_tokens < MIN_RETRY_NEW_TOKENS:
+                raise
+
+            logging.warning("Out of memory generating %d tokens, retrying with %d", generation['max_new_tokens'], max_new_tokens)
+            smaller = dict(generation, max_new_tokens=max_new_tokens, min_new_tokens=min(generation['min_new_tokens'], max_new_tokens))
+            return self._generate_within_memory(prompts, smaller)
+
+    def _generate(self, prompts: Union[str, List[str]], generation: Dict[str, Any]) -> List[Any]:
+        """Call the LLM with a prompt, or with a batch of prompts that use the same parameters.
+
+        The adapter of the parameters can be a tuple with the adapter of each prompt of the batch.
+        """
+        adapters = generation.get('adapter')
+        count = len(prompts) if isinstance(prompts, list) else 1
+        names = list(adapters) if isinstance(adapters, tuple) else [adapters] * count
+        with self._adapters(names) as adapter_arguments:
+            return self._call_pipeline(prompts, generation, adapter_arguments)
+
+    def _adapters(self, names: List[Optional[str]]) -> Any:
+        """Return the context that activates the adapters of the prompts of a generation."""
+
+        if self.adapters is None:
+            return contextlib.nullcontext({})
+
+        return self.adapters.use(self._pipe, names)
+
+    def _call_pipeline(self, prompts: Union[str, List[str]], generation: Dict[str, Any], adapter_arguments: Dict[str, Any]) -> List[Any]:
+        """Call the pipeline of the LLM with the prompts and the parameters of a generation."""
+
+        batch = {}
+        if isinstance(prompts, list):
+            # Pad on the left so all the prompts of the batch end where the generation starts
+            self._pipe.tokenizer.padding_side = 'left'
+            if self._pipe.tokenizer.pad_token_id is None:
+                self._pipe.tokenizer.pad_token = self._pipe.tokenizer.eos_token
+            batch['batch_size'] = len(prompts)
+
+        return self._pipe(
+            prompts,
+            max_new_tokens=generation['max_new_tokens'],
+            min_new_tokens=generation['min_new_tokens'],
             max_length=None,  # Silence warning about max_new_tokens vs max_length
             do_sample=True,
-            temperature=self.temperature,
-            top_k=self.top_k,
-            top_p=self.top_p,
-            pad_token_id=self.pipe.tokenizer.eos_token_id,
+            temperature=generation['temperature'],
+            top_k=generation['top_k'],
+            top_p=generation['top_p'],
+            pad_token_id=self._pipe.tokenizer.eos_token_id,
             generation_config=None,  # Silence deprecation warning when passing explicit parameters
-            return_full_text=False   # Only return the generated part
+            return_full_text=False,  # Only return the generated part
+            **batch,
+            **adapter_arguments,
+            **self._cache_arguments()
         )
 
-        reply_content = outputs[0]["generated_text"].strip()
+    def _cache_arguments(self) -> Dict[str, Any]:
+        """Return the arguments to generate with the KV cache implementation of the parameters.
+
+        The conversations are always generated with the dynamic cache, because it is the one that can be reused.
+        """
+        if self.kv_cache == 'quantized':
+            try:
+                return {'past_key_values': QuantizedKVCache(self._pipe.model.config)}
+
+            except (AttributeError, ImportError, ValueError) as error:
+                # Until the parameters change again
+                logging.warning("Generating with the dynamic KV cache, because the quantized one can not be used: %s", error)
+                self.kv_cache = 'dynamic'
+
+        elif self.kv_cache == 'offloaded' and self._pipe.model.device.type != 'cpu':
+            # The cache is already on the CPU when the model is
+            return {'cache_implementation': 'offloaded'}
+
+        return {}
+
+    def _extract_reply(self, subject: str, generated_text: str) -> Tuple[str, str]:
+        """Obtain the subject and the content of the reply from the generated text."""
+
+        reply_content = generated_text.strip()
         
         # Further cleanup: remove any trailing specialized tokens if they leaked
         # or markers that might have been generated by the model itself
@@ -237,5 +719,3 @@ class EMailReplierGenerator:
             reply_content = lines[1].strip() if len(lines) > 1 else ""
 
         return reply_subject, reply_content
-
-        
@@ -0,0 +1,135 @@
+# 
+# This file is part of the C1_llm_email_replier distribution (https://github.com/VALAWAI/C1_llm_email_replier).
+# Copyright (c) 2022-2026 VALAWAI (https://valawai.eu/).
+# 
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+# 
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+# 
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+
+
+import logging
+import os
+import queue
+import threading
+from concurrent.futures import Future
+from typing import List, Optional, Tuple
+
+from c1_llm_email_replier.email_replier_generator import EMailReplierGenerator
+from c1_llm_email_replier.generation_parameters_payload import GenerationParametersPayload
+
+
+class GenerationBatcher:
+    """Collect the e-mails that are waiting to be replied and generate their replies in batches.
+
+    The threads that process the e-mails wait for their reply while a single thread
+    passes the e-mails to the generator, that generates together the ones with compatible
+    parameters.
+    """
+
+    def __init__(
+        self,
+        generator: EMailReplierGenerator,
+        max_batch_size: int = int(os.getenv('REPLY_BATCH_SIZE', "1")),
+        max_wait: float = float(os.getenv('REPLY_BATCH_WAIT', "0.05"))
+    ):
+        """Initialize the batcher
+
+        Parameters
+        ----------
+        generator : EMailReplierGenerator
+            The generator of the replies.
+        max_batch_size : int
+            The maximum number of e-mails to generate at once.
+        max_wait : float
+            The maximum seconds to wait for more e-mails when a batch is not full.
+        """
+        self.generator = generator
+        self.max_batch_size = max(1, max_batch_size)
+        self.max_wait = max(0.0, max_wait)
+        self._requests: queue.SimpleQueue = queue.SimpleQueue()
+        self._thread = threading.Thread(target=self._run, name="generation-batcher", daemon=True)
+        self._thread.start()
+
+    def generate(self, subject: str, content: str, parameters: Optional[GenerationParametersPayload] = None) -> Tuple[str, str]:
+        """Generate the reply of an e-mail, waiting until its batch has been generated.
+
+        Parameters
+        ----------
+        subject : str
+            The subject of the e-mail to reply
+        content : str
+            The content of the e-mail to reply
+        parameters : GenerationParametersPayload, optional
+            The parameters of the e-mail that override the component ones.
+
+        Returns
+        -------
+        str
+            The subject of the reply message
+        str
+            The content of the reply message
+        """
+        future: Future = Future()
+        self._requests.put((subject, content, parameters, future))
+        return future.result()
+
+    def close(self) -> None:
+        """Stop the thread that generates the batches, once the e-mails that are waiting have been generated."""
+
+        self._requests.put(None)
+
+    def _next_batch(self) -> List[Tuple]:
+        """Wait for the e-mails to generate together."""
+
+        request = self._requests.get()
+        if request is None:
+            return []
+
+        batch = [request]
+        try:
+            while len(batch) < self.max_batch_size:
+                request = self._requests.get(timeout=self.max_wait)
+                if request is None:
+                    # Stop after generating this batch
+                    self._requests.put(None)
+                    break
+                batch.append(request)
+        except queue.Empty:
+            pass
+
+        return batch
+
+    def _run(self) -> None:
+        """Generate the replies of the e-mails."""
+
+        while True:
+            batch = self._next_batch()
+            if not batch:
+                return
+
+            try:
+                self.generator.refresh_parameters()
+                if len(batch) == 1:
+                    subject, content, parameters, _future = batch[0]
+                    replies = [self.generator.generate_reply(subject, content, parameters)]
+                else:
+                    logging.debug("Generating %d replies in a batch", len(batch))
+                    replies = self.generator.generate_replies([(subject, content, parameters) for subject, content, parameters, _future in batch])
+
+                for (_subject, _content, _parameters, future), reply in zip(batch, replies):
+                    future.set_result(reply)
+
+            except Exception as error:
+                for _subject, _content, _parameters, future in batch:
+                    if not future.done():
+                        future.set_exception(error)
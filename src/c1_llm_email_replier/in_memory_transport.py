@@ -0,0 +1,270 @@
+# 
+# This file is part of the C1_llm_email_replier distribution (https://github.com/VALAWAI/C1_llm_email_replier).
+# Copyright (c) 2022-2026 VALAWAI (https://valawai.eu/).
+# 
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+# 
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+# 
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+
+import logging
+import queue as thread_queue
+import threading
+from collections import deque
+from dataclasses import dataclass, field
+from itertools import count
+from threading import Thread
+from typing import Any, Callable, Optional
+
+import pika
+
+from c1_llm_email_replier.transport import Transport
+
+
+@dataclass
+class InMemoryChannel:
+    """The channel used by a listener of an in-memory transport."""
+
+    transport: 'InMemoryTransport'
+    queue: str
+    channel_number: int
+    is_open: bool = True
+
+
+@dataclass
+class _Consumer:
+    """A listener registered on a queue of the in-memory broker."""
+
+    channel: InMemoryChannel
+    callback: Callable
+    prefetch_count: int
+    priority: int
+    auto_ack: bool
+    unacked: dict[int, bytes] = field(default_factory=dict)
+
+    def has_capacity(self) -> bool:
+        """Check if the consumer can receive more messages."""
+        return self.auto_ack or self.prefetch_count <= 0 or len(self.unacked) < self.prefetch_count
+
+
+class InMemoryBroker:
+    """A thread-safe broker that keeps the queues in the memory of the process.
+
+    It has the same semantics as the RabbitMQ used by the component: the queues are durable,
+    so they keep the messages while nobody consumes them, the messages are delivered to the
+    consumers with more priority that have not reached their prefetch limit, and the messages
+    that are not acknowledged are delivered again when their consumer is closed.
+    """
+
+    _default: Optional['InMemoryBroker'] = None
+    _default_lock = threading.Lock()
+
+    def __init__(self):
+        """Initialize the broker without any queue."""
+        self.lock = threading.RLock()
+        self.queues: dict[str, deque[tuple[bytes, bool]]] = {}
+        self.consumers: dict[str, list[_Consumer]] = {}
+        self._delivery_tags = count(1)
+
+    @classmethod
+    def default(cls) -> 'InMemoryBroker':
+        """Return the broker shared by all the in-memory transports of the process."""
+        with cls._default_lock:
+            if cls._default is None:
+                cls._default = InMemoryBroker()
+            return cls._default
+
+    def queue_declare(self, queue: str) -> None:
+        """Create a queue if it does not exist."""
+        with self.lock:
+            self.queues.setdefault(queue, deque())
+            self.consumers.setdefault(queue, [])
+
+    def message_count(self, queue: str) -> int:
+        """Return the number of messages that are waiting on a queue."""
+        with self.lock:
+            return len(self.queues.get(queue, ()))
+
+    def consume(self, consumer: _Consumer) -> None:
+        """Register a consumer on a queue."""
+        with self.lock:
+            self.queue_declare(consumer.channel.queue)
+            self.consumers[consumer.channel.queue].append(consumer)
+            self._deliver(consumer.channel.queue)
+
+    def cancel(self, consumer: _Consumer) -> None:
+        """Remove a consumer and requeue the messages that it has not acknowledged."""
+        with self.lock:
+            queue = consumer.channel.queue
+            if consumer in self.consumers.get(queue, []):
+                self.consumers[queue].remove(consumer)
+            for body in reversed(list(consumer.unacked.values())):
+                self.queues[queue].appendleft((body, True))
+            consumer.unacked.clear()
+            self._deliver(queue)
+
+    def publish(self, queue: str, body: bytes, delay: float = 0.0) -> None:
+        """Store a message on a queue, after its delay, and deliver it if there is any consumer."""
+        if delay > 0:
+            timer = threading.Timer(delay, self.publish, (queue, body))
+            timer.daemon = True
+            timer.start()
+            return
+
+        with self.lock:
+            self.queue_declare(queue)
+            self.queues[queue].append((body, False))
+            self._deliver(queue)
+
+    def ack(self, consumer: _Consumer, delivery_tag: int) -> None:
+        """Acknowledge a message delivered to a consumer."""
+        with self.lock:
+            if consumer.unacked.pop(delivery_tag, None) is not None:
+                self._deliver(consumer.channel.queue)
+
+    def nack(self, consumer: _Consumer, delivery_tag: int, requeue: bool = True) -> None:
+        """Reject a message delivered to a consumer, returning it to the head of its queue if it is requeued."""
+        with self.lock:
+            body = consumer.unacked.pop(delivery_tag, None)
+            if body is not None:
+                if requeue:
+                    self.queues[consumer.channel.queue].appendleft((body, True))
+                self._deliver(consumer.channel.queue)
+
+    def _deliver(self, queue: str) -> None:
+        """Deliver the waiting messages of a queue to the consumers that can receive them."""
+        messages = self.queues[queue]
+        while messages:
+            consumer = self._next_consumer(queue)
+            if consumer is None:
+                return
+
+            body, redelivered = messages.popleft()
+            delivery_tag = next(self._delivery_tags)
+            if not consumer.auto_ack:
+                consumer.unacked[delivery_tag] = body
+            consumer.channel.transport._dispatch(consumer, delivery_tag, redelivered, body)
+
+    def _next_consumer(self, queue: str) -> Optional[_Consumer]:
+        """Return the consumer with more priority that can receive a message, rotating the ones with the same priority."""
+        consumers = self.consumers[queue]
+        candidates = [consumer for consumer in consumers if consumer.has_capacity()]
+        if not candidates:
+            return None
+
+        consumer = max(candidates, key=lambda candidate: candidate.priority)
+        consumers.remove(consumer)
+        consumers.append(consumer)
+        return consumer
+
+
+class InMemoryTransport(Transport):
+    """The transport that send and receive messages thought an in-memory broker.
+
+    As the pika transport, the listeners are called one after the other from a dedicated thread.
+    """
+
+    _channel_numbers = count(1)
+
+    def __init__(self, broker: Optional[InMemoryBroker] = None):
+        """Initialize the transport
+
+        Parameters
+        ----------
+        broker : InMemoryBroker
+            The broker to use. By default uses the one shared by all the process.
+        """
+        self.broker = broker or InMemoryBroker.default()
+        self.consumers: list[_Consumer] = []
+        self._deliveries: thread_queue.Queue = thread_queue.Queue()
+        self._stopping = False
+        self._dispatch_thread = Thread(target=self._run_dispatch_loop, name="in-memory-dispatch", daemon=True)
+        self._dispatch_thread.start()
+
+    def listen_for(self, queue: str, callback: Callable, prefetch_count: int = 0, priority: int = 0, auto_ack: bool = True) -> None:
+        """Register a listener on a queue of the broker."""
+        channel = InMemoryChannel(transport=self, queue=queue, channel_number=next(self._channel_numbers))
+        consumer = _Consumer(channel=channel, callback=callback, prefetch_count=prefetch_count, priority=priority, auto_ack=auto_ack)
+        self.consumers.append(consumer)
+        self.broker.consume(consumer)
+        logging.debug(f"Listen for the queue {queue}")
+
+    def ack(self, channel: Any, delivery_tag: int) -> None:
+        """Acknowledge a message received by a listener that is not auto acknowledged."""
+        for consumer in list(self.consumers):
+            if consumer.channel is channel:
+                self.broker.ack(consumer, delivery_tag)
+                return
+
+    def nack(self, channel: Any, delivery_tag: int, requeue: bool = True) -> None:
+        """Reject a message received by a listener that is not auto acknowledged."""
+        for consumer in list(self.consumers):
+            if consumer.channel is channel:
+                self.broker.nack(consumer, delivery_tag, requeue)
+                return
+
+    def publish(self, queue: str, body: str, delay: float = 0.0) -> None:
+        """Publish a message to a queue of the broker."""
+        if isinstance(body, str):
+            body = body.encode('utf-8')
+        self.broker.publish(queue, body, delay)
+        logging.debug(f"Publish message to the queue {queue}")
+
+    def message_count(self, queue: str) -> int:
+        """Return the number of messages that wait on a queue of the broker to be delivered."""
+        return self.broker.message_count(queue)
+
+    def _dispatch(self, consumer: _Consumer, delivery_tag: int, redelivered: bool, body: bytes) -> None:
+        """Called by the broker to deliver a message to a consumer of this transport."""
+        self._deliveries.put((consumer, delivery_tag, redelivered, body))
+
+    def _run_dispatch_loop(self) -> None:
+        """Call the listeners with the delivered messages until the transport is closed."""
+        properties = pika.BasicProperties(content_type='application/json')
+        while True:
+            delivery = self._deliveries.get()
+            if delivery is None:
+                break
+
+            consumer, delivery_tag, redelivered, body = delivery
+            if not consumer.channel.is_open:
+                continue
+
+            method = pika.spec.Basic.Deliver(
+                consumer_tag=f"ctag{consumer.channel.channel_number}",
+                delivery_tag=delivery_tag,
+                redelivered=redelivered,
+                exchange='',
+                routing_key=consumer.channel.queue
+            )
+            try:
+                consumer.callback(consumer.channel, method, properties, body)
+            except Exception:
+                logging.exception(f"Unexpected error processing a message of the queue {consumer.channel.queue}")
+
+    def start_consuming(self) -> None:
+        """Wait until the transport is closed while the messages are consumed."""
+        while self._dispatch_thread.is_alive():
+            self._dispatch_thread.join(timeout=1)
+
+    def close(self) -> None:
+        """Cancel the listeners and stop the dispatching of the messages."""
+        if self._stopping:
+            return
+
+        self._stopping = True
+        for consumer in self.consumers:
+            consumer.channel.is_open = False
+            self.broker.cancel(consumer)
+        self._deliveries.put(None)
+        if threading.current_thread() is not self._dispatch_thread:
+            self._dispatch_thread.join()
@@ -0,0 +1,203 @@
+# 
+# This file is part of the C1_llm_email_replier distribution (https://github.com/VALAWAI/C1_llm_email_replier).
+# Copyright (c) 2022-2026 VALAWAI (https://valawai.eu/).
+# 
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+# 
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+# 
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+
+
+import json
+import logging
+import os
+from typing import Any, Type, TypeVar, Union
+
+from pydantic import BaseModel
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - the faster backend is optional
+    orjson = None
+
+Model = TypeVar('Model', bound=BaseModel)
+
+
+class RawJSON(str):
+    """A text that is already encoded as JSON, so it is not serialized again."""
+
+
+def _use_orjson() -> bool:
+    """Check if the orjson backend has to be used."""
+
+    backend = os.getenv("JSON_BACKEND", "auto").lower()
+    if backend == "json":
+        return False
+
+    if orjson is None:
+        if backend == "orjson":
+            logging.warning("The orjson backend is not installed, so the standard json module is used")
+        return False
+
+    return True
+
+
+USE_ORJSON = _use_orjson()
+
+
+def loads(data: Union[bytes, bytearray, memoryview, str]) -> Any:
+    """Decode a JSON document.
+
+    Parameters
+    ----------
+    data : bytes or str
+        The JSON document to decode.
+
+    Returns
+    -------
+    object
+        The decoded value.
+
+    Raises
+    ------
+    ValueError
+        If the data is not a valid JSON document.
+    """
+    if USE_ORJSON:
+        return orjson.loads(data)
+
+    return json.loads(data)
+
+
+def dumps(obj: Any) -> str:
+    """Encode a value as a JSON document.
+
+    The pydantic models are serialized by pydantic and the RawJSON values are
+    returned as they are, so what has been serialized once is not serialized again.
+
+    Parameters
+    ----------
+    obj : object
+        The value to encode.
+
+    Returns
+    -------
+    str
+        The JSON document.
+
+    Raises
+    ------
+    TypeError
+        If the value cannot be encoded as JSON.
+    ValueError
+        If the value cannot be encoded as JSON.
+    """
+    if isinstance(obj, RawJSON):
+        return obj
+
+    if isinstance(obj, BaseModel):
+        return obj.model_dump_json()
+
+    if USE_ORJSON:
+        try:
+            return orjson.dumps(obj).decode('utf-8')
+        except orjson.JSONEncodeError as error:
+            # orjson only accepts string keys and 64 bit integers, so let json try it
+            logging.debug("Could not encode with orjson, because %s", error)
+
+    return json.dumps(obj)
+
+
+def encode_model(model: BaseModel) -> RawJSON:
+    """Serialize a model once, to use the same text on several messages.
+
+    Parameters
+    ----------
+    model : BaseModel
+        The model to serialize.
+
+    Returns
+    -------
+    RawJSON
+        The JSON document of the model.
+    """
+    return RawJSON(model.model_dump_json())
+
+
+def _is_json_string(data: Union[bytes, bytearray, memoryview, str]) -> bool:
+    """Check if a JSON document is a string, ignoring the leading white spaces."""
+
+    start = data[:1]
+    if isinstance(start, str):
+        if start.isspace():
+            start = data.lstrip()[:1]
+        return start == '"'
+
+    if bytes(start).isspace():
+        start = bytes(data).lstrip()[:1]
+    return start == b'"'
+
+
+def decode_model(model_class: Type[Model], data: Union[bytes, bytearray, memoryview, str]) -> Model:
+    """Decode a model from a JSON document.
+
+    Some publishers encode the JSON of the model again as a JSON string. This is detected
+    by the first character of the document, so the document is parsed only once in both cases.
+
+    Parameters
+    ----------
+    model_class : type
+        The class of the model to decode.
+    data : bytes or str
+        The JSON document with the model, or a JSON string with the JSON document of the model.
+
+    Returns
+    -------
+    BaseModel
+        The decoded model.
+
+    Raises
+    ------
+    ValueError
+        If the document is not a valid JSON or it does not match the model.
+    """
+    if _is_json_string(data):
+        data = loads(data)
+
+    return model_class.model_validate_json(data)
+
+
+def payload_to_str(payload: Any) -> str:
+    """Obtain the text to use as the payload of a log message.
+
+    Parameters
+    ----------
+    payload : object
+        The payload to convert.
+
+    Returns
+    -------
+    str
+        The JSON of the payload or, if it cannot be encoded, its text representation.
+    """
+    if isinstance(payload, str):
+        return payload
+
+    if isinstance(payload, (bytes, bytearray)):
+        return payload.decode('utf-8', errors='replace')
+
+    try:
+        return dumps(payload)
+
+    except (TypeError, ValueError):
+        logging.debug("Could not serialize payload to JSON; falling back to str()")
+        return str(payload)
@@ -0,0 +1,190 @@
+# 
+# This file is part of the C1_llm_email_replier distribution (https://github.com/VALAWAI/C1_llm_email_replier).
+# Copyright (c) 2022-2026 VALAWAI (https://valawai.eu/).
+# 
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+# 
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+# 
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+
+import math
+import os
+import re
+from collections import Counter
+from typing import Dict, Iterable, Optional, Tuple
+
+# Texts, with the vocabulary of the e-mails, to build the n-gram profile of each language
+SAMPLES: Dict[str, str] = {
+    'en': (
+        "Dear team, thank you for your e-mail. I would like to know when the order will be delivered, because "
+        "we have been waiting for two weeks and nobody has answered our questions. Could you please send me the "
+        "invoice and the tracking number? The product that we received does not work and the screen is broken. "
+        "We need a solution as soon as possible, otherwise we will ask for a refund. I am writing to confirm the "
+        "meeting of next Monday in the office. Please let me know if you have any problem with the schedule. "
+        "Best regards and thanks in advance for your help with this issue. What is the status of my request?"
+    ),
+    'es': (
+        "Estimado equipo, gracias por su correo. Me gustaría saber cuándo se entregará el pedido, porque llevamos "
+        "dos semanas esperando y nadie ha respondido a nuestras preguntas. ¿Podrían enviarme la factura y el número "
+        "de seguimiento? El producto que recibimos no funciona y la pantalla está rota. Necesitamos una solución lo "
+        "antes posible, de lo contrario pediremos el reembolso. Le escribo para confirmar la reunión del próximo "
+        "lunes en la oficina. Por favor, avíseme si tiene algún problema con el horario. Un saludo y muchas gracias "
+        "de antemano por su ayuda con este asunto. ¿Cuál es el estado de mi solicitud?"
+    ),
+    'ca': (
+        "Benvolgut equip, gràcies pel vostre correu. M'agradaria saber quan s'entregarà la comanda, perquè fa dues "
+        "setmanes que esperem i ningú no ha respost les nostres preguntes. Em podríeu enviar la factura i el número "
+        "de seguiment? El producte que vam rebre no funciona i la pantalla està trencada. Necessitem una solució tan "
+        "aviat com sigui possible, altrament demanarem el reemborsament. Us escric per confirmar la reunió del "
+        "proper dilluns a l'oficina. Si us plau, feu-me saber si teniu cap problema amb l'horari. Salutacions i "
+        "moltes gràcies per endavant per la vostra ajuda amb aquest tema. Quin és l'estat de la meva sol·licitud?"
+    ),
+    'fr': (
+        "Chère équipe, merci pour votre courriel. Je voudrais savoir quand la commande sera livrée, car nous "
+        "attendons depuis deux semaines et personne n'a répondu à nos questions. Pourriez-vous m'envoyer la facture "
+        "et le numéro de suivi? Le produit que nous avons reçu ne fonctionne pas et l'écran est cassé. Nous avons "
+        "besoin d'une solution le plus tôt possible, sinon nous demanderons un remboursement. Je vous écris pour "
+        "confirmer la réunion de lundi prochain au bureau. Merci de me dire si vous avez un problème avec l'horaire. "
+        "Cordialement et merci d'avance pour votre aide avec ce sujet. Quel est l'état de ma demande?"
+    ),
+    'de': (
+        "Liebes Team, vielen Dank für Ihre E-Mail. Ich möchte wissen, wann die Bestellung geliefert wird, weil wir "
+        "seit zwei Wochen warten und niemand unsere Fragen beantwortet hat. Könnten Sie mir bitte die Rechnung und "
+        "die Sendungsnummer schicken? Das Produkt, das wir erhalten haben, funktioniert nicht und der Bildschirm ist "
+        "kaputt. Wir brauchen so schnell wie möglich eine Lösung, sonst werden wir eine Rückerstattung verlangen. "
+        "Ich schreibe Ihnen, um das Treffen am nächsten Montag im Büro zu bestätigen. Bitte teilen Sie mir mit, ob "
+        "Sie ein Problem mit dem Zeitplan haben. Mit freundlichen Grüßen und danke im Voraus für Ihre Hilfe."
+    ),
+    'it': (
+        "Gentile team, grazie per la vostra e-mail. Vorrei sapere quando sarà consegnato l'ordine, perché aspettiamo "
+        "da due settimane e nessuno ha risposto alle nostre domande. Potreste inviarmi la fattura e il numero di "
+        "tracciamento? Il prodotto che abbiamo ricevuto non funziona e lo schermo è rotto. Abbiamo bisogno di una "
+        "soluzione il prima possibile, altrimenti chiederemo il rimborso. Vi scrivo per confermare la riunione di "
+        "lunedì prossimo in ufficio. Per favore, fatemi sapere se avete qualche problema con l'orario. Cordiali "
+        "saluti e grazie in anticipo per il vostro aiuto con questa questione. Qual è lo stato della mia richiesta?"
+    ),
+    'pt': (
+        "Prezada equipe, obrigado pelo seu e-mail. Gostaria de saber quando a encomenda será entregue, porque "
+        "estamos à espera há duas semanas e ninguém respondeu às nossas perguntas. Poderiam enviar-me a fatura e o "
+        "número de rastreamento? O produto que recebemos não funciona e o ecrã está partido. Precisamos de uma "
+        "solução o mais rápido possível, caso contrário vamos pedir o reembolso. Escrevo para confirmar a reunião "
+        "da próxima segunda-feira no escritório. Por favor, avise-me se tiver algum problema com o horário. "
+        "Cumprimentos e obrigado desde já pela sua ajuda com este assunto. Qual é o estado do meu pedido?"
+    )
+}
+
+# The parts of an e-mail that do not show its language
+_QUOTED_LINES = re.compile(r'^\s*>.*$', re.MULTILINE)
+_NOISE = re.compile(r'(\S+@\S+|https?://\S+|www\.\S+|[\d_]+)')
+_NOT_LETTERS = re.compile(r"[^\w'·]+")
+
+
+def _clean(text: str) -> str:
+    """Remove the quoted replies, the addresses, the links and the numbers of a text, and normalize its spaces."""
+
+    text = _NOISE.sub(' ', _QUOTED_LINES.sub(' ', text))
+    return f" {_NOT_LETTERS.sub(' ', text).strip().lower()} "
+
+
+def _profile(text: str, orders: Iterable[int]) -> Dict[str, float]:
+    """Return the normalized frequencies of the character n-grams of a cleaned text."""
+
+    counts: Counter = Counter()
+    for order in orders:
+        for start in range(len(text) - order + 1):
+            gram = text[start:start + order]
+            if gram.strip():
+                counts[gram] += 1
+
+    norm = math.sqrt(sum(count * count for count in counts.values())) or 1.0
+    return {gram: count / norm for gram, count in counts.items()}
+
+
+class LanguageIdentifier:
+    """Identify the language of the e-mails from the frequencies of their character n-grams.
+
+    The profile of each language is built from an embedded text, so nothing is downloaded,
+    and the language of an e-mail is the one whose profile is the most similar to the
+    profile of its content, once the quoted replies, the links and the numbers are removed.
+    """
+
+    def __init__(
+        self,
+        languages: Optional[str] = os.getenv('LANGUAGE_ID_LANGUAGES', ""),
+        min_letters: int = int(os.getenv('LANGUAGE_ID_MIN_LETTERS', "20")),
+        min_margin: float = float(os.getenv('LANGUAGE_ID_MIN_MARGIN', "0.01")),
+        orders: Tuple[int, ...] = (1, 2, 3)
+    ):
+        """Initialize the identifier
+
+        Parameters
+        ----------
+        languages : str, optional
+            The comma separated ISO 639-1 codes of the languages to identify. By default all the known ones.
+        min_letters : int
+            The minimum letters that a text must have to identify its language.
+        min_margin : float
+            The minimum difference between the similarity of the most similar language and the second one.
+        orders : tuple of int
+            The lengths of the n-grams.
+        """
+        codes = [code.strip().lower() for code in (languages or "").split(',') if code.strip()]
+        self.languages = [code for code in codes if code in SAMPLES] or list(SAMPLES)
+        self.min_letters = max(1, min_letters)
+        self.min_margin = max(0.0, min_margin)
+        self.orders = orders
+        self._profiles = {code: _profile(_clean(SAMPLES[code]), orders) for code in self.languages}
+
+    def scores(self, text: Optional[str]) -> Dict[str, float]:
+        """Return the cosine similarity between a text and each language.
+
+        Parameters
+        ----------
+        text : str, optional
+            The text to identify.
+
+        Returns
+        -------
+        dict
+            The similarity, between 0 and 1, by language. Empty if the text has not enough letters.
+        """
+        cleaned = _clean(text or "")
+        if sum(character.isalpha() for character in cleaned) < self.min_letters:
+            return {}
+
+        profile = _profile(cleaned, self.orders)
+        return {
+            code: sum(weight * reference.get(gram, 0.0) for gram, weight in profile.items())
+            for code, reference in self._profiles.items()
+        }
+
+    def identify(self, text: Optional[str]) -> Optional[str]:
+        """Return the language of a text.
+
+        Parameters
+        ----------
+        text : str, optional
+            The text to identify.
+
+        Returns
+        -------
+        str, optional
+            The ISO 639-1 code of the language, or None if the text is too short or ambiguous.
+        """
+        ranking = sorted(self.scores(text).items(), key=lambda score: score[1], reverse=True)
+        if not ranking:
+            return None
+
+        if len(ranking) > 1 and ranking[0][1] - ranking[1][1] < self.min_margin:
+            return None
+
+        return ranking[0][0]
@@ -0,0 +1,31 @@
+# 
+# This file is part of the C1_llm_email_replier distribution (https://github.com/VALAWAI/C1_llm_email_replier).
+# Copyright (c) 2022-2026 VALAWAI (https://valawai.eu/).
+# 
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+# 
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+# 
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+
+from pydantic import Field
+
+from c1_llm_email_replier.generation_parameters_payload import GenerationParametersPayload
+
+
+class LanguageProfilePayload(GenerationParametersPayload):
+	"""The model, the prompts and the generation parameters to reply the e-mails written in a language.
+
+	The parameters that are not defined take the value of the component ones.
+	"""
+
+	model_id: str | None = Field(default=None, min_length=1, max_length=256, title="The LLM model to reply the e-mails of the language (https://huggingface.co).")
+	user_prompt: str | None = Field(default=None, min_length=10, max_length=10000, title="The prompt to pass the e-mail to the LLM, with the placeholders {subject} and {content}.")
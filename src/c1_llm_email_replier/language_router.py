@@ -0,0 +1,235 @@
+# 
+# This file is part of the C1_llm_email_replier distribution (https://github.com/VALAWAI/C1_llm_email_replier).
+# Copyright (c) 2022-2026 VALAWAI (https://valawai.eu/).
+# 
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+# 
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+# 
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+
+import logging
+import os
+import threading
+from collections import Counter
+from typing import Any, Dict, Hashable, Mapping, Optional, Tuple
+
+from c1_llm_email_replier.component_config import ComponentConfig, ConfigStore
+from c1_llm_email_replier.conversation_cache import ConversationCache
+from c1_llm_email_replier.generation_batcher import GenerationBatcher
+from c1_llm_email_replier.generation_parameters_payload import GenerationParametersPayload
+from c1_llm_email_replier.language_identifier import LanguageIdentifier
+
+# The parameters of the component that a language profile can change
+PROFILE_PARAMETERS = ('model_id', 'max_new_tokens', 'min_new_tokens', 'temperature', 'top_k', 'top_p', 'system_prompt', 'user_prompt', 'adapter')
+
+# The parameters of the component that the lanes use, and that the profiles can not change
+SHARED_PARAMETERS = ('kv_cache',)
+
+
+class _LanguageLane:
+    """The generator and the batches of the e-mails of a language."""
+
+    def __init__(self, language: str, config: ComponentConfig, own_model: bool):
+        self.language = language
+        self.store = ConfigStore(config)
+        self.own_model = own_model
+        self.generator: Optional[Any] = None
+        self.batcher: Optional[GenerationBatcher] = None
+        self.replies = 0
+        self.lock = threading.Lock()
+
+    def close(self) -> None:
+        if self.batcher is not None:
+            self.batcher.close()
+
+
+class LanguageRouter:
+    """Reply the e-mails of each language with the model and the prompts of its profile.
+
+    The profiles are the language_profiles parameter of the component, that can be changed
+    through the parameters channel. The language of each e-mail is identified from its
+    content, and if it has a profile the reply is generated by the lane of the language,
+    that has its own generator and batch queue. The lanes share the model of the component
+    unless their profile defines another one, and they share the conversations cache of the
+    component, whose conversations are only reused with the same model and prompts.
+    """
+
+    def __init__(
+        self,
+        generator: Any,
+        identifier: Optional[LanguageIdentifier] = None,
+        batch_size: int = int(os.getenv('REPLY_BATCH_SIZE', "1")),
+        conversations: Optional[ConversationCache] = None,
+        mov: Optional[Any] = None
+    ):
+        """Initialize the router
+
+        Parameters
+        ----------
+        generator : EMailReplierGenerator
+            The generator of the component, whose parameters are the ones of the languages without profile.
+        identifier : LanguageIdentifier, optional
+            The identifier of the language of the e-mails.
+        batch_size : int
+            The maximum number of e-mails of a language to generate in a batch.
+        conversations : ConversationCache, optional
+            The cache of the conversations of the component, that the lanes share so they
+            do not exceed its memory. By default the lanes have a cache of their own.
+        mov : MOV, optional
+            The service to send the routing decisions.
+        """
+        self.generator = generator
+        self.config_store: ConfigStore = generator.config_store
+        self.identifier = identifier or LanguageIdentifier()
+        self.batch_size = max(1, batch_size)
+        self.conversations = conversations if conversations is not None else ConversationCache()
+        self.mov = mov
+        self.identified: Counter = Counter()
+        self._lanes: Dict[str, _LanguageLane] = {}
+        self._version: Optional[int] = None
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self) -> bool:
+        """Check if there are language profiles."""
+
+        return len(self.config_store.current.language_profiles) > 0
+
+    def route(self, subject: Optional[str], content: Optional[str]) -> Optional[str]:
+        """Identify the language of an e-mail.
+
+        Parameters
+        ----------
+        subject : str, optional
+            The subject of the e-mail.
+        content : str, optional
+            The content of the e-mail, without HTML.
+
+        Returns
+        -------
+        str, optional
+            The language of the e-mail if it has a profile, otherwise None.
+        """
+        # The subject is only used when the content is too short
+        language = self.identifier.identify(content) or self.identifier.identify(f"{subject or ''}\n{content or ''}")
+        with self._lock:
+            self.identified[language or "unknown"] += 1
+
+        if language is None or language not in self.config_store.current.language_profiles:
+            return None
+
+        if self.mov is not None:
+            self.mov.debug(f"Replying an e-mail with the {language} profile", {"identified": dict(self.identified)})
+        return language
+
+    def generate_reply(
+        self, language: str, subject: str, content: str,
+        parameters: Optional[GenerationParametersPayload] = None, conversation: Optional[Hashable] = None
+    ) -> Tuple[str, str]:
+        """Generate the reply of an e-mail with the profile of its language.
+
+        Parameters
+        ----------
+        language : str
+            The language returned by route.
+        subject : str
+            The subject of the e-mail to reply.
+        content : str
+            The content of the e-mail to reply.
+        parameters : GenerationParametersPayload, optional
+            The parameters of the e-mail, that override the ones of the profile.
+        conversation : hashable, optional
+            The conversation of the e-mail, if the conversations are cached.
+
+        Returns
+        -------
+        (str, str)
+            The subject and the content of the reply.
+        """
+        self.generator.refresh_parameters()
+        lane = self._lane(language)
+        with lane.lock:
+            if lane.generator is None:
+                logging.info("Creating the generator of the %s e-mails", language)
+                lane.generator = self.generator.derive(lane.store, self.conversations)
+                if self.batch_size > 1:
+                    lane.batcher = GenerationBatcher(lane.generator, max_batch_size=self.batch_size)
+
+            if not lane.own_model and lane.generator.pipe is not self.generator.pipe:
+                # Follow the model of the component when it changes
+                lane.generator.model_id, lane.generator.pipe = self.generator.model_id, self.generator.pipe
+
+            lane.replies += 1
+
+        if lane.batcher is not None:
+            return lane.batcher.generate(subject, content, parameters)
+
+        lane.generator.refresh_parameters()
+        if conversation is not None and self.conversations.enabled:
+            return lane.generator.generate_reply(subject, content, parameters, conversation)
+
+        return lane.generator.generate_reply(subject, content, parameters)
+
+    def _lane(self, language: str) -> _LanguageLane:
+        """Return the lane of a language, updating the lanes if the parameters of the component have changed."""
+
+        with self._lock:
+            config = self.config_store.current
+            if config.version != self._version:
+                self._update_lanes(config)
+                self._version = config.version
+
+            lane = self._lanes.get(language)
+            if lane is None:
+                # The profile has been removed after routing the e-mail
+                lane = self._lanes[language] = _LanguageLane(language, config, own_model=False)
+
+            return lane
+
+    def _update_lanes(self, config: ComponentConfig) -> None:
+        """Create, change or remove the lanes to match the language profiles of the component."""
+
+        profiles: Mapping[str, Mapping[str, Any]] = config.language_profiles
+        for language in [language for language in self._lanes if language not in profiles]:
+            self._lanes.pop(language).close()
+
+        for language, profile in profiles.items():
+            if language not in self.identifier.languages and language not in self._lanes:
+                logging.warning("The e-mails in %s are not identified, so its profile is not used", language)
+
+            values = {name: getattr(config, name) for name in PROFILE_PARAMETERS + SHARED_PARAMETERS}
+            values.update({name: value for name, value in profile.items() if name in PROFILE_PARAMETERS})
+            own_model = values['model_id'] != config.model_id
+            lane = self._lanes.get(language)
+            if lane is None or lane.own_model != own_model:
+                if lane is not None:
+                    lane.close()
+                self._lanes[language] = _LanguageLane(language, config.with_changes(**values), own_model)
+
+            else:
+                lane.store.publish(**values)
+
+    def metrics(self) -> Dict[str, Any]:
+        """Return the languages identified and the replies generated by each lane."""
+
+        with self._lock:
+            return {
+                "identified": dict(self.identified),
+                "lanes": {
+                    language: {
+                        "model_id": lane.store.current.model_id,
+                        "replies": lane.replies
+                    }
+                    for language, lane in self._lanes.items()
+                },
+                "conversations": self.conversations.metrics()["conversations"]
+            }
@@ -0,0 +1,180 @@
+# 
+# This file is part of the C1_llm_email_replier distribution (https://github.com/VALAWAI/C1_llm_email_replier).
+# Copyright (c) 2022-2026 VALAWAI (https://valawai.eu/).
+# 
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+# 
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+# 
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, Optional
+
+from c1_llm_email_replier.process_memory import process_rss
+
+MEGABYTE = 1048576
+
+
+class MemoryWatchdog:
+    """Watch the memory of the process to only start the generations that fit on it.
+
+    A background thread samples the resident memory of the process, and each generation
+    reserves the memory that its KV cache is estimated to need before it starts. When the
+    memory plus the reservations is near the limit the new generations wait until the
+    running ones finish, so the e-mails stay on the queue instead of killing the process.
+    """
+
+    def __init__(
+        self,
+        limit: float = float(os.getenv('MEMORY_LIMIT', "0")),
+        high_watermark: float = float(os.getenv('MEMORY_HIGH_WATERMARK', "0.9")),
+        interval: float = float(os.getenv('MEMORY_CHECK_INTERVAL', "1.0")),
+        report_interval: float = float(os.getenv('MEMORY_REPORT_INTERVAL', "60")),
+        mov: Optional[Any] = None
+    ):
+        """Initialize the watchdog
+
+        Parameters
+        ----------
+        limit : float
+            The megabytes of memory that the process can use. If it is 0 the memory is not watched.
+        high_watermark : float
+            The fraction of the limit from which no more generations are started.
+        interval : float
+            The seconds between the samples of the memory of the process.
+        report_interval : float
+            The seconds between the memory metrics sent to the MOV. If it is 0 they are not sent.
+        mov : MOV, optional
+            The service to send the memory metrics and the memory pressure changes.
+        """
+        self.limit = max(0, int(limit * MEGABYTE))
+        self.high_watermark = min(1.0, max(0.1, high_watermark))
+        self.interval = max(0.01, interval)
+        self.report_interval = max(0.0, report_interval)
+        self.mov = mov
+        self.rss = process_rss()
+        self.reserved = 0
+        self.under_pressure = False
+        self._condition = threading.Condition()
+        self._closed = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        if self.limit > 0:
+            self._thread = threading.Thread(target=self._run, name="memory-watchdog", daemon=True)
+            self._thread.start()
+
+    @property
+    def enabled(self) -> bool:
+        """Check if the memory is watched."""
+
+        return self.limit > 0
+
+    @property
+    def threshold(self) -> int:
+        """The bytes of memory from which no more generations are started."""
+
+        return int(self.limit * self.high_watermark)
+
+    @property
+    def headroom(self) -> int:
+        """The bytes of memory that can still be reserved by the generations."""
+
+        return self.threshold - self.rss - self.reserved
+
+    def metrics(self) -> Dict[str, Any]:
+        """Return the memory metrics, in megabytes."""
+
+        return {
+            "limit": self.limit / MEGABYTE,
+            "rss": self.rss / MEGABYTE,
+            "reserved": self.reserved / MEGABYTE,
+            "headroom": self.headroom / MEGABYTE
+        }
+
+    @contextmanager
+    def admit(self, estimate: int) -> Iterator[None]:
+        """Reserve the memory of a generation while it runs.
+
+        It waits until the memory fits below the high watermark. A generation is always
+        admitted when no other one is running, so a generation that alone exceeds the
+        limit is not blocked forever.
+
+        Parameters
+        ----------
+        estimate : int
+            The bytes of memory that the generation is estimated to need.
+        """
+        if not self.enabled:
+            yield
+            return
+
+        estimate = max(0, int(estimate))
+        with self._condition:
+            waiting = False
+            while self.reserved > 0 and self.rss + self.reserved + estimate > self.threshold:
+                if not waiting:
+                    waiting = True
+                    logging.warning("Waiting for memory to start a generation that needs %.1f MB", estimate / MEGABYTE)
+                self._condition.wait(self.interval)
+                self.rss = process_rss()
+
+            self.reserved += estimate
+
+        try:
+            yield
+
+        finally:
+            with self._condition:
+                self.reserved -= estimate
+                self._condition.notify_all()
+
+    def _run(self) -> None:
+        """Sample the memory of the process."""
+
+        last_report = time.monotonic()
+        while not self._closed.wait(self.interval):
+            with self._condition:
+                self.rss = process_rss()
+                under_pressure = self.headroom <= 0
+                self._condition.notify_all()
+
+            if under_pressure != self.under_pressure:
+                self.under_pressure = under_pressure
+                self._report_pressure()
+
+            if self.mov is not None and self.report_interval > 0 and time.monotonic() - last_report >= self.report_interval:
+                last_report = time.monotonic()
+                self.mov.debug("Memory headroom", self.metrics())
+
+    def _report_pressure(self) -> None:
+        """Notify that the memory pressure has changed."""
+
+        metrics = self.metrics()
+        if self.under_pressure:
+            logging.warning("The memory is near the limit, headroom %.1f MB", metrics["headroom"])
+            if self.mov is not None:
+                self.mov.warn("Stopped starting generations because the memory is near the limit", metrics)
+
+        else:
+            logging.info("The memory is below the limit again, headroom %.1f MB", metrics["headroom"])
+            if self.mov is not None:
+                self.mov.info("Resumed starting generations because the memory is below the limit", metrics)
+
+    def close(self) -> None:
+        """Stop watching the memory."""
+
+        self._closed.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5.0)
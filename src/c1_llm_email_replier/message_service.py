@@ -16,19 +16,28 @@
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 #
 
-import json
 import logging
 import os
-import time
-from threading import Thread
 from typing import Any, Callable, Optional
-from pydantic import BaseModel
 
-import pika
+from c1_llm_email_replier import json_codec
+from c1_llm_email_replier.in_memory_transport import InMemoryTransport
+from c1_llm_email_replier.pika_transport import PikaTransport
+from c1_llm_email_replier.transport import Transport
+
+# The consumer priority of the queues that control the component,
+# they must be processed even when the data queues are saturated.
+CONTROL_PRIORITY = 10
 
 
 class MessageService:
-    """The service to send and receive messages from the RabbitMQ"""
+    """The service to send and receive messages from the RabbitMQ
+
+    The messages are sent and received by a transport. By default it is the pika transport,
+    that connects to the RabbitMQ, but if the environment variable MESSAGE_TRANSPORT is 'memory'
+    it uses an in-memory broker shared by all the process, that allows running the component
+    without any RabbitMQ.
+    """
 
     def __init__(
         self,
@@ -38,6 +47,7 @@ class MessageService:
         password: str = os.getenv('RABBITMQ_PASSWORD', 'password'),
         max_retries: int = int(os.getenv('RABBITMQ_MAX_RETRIES', "100")),
         retry_sleep_seconds: int = int(os.getenv('RABBITMQ_RETRY_SLEEP', "3")),
+        transport: Optional[Transport] = None,
     ):
         """Initialize the connection to the RabbitMQ
 
@@ -61,137 +71,125 @@ class MessageService:
         retry_sleep_seconds : int
             The seconds to wait between the tries for create a connection with the RabbitMQ server.
             By default uses the environment variable RABBITMQ_RETRY_SLEEP and if it is not defined uses '3'.
+        transport : Transport
+            The transport to use to send and receive the messages. If it is not defined the transport
+            is selected with the environment variable MESSAGE_TRANSPORT ('pika' or 'memory').
         """
-        self.credentials = pika.PlainCredentials(username=username, password=password)
-        self.host = host
-        self.port = port
-        self.listen_connection: Optional[pika.BlockingConnection] = None
-        self.listen_channel: Any = None
-        self.connection_params = pika.ConnectionParameters(
-            host=self.host, 
-            port=self.port, 
-            credentials=self.credentials,
-            heartbeat=int(os.getenv('RABBITMQ_HEARTBEAT', "600")) # Higher heartbeat to survive LLM generation
-        )
-        self.max_retries = max_retries
-        self.retry_sleep_seconds = retry_sleep_seconds
-        self.listeners: list[tuple[str, Callable]] = []
-        self._stopping = False
-
-        self._connect()
-
-    def _connect(self) -> None:
-        """Establish the connection to RabbitMQ with retries."""
-        for attempt in range(self.max_retries):
-            try:
-                if self.listen_connection is not None and self.listen_connection.is_open:
-                    return
-
-                self.listen_connection = pika.BlockingConnection(self.connection_params)
-                self.listen_channel = self.listen_connection.channel()
-                
-                # Re-apply listeners if any
-                for queue, callback in self.listeners:
-                    self._apply_listener(queue, callback)
-                
-                logging.info(f"Connected to RabbitMQ at {self.host}:{self.port}")
-                return
-            except (OSError, pika.exceptions.AMQPError) as error:
-                logging.warning(f"Cannot connect to RabbitMQ (attempt {attempt + 1}/{self.max_retries}) because {error}. Retrying in {self.retry_sleep_seconds}s...")
-                time.sleep(self.retry_sleep_seconds)
-
-        raise ValueError(f"Cannot connect to RabbitMQ at {self.host}:{self.port} after {self.max_retries} attempts")
+        if transport is None:
+            if os.getenv('MESSAGE_TRANSPORT', 'pika').lower() == 'memory':
+                transport = InMemoryTransport()
+
+            else:
+                transport = PikaTransport(
+                    host=host,
+                    port=port,
+                    username=username,
+                    password=password,
+                    max_retries=max_retries,
+                    retry_sleep_seconds=retry_sleep_seconds
+                )
+
+        self.transport = transport
 
     def close(self) -> None:
         """Close the connection."""
-        self._stopping = True
-        try:
-            if self.listen_channel is not None and self.listen_channel.is_open:
-                self.listen_channel.stop_consuming()
-            if self.listen_connection is not None and self.listen_connection.is_open:
-                self.listen_connection.close()
-        except (OSError, pika.exceptions.AMQPError):
-            logging.exception("Cannot close the connection to RabbitMQ")
-        except BaseException:
-            logging.exception("Unexpected error closing RabbitMQ connection")
-
-    def listen_for(self, queue: str, callback: Callable) -> None:
+        self.transport.close()
+
+    def listen_for(self, queue: str, callback: Callable, prefetch_count: int = 0, priority: int = 0, auto_ack: bool = True) -> None:
         """Register a listener on a queue.
 
+        Each queue is consumed by its own channel, so a backlog on a queue does not
+        delay the messages received on the other queues.
+
         Parameters
         ----------
         queue : str
             The name of the queue to listen.
         callback: method
             The method to call when a message is received.
+        prefetch_count: int
+            The maximum number of messages not acknowledged that the queue can deliver,
+            or 0 if it is not limited. It only has effect if the messages are not auto acknowledged.
+        priority: int
+            The priority of the consumer. The channels with more priority are opened first
+            and the broker delivers to them before the ones with less priority.
+        auto_ack: bool
+            True if the messages are acknowledged when they are received, otherwise the
+            callback must call the method 'ack' when the message has been processed.
         """
-        self.listeners.append((queue, callback))
-        self._apply_listener(queue, callback)
+        self.transport.listen_for(queue, callback, prefetch_count=prefetch_count, priority=priority, auto_ack=auto_ack)
+
+    def ack(self, channel: Any, delivery_tag: int) -> None:
+        """Acknowledge a message received by a listener that is not auto acknowledged.
+
+        This method can be called from any thread.
+
+        Parameters
+        ----------
+        channel : object
+            The channel that has received the message.
+        delivery_tag: int
+            The delivery tag of the message to acknowledge.
+        """
+        self.transport.ack(channel, delivery_tag)
+
+    def nack(self, channel: Any, delivery_tag: int, requeue: bool = True) -> None:
+        """Reject a message received by a listener that is not auto acknowledged.
 
-    def _apply_listener(self, queue: str, callback: Callable) -> None:
-        """Actually register the listener on the channel."""
-        self.listen_channel.queue_declare(queue=queue, durable=True, exclusive=False, auto_delete=False)
-        self.listen_channel.basic_consume(queue=queue, auto_ack=True, on_message_callback=callback)
-        logging.debug(f"Listen for the queue {queue}")
+        This method can be called from any thread.
 
-    def publish_to(self, queue: str, msg: Any) -> None:
+        Parameters
+        ----------
+        channel : object
+            The channel that has received the message.
+        delivery_tag: int
+            The delivery tag of the message to reject.
+        requeue: bool
+            True if the message is returned to its queue to be delivered again.
+        """
+        self.transport.nack(channel, delivery_tag, requeue)
+
+    def publish_to(self, queue: str, msg: Any, delay: float = 0.0) -> None:
         """Publish a message to a queue.
 
+        This method can be called from any thread.
+
         Parameters
         ----------
         queue : str
             The name of the queue to publish the event.
         msg: object
             The message to send.
+        delay: float
+            The seconds that the broker keeps the message before delivering it to the queue.
         """
         try:
-            if isinstance(msg, BaseModel):
-                body = msg.model_dump_json()
-            else:
-                body = json.dumps(msg)
-
-            properties = pika.BasicProperties(content_type='application/json')
-
-            # Create an on-demand connection for publishing
-            with pika.BlockingConnection(self.connection_params) as publish_connection:
-                with publish_connection.channel() as publish_channel:
-                    publish_channel.basic_publish(
-                        exchange='',
-                        routing_key=queue,
-                        body=body,
-                        properties=properties,
-                    )
-            logging.debug(f"Publish message to the queue {queue}")
-
-        except (OSError, pika.exceptions.AMQPError):
-            logging.exception(f"Cannot publish a msg in the queue {queue}")
+            body = json_codec.dumps(msg)
+            self.transport.publish(queue, body, delay)
+
         except (TypeError, ValueError):
             logging.exception("Cannot publish a msg because the message could not be encoded")
 
+    def message_count(self, queue: str) -> int:
+        """Return the number of messages that wait on a queue to be delivered.
+
+        This method can be called from any thread, except the one that calls the listeners.
+
+        Parameters
+        ----------
+        queue : str
+            The name of the queue.
+
+        Returns
+        -------
+        int
+            The messages of the queue that have not been delivered, or 0 if they can not be counted.
+        """
+        return self.transport.message_count(queue)
+
     def start_consuming(self) -> None:
-        """Start to consume the messages with automatic reconnection."""
-        while not self._stopping:
-            try:
-                self._connect()
-                logging.info(f"Start listening for events on {self.host}:{self.port}")
-                self.listen_channel.start_consuming()
-            except KeyboardInterrupt:
-                logging.info(f"Stop listening for events on {self.host}:{self.port}")
-                self.close()
-            except (pika.exceptions.AMQPError, pika.exceptions.ConnectionClosedByBroker) as error:
-                if self._stopping:
-                    break
-                logging.warning(f"Connection lost to RabbitMQ at {self.host}:{self.port} ({error}). Reconnecting...")
-                self.listen_connection = None # Force reconnection
-                time.sleep(self.retry_sleep_seconds)
-            except BaseException as error:
-                if self._stopping:
-                    break
-                logging.exception(f"Consuming messages error from RabbitMQ at {self.host}:{self.port} because {error}. Reconnecting...")
-                self.listen_connection = None # Force reconnection
-                time.sleep(self.retry_sleep_seconds)
+        """Wait until the service is closed while the transport consumes the messages."""
+        self.transport.start_consuming()
 
     def start_consuming_and_forget(self) -> None:
-        """Start consuming messages in a background daemon thread."""
-        thread = Thread(target=self.start_consuming, daemon=True)
-        thread.start()
+        """The messages are consumed by the thread of the transport, so nothing has to be started."""
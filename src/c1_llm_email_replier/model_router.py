@@ -0,0 +1,267 @@
+# 
+# This file is part of the C1_llm_email_replier distribution (https://github.com/VALAWAI/C1_llm_email_replier).
+# Copyright (c) 2022-2026 VALAWAI (https://valawai.eu/).
+# 
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+# 
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+# 
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+
+import logging
+import math
+import os
+import re
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, Hashable, List, Optional, Tuple
+
+from c1_llm_email_replier import json_codec
+from c1_llm_email_replier.email_replier_generator import EMailReplierGenerator
+from c1_llm_email_replier.generation_parameters_payload import GenerationParametersPayload
+from c1_llm_email_replier.reply_scheduler import estimate_tokens
+
+# The words and symbols that show that an e-mail is about a technical problem
+_TECHNICAL = re.compile(r'(\b(error|exception|traceback|failed|failure|bug|crash|stack|version|log|config\w*|http\S*)\b|[{}<>\[\]=;]|\d+\.\d+)', re.IGNORECASE)
+
+# The latencies to remember by tier to calculate their percentiles
+LATENCY_SAMPLES = 100
+
+
+def complexity(subject: Optional[str], content: Optional[str]) -> float:
+    """Estimate how complex is to reply an e-mail.
+
+    The complexity starts at the estimated tokens of the e-mail, and it grows with the
+    questions that have to be answered, the technical terms, and the letters that are not
+    ASCII, because the small models are worse on the languages other than English.
+
+    Parameters
+    ----------
+    subject : str, optional
+        The subject of the e-mail.
+    content : str, optional
+        The content of the e-mail.
+
+    Returns
+    -------
+    float
+        The complexity, in tokens of a simple English e-mail.
+    """
+    text = f"{subject or ''}\n{content or ''}"
+    score = float(estimate_tokens(subject, content))
+    score *= 1.0 + 0.25 * min(text.count('?'), 4)
+    if len(_TECHNICAL.findall(text)) >= 2:
+        score *= 1.5
+
+    letters = [character for character in text if character.isalpha()]
+    if letters and sum(not character.isascii() for character in letters) / len(letters) > 0.05:
+        score *= 1.5
+
+    return score
+
+
+class ModelTier:
+    """A model that replies the e-mails up to a complexity, with its own workers."""
+
+    def __init__(self, name: str, model_id: Optional[str], max_complexity: float, workers: int):
+        self.name = name
+        self.model_id = model_id
+        self.max_complexity = max_complexity
+        self.workers = workers
+        self.generator: Optional[Any] = None
+        self.executor: Optional[ThreadPoolExecutor] = None
+        self.routed = 0
+        self.latencies: deque = deque(maxlen=LATENCY_SAMPLES)
+
+    def latency(self, quantile: float) -> Optional[float]:
+        """Return a quantile of the recent latencies of the tier."""
+
+        if not self.latencies:
+            return None
+
+        latencies = sorted(self.latencies)
+        return latencies[min(len(latencies) - 1, int(quantile * len(latencies)))]
+
+
+def _tiers(value: str) -> List[ModelTier]:
+    """Convert the JSON with the model tiers, sorted by their maximum complexity."""
+
+    if not value.strip():
+        return []
+
+    try:
+        tiers = []
+        for index, tier in enumerate(json_codec.loads(value)):
+            max_complexity = tier.get('max_complexity')
+            tiers.append(ModelTier(
+                name=str(tier.get('name') or f"tier{index}"),
+                model_id=tier.get('model_id') or None,
+                max_complexity=math.inf if max_complexity is None else float(max_complexity),
+                workers=max(1, int(tier.get('workers', 1)))
+            ))
+
+    except (AttributeError, TypeError, ValueError):
+        logging.warning("Ignored the bad model tiers %s", value)
+        return []
+
+    tiers.sort(key=lambda tier: tier.max_complexity)
+    return tiers
+
+
+class ModelRouter:
+    """Route the e-mails to the model tier that fits their complexity.
+
+    The tiers are defined in MODEL_TIERS as a JSON array with the name of each tier, the
+    model_id to use, the max_complexity of the e-mails that it replies and its workers.
+    The tiers without model_id use the model of the component, and the tier without
+    max_complexity replies the most complex e-mails. Each tier has its own pipeline
+    and pool of workers, so the simple e-mails do not wait for the complex ones.
+    """
+
+    def __init__(
+        self,
+        generator: Any,
+        tiers: str = os.getenv('MODEL_TIERS', ""),
+        mov: Optional[Any] = None
+    ):
+        """Initialize the router
+
+        Parameters
+        ----------
+        generator : EMailReplierGenerator
+            The generator of the model of the component.
+        tiers : str
+            The JSON array with the model tiers. If it is empty the e-mails are not routed.
+        mov : MOV, optional
+            The service to send the routing decisions.
+        """
+        self.generator = generator
+        self.mov = mov
+        self.tiers = _tiers(tiers)
+        self._lock = threading.Lock()
+        for tier in self.tiers:
+            tier.executor = ThreadPoolExecutor(max_workers=tier.workers, thread_name_prefix=f"tier-{tier.name}")
+            if tier.model_id is None or tier.model_id == generator.model_id:
+                tier.generator = generator
+
+            else:
+                # The tiers share the parameters, the memory watchdog and the conversations of the component
+                tier.generator = EMailReplierGenerator(
+                    model_id=tier.model_id, config_store=generator.config_store,
+                    memory_watchdog=generator.memory_watchdog, conversation_cache=generator.conversation_cache,
+                    fixed_model=True
+                )
+
+        if self.tiers and not math.isinf(self.tiers[-1].max_complexity):
+            # The most complex e-mails are replied by the last tier
+            self.tiers[-1].max_complexity = math.inf
+
+    @property
+    def enabled(self) -> bool:
+        """Check if the e-mails are routed."""
+
+        return len(self.tiers) > 0
+
+    @property
+    def workers(self) -> int:
+        """Return the workers of all the tiers."""
+
+        return sum(tier.workers for tier in self.tiers)
+
+    def route(self, subject: Optional[str], content: Optional[str]) -> Tuple[ModelTier, float]:
+        """Select the tier to reply an e-mail.
+
+        Parameters
+        ----------
+        subject : str, optional
+            The subject of the e-mail.
+        content : str, optional
+            The content of the e-mail.
+
+        Returns
+        -------
+        (ModelTier, float)
+            The first tier whose maximum complexity is not lower than the complexity of the e-mail, and the complexity.
+        """
+        score = complexity(subject, content)
+        for tier in self.tiers:
+            if score <= tier.max_complexity:
+                return tier, score
+
+        return self.tiers[-1], score
+
+    def generate_reply(
+        self, subject: str, content: str, parameters: Optional[GenerationParametersPayload] = None, conversation: Optional[Hashable] = None
+    ) -> Tuple[str, str]:
+        """Generate the reply of an e-mail with the model of its tier, waiting for a worker of the tier.
+
+        Parameters
+        ----------
+        subject : str
+            The subject of the e-mail to reply.
+        content : str
+            The content of the e-mail to reply.
+        parameters : GenerationParametersPayload, optional
+            The parameters of the e-mail that override the component ones.
+        conversation : hashable, optional
+            The conversation of the e-mail, if the conversations are cached.
+
+        Returns
+        -------
+        (str, str)
+            The subject and the content of the reply.
+        """
+        tier, score = self.route(subject, content)
+        reply = tier.executor.submit(self._generate_on_tier, tier, subject, content, parameters, conversation).result()
+
+        if self.mov is not None:
+            self.mov.debug(f"Routed an e-mail to the {tier.name} tier", {"complexity": round(score, 1), "tier": self.metrics()[tier.name]})
+        return reply
+
+    def _generate_on_tier(
+        self, tier: ModelTier, subject: str, content: str, parameters: Optional[GenerationParametersPayload], conversation: Optional[Hashable]
+    ) -> Tuple[str, str]:
+        """Generate a reply on a worker of a tier, measuring its latency."""
+
+        start = time.monotonic()
+        tier.generator.refresh_parameters()
+        if conversation is not None:
+            reply = tier.generator.generate_reply(subject, content, parameters, conversation)
+        else:
+            reply = tier.generator.generate_reply(subject, content, parameters)
+
+        with self._lock:
+            tier.routed += 1
+            tier.latencies.append(time.monotonic() - start)
+        return reply
+
+    def metrics(self) -> Dict[str, Dict[str, Any]]:
+        """Return the e-mails routed to each tier and their latency."""
+
+        with self._lock:
+            return {
+                tier.name: {
+                    "model_id": tier.generator.model_id if tier.generator is not None else tier.model_id,
+                    "max_complexity": None if math.isinf(tier.max_complexity) else tier.max_complexity,
+                    "routed": tier.routed,
+                    "latency_p50": tier.latency(0.5),
+                    "latency_p95": tier.latency(0.95)
+                }
+                for tier in self.tiers
+            }
+
+    def close(self) -> None:
+        """Stop the workers of the tiers."""
+
+        for tier in self.tiers:
+            tier.executor.shutdown(wait=False)
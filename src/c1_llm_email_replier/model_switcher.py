@@ -0,0 +1,208 @@
+# 
+# This file is part of the C1_llm_email_replier distribution (https://github.com/VALAWAI/C1_llm_email_replier).
+# Copyright (c) 2022-2026 VALAWAI (https://valawai.eu/).
+# 
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+# 
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+# 
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+
+import gc
+import logging
+import os
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Dict, Optional
+
+from c1_llm_email_replier.component_config import ConfigStore
+from c1_llm_email_replier.email_replier_generator import EMailReplierGenerator, load_pipeline
+from c1_llm_email_replier.mov import MOV
+from c1_llm_email_replier.process_memory import device_memory_allocated, process_rss
+
+
+class ModelSwitcher:
+    """Change the model of the generator only when the new model has been validated.
+
+    The new model is loaded in the background, while the current model continues replying
+    the e-mails, and it is benchmarked to know how much memory it uses and how fast it
+    generates. The results are published to the MOV, and the generator only starts to use
+    the new model if it fits the configured limits.
+    """
+
+    def __init__(
+        self,
+        generator: EMailReplierGenerator,
+        mov: MOV,
+        config_store: Optional[ConfigStore] = None,
+        max_memory: float = float(os.getenv('MODEL_SWITCH_MAX_MEMORY', "0")),
+        max_latency: float = float(os.getenv('MODEL_SWITCH_MAX_LATENCY', "0")),
+        probe_tokens: int = int(os.getenv('MODEL_SWITCH_PROBE_TOKENS', "32"))
+    ):
+        """Initialize the switcher
+
+        Parameters
+        ----------
+        generator : EMailReplierGenerator
+            The generator that uses the model.
+        mov : MOV
+            The service to publish the results of the benchmarks.
+        config_store : ConfigStore, optional
+            The store where the model is published. By default the store shared by the process.
+        max_memory : float
+            The maximum megabytes of memory, on the host and on the GPUs, that the new model can use. If it
+            is 0 the memory is not limited.
+        max_latency : float
+            The maximum seconds to generate the probe reply. If it is 0 the latency is not limited.
+        probe_tokens : int
+            The number of tokens to generate in the probe reply.
+        """
+        self.generator = generator
+        self.mov = mov
+        self.config_store = config_store or ConfigStore.default()
+        self.max_memory = max(0.0, max_memory)
+        self.max_latency = max(0.0, max_latency)
+        self.probe_tokens = max(2, probe_tokens)
+        self.staged_model_id: Optional[str] = None
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="model-switch")
+
+    def stage(self, model_id: str) -> Optional[Future]:
+        """Start to validate a model to use it on the generator.
+
+        Parameters
+        ----------
+        model_id : str
+            The LLM model name (https://huggingface.co).
+
+        Returns
+        -------
+        Future, optional
+            The validation, that returns True if the model has been switched, or None
+            if the model is already in use or it is being validated.
+        """
+        with self._lock:
+            if model_id in (self.generator.model_id, self.staged_model_id):
+                return None
+
+            self.staged_model_id = model_id
+
+        self.mov.info(f"Validating the model {model_id}", {"model_id": model_id})
+        return self._executor.submit(self._switch, model_id)
+
+    def _switch(self, model_id: str) -> bool:
+        """Load, benchmark and, if it fits the limits, use a model."""
+
+        pipe = None
+        try:
+            rss = process_rss()
+            allocated = device_memory_allocated()
+            start = time.perf_counter()
+            pipe = load_pipeline(model_id)
+            load_time = time.perf_counter() - start
+            # The weights placed on a GPU do not count in the resident memory of the process
+            device_memory = max(0, device_memory_allocated() - allocated) / 1048576
+            results: Dict[str, Any] = {
+                "model_id": model_id,
+                "load_time": load_time,
+                "memory": max(0, process_rss() - rss) / 1048576 + device_memory,
+                "device_memory": device_memory
+            }
+            results.update(self.benchmark(pipe))
+            self.mov.info(f"Benchmarked the model {model_id}", results)
+
+            problem = self._exceeded_limit(results)
+            if problem is not None:
+                self.mov.error(f"Kept the model {self.generator.model_id}, because {model_id} {problem}", results)
+                return False
+
+            self.generator.use_pipeline(model_id, pipe)
+            pipe = None
+            self.config_store.publish(model_id=model_id)
+            self.config_store.save()
+            self.mov.info(f"Switched to the model {model_id}", results)
+            return True
+
+        except Exception as error:
+            logging.exception("Could not validate the model %s", model_id)
+            self.mov.error(f"Kept the model {self.generator.model_id}, because cannot load {model_id}: {error}", {"model_id": model_id})
+            return False
+
+        finally:
+            with self._lock:
+                if self.staged_model_id == model_id:
+                    self.staged_model_id = None
+
+            if pipe is not None:
+                # Release the rejected model
+                del pipe
+                gc.collect()
+
+    def _exceeded_limit(self, results: Dict[str, Any]) -> Optional[str]:
+        """Return the limit that the benchmark results exceed, if any."""
+
+        if self.max_memory > 0 and results["memory"] > self.max_memory:
+            return f"uses {results['memory']:.0f} MB and the limit is {self.max_memory:.0f} MB"
+
+        if self.max_latency > 0 and results["latency"] > self.max_latency:
+            return f"replies in {results['latency']:.2f} s and the limit is {self.max_latency:.2f} s"
+
+        return None
+
+    def benchmark(self, pipe: Any) -> Dict[str, Any]:
+        """Measure how fast a model processes a prompt and generates a reply.
+
+        Parameters
+        ----------
+        pipe : Any
+            The text-generation pipeline of the model.
+
+        Returns
+        -------
+        dict
+            The number of tokens of the prompt, the prompt and decode tokens per second,
+            and the seconds to generate the probe reply (latency).
+        """
+        config = self.config_store.current
+        prompt = config.user_prompt.format(
+            subject="How to create a VALAWAI component?",
+            content="Hi! I am a new user of the VALAWAI and I do not know how to create a component. Can you help me with it?"
+        )
+        prompt_tokens = len(pipe.tokenizer(prompt)["input_ids"])
+        generation = {
+            "do_sample": False,
+            "max_length": None,
+            "pad_token_id": pipe.tokenizer.eos_token_id,
+            "generation_config": None,
+            "return_full_text": False
+        }
+
+        # The first token measures the prompt processing and the rest the decoding
+        start = time.perf_counter()
+        pipe(prompt, max_new_tokens=1, **generation)
+        prefill = max(time.perf_counter() - start, 1e-9)
+
+        start = time.perf_counter()
+        pipe(prompt, max_new_tokens=self.probe_tokens, min_new_tokens=self.probe_tokens, **generation)
+        latency = time.perf_counter() - start
+
+        return {
+            "prompt_tokens": prompt_tokens,
+            "prompt_tokens_per_second": prompt_tokens / prefill,
+            "decode_tokens_per_second": (self.probe_tokens - 1) / max(latency - prefill, 1e-9),
+            "latency": latency
+        }
+
+    def close(self) -> None:
+        """Wait for the validation in progress and stop the switcher."""
+
+        self._executor.shutdown(wait=True)
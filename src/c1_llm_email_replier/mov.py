@@ -1,27 +1,34 @@
-from pydantic import BaseModel
 import json
 import logging
 import os.path
 from typing import Any, Optional, Dict
 
-from c1_llm_email_replier.message_service import MessageService
+from c1_llm_email_replier import json_codec
+from c1_llm_email_replier.component_config import ConfigStore
+from c1_llm_email_replier.message_service import CONTROL_PRIORITY, MessageService
+from c1_llm_email_replier.mov_log_policy import MOVLogPolicy
+from c1_llm_email_replier.mov_log_shipper import MOVLogShipper
 from c1_llm_email_replier import __version__
 
 
 class MOV:
     """The component used to interact with the Master Of VALAWAI (MOV)"""
 
-    def __init__(self, message_service: MessageService):
+    def __init__(self, message_service: MessageService, config_store: Optional[ConfigStore] = None):
         """Initialize the connection to the MOV
 
         Parameters
         ----------
         message_service: MessageService
             The service to receive or send messages thought RabbitMQ
+        config_store: ConfigStore, optional
+            The store with the parameters of the component. By default the store shared by the process.
         """
         self.message_service = message_service
         self.component_id: Optional[str] = None
-        self.message_service.listen_for('valawai/c1/llm_email_replier/control/registered', self.registered_component)
+        self.log_policy = MOVLogPolicy(config_store)
+        self.log_shipper = MOVLogShipper(message_service, self.log_policy)
+        self.message_service.listen_for('valawai/c1/llm_email_replier/control/registered', self.registered_component, priority=CONTROL_PRIORITY)
 
     def __read_file(self, path: str) -> str:
         """Read a file and return its content."""
@@ -55,9 +62,13 @@ class MOV:
         """Called when the component has been registered."""
 
         logging.debug("Received registered component %s", body)
-        msg = json.loads(body)
+        msg = json_codec.loads(body)
         self.component_id = msg['id']
         logging.info("Register C1 LLM E-Mail replier with the identifier '%s'", self.component_id)
+        self._store_component_id(msg)
+
+    def _store_component_id(self, msg: Dict[str, Any]) -> None:
+        """Store the registered component into a file."""
 
         try:
             log_dir = os.getenv("LOG_DIR", "logs")
@@ -86,6 +97,9 @@ class MOV:
         except (OSError, ValueError):
             logging.exception("Could not remove previous component id file")
 
+        # Ship the logs of the component before it is unregistered
+        self.log_shipper.flush(timeout=10.0)
+
         if self.component_id is not None:
             msg = {"component_id": self.component_id}
             self.message_service.publish_to('valawai/component/unregister', msg)
@@ -149,7 +163,7 @@ class MOV:
         logging.error(msg)
 
     def __log(self, level: str, msg: str, payload: Any = None) -> None:
-        """ Send a log message to the MOV
+        """ Buffer a log message that the log shipper sends to the MOV
             (https://valawai.github.io/docs/tutorials/mov/#add-a-log-message)
 
         Parameters
@@ -162,28 +176,11 @@ class MOV:
             The payload associated with the log message.
         """
 
-        # MOV treats {…} as template placeholders, so we strip braces from the message
-        # to prevent accidental placeholder expansion or errors on the MOV side.
-        safe_msg = msg.replace("{", "[").replace("}", "]")
-        add_log_payload = {"level": level, "message": safe_msg}
-
-        if payload is not None:
-            if isinstance(payload, BaseModel):
-                add_log_payload["payload"] = payload.model_dump_json()
-            elif isinstance(payload, (dict, list)):
-                add_log_payload["payload"] = json.dumps(payload)
-            elif isinstance(payload, bytes):
-                add_log_payload["payload"] = payload.decode('utf-8', errors='replace')
-            elif isinstance(payload, str):
-                add_log_payload["payload"] = payload
-            else:
-                try:
-                    add_log_payload["payload"] = json.dumps(payload)
-                except (TypeError, ValueError):
-                    logging.debug("Could not serialize payload to JSON; falling back to str()")
-                    add_log_payload["payload"] = str(payload)
+        # Check the policy before anything is serialized
+        if self.log_policy.accepts(level, msg):
+            self.log_shipper.add(level, msg, payload, self.component_id)
 
-        if self.component_id is not None:
-            add_log_payload["component_id"] = self.component_id
+    def close(self) -> None:
+        """Ship the pending log messages and stop the log shipper."""
 
-        self.message_service.publish_to('valawai/log/add', add_log_payload)
+        self.log_shipper.close()
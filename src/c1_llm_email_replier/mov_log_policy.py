@@ -0,0 +1,124 @@
+# 
+# This file is part of the C1_llm_email_replier distribution (https://github.com/VALAWAI/C1_llm_email_replier).
+# Copyright (c) 2022-2026 VALAWAI (https://valawai.eu/).
+# 
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+# 
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+# 
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+
+
+import hashlib
+import logging
+import random
+from typing import Any, Mapping, Optional
+
+from c1_llm_email_replier import json_codec
+from c1_llm_email_replier.component_config import ConfigStore
+
+LOG_LEVELS = {'DEBUG': 10, 'INFO': 20, 'WARN': 30, 'ERROR': 40}
+
+
+class MOVLogPolicy:
+    """The policy that decides which log messages are sent to the MOV and how big their payloads can be.
+
+    The level and the sampling are checked before the payload is serialized, so the log
+    messages that are not sent do not cost anything. The policy is obtained from the
+    parameters mov_log_level, mov_log_sampling, mov_log_payload_max_size and mov_log_payload_mode
+    of the component, and it is rebuilt only when a new version of them is published.
+    """
+
+    def __init__(self, config_store: Optional[ConfigStore] = None):
+        """Initialize the policy
+
+        Parameters
+        ----------
+        config_store : ConfigStore, optional
+            The store with the parameters of the component. By default the store shared by the process.
+        """
+        self.config_store = config_store or ConfigStore.default()
+        self.version = -1
+        self.level = 'DEBUG'
+        self.sampling: Mapping[str, float] = {}
+        self.payload_max_size = 0
+        self.payload_mode = 'truncate'
+        self._random = random.Random()
+        self.refresh()
+
+    def refresh(self) -> None:
+        """Rebuild the policy if the parameters of the component have changed."""
+
+        config = self.config_store.current
+        if config.version == self.version:
+            return
+
+        if config.mov_log_level in LOG_LEVELS:
+            self.level = config.mov_log_level
+        else:
+            logging.warning("Unknown MOV log level %s", config.mov_log_level)
+
+        self.sampling = config.mov_log_sampling
+        self.payload_max_size = max(0, config.mov_log_payload_max_size)
+        if config.mov_log_payload_mode in ('truncate', 'hash'):
+            self.payload_mode = config.mov_log_payload_mode
+        else:
+            logging.warning("Unknown MOV log payload mode %s", config.mov_log_payload_mode)
+
+        self.version = config.version
+
+    def accepts(self, level: str, message: str) -> bool:
+        """Check if a log message has to be sent to the MOV.
+
+        Parameters
+        ----------
+        level : str
+            The log level (DEBUG, INFO, WARN, ERROR)
+        message : str
+            The log message
+
+        Returns
+        -------
+        bool
+            True if the level is not below the policy level and the message has been sampled.
+        """
+        self.refresh()
+        if LOG_LEVELS.get(level, 0) < LOG_LEVELS[self.level]:
+            return False
+
+        # The rate of a message takes precedence over the rate of its level
+        rate = self.sampling.get(message, self.sampling.get(level, 1.0))
+        return rate >= 1.0 or self._random.random() < rate
+
+    def payload_to_str(self, payload: Any) -> str:
+        """Obtain the payload of a log message limited to the maximum size.
+
+        Parameters
+        ----------
+        payload : object
+            The payload of the log message.
+
+        Returns
+        -------
+        str
+            The payload as it is, if it is not greater than the maximum size, or otherwise
+            a JSON object with its size and its first characters or its SHA-256 hash.
+        """
+        text = json_codec.payload_to_str(payload)
+        size = len(text)
+        if self.payload_max_size <= 0 or size <= self.payload_max_size:
+            return text
+
+        if self.payload_mode == 'hash':
+            digest = hashlib.sha256(text.encode('utf-8', errors='replace')).hexdigest()
+            return json_codec.dumps({"size": size, "sha256": digest})
+
+        return json_codec.dumps({"size": size, "truncated": text[:self.payload_max_size]})
@@ -0,0 +1,232 @@
+# 
+# This file is part of the C1_llm_email_replier distribution (https://github.com/VALAWAI/C1_llm_email_replier).
+# Copyright (c) 2022-2026 VALAWAI (https://valawai.eu/).
+# 
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+# 
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+# 
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+
+
+import logging
+import os
+import threading
+from collections import deque
+from dataclasses import dataclass
+from typing import Any, Deque, Dict, List, Optional
+
+from c1_llm_email_replier.mov_log_policy import MOVLogPolicy
+
+LOG_ADD_TOPIC = 'valawai/log/add'
+
+
+@dataclass
+class LogRecord:
+    """A log message that is waiting to be shipped to the MOV."""
+
+    level: str
+    message: str
+    payload: Any = None
+    component_id: Optional[str] = None
+    repetitions: int = 1
+
+    def is_repetition_of(self, other: 'LogRecord') -> bool:
+        """Check if this record is the same log message as another one."""
+
+        return (self.level == other.level and self.message == other.message
+                and self.component_id == other.component_id
+                and (self.payload is other.payload or self.payload == other.payload))
+
+    def to_msg(self, policy: MOVLogPolicy) -> Dict[str, Any]:
+        """Obtain the message to add this log into the MOV."""
+
+        message = self.message
+        if self.repetitions > 1:
+            message = f"{message} (repeated {self.repetitions} times)"
+
+        # MOV treats {…} as template placeholders, so we strip braces from the message
+        # to prevent accidental placeholder expansion or errors on the MOV side.
+        add_log_payload = {"level": self.level, "message": message.replace("{", "[").replace("}", "]")}
+        if self.payload is not None:
+            add_log_payload["payload"] = policy.payload_to_str(self.payload)
+
+        if self.component_id is not None:
+            add_log_payload["component_id"] = self.component_id
+
+        return add_log_payload
+
+
+class MOVLogShipper:
+    """Ship the log messages to the MOV from a background thread.
+
+    The records are stored in a bounded buffer and they are serialized and published
+    in batches, when the batch is full or the flush interval has passed. When the buffer
+    is full the DEBUG records are dropped first, and consecutive repetitions of the same
+    record are coalesced into a single log message.
+    """
+
+    def __init__(
+        self,
+        message_service: Any,
+        policy: Optional[MOVLogPolicy] = None,
+        buffer_size: int = int(os.getenv('MOV_LOG_BUFFER_SIZE', "1000")),
+        batch_size: int = int(os.getenv('MOV_LOG_BATCH_SIZE', "100")),
+        flush_interval: float = float(os.getenv('MOV_LOG_FLUSH_INTERVAL', "0.5"))
+    ):
+        """Initialize the shipper
+
+        Parameters
+        ----------
+        message_service : MessageService
+            The service used to publish the log messages.
+        policy : MOVLogPolicy, optional
+            The policy that limits the size of the payloads.
+        buffer_size : int
+            The maximum number of records waiting to be shipped.
+        batch_size : int
+            The number of records that wakes up the background thread before the flush interval.
+        flush_interval : float
+            The maximum seconds that a record waits before being shipped.
+        """
+        self.message_service = message_service
+        self.policy = policy or MOVLogPolicy()
+        self.buffer_size = max(1, buffer_size)
+        self.batch_size = max(1, batch_size)
+        self.flush_interval = max(0.0, flush_interval)
+        self.shipped = 0
+        self.dropped = 0
+        self.coalesced = 0
+        self._records: Deque[LogRecord] = deque()
+        self._in_flight = 0
+        self._flush_requested = False
+        self._closed = False
+        self._condition = threading.Condition()
+        self._thread = threading.Thread(target=self._run, name="mov-log-shipper", daemon=True)
+        self._thread.start()
+
+    def add(self, level: str, message: str, payload: Any = None, component_id: Optional[str] = None) -> None:
+        """Add a log message to ship to the MOV. This method can be called from any thread.
+
+        Parameters
+        ----------
+        level : str
+            The log level (DEBUG, INFO, WARN, ERROR)
+        message : str
+            The log message
+        payload: object, optional
+            The payload associated with the log message.
+        component_id: str, optional
+            The identifier of the component that has generated the log.
+        """
+        record = LogRecord(level, message, payload, component_id)
+        with self._condition:
+            if self._closed:
+                self.dropped += 1
+                return
+
+            if self._records and record.is_repetition_of(self._records[-1]):
+                self._records[-1].repetitions += 1
+                self.coalesced += 1
+                return
+
+            if len(self._records) >= self.buffer_size and not self._drop_one_for(record):
+                return
+
+            self._records.append(record)
+            if len(self._records) == 1 or len(self._records) >= self.batch_size:
+                self._condition.notify_all()
+
+    def _drop_one_for(self, record: LogRecord) -> bool:
+        """Drop a record to make space for another. Return False if the new record is the dropped one."""
+
+        self.dropped += 1
+        for index, buffered in enumerate(self._records):
+            if buffered.level == 'DEBUG':
+                del self._records[index]
+                return True
+
+        if record.level == 'DEBUG':
+            return False
+
+        self._records.popleft()
+        return True
+
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        """Wait until the buffered records have been shipped.
+
+        Parameters
+        ----------
+        timeout : float, optional
+            The maximum seconds to wait.
+
+        Returns
+        -------
+        bool
+            True if all the records have been shipped.
+        """
+        with self._condition:
+            self._flush_requested = True
+            self._condition.notify_all()
+            return self._condition.wait_for(lambda: not self._records and self._in_flight == 0, timeout)
+
+    def close(self, timeout: Optional[float] = 10.0) -> None:
+        """Ship the buffered records and stop the background thread.
+
+        Parameters
+        ----------
+        timeout : float, optional
+            The maximum seconds to wait for the records to be shipped.
+        """
+        with self._condition:
+            self._closed = True
+            self._condition.notify_all()
+
+        self._thread.join(timeout)
+        logging.info("Shipped %d log messages to the MOV, coalesced %d and dropped %d", self.shipped, self.coalesced, self.dropped)
+
+    def _next_batch(self) -> Optional[List[LogRecord]]:
+        """Wait for the next records to ship. Return None when the shipper is closed and empty."""
+
+        with self._condition:
+            self._condition.wait_for(lambda: self._closed or self._records)
+            if not self._records:
+                return None
+
+            # Give time to the burst to fill the batch
+            self._condition.wait_for(lambda: self._closed or self._flush_requested or len(self._records) >= self.batch_size, self.flush_interval)
+            batch = list(self._records)
+            self._records.clear()
+            self._flush_requested = False
+            self._in_flight = len(batch)
+            return batch
+
+    def _run(self) -> None:
+        """Ship the records until the shipper is closed."""
+
+        while True:
+            batch = self._next_batch()
+            if batch is None:
+                return
+
+            shipped = 0
+            for record in batch:
+                try:
+                    self.message_service.publish_to(LOG_ADD_TOPIC, record.to_msg(self.policy))
+                    shipped += 1
+                except Exception:
+                    logging.exception("Cannot ship a log message to the MOV")
+
+            with self._condition:
+                self.shipped += shipped
+                self.dropped += len(batch) - shipped
+                self._in_flight = 0
+                self._condition.notify_all()
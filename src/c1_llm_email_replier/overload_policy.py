@@ -0,0 +1,255 @@
+# 
+# This file is part of the C1_llm_email_replier distribution (https://github.com/VALAWAI/C1_llm_email_replier).
+# Copyright (c) 2022-2026 VALAWAI (https://valawai.eu/).
+# 
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+# 
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+# 
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+
+import hashlib
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+
+# The degradation levels, where each level also applies the degradations of the previous ones
+NORMAL = 0
+SHORTER_REPLIES = 1
+FALLBACK_MODEL = 2
+CACHED_REPLIES = 3
+DEFER_LOW_PRIORITY = 4
+
+LEVEL_NAMES = ("normal", "shorter replies", "fallback model", "cached or template replies", "defer low priority e-mails")
+
+
+def _thresholds(value: str) -> List[float]:
+    """Convert a comma separated list to the thresholds of the levels."""
+
+    return [float(threshold) for threshold in value.split(',') if threshold.strip()][:DEFER_LOW_PRIORITY]
+
+
+class OverloadPolicy:
+    """Decide how much to degrade the replies depending on the load of the component.
+
+    The load is measured by the time that the e-mails wait until their reply starts to be
+    generated, smoothed with an exponential moving average, and by the number of e-mails
+    pending to be replied. The level rises as soon as any of them exceeds the threshold of
+    a level, and falls one level at a time when the load is well below the threshold of
+    the current level, so it does not oscillate. Each recovery interval without e-mails counts
+    as an e-mail that has not waited, so the next e-mail after a pause is not degraded by the
+    load that there was before it.
+    """
+
+    def __init__(
+        self,
+        wait_thresholds: str = os.getenv('OVERLOAD_WAIT_THRESHOLDS', ""),
+        depth_thresholds: str = os.getenv('OVERLOAD_DEPTH_THRESHOLDS', ""),
+        recovery_ratio: float = float(os.getenv('OVERLOAD_RECOVERY_RATIO', "0.5")),
+        smoothing: float = float(os.getenv('OVERLOAD_SMOOTHING', "0.2")),
+        recovery_interval: float = float(os.getenv('OVERLOAD_RECOVERY_INTERVAL', "10")),
+        max_new_tokens: int = int(os.getenv('OVERLOAD_MAX_NEW_TOKENS', "128")),
+        defer_priority: int = int(os.getenv('OVERLOAD_DEFER_PRIORITY', "1")),
+        template_reply: str = os.getenv('OVERLOAD_TEMPLATE_REPLY', "Thank you for your e-mail. We have received it and we will reply to you as soon as possible."),
+        cache_size: int = int(os.getenv('OVERLOAD_CACHE_SIZE', "256")),
+        mov: Optional[Any] = None
+    ):
+        """Initialize the policy
+
+        Parameters
+        ----------
+        wait_thresholds : str
+            The comma separated seconds that the e-mails wait from which each level starts,
+            for example '30,60,120,300'. If there are no thresholds the replies are never degraded.
+        depth_thresholds : str
+            The comma separated number of pending e-mails from which each level starts.
+        recovery_ratio : float
+            The fraction of the threshold of a level that the load must be below to leave it.
+        smoothing : float
+            The weight of the last wait on the moving average of the waits.
+        recovery_interval : float
+            The seconds without e-mails that count as an e-mail without wait. If it is 0 the
+            level only changes when the e-mails are observed.
+        max_new_tokens : int
+            The maximum tokens to generate from the shorter replies level.
+        defer_priority : int
+            The e-mails with a priority lower than this are deferred on the last level.
+        template_reply : str
+            The reply to send when there is no cached reply for an e-mail.
+        cache_size : int
+            The number of replies to remember to use them on the cached replies level.
+        mov : MOV, optional
+            The service to notify the changes of level.
+        """
+        self.wait_thresholds = _thresholds(wait_thresholds)
+        self.depth_thresholds = _thresholds(depth_thresholds)
+        self.recovery_ratio = min(1.0, max(0.0, recovery_ratio))
+        self.smoothing = min(1.0, max(0.01, smoothing))
+        self.recovery_interval = max(0.0, recovery_interval)
+        self.max_new_tokens = max(1, max_new_tokens)
+        self.defer_priority = defer_priority
+        self.template_reply = template_reply
+        self.cache_size = max(0, cache_size)
+        self.mov = mov
+        self.level = NORMAL
+        self.wait = 0.0
+        self.depth = 0
+        self._observed_at = time.monotonic()
+        self._cache: OrderedDict = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _target_level(self, wait: float, depth: int, ratio: float = 1.0) -> int:
+        """Return the greatest level whose thresholds, scaled by a ratio, are exceeded."""
+
+        level = NORMAL
+        for thresholds, value in ((self.wait_thresholds, wait), (self.depth_thresholds, depth)):
+            for index, threshold in enumerate(thresholds):
+                if value >= threshold * ratio:
+                    level = max(level, index + 1)
+
+        return level
+
+    def observe(self, wait: float, depth: int) -> int:
+        """Update the load with the wait of an e-mail and return the level to reply to it.
+
+        Parameters
+        ----------
+        wait : float
+            The seconds that the e-mail has waited until its reply starts to be generated.
+        depth : int
+            The number of e-mails pending to be replied.
+
+        Returns
+        -------
+        int
+            The degradation level.
+        """
+        with self._lock:
+            previous = self.level
+            now = time.monotonic()
+            self._decay(now)
+            self._observed_at = now
+            self.wait += self.smoothing * (max(0.0, wait) - self.wait)
+            self.depth = depth
+            self._evaluate()
+            level = self.level
+
+        if level != previous:
+            self._report(previous, level)
+
+        return level
+
+    def _evaluate(self) -> None:
+        """Rise or fall the level depending on the current load."""
+
+        target = self._target_level(self.wait, self.depth)
+        if target > self.level:
+            self.level = target
+
+        elif target < self.level and self._target_level(self.wait, self.depth, self.recovery_ratio) < self.level:
+            self.level -= 1
+
+    def _decay(self, now: float) -> None:
+        """Observe an e-mail without wait for each recovery interval passed since the last e-mail."""
+
+        if self.recovery_interval <= 0:
+            return
+
+        intervals = int((now - self._observed_at) // self.recovery_interval)
+        if intervals <= 0:
+            return
+
+        self._observed_at += intervals * self.recovery_interval
+        self.depth = 0
+        for index in range(intervals):
+            if self.level == NORMAL:
+                # Only the average of the waits changes once the level is normal
+                self.wait *= (1.0 - self.smoothing) ** (intervals - index)
+                break
+
+            self.wait -= self.smoothing * self.wait
+            self._evaluate()
+
+    def _report(self, previous: int, level: int) -> None:
+        """Notify a change of level."""
+
+        msg = f"Overload level changed from {LEVEL_NAMES[previous]} to {LEVEL_NAMES[level]}"
+        load = self.metrics()
+        if level > previous:
+            logging.warning(msg)
+            if self.mov is not None:
+                self.mov.warn(msg, load)
+
+        else:
+            logging.info(msg)
+            if self.mov is not None:
+                self.mov.info(msg, load)
+
+    @staticmethod
+    def _key(subject: str, content: str) -> str:
+        """Return the key of the cached reply of an e-mail."""
+
+        return hashlib.sha256(f"{subject}\n{content}".encode('utf-8')).hexdigest()
+
+    def remember_reply(self, subject: str, content: str, reply: Tuple[str, str]) -> None:
+        """Remember the reply generated for an e-mail.
+
+        Parameters
+        ----------
+        subject : str
+            The subject of the e-mail.
+        content : str
+            The content of the e-mail.
+        reply : (str, str)
+            The subject and the content of the reply.
+        """
+        if self.cache_size == 0:
+            return
+
+        key = self._key(subject, content)
+        with self._lock:
+            self._cache[key] = reply
+            self._cache.move_to_end(key)
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+
+    def cached_reply(self, subject: str, content: str) -> Tuple[str, str]:
+        """Return the reply remembered for an e-mail, or the template reply if there is none.
+
+        Parameters
+        ----------
+        subject : str
+            The subject of the e-mail.
+        content : str
+            The content of the e-mail.
+
+        Returns
+        -------
+        str
+            The subject of the reply.
+        str
+            The content of the reply.
+        """
+        with self._lock:
+            reply = self._cache.get(self._key(subject, content))
+
+        if reply is not None:
+            return reply
+
+        return f"Re: {subject}", self.template_reply
+
+    def metrics(self) -> Dict[str, Any]:
+        """Return the current load and level."""
+
+        return {"level": self.level, "wait": self.wait, "depth": self.depth}
@@ -0,0 +1,126 @@
+# 
+# This file is part of the C1_llm_email_replier distribution (https://github.com/VALAWAI/C1_llm_email_replier).
+# Copyright (c) 2022-2026 VALAWAI (https://valawai.eu/).
+# 
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+# 
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+# 
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+
+import logging
+from collections import deque
+
+import pika
+
+# The suffix of the queues where the broker keeps the delayed messages of a queue
+DELAYED_QUEUE_SUFFIX = '/delayed'
+
+
+class PendingMessages:
+    """The messages to publish that are kept, in order, while the connection with the RabbitMQ is recovered.
+
+    A message is only removed when it has been published, or when the broker refuses it,
+    so the messages that could not be sent because the channel was lost are published
+    on the next connection.
+
+    The delayed messages are published, with their delay as expiration, to a queue without
+    consumers that dead-letters them to their queue. The broker only expires the messages at
+    the head of that queue, so a message is not delivered before the ones delayed before it.
+    """
+
+    def __init__(self, max_messages: int):
+        """Initialize the messages
+
+        Parameters
+        ----------
+        max_messages : int
+            The maximum number of messages to keep. The messages published when it is reached are dropped.
+        """
+        self.max_messages = max_messages
+        self._messages: deque[tuple[str, str, float]] = deque()
+
+    def __len__(self) -> int:
+        return len(self._messages)
+
+    def add(self, queue: str, body: str, delay: float = 0.0) -> bool:
+        """Keep a message to publish.
+
+        Parameters
+        ----------
+        queue : str
+            The name of the queue to publish the message.
+        body: str
+            The encoded message.
+        delay: float
+            The seconds that the broker keeps the message before delivering it to the queue.
+
+        Returns
+        -------
+        bool
+            True if the message is kept, or False if there are too many messages.
+        """
+        if len(self._messages) >= self.max_messages:
+            logging.error(f"Cannot publish a msg in the queue {queue} because there are too many pending messages")
+            return False
+
+        self._messages.append((queue, body, max(0.0, delay)))
+        return True
+
+    def publish(self, channel) -> None:
+        """Publish the messages on a channel, in the order they were added.
+
+        It must be called from the thread that services the channel. The errors of the
+        channel, that is lost, are raised and the message that was being published is kept.
+
+        Parameters
+        ----------
+        channel : Channel
+            The channel to publish the messages.
+        """
+        properties = pika.BasicProperties(content_type='application/json')
+        while self._messages:
+            queue, body, delay = self._messages[0]
+            try:
+                if delay > 0:
+                    self._publish_delayed(channel, queue, body, delay)
+
+                else:
+                    channel.basic_publish(
+                        exchange='',
+                        routing_key=queue,
+                        body=body,
+                        properties=properties,
+                    )
+                self._messages.popleft()
+                logging.debug(f"Publish message to the queue {queue}")
+
+            except (pika.exceptions.UnroutableError, pika.exceptions.NackError):
+                self._messages.popleft()
+                logging.exception(f"Cannot publish a msg in the queue {queue}")
+
+    @staticmethod
+    def _publish_delayed(channel, queue: str, body: str, delay: float) -> None:
+        """Publish a message to the queue that keeps it until its delay expires."""
+        delayed_queue = queue + DELAYED_QUEUE_SUFFIX
+        channel.queue_declare(
+            queue=delayed_queue,
+            durable=True,
+            exclusive=False,
+            auto_delete=False,
+            arguments={"x-dead-letter-exchange": "", "x-dead-letter-routing-key": queue}
+        )
+        channel.basic_publish(
+            exchange='',
+            routing_key=delayed_queue,
+            body=body,
+            properties=pika.BasicProperties(content_type='application/json', expiration=str(max(1, round(delay * 1000)))),
+        )
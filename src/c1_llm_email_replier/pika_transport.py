@@ -0,0 +1,369 @@
+# 
+# This file is part of the C1_llm_email_replier distribution (https://github.com/VALAWAI/C1_llm_email_replier).
+# Copyright (c) 2022-2026 VALAWAI (https://valawai.eu/).
+# 
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+# 
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+# 
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+
+import logging
+import os
+import threading
+import time
+from threading import Thread
+from typing import Any, Callable, Optional
+
+import pika
+
+from c1_llm_email_replier.pending_messages import PendingMessages
+from c1_llm_email_replier.transport import Transport
+
+
+class PikaTransport(Transport):
+    """The transport to send and receive messages from the RabbitMQ using pika.
+
+    The connection is serviced by a dedicated I/O thread that is always processing the
+    data events, so the heartbeats do not depend on how long the listeners take to
+    process the messages and a broken connection is detected and recovered in a few seconds.
+    The listeners are called from the I/O thread, so they must offload any slow work.
+    """
+
+    def __init__(
+        self,
+        host: str = os.getenv('RABBITMQ_HOST', 'mov-mq'),
+        port: int = int(os.getenv('RABBITMQ_PORT', "5672")),
+        username: str = os.getenv('RABBITMQ_USERNAME', 'mov'),
+        password: str = os.getenv('RABBITMQ_PASSWORD', 'password'),
+        max_retries: int = int(os.getenv('RABBITMQ_MAX_RETRIES', "100")),
+        retry_sleep_seconds: int = int(os.getenv('RABBITMQ_RETRY_SLEEP', "3")),
+        heartbeat: int = int(os.getenv('RABBITMQ_HEARTBEAT', "10")),
+        max_pending_messages: int = int(os.getenv('RABBITMQ_MAX_PENDING_MESSAGES', "10000")),
+    ):
+        """Initialize the connection to the RabbitMQ
+
+        Parameters
+        ----------
+        host : str
+            The RabbitMQ server host name. By default uses the environment variable RABBITMQ_HOST
+            and if it is not defined uses 'mov-mq'.
+        port : int
+            The RabbitMQ server port. By default uses the environment variable RABBITMQ_PORT
+            and if it is not defined uses '5672'.
+        username : str
+            The user name of the credential to connect to the RabbitMQ serve. By default uses the environment
+            variable RABBITMQ_USERNAME and if it is not defined uses 'mov'.
+        password : str
+            The password of the credential to connect to the RabbitMQ serve. By default uses the environment
+            variable RABBITMQ_PASSWORD and if it is not defined uses 'password'.
+        max_retries : int
+            The number maximum of tries to create a connection with the RabbitMQ server. By default uses
+            the environment variable RABBITMQ_MAX_RETRIES and if it is not defined uses '100'.
+        retry_sleep_seconds : int
+            The seconds to wait between the tries for create a connection with the RabbitMQ server.
+            By default uses the environment variable RABBITMQ_RETRY_SLEEP and if it is not defined uses '3'.
+        heartbeat : int
+            The seconds of the heartbeat timeout negotiated with the RabbitMQ server. By default uses
+            the environment variable RABBITMQ_HEARTBEAT and if it is not defined uses '10'.
+        max_pending_messages : int
+            The maximum number of messages to publish that are kept while the connection is recovered.
+            By default uses the environment variable RABBITMQ_MAX_PENDING_MESSAGES and if it is not defined uses '10000'.
+        """
+        self.credentials = pika.PlainCredentials(username=username, password=password)
+        self.host = host
+        self.port = port
+        self.listen_connection: Optional[pika.BlockingConnection] = None
+        self.listen_channels: dict[str, Any] = {}
+        self.publish_channel: Any = None
+        self.connection_params = pika.ConnectionParameters(
+            host=self.host,
+            port=self.port,
+            credentials=self.credentials,
+            heartbeat=heartbeat
+        )
+        self.max_retries = max_retries
+        self.retry_sleep_seconds = retry_sleep_seconds
+        self.max_pending_messages = max_pending_messages
+        self.listeners: list[tuple[str, Callable, dict[str, Any]]] = []
+        self._pending_messages = PendingMessages(max_pending_messages)
+        self._stopping = False
+
+        self._connect()
+        self._io_thread = Thread(target=self._run_io_loop, name="rabbitmq-io", daemon=True)
+        self._io_thread.start()
+
+    def _connect(self) -> None:
+        """Establish the connection to RabbitMQ with retries."""
+        for attempt in range(self.max_retries):
+            try:
+                if self.listen_connection is not None and self.listen_connection.is_open:
+                    return
+
+                self.listen_connection = pika.BlockingConnection(self.connection_params)
+                self.listen_channels = {}
+                self.publish_channel = self.listen_connection.channel()
+                # The messages are removed from the pending ones when the broker confirms them
+                self.publish_channel.confirm_delivery()
+
+                # Re-apply listeners if any, the ones with more priority first
+                for queue, callback, options in sorted(self.listeners, key=lambda listener: -listener[2]['priority']):
+                    self._apply_listener(queue, callback, **options)
+
+                logging.info(f"Connected to RabbitMQ at {self.host}:{self.port}")
+                return
+            except (OSError, pika.exceptions.AMQPError) as error:
+                self._close_connection()
+                if self._stopping:
+                    return
+                logging.warning(f"Cannot connect to RabbitMQ (attempt {attempt + 1}/{self.max_retries}) because {error}. Retrying in {self.retry_sleep_seconds}s...")
+                time.sleep(self.retry_sleep_seconds)
+
+        raise ValueError(f"Cannot connect to RabbitMQ at {self.host}:{self.port} after {self.max_retries} attempts")
+
+    def _run_io_loop(self) -> None:
+        """Service the connection until the service is closed, reconnecting when it is lost."""
+        while not self._stopping:
+            try:
+                self._connect()
+                while not self._stopping:
+                    self._publish_pending_messages()
+                    self.listen_connection.process_data_events(time_limit=1)
+
+            except (OSError, pika.exceptions.AMQPError) as error:
+                if self._stopping:
+                    break
+                # Reconnect immediately, the retries of _connect wait if the server is not ready
+                logging.warning(f"Connection lost to RabbitMQ at {self.host}:{self.port} ({error!r}). Reconnecting...")
+                self._drop_connection()
+            except BaseException as error:
+                if self._stopping:
+                    break
+                logging.exception(f"Consuming messages error from RabbitMQ at {self.host}:{self.port} because {error}. Reconnecting...")
+                self._drop_connection()
+                time.sleep(self.retry_sleep_seconds)
+
+        try:
+            if self.listen_connection is not None and self.listen_connection.is_open:
+                self._publish_pending_messages()
+        except (OSError, pika.exceptions.AMQPError):
+            logging.exception("Cannot publish the pending messages before closing the connection")
+
+        self._close_connection()
+
+    def _close_connection(self) -> None:
+        """Close the current connection if it is open."""
+        try:
+            if self.listen_connection is not None and self.listen_connection.is_open:
+                self.listen_connection.close()
+        except (OSError, pika.exceptions.AMQPError):
+            logging.exception("Cannot close the connection to RabbitMQ")
+        except BaseException:
+            logging.exception("Unexpected error closing RabbitMQ connection")
+
+    def _drop_connection(self) -> None:
+        """Close the current connection, that is being replaced, and forget it."""
+        connection, self.listen_connection = self.listen_connection, None
+        try:
+            # A channel error can leave the connection open, and its socket would not be released
+            if connection is not None and connection.is_open:
+                connection.close()
+        except Exception:
+            logging.debug("Ignored the error closing the lost connection to RabbitMQ", exc_info=True)
+
+    def _call_on_io_thread(self, function: Callable, timeout: Optional[float] = None) -> None:
+        """Execute a function on the I/O thread and wait until it is done."""
+        if threading.current_thread() is self._io_thread or not self._io_thread.is_alive():
+            function()
+            return
+
+        if self.listen_connection is None or not self.listen_connection.is_open:
+            # The I/O thread applies the listeners when the connection is recovered
+            return
+
+        done = threading.Event()
+        errors: list[BaseException] = []
+
+        def call():
+            try:
+                function()
+            except BaseException as error:
+                errors.append(error)
+            finally:
+                done.set()
+
+        self.listen_connection.add_callback_threadsafe(call)
+        if not done.wait(timeout):
+            raise TimeoutError("The RabbitMQ I/O thread has not executed the requested action")
+        if errors:
+            raise errors[0]
+
+    def close(self) -> None:
+        """Close the connection."""
+        self._stopping = True
+        try:
+            if self.listen_connection is not None and self.listen_connection.is_open:
+                # Wake up the I/O thread, so it closes the connection
+                self.listen_connection.add_callback_threadsafe(lambda: None)
+        except (OSError, pika.exceptions.AMQPError):
+            logging.debug("The connection to RabbitMQ is already closed")
+
+        if threading.current_thread() is not self._io_thread:
+            self._io_thread.join(timeout=self.retry_sleep_seconds + self.connection_params.heartbeat)
+
+    def listen_for(self, queue: str, callback: Callable, prefetch_count: int = 0, priority: int = 0, auto_ack: bool = True) -> None:
+        """Register a listener on a queue.
+
+        Each queue is consumed by its own channel, so a backlog on a queue does not
+        delay the messages received on the other queues.
+
+        Parameters
+        ----------
+        queue : str
+            The name of the queue to listen.
+        callback: method
+            The method to call when a message is received.
+        prefetch_count: int
+            The maximum number of messages not acknowledged that the queue can deliver,
+            or 0 if it is not limited. It only has effect if the messages are not auto acknowledged.
+        priority: int
+            The priority of the consumer. The channels with more priority are opened first
+            and the broker delivers to them before the ones with less priority.
+        auto_ack: bool
+            True if the messages are acknowledged when they are received, otherwise the
+            callback must call the method 'ack' when the message has been processed.
+        """
+        options = {"prefetch_count": prefetch_count, "priority": priority, "auto_ack": auto_ack}
+        self.listeners.append((queue, callback, options))
+        self._call_on_io_thread(lambda: self._apply_listener(queue, callback, **options), timeout=self.retry_sleep_seconds + self.connection_params.heartbeat)
+
+    def _apply_listener(self, queue: str, callback: Callable, prefetch_count: int = 0, priority: int = 0, auto_ack: bool = True) -> None:
+        """Actually register the listener on its own channel."""
+        channel = self.listen_connection.channel()
+        channel.queue_declare(queue=queue, durable=True, exclusive=False, auto_delete=False)
+        if prefetch_count > 0:
+            channel.basic_qos(prefetch_count=prefetch_count)
+        arguments = {"x-priority": priority} if priority != 0 else None
+        channel.basic_consume(queue=queue, auto_ack=auto_ack, on_message_callback=callback, arguments=arguments)
+        self.listen_channels[queue] = channel
+        logging.debug(f"Listen for the queue {queue}")
+
+    def ack(self, channel: Any, delivery_tag: int) -> None:
+        """Acknowledge a message received by a listener that is not auto acknowledged.
+
+        This method can be called from any thread.
+
+        Parameters
+        ----------
+        channel : BlockingChannel
+            The channel that has received the message.
+        delivery_tag: int
+            The delivery tag of the message to acknowledge.
+        """
+        try:
+            if channel is not None and channel.is_open and self.listen_connection is not None:
+                self.listen_connection.add_callback_threadsafe(lambda: channel.basic_ack(delivery_tag=delivery_tag))
+
+        except (OSError, pika.exceptions.AMQPError):
+            # The message will be delivered again when the connection is recovered
+            logging.exception(f"Cannot acknowledge the message {delivery_tag}")
+
+    def nack(self, channel: Any, delivery_tag: int, requeue: bool = True) -> None:
+        """Reject a message received by a listener that is not auto acknowledged.
+
+        This method can be called from any thread.
+
+        Parameters
+        ----------
+        channel : BlockingChannel
+            The channel that has received the message.
+        delivery_tag: int
+            The delivery tag of the message to reject.
+        requeue: bool
+            True if the message is returned to its queue to be delivered again.
+        """
+        try:
+            if channel is not None and channel.is_open and self.listen_connection is not None:
+                self.listen_connection.add_callback_threadsafe(lambda: channel.basic_nack(delivery_tag=delivery_tag, requeue=requeue))
+
+        except (OSError, pika.exceptions.AMQPError):
+            # The message will be delivered again when the connection is recovered
+            logging.exception(f"Cannot reject the message {delivery_tag}")
+
+    def publish(self, queue: str, body: str, delay: float = 0.0) -> None:
+        """Publish a message to a queue.
+
+        This method can be called from any thread. The message is published by the I/O thread,
+        and if the connection is lost it is published when the connection is recovered.
+
+        Parameters
+        ----------
+        queue : str
+            The name of the queue to publish the event.
+        body: str
+            The encoded message to send.
+        delay: float
+            The seconds that the broker keeps the message before delivering it to the queue.
+        """
+        if not self._pending_messages.add(queue, body, delay):
+            return
+
+        try:
+            if self.listen_connection is not None and self.listen_connection.is_open:
+                self.listen_connection.add_callback_threadsafe(self._publish_pending_messages)
+
+        except (OSError, pika.exceptions.AMQPError):
+            # The I/O thread publishes the message when the connection is recovered
+            logging.debug(f"Delayed the publication of a msg in the queue {queue}")
+
+    def message_count(self, queue: str) -> int:
+        """Return the number of messages that wait on a queue to be delivered.
+
+        This method can be called from any thread, except the one that calls the listeners.
+
+        Parameters
+        ----------
+        queue : str
+            The name of the queue.
+
+        Returns
+        -------
+        int
+            The messages of the queue that have not been delivered, or 0 if they can not be counted.
+        """
+        counts: list[int] = []
+
+        def declare():
+            # A passive declaration does not modify the queue, it only obtains its counters
+            declared = self.publish_channel.queue_declare(queue=queue, passive=True)
+            counts.append(declared.method.message_count)
+
+        try:
+            self._call_on_io_thread(declare, timeout=self.connection_params.heartbeat)
+
+        except (OSError, TimeoutError, pika.exceptions.AMQPError):
+            logging.debug(f"Cannot count the messages of the queue {queue}", exc_info=True)
+
+        return counts[0] if counts else 0
+
+    def _publish_pending_messages(self) -> None:
+        """Publish the messages that are waiting. It must be called from the I/O thread."""
+        self._pending_messages.publish(self.publish_channel)
+
+    def start_consuming(self) -> None:
+        """Wait until the service is closed while the I/O thread consumes the messages."""
+        try:
+            while self._io_thread.is_alive():
+                self._io_thread.join(timeout=1)
+
+        except KeyboardInterrupt:
+            logging.info(f"Stop listening for events on {self.host}:{self.port}")
+            self.close()
@@ -0,0 +1,62 @@
+# 
+# This file is part of the C1_llm_email_replier distribution (https://github.com/VALAWAI/C1_llm_email_replier).
+# Copyright (c) 2022-2026 VALAWAI (https://valawai.eu/).
+# 
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+# 
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+# 
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+
+
+import os
+import resource
+import sys
+
+import torch
+
+try:
+    import psutil
+except ImportError:  # pragma: no cover - psutil is optional
+    psutil = None
+
+
+def process_rss() -> int:
+    """Return the resident memory, in bytes, of the process.
+
+    It uses psutil when it is installed, and otherwise it reads /proc or, as last
+    resort, the maximum resident memory reported by the operating system.
+    """
+
+    if psutil is not None:
+        return psutil.Process().memory_info().rss
+
+    try:
+        with open("/proc/self/statm") as statm:
+            return int(statm.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+
+    except (OSError, ValueError, IndexError):
+        max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # Linux reports kilobytes and macOS bytes
+        return max_rss if sys.platform == "darwin" else max_rss * 1024
+
+
+def device_memory_allocated() -> int:
+    """Return the memory, in bytes, that the tensors of the process use on the GPUs.
+
+    It is 0 when CUDA is not available, because then the tensors are on the host and
+    their memory is already part of the resident memory.
+    """
+
+    if not torch.cuda.is_available():
+        return 0
+
+    return sum(torch.cuda.memory_allocated(device) for device in range(torch.cuda.device_count()))
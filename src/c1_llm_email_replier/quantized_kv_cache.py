@@ -0,0 +1,136 @@
+# 
+# This file is part of the C1_llm_email_replier distribution (https://github.com/VALAWAI/C1_llm_email_replier).
+# Copyright (c) 2022-2026 VALAWAI (https://valawai.eu/).
+# 
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+# 
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+# 
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+
+import os
+from typing import Any, Tuple
+
+import torch
+
+try:
+    from transformers.cache_utils import Cache, QuantizedLayer
+except ImportError:  # pragma: no cover - transformers older than 4.56
+    Cache = object
+    QuantizedLayer = None
+
+
+if QuantizedLayer is not None:
+
+    class _TorchQuantizedLayer(QuantizedLayer):
+        """A layer of the cache that quantizes the keys and the values with torch, so it does not need quanto or hqq.
+
+        The values are quantized by groups of the last dimension, with the minimum and the scale of each group,
+        and the values of less than 8 bits are packed in bytes.
+        """
+
+        def _quantize(self, tensor: torch.Tensor, axis: int) -> Tuple[Any, ...]:
+            shape = tensor.shape
+            group_size = self.q_group_size if shape[-1] % self.q_group_size == 0 else shape[-1]
+            groups = tensor.reshape(*shape[:-1], shape[-1] // group_size, group_size)
+            minimum = groups.amin(dim=-1, keepdim=True)
+            levels = (1 << self.nbits) - 1
+            scale = ((groups.amax(dim=-1, keepdim=True) - minimum) / levels).clamp(min=1e-8)
+            quantized = ((groups - minimum) / scale).round_().clamp_(0, levels).to(torch.uint8)
+
+            per_byte = 8 // self.nbits
+            if per_byte > 1 and group_size % per_byte == 0:
+                quantized = quantized.reshape(*quantized.shape[:-1], group_size // per_byte, per_byte)
+                packed = quantized[..., 0].clone()
+                for index in range(1, per_byte):
+                    packed |= quantized[..., index] << (self.nbits * index)
+                quantized = packed
+
+            else:
+                per_byte = 1
+
+            return quantized, minimum, scale, per_byte, shape
+
+        def _dequantize(self, q_tensor: Tuple[Any, ...]) -> torch.Tensor:
+            quantized, minimum, scale, per_byte, shape = q_tensor
+            if per_byte > 1:
+                mask = (1 << self.nbits) - 1
+                quantized = torch.stack([(quantized >> (self.nbits * index)) & mask for index in range(per_byte)], dim=-1)
+                quantized = quantized.reshape(*quantized.shape[:-2], -1)
+
+            return (quantized.to(scale.dtype) * scale + minimum).reshape(shape)
+
+
+class QuantizedKVCache(Cache):
+    """A KV cache that keeps the keys and the values of the tokens quantized.
+
+    The last residual_length tokens are kept in full precision, and when they are more they are
+    quantized with the previous ones, as in KIVI. Unlike the QuantizedCache of transformers it does
+    not need quanto or hqq, so it can be used on the nodes without GPU.
+    """
+
+    available = QuantizedLayer is not None
+
+    def __init__(
+        self,
+        config: Any,
+        nbits: int = int(os.getenv('KV_CACHE_BITS', "8")),
+        q_group_size: int = int(os.getenv('KV_CACHE_GROUP_SIZE', "64")),
+        residual_length: int = int(os.getenv('KV_CACHE_RESIDUAL_LENGTH', "128"))
+    ):
+        """Initialize the cache
+
+        Parameters
+        ----------
+        config : PretrainedConfig
+            The configuration of the model, that must only have full attention layers.
+        nbits : int
+            The bits of each quantized value, that can be 2, 4 or 8.
+        q_group_size : int
+            The values that share the minimum and the scale of the quantization.
+        residual_length : int
+            The tokens that are kept in full precision before quantizing them.
+        """
+        if not self.available:
+            raise ImportError("The quantized KV cache needs transformers 4.56 or later")
+
+        if nbits not in (2, 4, 8):
+            raise ValueError(f"The bits of the quantized KV cache must be 2, 4 or 8, not {nbits}")
+
+        config = config.get_text_config(decoder=True) if hasattr(config, 'get_text_config') else config
+        layer_types = set(getattr(config, 'layer_types', None) or []) - {'full_attention'}
+        if layer_types:
+            raise ValueError(f"The quantized KV cache only supports full attention layers, not {', '.join(sorted(layer_types))}")
+
+        layers = [
+            _TorchQuantizedLayer(nbits=nbits, q_group_size=q_group_size, residual_length=residual_length)
+            for _ in range(config.num_hidden_layers)
+        ]
+        super().__init__(layers=layers)
+
+    @staticmethod
+    def compression(
+        element_size: int,
+        nbits: int = int(os.getenv('KV_CACHE_BITS', "8")),
+        q_group_size: int = int(os.getenv('KV_CACHE_GROUP_SIZE', "64"))
+    ) -> float:
+        """Return the fraction of the memory of the full precision cache that the quantized one needs.
+
+        Parameters
+        ----------
+        element_size : int
+            The bytes of each value of the full precision cache.
+        nbits : int
+            The bits of each quantized value.
+        q_group_size : int
+            The values that share the minimum and the scale of the quantization.
+        """
+        return (nbits / 8 + 2 * element_size / q_group_size) / element_size
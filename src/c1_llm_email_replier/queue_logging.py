@@ -0,0 +1,133 @@
+# 
+# This file is part of the C1_llm_email_replier distribution (https://github.com/VALAWAI/C1_llm_email_replier).
+# Copyright (c) 2022-2026 VALAWAI (https://valawai.eu/).
+# 
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+# 
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+# 
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+
+
+import logging
+import logging.handlers
+import os
+import queue
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+
+
+class LazyQueueHandler(logging.handlers.QueueHandler):
+    """A queue handler that leaves the formatting of the records to the writer thread.
+
+    The standard QueueHandler formats the message on the thread that logs, so the
+    threads that process the messages pay the cost. This handler only enqueues the
+    record, so the arguments of the record must not be modified after logging them.
+    """
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        """The record is enqueued as it is, because it is consumed by the same process."""
+        return record
+
+
+class RepeatedMessageFilter(logging.Filter):
+    """Limit how many times the same message is logged in an interval.
+
+    The messages are identified by their logger, level and unformatted message, and only
+    the records with a level equal or greater than the minimum level are limited. When
+    the interval finishes, the next record of the message reports how many have been suppressed.
+    """
+
+    def __init__(
+        self,
+        max_repetitions: int = int(os.getenv('LOG_REPEATED_MAX', "5")),
+        interval: float = float(os.getenv('LOG_REPEATED_INTERVAL', "60")),
+        min_level: int = logging.WARNING
+    ):
+        """Initialize the filter
+
+        Parameters
+        ----------
+        max_repetitions : int
+            The maximum number of times a message is logged in an interval.
+        interval : float
+            The seconds of the interval.
+        min_level : int
+            The minimum level of the records that are limited.
+        """
+        super().__init__()
+        self.max_repetitions = max(1, max_repetitions)
+        self.interval = interval
+        self.min_level = min_level
+        self.suppressed = 0
+        self._lock = threading.Lock()
+        self._messages: Dict[Tuple[str, int, str], List] = {}
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        """Check if a record has to be logged."""
+
+        if record.levelno < self.min_level:
+            return True
+
+        key = (record.name, record.levelno, str(record.msg))
+        now = time.monotonic()
+        with self._lock:
+            state = self._messages.get(key)
+            if state is None or now - state[0] >= self.interval:
+                if len(self._messages) > 10000:
+                    self._messages.clear()
+
+                suppressed = state[2] if state is not None else 0
+                self._messages[key] = [now, 1, 0]
+                if suppressed > 0:
+                    record.msg = f"{record.msg} (suppressed {suppressed} similar messages)"
+                return True
+
+            if state[1] < self.max_repetitions:
+                state[1] += 1
+                return True
+
+            state[2] += 1
+            self.suppressed += 1
+            return False
+
+
+def start_queue_logging(rate_limit: Optional[RepeatedMessageFilter] = None) -> logging.handlers.QueueListener:
+    """Move the handlers of the root logger to a single background thread.
+
+    The root logger only enqueues the records, and the thread of the returned listener
+    formats and writes them into the handlers that the root logger had.
+
+    Parameters
+    ----------
+    rate_limit : RepeatedMessageFilter, optional
+        The filter to limit the repeated messages.
+
+    Returns
+    -------
+    logging.handlers.QueueListener
+        The listener that writes the records. It must be stopped to write the pending records.
+    """
+    root = logging.getLogger()
+    handlers = list(root.handlers)
+    for handler in handlers:
+        root.removeHandler(handler)
+
+    records: queue.SimpleQueue = queue.SimpleQueue()
+    queue_handler = LazyQueueHandler(records)
+    if rate_limit is not None:
+        queue_handler.addFilter(rate_limit)
+    root.addHandler(queue_handler)
+
+    listener = logging.handlers.QueueListener(records, *handlers, respect_handler_level=True)
+    listener.start()
+    return listener
@@ -16,29 +16,61 @@
 # along with this program.	If not, see <http://www.gnu.org/licenses/>.
 #
 
+import hashlib
+import logging
 import os
-import json
-from typing import List
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, List, Optional, Tuple
 import html2text
 from concurrent.futures import ThreadPoolExecutor
 
+from c1_llm_email_replier import json_codec
+from c1_llm_email_replier.adapter_manager import AdapterManager
+from c1_llm_email_replier.component_config import ConfigStore
+from c1_llm_email_replier.concurrency_controller import ConcurrencyController
+from c1_llm_email_replier.conversation_cache import ConversationCache
 from c1_llm_email_replier.message_service import MessageService
 from c1_llm_email_replier.mov import MOV
+from c1_llm_email_replier.duplicate_detector import DuplicateDetector
+from c1_llm_email_replier.e_mail_classifier import AUTOMATED, EMailClassifier
 from c1_llm_email_replier.email_replier_generator import EMailReplierGenerator
+from c1_llm_email_replier.generation_batcher import GenerationBatcher
+from c1_llm_email_replier.generation_parameters_payload import GenerationParametersPayload
+from c1_llm_email_replier.language_router import LanguageRouter
+from c1_llm_email_replier.memory_watchdog import MemoryWatchdog
+from c1_llm_email_replier.model_router import ModelRouter
+from c1_llm_email_replier.overload_policy import CACHED_REPLIES, DEFER_LOW_PRIORITY, FALLBACK_MODEL, SHORTER_REPLIES, OverloadPolicy
 from c1_llm_email_replier.received_e_mail_payload import ReceivedEMailPayload
+from c1_llm_email_replier.reply_scheduler import FIFO, ReplyScheduler, estimate_tokens
+from c1_llm_email_replier.sender_fairness import DEFER, SenderFairness
+from c1_llm_email_replier.thread_coalescer import ThreadCoalescer, thread_key
 from c1_llm_email_replier.received_e_mail_address_payload import ReceivedEMailAddressType
 from c1_llm_email_replier.reply_e_mail_payload import ReplyEMailPayload
 from c1_llm_email_replier.reply_e_mail_address_payload import ReplyEMailAddressType, ReplyEMailAddressPayload
 
 
+class _OverQuota(Exception):
+    """Raised when an e-mail must be delivered again when the quota of its sender is restored."""
+
+    def __init__(self, delay: float):
+        super().__init__(f"The sender is over its quota for {delay:.0f} seconds")
+        self.delay = delay
+
+
 class ReceivedEMailHandler:
     """The component that handle the messages with the e-mails to reply.
     """
 
     RECEIVED_EMAIL_TOPIC = 'valawai/c1/llm_email_replier/data/received_e_mail'
     REPLY_EMAIL_TOPIC = 'valawai/c1/llm_email_replier/data/reply_e_mail'
+    # The seconds between the counts of the messages that wait on the queue of the broker
+    QUEUE_DEPTH_INTERVAL = 1.0
+    # The maximum number of messages delayed on the broker that are remembered
+    MAX_DELAYED_MESSAGES = 10000
 
-    def __init__(self, message_service: MessageService, mov: MOV):
+    def __init__(self, message_service: MessageService, mov: MOV, config_store: Optional[ConfigStore] = None):
         """Initialize the handler
 
         Parameters
@@ -47,95 +79,592 @@ class ReceivedEMailHandler:
                 The service to receive or send messages thought RabbitMQ
         mov : MOV
                 The service to interact with the MOV
+        config_store : ConfigStore, optional
+                The store with the parameters of the component. By default the store shared by the process.
         """
         self.message_service = message_service
         self.mov = mov
-        self.generator = EMailReplierGenerator()
+        self.config_store = config_store
+        # Only start the generations that fit in memory, so a burst does not kill the process
+        self.memory_watchdog = MemoryWatchdog(mov=mov)
+        # Reuse the KV cache of the previous turns of the conversations
+        self.conversations = ConversationCache()
+        # Activate the LoRA adapter of each e-mail instead of loading another model
+        self.adapters = AdapterManager(mov=mov)
+        self.generator = EMailReplierGenerator(
+            config_store=config_store, memory_watchdog=self.memory_watchdog, conversation_cache=self.conversations, adapters=self.adapters
+        )
+        # Reply the simple e-mails with smaller models
+        self.router = ModelRouter(self.generator, mov=mov)
+        # Reply the e-mails of the languages with a profile with their own model and prompts
+        self.languages = LanguageRouter(self.generator, conversations=self.conversations, mov=mov)
         
         # Use a thread pool to process messages off-thread
         # this prevents the LLM generation from blocking the RabbitMQ heartbeat
         max_workers = int(os.getenv('REPLY_MAX_WORKERS', '1'))
         if max_workers < 1:
             max_workers = 1
+
+        # The workers wait for the workers of the tier of their e-mail
+        if self.router.enabled:
+            max_workers = max(max_workers, self.router.workers)
+
+        # When the replies are generated in batches the workers only wait for their batch,
+        # so there must be enough of them to fill a batch
+        self.batcher: Optional[GenerationBatcher] = None
+        batch_size = int(os.getenv('REPLY_BATCH_SIZE', '1'))
+        if batch_size > 1:
+            self.batcher = GenerationBatcher(self.generator, max_batch_size=batch_size)
+            max_workers = max(max_workers, batch_size)
+
+        # The workers and the batch size are the bounds of the adaptive concurrency
+        self.concurrency: Optional[ConcurrencyController] = None
+        if os.getenv('ADAPTIVE_CONCURRENCY', 'false').lower() == 'true':
+            self.concurrency = ConcurrencyController(self.batcher, max_workers=max_workers, max_batch_size=batch_size, mov=mov)
+
         self.executor = ThreadPoolExecutor(max_workers=max_workers)
-        
-        self.message_service.listen_for(self.RECEIVED_EMAIL_TOPIC, self.handle_message)
+        # Decide which of the e-mails that wait is replied first, sharing the generation between the senders
+        self.scheduler = ReplyScheduler(self.executor)
+        self.fairness = SenderFairness()
+
+        # Only reply once to the e-mails that are delivered several times
+        self.duplicates = DuplicateDetector()
+
+        # Reply once to the follow-ups that a sender writes in a short time on the same conversation
+        self.coalescer = ThreadCoalescer()
+
+        # Do not generate the replies of the e-mails sent by machines
+        self.classifier = EMailClassifier()
+        self.classifier_template_reply = os.getenv('CLASSIFIER_TEMPLATE_REPLY', "")
+        self.generation_seconds = 0.0
+
+        # Degrade the replies when the e-mails wait too much to be replied
+        self.overload = OverloadPolicy(mov=mov)
+        self.fallback_model_id = os.getenv('OVERLOAD_FALLBACK_MODEL', "")
+        self.fallback_generator: Optional[EMailReplierGenerator] = None
+        self._fallback_loading = False
+        self._pending = 0
+        self._pending_lock = threading.Lock()
+        self._queued = 0
+        self._queued_at = float('-inf')
+        # The seconds that the component has delayed on the broker each message, by its digest
+        self._delays: OrderedDict = OrderedDict()
+
+        # The e-mails are acknowledged when they have been processed, so the broker
+        # only delivers a few of them and the backlog stays on the queue
+        prefetch_count = int(os.getenv('REPLY_PREFETCH_COUNT', str(2 * max_workers)))
+        if self.scheduler.policy != FIFO:
+            # The scheduler can only order the e-mails that have been delivered, so it receives a window of the backlog
+            prefetch_count = max(prefetch_count, int(os.getenv('REPLY_SCHEDULER_WINDOW', "64")))
+        self.message_service.listen_for(self.RECEIVED_EMAIL_TOPIC, self.handle_message, prefetch_count=max(1, prefetch_count), auto_ack=False)
 
     def handle_message(self, ch, method, properties, body: bytes) -> None:
         """Receive RabbitMQ messages and offload them to the executor thread."""
-        self.executor.submit(self._handle_message_task, body)
+        if self._is_duplicate(body):
+            self._settle_deliveries([(ch, method, body)])
+            return
+
+        key = self._thread_key(body) if self.coalescer.enabled else None
+        if key is not None:
+            # The message is acknowledged when the reply of its conversation has been generated
+            self.coalescer.add(key, (ch, method, body), self._submit_deliveries)
+            return
+
+        self._submit_deliveries([(ch, method, body)])
+
+    def _submit_deliveries(self, deliveries: List[Tuple[Any, Any, bytes]]) -> None:
+        """Pass to the executor the messages to reply together, acknowledging them when they have been processed."""
+        bodies = [body for _, _, body in deliveries]
+        self._change_pending(1)
+        received_at, cost, sender = self._scheduling_info(bodies)
+        future = self.scheduler.submit(
+            self._handle_deliveries_task, bodies, time.monotonic(),
+            received_at=received_at, cost=cost, sender=sender, weight=self.fairness.weight(sender)
+        )
+
+        future.add_done_callback(lambda _future: self._change_pending(-1))
+        future.add_done_callback(lambda done: self._settle_deliveries(
+            deliveries, done.result() if not done.cancelled() and done.exception() is None else None
+        ))
+
+    def _settle_deliveries(self, deliveries: List[Tuple[Any, Any, bytes]], delay: Optional[float] = None) -> None:
+        """Acknowledge the messages that have been processed, publishing them again if they must be delivered later.
 
-    def _handle_message_task(self, body: bytes) -> None:
-        """Manage the received messages on the channel valawai/c1/llm_email_replier/data/received_e_mail
+        Parameters
+        ----------
+        deliveries : list of (channel, method, bytes)
+            The messages of the e-mail.
+        delay : float, optional
+            The seconds that the broker keeps the messages before delivering them again, or None
+            if they have been processed.
         """
+        for _, _, body in deliveries:
+            self._remember_delay(body, delay)
+
+        if delay is not None:
+            # The broker keeps them out of the queue, so they do not count for the prefetch
+            # limit and the e-mails of the other senders are still delivered meanwhile
+            for _, _, body in deliveries:
+                self.message_service.publish_to(self.RECEIVED_EMAIL_TOPIC, json_codec.RawJSON(body.decode('utf-8')), delay=delay)
+
+        for ch, method, _ in deliveries:
+            if method is not None:
+                self.message_service.ack(ch, method.delivery_tag)
+
+    def _remember_delay(self, body: bytes, delay: Optional[float]) -> None:
+        """Add the seconds that a message is delayed, so they are not counted as the wait of its e-mail, or forget them if it has been processed."""
+
+        if delay is None and not self._delays:
+            return
+
+        digest = hashlib.sha256(body).digest()
+        with self._pending_lock:
+            if delay is None:
+                self._delays.pop(digest, None)
+                return
+
+            self._delays[digest] = self._delays.get(digest, 0.0) + delay
+            while len(self._delays) > self.MAX_DELAYED_MESSAGES:
+                self._delays.popitem(last=False)
+
+    def _delay_of(self, bodies: List[bytes]) -> float:
+        """Return the greatest seconds that the component has delayed some messages."""
+
+        if not self._delays:
+            return 0.0
+
+        with self._pending_lock:
+            return max((self._delays.get(hashlib.sha256(body).digest(), 0.0) for body in bodies), default=0.0)
+
+    def stop(self) -> None:
+        """Process the conversations that are being coalesced."""
+
+        self.coalescer.flush_all()
+
+    def _thread_key(self, body: bytes) -> Optional[Tuple[str, str]]:
+        """Obtain the conversation of a message, or None if it can not be coalesced."""
 
         try:
-            # Handle potential double-encoding from RabbitMQ/Pika
+            e_mail = json_codec.loads(body)
+            return thread_key(e_mail.get('addresses') or [], e_mail.get('subject'))
+
+        except (AttributeError, TypeError, ValueError):
+            # The task reports the messages that are not valid
+            return None
+
+    def _scheduling_info(self, bodies: List[bytes]) -> Tuple[Optional[float], int, Optional[str]]:
+        """Obtain when the e-mails to reply together were received, how many tokens their prompt has and their sender, if the scheduler needs them."""
+
+        if self.scheduler.policy == FIFO:
+            return None, 0, None
+
+        received_at, cost, sender = None, 0, None
+        for body in bodies:
             try:
-                # model_validate_json handles bytes or single-encoded JSON strings
-                e_mail = ReceivedEMailPayload.model_validate_json(body)
-            except Exception:
-                # Fallback: if body is double-encoded, it might be a JSON string inside a JSON string
-                data = json.loads(body)
-                if isinstance(data, str):
-                    data = json.loads(data)
-                e_mail = ReceivedEMailPayload.model_validate(data)
-
-            self.mov.info("Received an e-mail", e_mail)
-
-            # Map received addresses to reply addresses
-            reply_addresses: List[dict] = []
-            for addr in e_mail.addresses:
-                # We skip TO addresses from the original email as they are likely the component's own address
-                if addr.address_type == ReceivedEMailAddressType.TO:
-                    continue
-
-                # Map Original Address Type -> Reply Address Type
-                # FROM in original email becomes TO in the reply
-                # CC and BCC stay the same
-                reply_type = ReplyEMailAddressType.TO
-                if addr.address_type == ReceivedEMailAddressType.CC:
-                    reply_type = ReplyEMailAddressType.CC
-                elif addr.address_type == ReceivedEMailAddressType.BCC:
-                    reply_type = ReplyEMailAddressType.BCC
-
-                reply_to = ReplyEMailAddressPayload(
-                    type=reply_type,
-                    address=addr.address,
-                    name=addr.name
-                ).model_dump()
-                reply_addresses.append(reply_to)
-
-            if not reply_addresses:
-                self.mov.error("No valid addresses found to reply to", e_mail)
-                return
+                e_mail = json_codec.loads(body)
+                sender = sender or self.fairness.sender_of(e_mail.get('addresses') or [])
+                if e_mail.get('received_at') is not None:
+                    received_at = e_mail['received_at'] if received_at is None else min(received_at, e_mail['received_at'])
+                cost += estimate_tokens(e_mail.get('subject'), e_mail.get('content'))
+
+            except (AttributeError, TypeError, ValueError):
+                # The task reports the messages that are not valid
+                continue
+
+        return received_at, cost, sender
+
+    def _change_pending(self, delta: int) -> None:
+        """Change the number of e-mails that are pending to be replied."""
+
+        with self._pending_lock:
+            self._pending += delta
+
+    def _handle_deliveries_task(self, bodies: List[bytes], enqueued_at: Optional[float] = None) -> Optional[float]:
+        """Reply once to the messages received on the same conversation during the coalescing window.
+
+        Returns the seconds to wait before delivering the messages again, or None if they have been processed.
+        """
 
-            # Prepare content for generation
-            subject = e_mail.subject or "No subject"
-            content = e_mail.content or "No content"
-
-            # Convert HTML to Markdown if necessary
-            if e_mail.mime_type == "text/html":
-                converter = html2text.HTML2Text()
-                converter.ignore_links = True
-                content = converter.handle(content)
-
-            # Generate the reply
-            self.generator.refresh_parameters()
-            reply_subject, reply_content = self.generator.generate_reply(subject, content)
-
-            # Construct and send the reply payload
-            reply_msg = ReplyEMailPayload(
-                addresses=reply_addresses,
-                subject=reply_subject,
-                is_html=False,
-                content=reply_content
+        e_mails: List[ReceivedEMailPayload] = []
+        body = bodies[-1]
+        delayed = self._delay_of(bodies)
+        try:
+            e_mails, e_mail, body = self._coalesce(bodies)
+            reply_addresses = self._accept_e_mail(e_mail) if e_mail is not None else None
+            if reply_addresses is not None:
+                reply = self._reply_under_load(e_mail, body, enqueued_at, delayed)
+                if reply is not None:
+                    self._send_reply(reply_addresses, *reply)
+
+        except _OverQuota as over_quota:
+            return self._defer_e_mails(e_mails, over_quota)
+
+        except Exception as error:
+            self._report_failure(error, body)
+
+        return None
+
+    def _coalesce(self, bodies: List[bytes]) -> Tuple[List[ReceivedEMailPayload], Optional[ReceivedEMailPayload], bytes]:
+        """Decode the messages of a conversation and merge their e-mails into the one to reply.
+
+        Parameters
+        ----------
+        bodies : list of bytes
+            The messages in the order they were received.
+
+        Returns
+        -------
+        (list of ReceivedEMailPayload, ReceivedEMailPayload, bytes)
+            The valid e-mails, the e-mail to reply, or None if no one is valid, and the message of
+            the e-mail to reply, that is the one published again if it is deferred.
+        """
+        e_mails: List[ReceivedEMailPayload] = []
+        for body in bodies:
+            try:
+                e_mails.append(self._decode_e_mail(body))
+
+            except Exception as error:
+                self._report_failure(error, body)
+
+        body = bodies[-1]
+        if not e_mails:
+            return e_mails, None, body
+
+        e_mail = self._merge_e_mails(e_mails)
+        if len(e_mails) > 1:
+            self.mov.info(f"Coalesced {len(e_mails)} e-mails of the same conversation", {"coalesced": self.coalescer.coalesced, "subject": e_mail.subject})
+            body = json_codec.encode_model(e_mail).encode('utf-8')
+
+        return e_mails, e_mail, body
+
+    def _accept_e_mail(self, e_mail: ReceivedEMailPayload) -> Optional[List[dict]]:
+        """Return the addresses to reply a received e-mail, or None if it can not be replied."""
+
+        self.mov.info("Received an e-mail", e_mail)
+
+        reply_addresses = self._reply_addresses_for(e_mail)
+        if not reply_addresses:
+            self.mov.error("No valid addresses found to reply to", e_mail)
+            return None
+
+        return reply_addresses
+
+    def _defer_e_mails(self, e_mails: List[ReceivedEMailPayload], over_quota: _OverQuota) -> float:
+        """Accept the next delivery of the e-mails that are deferred, returning the seconds to delay them."""
+
+        # Each message of the conversation is delivered again, and it is not a duplicate
+        for e_mail in e_mails:
+            self.duplicates.expect(e_mail)
+
+        return over_quota.delay
+
+    def _merge_e_mails(self, e_mails: List[ReceivedEMailPayload]) -> ReceivedEMailPayload:
+        """Merge the e-mails of a conversation into one, to generate a single reply.
+
+        The merged e-mail has the subject of the first e-mail, the contents of all of them in
+        the order they were received, all their addresses, the earliest reception time, the
+        highest priority and the generation parameters of the last one.
+        """
+        if len(e_mails) == 1:
+            return e_mails[0]
+
+        addresses = []
+        known = set()
+        for e_mail in e_mails:
+            for address in e_mail.addresses:
+                identity = (address.address_type, (address.address or "").strip().lower())
+                if identity not in known:
+                    known.add(identity)
+                    addresses.append(address)
+
+        contents = [self._prepare_content(e_mail)[1].strip() for e_mail in e_mails if e_mail.content]
+        received_at = [e_mail.received_at for e_mail in e_mails if e_mail.received_at is not None]
+        priorities = [e_mail.priority for e_mail in e_mails if e_mail.priority is not None]
+        return e_mails[-1].model_copy(update={
+            'addresses': addresses,
+            'subject': next((e_mail.subject for e_mail in e_mails if e_mail.subject), None),
+            'mime_type': "text/plain",
+            'content': "\n\n".join(contents) or None,
+            'received_at': min(received_at) if received_at else None,
+            'priority': max(priorities) if priorities else None
+        })
+
+    def _is_duplicate(self, body: bytes) -> bool:
+        """Check if the e-mail of a message has already been received, so it must not be processed again.
+
+        It is checked when the message is received, so the duplicates are not scheduled nor coalesced.
+        """
+        if not self.duplicates.enabled:
+            return False
+
+        try:
+            e_mail = self._decode_e_mail(body)
+
+        except ValueError:
+            # The task reports the messages that are not valid
+            return False
+
+        if not self.duplicates.seen(e_mail):
+            return False
+
+        self.mov.info("Skipped a duplicated e-mail", {"duplicates": self.duplicates.duplicates, "subject": e_mail.subject})
+        return True
+
+    def _reply_under_load(
+        self, e_mail: ReceivedEMailPayload, body: bytes, enqueued_at: Optional[float] = None, delayed: float = 0.0
+    ) -> Optional[Tuple[str, str]]:
+        """Obtain the reply of an e-mail degrading it as much as the load of the component requires.
+
+        Parameters
+        ----------
+        e_mail : ReceivedEMailPayload
+            The e-mail to reply.
+        body : bytes
+            The message with the e-mail, to publish it again if it is deferred.
+        enqueued_at : float, optional
+            The monotonic time when the e-mail was passed to the executor.
+        delayed : float
+            The seconds that the component has delayed the e-mail on the broker.
+
+        Returns
+        -------
+        (str, str), optional
+            The subject and the content of the reply, or None if the e-mail has been deferred.
+
+        Raises
+        ------
+        _OverQuota
+            If the sender is over its quota and its e-mails must be delivered again when it is restored.
+        """
+        # The classifier needs the FROM address, not the sender of the fairness that can be its domain
+        thread = thread_key(e_mail.addresses, e_mail.subject)
+        e_mail_class = self.classifier.classify(thread[0] if thread is not None else None, e_mail.subject, e_mail.content)
+        if e_mail_class is not None:
+            return self._skip_generation(e_mail, e_mail_class)
+
+        if not self._within_quota(e_mail):
+            return None
+
+        level = self.overload.observe(self._wait_of(e_mail, enqueued_at, delayed), self._depth())
+        if level >= DEFER_LOW_PRIORITY and (e_mail.priority or 0) < self.overload.defer_priority:
+            # Publish the e-mail again at the end of the queue to reply it when the load drops
+            self.duplicates.expect(e_mail)
+            self.message_service.publish_to(self.RECEIVED_EMAIL_TOPIC, json_codec.RawJSON(body.decode('utf-8')))
+            self.mov.info("Deferred an e-mail because the component is overloaded", e_mail)
+            return None
+
+        subject, content = self._prepare_content(e_mail)
+        if level >= CACHED_REPLIES:
+            return self.overload.cached_reply(subject, content)
+
+        parameters = e_mail.generation_parameters
+        if level >= SHORTER_REPLIES:
+            max_new_tokens = min(int((parameters and parameters.max_new_tokens) or self.generator.max_new_tokens), self.overload.max_new_tokens)
+            parameters = (parameters or GenerationParametersPayload()).model_copy(update={'max_new_tokens': max_new_tokens})
+
+        fallback = self._fallback_generator() if level >= FALLBACK_MODEL else None
+        if fallback is not None:
+            # The fallback model uses the parameters of the component, not its own ones
+            generation = self.generator.generation_parameters(parameters)
+            return fallback.generate_reply(subject, content, GenerationParametersPayload.model_construct(**generation))
+
+        start = time.monotonic()
+        conversation = thread_key(e_mail.addresses, e_mail.subject) if self.conversations.enabled else None
+        reply = self._generate_reply(subject, content, parameters, conversation)
+        # The mean generation time is the time saved by each e-mail that is not generated
+        elapsed = time.monotonic() - start
+        self.generation_seconds = elapsed if self.generation_seconds == 0.0 else self.generation_seconds + 0.2 * (elapsed - self.generation_seconds)
+        self.overload.remember_reply(subject, content, reply)
+        return reply
+
+    def _wait_of(self, e_mail: ReceivedEMailPayload, enqueued_at: Optional[float] = None, delayed: float = 0.0) -> float:
+        """Return the seconds that an e-mail has waited to be replied.
+
+        It is the age of the e-mail, so it includes the time on the queue of the broker, but
+        not the time that the component has delayed it. The e-mails without reception time
+        are measured from when they were passed to the executor.
+        """
+        wait = time.monotonic() - enqueued_at if enqueued_at is not None else 0.0
+        if e_mail.received_at is not None:
+            wait = max(wait, time.time() - e_mail.received_at - delayed)
+
+        return wait
+
+    def _depth(self) -> int:
+        """Return the number of e-mails that wait to be replied, on the queue of the broker and on the component."""
+
+        if not self.overload.depth_thresholds:
+            return self._pending
+
+        now = time.monotonic()
+        with self._pending_lock:
+            # The broker is asked at most once by interval, not for each e-mail
+            refresh = now - self._queued_at >= self.QUEUE_DEPTH_INTERVAL
+            if refresh:
+                self._queued_at = now
+
+        if refresh:
+            self._queued = self.message_service.message_count(self.RECEIVED_EMAIL_TOPIC)
+
+        return self._queued + self._pending
+
+    def _skip_generation(self, e_mail: ReceivedEMailPayload, e_mail_class: str) -> Optional[Tuple[str, str]]:
+        """Drop, or reply with the template, an e-mail that must not be replied by the LLM."""
+
+        self.classifier.count_skipped(e_mail_class, self.generation_seconds)
+        counters = {"class": e_mail_class, "skipped": dict(self.classifier.counters), "saved_seconds": self.classifier.saved_seconds}
+        # The automated e-mails can be acknowledged, but replying the others could start a mail loop
+        if e_mail_class == AUTOMATED and self.classifier_template_reply:
+            self.mov.info(f"Replied with the template an e-mail classified as {e_mail_class}", counters)
+            return f"Re: {e_mail.subject or 'No subject'}", self.classifier_template_reply
+
+        self.mov.info(f"Skipped the reply of an e-mail classified as {e_mail_class}", counters)
+        return None
+
+    def _within_quota(self, e_mail: ReceivedEMailPayload) -> bool:
+        """Check that the sender of an e-mail has not consumed its quota of tokens, deferring or rejecting the e-mail otherwise."""
+
+        sender = self.fairness.sender_of(e_mail.addresses)
+        parameters = e_mail.generation_parameters
+        max_new_tokens = int((parameters and parameters.max_new_tokens) or self.generator.max_new_tokens)
+        if self.fairness.consume(sender, estimate_tokens(e_mail.subject, e_mail.content) + max_new_tokens):
+            return True
+
+        if self.fairness.over_quota == DEFER:
+            # The message is published again to be delivered when the quotas are restored
+            self.mov.info(f"Deferred an e-mail because {sender} is over its quota", e_mail)
+            raise _OverQuota(self.fairness.remaining_window())
+
+        self.mov.warn(f"Rejected an e-mail because {sender} is over its quota", e_mail)
+        return False
+
+    def _fallback_generator(self) -> Optional[EMailReplierGenerator]:
+        """Return the generator of the fallback model, starting to load it the first time it is required."""
+
+        if self.fallback_generator is not None or not self.fallback_model_id:
+            return self.fallback_generator
+
+        with self._pending_lock:
+            if self._fallback_loading:
+                return None
+            self._fallback_loading = True
+
+        threading.Thread(target=self._load_fallback_generator, name="fallback-model", daemon=True).start()
+        return None
+
+    def _load_fallback_generator(self) -> None:
+        """Load the fallback model."""
+
+        try:
+            self.fallback_generator = EMailReplierGenerator(
+                model_id=self.fallback_model_id, config_store=self.config_store, memory_watchdog=self.memory_watchdog, fixed_model=True
             )
-            self.message_service.publish_to(self.REPLY_EMAIL_TOPIC, reply_msg)
-            self.mov.info("Sent e-mail reply", reply_msg)
+            self.mov.info(f"Loaded the fallback model {self.fallback_model_id}")
 
         except Exception as error:
-            # Enhanced error logging with body snippet
-            body_snippet = body[:100].decode('utf-8', errors='replace') if body else "None"
-            msg = f"Failed to process message: {error}. Body start: {body_snippet}..."
-            self.mov.error(msg, body)
\ No newline at end of file
+            logging.exception("Could not load the fallback model")
+            self.mov.error(f"Cannot load the fallback model {self.fallback_model_id}: {error}")
+
+    def _decode_e_mail(self, body: bytes) -> ReceivedEMailPayload:
+        """Obtain the received e-mail from the body of a message."""
+
+        # The codec also accepts the e-mails that have been double-encoded by the publisher
+        return json_codec.decode_model(ReceivedEMailPayload, body)
+
+    def _reply_addresses_for(self, e_mail: ReceivedEMailPayload) -> List[dict]:
+        """Map the addresses of a received e-mail to the addresses of the reply."""
+
+        reply_addresses: List[dict] = []
+        for addr in e_mail.addresses:
+            # We skip TO addresses from the original email as they are likely the component's own address
+            if addr.address_type == ReceivedEMailAddressType.TO:
+                continue
+
+            # Map Original Address Type -> Reply Address Type
+            # FROM in original email becomes TO in the reply
+            # CC and BCC stay the same
+            reply_type = ReplyEMailAddressType.TO
+            if addr.address_type == ReceivedEMailAddressType.CC:
+                reply_type = ReplyEMailAddressType.CC
+            elif addr.address_type == ReceivedEMailAddressType.BCC:
+                reply_type = ReplyEMailAddressType.BCC
+
+            reply_to = ReplyEMailAddressPayload(
+                type=reply_type,
+                address=addr.address,
+                name=addr.name
+            ).model_dump()
+            reply_addresses.append(reply_to)
+
+        return reply_addresses
+
+    def _prepare_content(self, e_mail: ReceivedEMailPayload) -> Tuple[str, str]:
+        """Obtain the subject and the content to use to generate the reply."""
+
+        subject = e_mail.subject or "No subject"
+        content = e_mail.content or "No content"
+
+        # Convert HTML to Markdown if necessary
+        if e_mail.mime_type == "text/html":
+            converter = html2text.HTML2Text()
+            converter.ignore_links = True
+            content = converter.handle(content)
+
+        return subject, content
+
+    def _generate_reply(
+        self, subject: str, content: str, parameters: Optional[GenerationParametersPayload] = None, conversation: Optional[Tuple[str, str]] = None
+    ) -> Tuple[str, str]:
+        """Generate the subject and the content of the reply. This is the slow part of the process."""
+
+        if self.concurrency is not None:
+            with self.concurrency.slot():
+                return self._generate_reply_now(subject, content, parameters, conversation)
+
+        return self._generate_reply_now(subject, content, parameters, conversation)
+
+    def _generate_reply_now(
+        self, subject: str, content: str, parameters: Optional[GenerationParametersPayload] = None, conversation: Optional[Tuple[str, str]] = None
+    ) -> Tuple[str, str]:
+        """Generate the reply, once the concurrency controller allows it."""
+
+        if self.languages.enabled:
+            language = self.languages.route(subject, content)
+            if language is not None:
+                return self.languages.generate_reply(language, subject, content, parameters, conversation)
+
+        if self.router.enabled:
+            return self.router.generate_reply(subject, content, parameters, conversation)
+
+        if self.batcher is not None:
+            return self.batcher.generate(subject, content, parameters)
+
+        self.generator.refresh_parameters()
+        if conversation is not None:
+            # Only the e-mails that are not batched can reuse the cache of their conversation
+            return self.generator.generate_reply(subject, content, parameters, conversation)
+
+        return self.generator.generate_reply(subject, content, parameters)
+
+    def _send_reply(self, reply_addresses: List[dict], reply_subject: str, reply_content: str) -> None:
+        """Construct and send the reply payload."""
+
+        reply_msg = ReplyEMailPayload(
+            addresses=reply_addresses,
+            subject=reply_subject,
+            is_html=False,
+            content=reply_content
+        )
+        # Serialize the reply once for the message and the log
+        reply_json = json_codec.encode_model(reply_msg)
+        self.message_service.publish_to(self.REPLY_EMAIL_TOPIC, reply_json)
+        self.classifier.remember_reply([address['address'] for address in reply_addresses if address.get('address')], reply_subject, reply_content)
+        self.mov.info("Sent e-mail reply", reply_json)
+
+    def _report_failure(self, error: Exception, body: bytes) -> None:
+        """Notify the MOV that a message could not be processed."""
+
+        # Enhanced error logging with body snippet
+        body_snippet = body[:100].decode('utf-8', errors='replace') if body else "None"
+        msg = f"Failed to process message: {error}. Body start: {body_snippet}..."
+        self.mov.error(msg, body)
@@ -18,6 +18,7 @@
 
 from pydantic import BaseModel, Field, ConfigDict
 from received_e_mail_address_payload import ReceivedEMailAddressPayload
+from c1_llm_email_replier.generation_parameters_payload import GenerationParametersPayload
 
 class ReceivedEMailPayload(BaseModel):
 	"""The payload containing metadata and content of a received e-mail."""
@@ -27,5 +28,7 @@ class ReceivedEMailPayload(BaseModel):
 	mime_type: str | None = Field(default=None, title="The MIME type of the content (e.g., text/html, text/plain).")
 	content: str | None = Field(default=None, title="The actual body content of the email.")
 	received_at: int | None = Field(default=None, title="The Unix epoch timestamp (seconds) when the email was received.")
+	priority: int | None = Field(default=None, ge=0, le=9, title="The priority of the e-mail, where the greater the more important.")
+	generation_parameters: GenerationParametersPayload | None = Field(default=None, title="The parameters to use, instead of the component ones, to generate the reply.")
 
 	model_config = ConfigDict(serialize_by_alias=True,populate_by_name=True)
\ No newline at end of file
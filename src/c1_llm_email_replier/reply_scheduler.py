@@ -0,0 +1,230 @@
+# 
+# This file is part of the C1_llm_email_replier distribution (https://github.com/VALAWAI/C1_llm_email_replier).
+# Copyright (c) 2022-2026 VALAWAI (https://valawai.eu/).
+# 
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+# 
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+# 
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+
+import itertools
+import logging
+import os
+import threading
+import time
+from concurrent.futures import Executor, Future
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+# The policies to decide which e-mail is replied first
+FIFO = 'fifo'
+EARLIEST_DEADLINE_FIRST = 'edf'
+SHORTEST_JOB_FIRST = 'sjf'
+WEIGHTED_FAIR = 'fair'
+POLICIES = (FIFO, EARLIEST_DEADLINE_FIRST, SHORTEST_JOB_FIRST, WEIGHTED_FAIR)
+
+
+def estimate_tokens(*texts: Optional[str]) -> int:
+    """Estimate, without the tokenizer, the tokens of the prompt of some texts.
+
+    The LLM tokenizers produce about one token for each four characters of English text.
+    """
+
+    return sum(len(text) for text in texts if text) // 4
+
+
+@dataclass
+class ScheduledJob:
+    """A reply that is waiting to be generated."""
+
+    function: Callable[..., Any]
+    args: Tuple[Any, ...]
+    future: Future
+    sequence: int
+    enqueued_at: float
+    received_at: Optional[float] = None
+    cost: int = 0
+    sender: Optional[str] = None
+    weight: float = 1.0
+    deadline: float = field(init=False, default=0.0)
+    finish: float = field(init=False, default=0.0)
+
+
+class ReplyScheduler:
+    """Decide the order in which the waiting e-mails are replied.
+
+    The jobs are passed to the executor in the order of the policy instead of the order
+    in which they have arrived. The policy can be first in first out (fifo), earliest
+    deadline first (edf), where the deadline is when the e-mail was received plus the SLA,
+    shortest job first (sjf), by the tokens of the prompt, or weighted fair (fair), that
+    shares the generation between the senders in proportion to their weights, so a sender
+    that sends many e-mails only delays its own ones. To avoid that a job is never served,
+    the jobs that have waited more than the maximum wait are served first.
+    """
+
+    def __init__(
+        self,
+        executor: Optional[Executor] = None,
+        policy: str = os.getenv('REPLY_SCHEDULER', FIFO),
+        sla: float = float(os.getenv('REPLY_SLA', "3600")),
+        max_wait: float = float(os.getenv('REPLY_MAX_WAIT', "600")),
+        clock: Callable[[], float] = time.time
+    ):
+        """Initialize the scheduler
+
+        Parameters
+        ----------
+        executor : Executor, optional
+            The executor that runs the jobs. Without it the jobs must be obtained with pop().
+        policy : str
+            The policy to order the jobs: fifo, edf, sjf or fair.
+        sla : float
+            The seconds after an e-mail is received that its reply must be sent.
+        max_wait : float
+            The seconds that a job can wait before being served ahead of the policy order.
+            If it is 0 the jobs are always served in the policy order.
+        clock : callable
+            The function that returns the current time, in seconds since the epoch.
+        """
+        policy = policy.strip().lower()
+        if policy not in POLICIES:
+            logging.warning("Undefined scheduler policy %s, using %s", policy, FIFO)
+            policy = FIFO
+
+        self.executor = executor
+        self.policy = policy
+        self.sla = max(0.0, sla)
+        self.max_wait = max(0.0, max_wait)
+        self.clock = clock
+        self.starved = 0
+        self._jobs: List[ScheduledJob] = []
+        self._sequence = itertools.count()
+        # The virtual time and the finish tag of the last job of each sender of the fair policy
+        self._virtual_time = 0.0
+        self._last_finish: Dict[str, float] = {}
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        """Return the number of jobs that are waiting."""
+
+        return len(self._jobs)
+
+    def submit(
+        self,
+        function: Callable[..., Any],
+        *args: Any,
+        received_at: Optional[float] = None,
+        cost: int = 0,
+        sender: Optional[str] = None,
+        weight: float = 1.0
+    ) -> Future:
+        """Schedule a job to run it on the executor.
+
+        Parameters
+        ----------
+        function : callable
+            The function of the job.
+        args : tuple
+            The arguments of the function.
+        received_at : float, optional
+            The seconds since the epoch when the e-mail was received.
+        cost : int
+            The tokens of the prompt of the e-mail.
+        sender : str, optional
+            The sender of the e-mail.
+        weight : float
+            The share of the generation of the sender.
+
+        Returns
+        -------
+        Future
+            The result of the function.
+        """
+        job = self.put(function, *args, received_at=received_at, cost=cost, sender=sender, weight=weight)
+        # Each job passed to the executor runs the next job in the order of the policy
+        self.executor.submit(self._run_next)
+        return job.future
+
+    def put(
+        self,
+        function: Callable[..., Any],
+        *args: Any,
+        received_at: Optional[float] = None,
+        cost: int = 0,
+        sender: Optional[str] = None,
+        weight: float = 1.0
+    ) -> ScheduledJob:
+        """Add a job to the ones that are waiting, without running it."""
+
+        now = self.clock()
+        job = ScheduledJob(function, args, Future(), next(self._sequence), now, received_at, max(0, cost), sender, max(0.01, weight))
+        job.deadline = (received_at if received_at is not None else now) + self.sla
+        with self._lock:
+            if self.policy == WEIGHTED_FAIR:
+                # Self-clocked fair queuing, each sender advances its finish tag by its cost over its weight
+                start = max(self._virtual_time, self._last_finish.get(sender, 0.0))
+                job.finish = start + (job.cost + 1) / job.weight
+                self._last_finish[sender] = job.finish
+            self._jobs.append(job)
+
+        return job
+
+    def _key(self, job: ScheduledJob) -> Tuple:
+        """Return the value to sort the jobs by the policy."""
+
+        if self.policy == EARLIEST_DEADLINE_FIRST:
+            return (job.deadline, job.sequence)
+
+        if self.policy == SHORTEST_JOB_FIRST:
+            return (job.cost, job.sequence)
+
+        if self.policy == WEIGHTED_FAIR:
+            return (job.finish, job.sequence)
+
+        return (job.sequence,)
+
+    def pop(self) -> Optional[ScheduledJob]:
+        """Remove and return the next job to run, or None if no job is waiting."""
+
+        with self._lock:
+            if not self._jobs:
+                return None
+
+            # The jobs are kept in arrival order, so the first is the one that has waited more
+            oldest = self._jobs[0]
+            if self.policy != FIFO and self.max_wait > 0 and self.clock() - oldest.enqueued_at >= self.max_wait:
+                self.starved += 1
+                job = oldest
+            else:
+                job = min(self._jobs, key=self._key)
+
+            self._jobs.remove(job)
+            if self.policy == WEIGHTED_FAIR:
+                self._virtual_time = max(self._virtual_time, job.finish)
+                if len(self._last_finish) > 2 * len(self._jobs):
+                    # The senders whose jobs have all been served start again from the virtual time,
+                    # so they can be forgotten and the memory does not grow
+                    self._last_finish = {sender: finish for sender, finish in self._last_finish.items() if finish > self._virtual_time}
+            return job
+
+    def _run_next(self) -> None:
+        """Run the next job."""
+
+        job = self.pop()
+        if job is None or not job.future.set_running_or_notify_cancel():
+            return
+
+        try:
+            job.future.set_result(job.function(*job.args))
+
+        except BaseException as error:
+            job.future.set_exception(error)
@@ -0,0 +1,166 @@
+# 
+# This file is part of the C1_llm_email_replier distribution (https://github.com/VALAWAI/C1_llm_email_replier).
+# Copyright (c) 2022-2026 VALAWAI (https://valawai.eu/).
+# 
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+# 
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+# 
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+
+import logging
+import os
+import threading
+import time
+from typing import Any, Callable, Dict, Iterable, Mapping, Optional
+
+from c1_llm_email_replier import json_codec
+
+# The actions to do with the e-mails of the senders that are over their quota
+DEFER = 'defer'
+REJECT = 'reject'
+
+
+def _weights(value: str) -> Mapping[str, float]:
+    """Convert the JSON with the weight of each sender."""
+
+    try:
+        return {str(sender).lower(): max(0.01, float(weight)) for sender, weight in json_codec.loads(value).items()}
+
+    except (AttributeError, TypeError, ValueError):
+        logging.warning("Ignored the bad sender weights %s", value)
+        return {}
+
+
+class SenderFairness:
+    """Identify the sender of the e-mails and limit the tokens that each one can consume.
+
+    The senders are identified by their FROM address or by its domain. Each sender has
+    a weight, that is the share of the generation that it obtains when the replies are
+    scheduled fairly, and a budget of tokens, proportional to its weight, that can
+    consume on each time window.
+    """
+
+    def __init__(
+        self,
+        key: str = os.getenv('SENDER_KEY', "address"),
+        weights: str = os.getenv('SENDER_WEIGHTS', "{}"),
+        quota_tokens: int = int(os.getenv('SENDER_QUOTA_TOKENS', "0")),
+        quota_window: float = float(os.getenv('SENDER_QUOTA_WINDOW', "3600")),
+        over_quota: str = os.getenv('SENDER_OVER_QUOTA', REJECT),
+        clock: Callable[[], float] = time.monotonic
+    ):
+        """Initialize the fairness
+
+        Parameters
+        ----------
+        key : str
+            How to identify the senders: by their address or by their domain.
+        weights : str
+            The JSON object with the weight of the senders, or domains, that do not have the default weight 1.
+        quota_tokens : int
+            The tokens that a sender with weight 1 can consume on each window. If it is 0 there is no quota.
+        quota_window : float
+            The seconds of the window of the quota.
+        over_quota : str
+            What to do with the e-mails of the senders that are over their quota: defer or reject.
+        clock : callable
+            The function that returns the current time in seconds.
+        """
+        self.by_domain = key.strip().lower() == "domain"
+        self.weights = _weights(weights)
+        self.quota_tokens = max(0, quota_tokens)
+        self.quota_window = max(1.0, quota_window)
+        self.over_quota = DEFER if over_quota.strip().lower() == DEFER else REJECT
+        self.clock = clock
+        self._window_start = clock()
+        self._consumed: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    def sender_of(self, addresses: Iterable[Any]) -> Optional[str]:
+        """Return the sender of an e-mail.
+
+        Parameters
+        ----------
+        addresses : iterable
+            The addresses of the e-mail, as ReceivedEMailAddressPayload or as the dictionaries of a message.
+
+        Returns
+        -------
+        str, optional
+            The FROM address, or its domain, in lower case. None if the e-mail has not a FROM address.
+        """
+        for address in addresses:
+            if isinstance(address, Mapping):
+                address_type, value = address.get('type'), address.get('address')
+            else:
+                address_type, value = address.address_type, address.address
+
+            if address_type == "FROM" and value:
+                value = value.strip().lower()
+                return value.rpartition('@')[2] if self.by_domain else value
+
+        return None
+
+    def weight(self, sender: Optional[str]) -> float:
+        """Return the weight of a sender."""
+
+        if sender is None:
+            return 1.0
+
+        weight = self.weights.get(sender)
+        if weight is None and not self.by_domain:
+            weight = self.weights.get(sender.rpartition('@')[2])
+
+        return weight if weight is not None else 1.0
+
+    def consume(self, sender: Optional[str], tokens: int) -> bool:
+        """Consume tokens of the quota of a sender.
+
+        Parameters
+        ----------
+        sender : str, optional
+            The sender of the e-mail.
+        tokens : int
+            The tokens that the reply is expected to consume.
+
+        Returns
+        -------
+        bool
+            True if the sender is within its quota, otherwise the tokens are not consumed.
+        """
+        if self.quota_tokens == 0 or sender is None:
+            return True
+
+        with self._lock:
+            self._roll_window()
+            consumed = self._consumed.get(sender, 0)
+            if consumed > 0 and consumed + tokens > self.quota_tokens * self.weight(sender):
+                return False
+
+            self._consumed[sender] = consumed + tokens
+            return True
+
+    def remaining_window(self) -> float:
+        """Return the seconds until the quotas are restored."""
+
+        with self._lock:
+            self._roll_window()
+            return max(0.0, self._window_start + self.quota_window - self.clock())
+
+    def _roll_window(self) -> None:
+        """Restore the quotas when the window has finished."""
+
+        now = self.clock()
+        if now - self._window_start >= self.quota_window:
+            # Only the senders of the current window are kept, so the memory does not grow
+            self._window_start = now - (now - self._window_start) % self.quota_window
+            self._consumed.clear()
@@ -0,0 +1,46 @@
+# 
+# This file is part of the C1_llm_email_replier distribution (https://github.com/VALAWAI/C1_llm_email_replier).
+# Copyright (c) 2022-2026 VALAWAI (https://valawai.eu/).
+# 
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+# 
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+# 
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+
+import re
+from typing import Optional
+
+# The prefixes that the mail clients add when replying or forwarding, in several languages
+_REPLY_PREFIX = re.compile(r'^\s*((re|fwd?|aw|wg|sv|vs|tr|rv|enc|r)\s*(\[\d+\])?\s*:\s*)+', re.IGNORECASE)
+_SPACES = re.compile(r'\s+')
+
+
+def normalize_subject(subject: Optional[str]) -> str:
+    """Normalize the subject of an e-mail to identify its thread.
+
+    The reply and forward prefixes, such as 'Re:', 'Fwd:' or 'RE[2]:', are removed,
+    the spaces are collapsed and the letters are converted to lower case.
+
+    Parameters
+    ----------
+    subject : str, optional
+        The subject of the e-mail.
+
+    Returns
+    -------
+    str
+        The normalized subject, that is empty if the e-mail has not a subject.
+    """
+    if not subject:
+        return ""
+
+    return _SPACES.sub(' ', _REPLY_PREFIX.sub('', subject)).strip().lower()
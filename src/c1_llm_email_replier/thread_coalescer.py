@@ -0,0 +1,150 @@
+# 
+# This file is part of the C1_llm_email_replier distribution (https://github.com/VALAWAI/C1_llm_email_replier).
+# Copyright (c) 2022-2026 VALAWAI (https://valawai.eu/).
+# 
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+# 
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+# 
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+
+import os
+import threading
+from typing import Any, Callable, Dict, Hashable, Iterable, List, Mapping, Optional, Tuple
+
+from c1_llm_email_replier.subject_normalizer import normalize_subject
+
+
+def thread_key(addresses: Iterable[Any], subject: Optional[str]) -> Optional[Tuple[str, str]]:
+    """Return the key of the conversation of an e-mail.
+
+    Parameters
+    ----------
+    addresses : iterable
+        The addresses of the e-mail, as ReceivedEMailAddressPayload or as the dictionaries of a message.
+    subject : str, optional
+        The subject of the e-mail.
+
+    Returns
+    -------
+    (str, str), optional
+        The FROM address in lower case and the normalized subject. None if the e-mail has not a FROM address.
+    """
+    for address in addresses:
+        if isinstance(address, Mapping):
+            address_type, value = address.get('type'), address.get('address')
+        else:
+            address_type, value = address.address_type, address.address
+
+        if address_type == "FROM" and value:
+            return value.strip().lower(), normalize_subject(subject)
+
+    return None
+
+
+class _Group:
+    """The messages of a conversation that wait to be flushed together."""
+
+    def __init__(self, flush: Callable[[List[Any]], None]):
+        self.flush = flush
+        self.items: List[Any] = []
+        self.timer: Optional[threading.Timer] = None
+
+
+class ThreadCoalescer:
+    """Hold the messages of the same conversation during a short window to process them together.
+
+    The first message of a conversation starts the window, and when it finishes, or the
+    conversation has the maximum number of messages, all the messages are passed at once
+    to the function that flushes them.
+    """
+
+    def __init__(
+        self,
+        window: float = float(os.getenv('COALESCE_WINDOW', "0")),
+        max_messages: int = int(os.getenv('COALESCE_MAX_MESSAGES', "5"))
+    ):
+        """Initialize the coalescer
+
+        Parameters
+        ----------
+        window : float
+            The seconds to wait for more messages of a conversation. If it is 0 the messages are not coalesced.
+        max_messages : int
+            The maximum messages to process together.
+        """
+        self.window = max(0.0, window)
+        self.max_messages = max(1, max_messages)
+        self.coalesced = 0
+        self._groups: Dict[Hashable, _Group] = {}
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self) -> bool:
+        """Check if the messages are coalesced."""
+
+        return self.window > 0 and self.max_messages > 1
+
+    def add(self, key: Hashable, item: Any, flush: Callable[[List[Any]], None]) -> None:
+        """Hold a message until the window of its conversation finishes.
+
+        Parameters
+        ----------
+        key : hashable
+            The conversation of the message.
+        item : object
+            The message to hold.
+        flush : callable
+            The function to call with the messages of the conversation, when the first one of them is added.
+            It is called from a timer thread, or from the caller when the conversation is full.
+        """
+        with self._lock:
+            group = self._groups.get(key)
+            if group is None:
+                group = _Group(flush)
+                group.timer = threading.Timer(self.window, self._expire, (key, group))
+                group.timer.daemon = True
+                self._groups[key] = group
+                group.timer.start()
+
+            else:
+                self.coalesced += 1
+
+            group.items.append(item)
+            if len(group.items) < self.max_messages:
+                return
+
+            del self._groups[key]
+            group.timer.cancel()
+
+        group.flush(group.items)
+
+    def _expire(self, key: Hashable, group: _Group) -> None:
+        """Flush the messages of a conversation when its window finishes."""
+
+        with self._lock:
+            if self._groups.get(key) is not group:
+                # It has been flushed because it was full
+                return
+            del self._groups[key]
+
+        group.flush(group.items)
+
+    def flush_all(self) -> None:
+        """Flush now the messages of all the conversations."""
+
+        with self._lock:
+            groups = list(self._groups.values())
+            self._groups.clear()
+
+        for group in groups:
+            group.timer.cancel()
+            group.flush(group.items)
@@ -0,0 +1,118 @@
+# 
+# This file is part of the C1_llm_email_replier distribution (https://github.com/VALAWAI/C1_llm_email_replier).
+# Copyright (c) 2022-2026 VALAWAI (https://valawai.eu/).
+# 
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+# 
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+# 
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+
+from abc import ABC, abstractmethod
+from typing import Any, Callable
+
+
+class Transport(ABC):
+    """The interface of the transports used by the MessageService to send and receive messages.
+
+    The listeners are called with the arguments (channel, method, properties, body)
+    as pika does, where method contains the delivery_tag used to acknowledge the message.
+    """
+
+    @abstractmethod
+    def listen_for(self, queue: str, callback: Callable, prefetch_count: int = 0, priority: int = 0, auto_ack: bool = True) -> None:
+        """Register a listener on a durable queue.
+
+        Parameters
+        ----------
+        queue : str
+            The name of the queue to listen.
+        callback: method
+            The method to call when a message is received.
+        prefetch_count: int
+            The maximum number of messages not acknowledged that the queue can deliver,
+            or 0 if it is not limited. It only has effect if the messages are not auto acknowledged.
+        priority: int
+            The priority of the consumer. The messages are delivered first to the consumers
+            with more priority.
+        auto_ack: bool
+            True if the messages are acknowledged when they are received, otherwise the
+            callback must call the method 'ack' when the message has been processed.
+        """
+
+    @abstractmethod
+    def ack(self, channel: Any, delivery_tag: int) -> None:
+        """Acknowledge a message received by a listener that is not auto acknowledged.
+
+        This method can be called from any thread.
+
+        Parameters
+        ----------
+        channel : object
+            The channel that has received the message.
+        delivery_tag: int
+            The delivery tag of the message to acknowledge.
+        """
+
+    @abstractmethod
+    def nack(self, channel: Any, delivery_tag: int, requeue: bool = True) -> None:
+        """Reject a message received by a listener that is not auto acknowledged.
+
+        This method can be called from any thread.
+
+        Parameters
+        ----------
+        channel : object
+            The channel that has received the message.
+        delivery_tag: int
+            The delivery tag of the message to reject.
+        requeue: bool
+            True if the message is returned to its queue to be delivered again.
+        """
+
+    @abstractmethod
+    def publish(self, queue: str, body: str, delay: float = 0.0) -> None:
+        """Publish a message to a queue. This method can be called from any thread.
+
+        Parameters
+        ----------
+        queue : str
+            The name of the queue to publish the event.
+        body: str
+            The encoded message to send.
+        delay: float
+            The seconds that the broker keeps the message before delivering it to the queue.
+        """
+
+    @abstractmethod
+    def message_count(self, queue: str) -> int:
+        """Return the number of messages that wait on a queue to be delivered.
+
+        This method can be called from any thread, except the one that calls the listeners.
+
+        Parameters
+        ----------
+        queue : str
+            The name of the queue.
+
+        Returns
+        -------
+        int
+            The messages of the queue that have not been delivered, or 0 if they can not be counted.
+        """
+
+    @abstractmethod
+    def start_consuming(self) -> None:
+        """Wait until the transport is closed while the messages are consumed."""
+
+    @abstractmethod
+    def close(self) -> None:
+        """Close the transport."""
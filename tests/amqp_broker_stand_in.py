@@ -0,0 +1,241 @@
+#
+# This file is part of the C1_llm_email_replier distribution (https://github.com/VALAWAI/C1_llm_email_replier).
+# Copyright (c) 2022-2026 VALAWAI (https://valawai.eu/).
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+
+import socket
+import threading
+import time
+from collections import defaultdict, deque
+
+from pika import frame, spec
+
+
+class AMQPBrokerStandIn:
+	"""A minimal AMQP 0-9-1 broker that runs in the tests process.
+
+	It only supports what the MessageService needs (declare, qos, consume, publish, confirms and ack)
+	and allows to inject failures, like a network partition, to check how the clients react.
+	"""
+
+	def __init__(self, heartbeat: int = 1):
+		"""Start to listen for connections on a random local port.
+
+		Parameters
+		----------
+		heartbeat: int
+			The heartbeat timeout, in seconds, that the broker negotiates with the clients.
+		"""
+		self.heartbeat = heartbeat
+		self.server = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+		self.server.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+		self.server.bind(('127.0.0.1', 0))
+		self.server.listen()
+		self.port = self.server.getsockname()[1]
+		self.lock = threading.RLock()
+		self.queues: dict[str, deque] = defaultdict(deque)
+		self.consumers: dict[str, list] = defaultdict(list)
+		self.connections: list['_StandInConnection'] = []
+		self.accepted_connections = 0
+		self.stopped = False
+		threading.Thread(target=self._accept, daemon=True).start()
+
+	def _accept(self):
+		"""Accept the connections of the clients."""
+		while not self.stopped:
+			try:
+				client, _address = self.server.accept()
+			except OSError:
+				break
+			connection = _StandInConnection(self, client)
+			with self.lock:
+				self.connections.append(connection)
+				self.accepted_connections += 1
+			threading.Thread(target=connection.serve, daemon=True).start()
+
+	def freeze(self):
+		"""Simulate a network partition, the open connections do not send or receive anything more."""
+		with self.lock:
+			for connection in self.connections:
+				connection.frozen = True
+			self.connections = []
+			for consumers in self.consumers.values():
+				consumers.clear()
+
+	def stop(self):
+		"""Stop the broker and close all the connections."""
+		self.stopped = True
+		self.server.close()
+		with self.lock:
+			for connection in self.connections:
+				connection.close()
+
+	def publish(self, queue: str, body: bytes):
+		"""Publish a message into a queue."""
+		with self.lock:
+			self.queues[queue].append(body)
+			self._deliver(queue)
+
+	def _deliver(self, queue: str):
+		"""Deliver the messages of a queue to its consumers."""
+		consumers = self.consumers[queue]
+		while consumers and self.queues[queue]:
+			connection, channel_number, consumer_tag = consumers[0]
+			consumers.append(consumers.pop(0))
+			connection.deliver(channel_number, consumer_tag, queue, self.queues[queue].popleft())
+
+
+class _StandInConnection:
+	"""A connection of a client with the stand-in broker."""
+
+	def __init__(self, broker: AMQPBrokerStandIn, client: socket.socket):
+		self.broker = broker
+		self.client = client
+		self.frozen = False
+		self.closed = False
+		self.write_lock = threading.Lock()
+		self.delivery_tag = 0
+		self.publishing: dict[int, list] = {}
+		self.confirmed: dict[int, int] = {}
+
+	def send(self, *frames):
+		"""Send some frames to the client."""
+		if self.frozen or self.closed:
+			return
+		with self.write_lock:
+			try:
+				self.client.sendall(b''.join(value.marshal() for value in frames))
+			except OSError:
+				self.close()
+
+	def close(self):
+		"""Close the connection."""
+		self.closed = True
+		try:
+			self.client.close()
+		except OSError:
+			pass
+
+	def deliver(self, channel_number: int, consumer_tag: str, queue: str, body: bytes):
+		"""Deliver a message to the client."""
+		self.delivery_tag += 1
+		deliver = spec.Basic.Deliver(consumer_tag=consumer_tag, delivery_tag=self.delivery_tag, exchange='', routing_key=queue)
+		self.send(
+			frame.Method(channel_number, deliver),
+			frame.Header(channel_number, len(body), spec.BasicProperties(content_type='application/json')),
+			frame.Body(channel_number, body)
+		)
+
+	def _send_heartbeats(self):
+		"""Send the heartbeats to the client while the connection is alive."""
+		while not self.closed and not self.frozen:
+			self.send(frame.Heartbeat())
+			time.sleep(self.broker.heartbeat / 2)
+
+	def serve(self):
+		"""Process the frames received from the client."""
+		buffer = b''
+		while not self.closed:
+			if self.frozen:
+				time.sleep(0.1)
+				continue
+			try:
+				data = self.client.recv(65536)
+			except OSError:
+				break
+			if not data:
+				break
+			if self.frozen:
+				continue
+			buffer += data
+			while buffer:
+				consumed, value = frame.decode_frame(buffer)
+				if value is None:
+					break
+				buffer = buffer[consumed:]
+				self._process(value)
+
+		self.closed = True
+
+	def _process(self, value):
+		"""Process a frame received from the client."""
+		if isinstance(value, frame.ProtocolHeader):
+			server_properties = {'capabilities': {'consumer_priorities': True, 'basic.nack': True, 'publisher_confirms': True}}
+			self.send(frame.Method(0, spec.Connection.Start(server_properties=server_properties)))
+
+		elif isinstance(value, frame.Header):
+			self.publishing[value.channel_number].append(value.body_size)
+			self._publish_if_complete(value.channel_number)
+
+		elif isinstance(value, frame.Body):
+			self.publishing[value.channel_number].append(value.fragment)
+			self._publish_if_complete(value.channel_number)
+
+		elif isinstance(value, frame.Method):
+			self._process_method(value.channel_number, value.method)
+
+	def _publish_if_complete(self, channel_number: int):
+		"""Route a published message when all its body has been received."""
+		publish = self.publishing[channel_number]
+		body = b''.join(publish[2:])
+		if len(publish) >= 2 and len(body) == publish[1]:
+			del self.publishing[channel_number]
+			self.broker.publish(publish[0], body)
+			if channel_number in self.confirmed:
+				self.confirmed[channel_number] += 1
+				self.send(frame.Method(channel_number, spec.Basic.Ack(delivery_tag=self.confirmed[channel_number])))
+
+	def _process_method(self, channel_number: int, method):
+		"""Process a method received from the client."""
+		if isinstance(method, spec.Connection.StartOk):
+			self.send(frame.Method(0, spec.Connection.Tune(channel_max=2047, frame_max=131072, heartbeat=self.broker.heartbeat)))
+
+		elif isinstance(method, spec.Connection.Open):
+			self.send(frame.Method(0, spec.Connection.OpenOk()))
+			threading.Thread(target=self._send_heartbeats, daemon=True).start()
+
+		elif isinstance(method, spec.Connection.Close):
+			self.send(frame.Method(0, spec.Connection.CloseOk()))
+			self.close()
+
+		elif isinstance(method, spec.Channel.Open):
+			self.send(frame.Method(channel_number, spec.Channel.OpenOk()))
+
+		elif isinstance(method, spec.Channel.Close):
+			self.send(frame.Method(channel_number, spec.Channel.CloseOk()))
+
+		elif isinstance(method, spec.Queue.Declare):
+			self.send(frame.Method(channel_number, spec.Queue.DeclareOk(queue=method.queue, message_count=0, consumer_count=0)))
+
+		elif isinstance(method, spec.Basic.Qos):
+			self.send(frame.Method(channel_number, spec.Basic.QosOk()))
+
+		elif isinstance(method, spec.Basic.Consume):
+			consumer_tag = method.consumer_tag or f"ctag{channel_number}.{time.monotonic_ns()}"
+			self.send(frame.Method(channel_number, spec.Basic.ConsumeOk(consumer_tag=consumer_tag)))
+			with self.broker.lock:
+				self.broker.consumers[method.queue].append((self, channel_number, consumer_tag))
+				self.broker._deliver(method.queue)
+
+		elif isinstance(method, spec.Basic.Cancel):
+			self.send(frame.Method(channel_number, spec.Basic.CancelOk(consumer_tag=method.consumer_tag)))
+
+		elif isinstance(method, spec.Confirm.Select):
+			self.confirmed[channel_number] = 0
+			self.send(frame.Method(channel_number, spec.Confirm.SelectOk()))
+
+		elif isinstance(method, spec.Basic.Publish):
+			self.publishing[channel_number] = [method.routing_key]
@@ -0,0 +1,223 @@
+# 
+# This file is part of the C1_llm_email_replier distribution (https://github.com/VALAWAI/C1_llm_email_replier).
+# Copyright (c) 2022-2026 VALAWAI (https://valawai.eu/).
+# 
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+# 
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+# 
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import threading
+import time
+import unittest
+from unittest.mock import MagicMock, patch
+
+from c1_llm_email_replier.adapter_manager import BASE_ADAPTER, AdapterManager
+
+ADAPTERS = '{"support": "adapters/support", "sales": "adapters/sales", "legal": "org/legal-adapter"}'
+
+
+class FakePeftModel:
+    """A model wrapped with LoRA adapters that records how they are loaded and activated."""
+
+    def __init__(self, base_model, source, adapter_name):
+        self.base_model = base_model
+        self.adapters = {adapter_name: source}
+        self.active = adapter_name
+        self.calls = []
+
+    def load_adapter(self, source, adapter_name):
+        self.adapters[adapter_name] = source
+        self.calls.append(("load", adapter_name))
+
+    def delete_adapter(self, adapter_name):
+        del self.adapters[adapter_name]
+        self.calls.append(("delete", adapter_name))
+
+    def set_adapter(self, adapter_name):
+        assert adapter_name in self.adapters
+        self.active = adapter_name
+        self.calls.append(("set", adapter_name))
+
+
+class TestAdapterManager(unittest.TestCase):
+    """Class to test the loading and the activation of the LoRA adapters."""
+
+    def setUp(self):
+        self.peft = MagicMock()
+        self.peft.PeftModel.from_pretrained.side_effect = FakePeftModel
+        patcher = patch('c1_llm_email_replier.adapter_manager.peft', self.peft)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.base_model = MagicMock()
+        self.pipe = MagicMock(model=self.base_model)
+        self.mov = MagicMock()
+        self.manager = AdapterManager(adapters=ADAPTERS, cache_size=2, mov=self.mov)
+
+    def test_disabled(self):
+        """Test that without adapters or without peft the model is not modified."""
+
+        assert not AdapterManager(adapters="{}").enabled
+        assert not AdapterManager(adapters="[").enabled
+        with patch('c1_llm_email_replier.adapter_manager.peft', None):
+            manager = AdapterManager(adapters=ADAPTERS)
+            assert not manager.enabled
+            with manager.use(self.pipe, ["support"]) as arguments:
+                assert arguments == {}
+
+        assert self.pipe.model is self.base_model
+
+    def test_base_model_is_not_wrapped(self):
+        """Test that the model is only wrapped when an adapter is used."""
+
+        with self.manager.use(self.pipe, [None, "", "undefined"]) as arguments:
+            assert arguments == {}
+
+        assert self.pipe.model is self.base_model
+        self.peft.PeftModel.from_pretrained.assert_not_called()
+
+    def test_load_and_activate_adapter(self):
+        """Test that the first adapter wraps the model and the next ones are loaded on it."""
+
+        with self.manager.use(self.pipe, ["support", "support"]) as arguments:
+            assert arguments == {}
+            model = self.pipe.model
+            assert isinstance(model, FakePeftModel)
+            assert model.base_model is self.base_model
+            assert model.active == "support"
+
+        with self.manager.use(self.pipe, ["sales"]) as arguments:
+            assert arguments == {}
+            assert self.pipe.model is model
+            assert model.active == "sales"
+
+        with self.manager.use(self.pipe, ["support"]):
+            assert model.active == "support"
+
+        assert model.calls == [("load", "sales"), ("set", "sales"), ("set", "support")]
+        metrics = self.manager.metrics()
+        assert metrics["loaded"] == ["sales", "support"]
+        assert metrics["loads"] == 2
+        assert metrics["switches"] == 2
+        assert self.mov.debug.call_count == 2
+
+    def test_mixed_batch(self):
+        """Test that a batch with several adapters, or the base model, selects the adapter of each prompt."""
+
+        with self.manager.use(self.pipe, ["support", None, "sales", "support"]) as arguments:
+            assert arguments == {'adapter_names': ["support", BASE_ADAPTER, "sales", "support"]}
+
+        with self.manager.use(self.pipe, [None]) as arguments:
+            assert arguments == {'adapter_names': [BASE_ADAPTER]}
+
+        assert self.manager.metrics()["mixed_batches"] == 2
+
+    def test_evict_least_recently_used(self):
+        """Test that the least recently used adapter is unloaded when the cache is full."""
+
+        for name in ("support", "sales", "support", "legal"):
+            with self.manager.use(self.pipe, [name]):
+                pass
+
+        assert "delete" in [call for call, _name in self.pipe.model.calls]
+        assert ("delete", "sales") in self.pipe.model.calls
+        assert set(self.pipe.model.adapters) == {"support", "legal"}
+        assert self.manager.metrics()["evictions"] == 1
+
+    def test_do_not_evict_adapters_in_use(self):
+        """Test that the adapters that are generating are not unloaded."""
+
+        with self.manager.use(self.pipe, ["support", "sales"]):
+            with self.manager.use(self.pipe, ["legal", None]):
+                assert set(self.pipe.model.adapters) == {"support", "sales", "legal"}
+
+            # Unloaded when it is released, because the others are still in use
+            assert set(self.pipe.model.adapters) == {"support", "sales"}
+
+        assert self.manager.metrics()["evictions"] == 1
+
+    def test_wait_for_generations_with_other_adapter(self):
+        """Test that an adapter is not activated while another one is generating."""
+
+        events = []
+        started = threading.Event()
+
+        def generate(name):
+            with self.manager.use(self.pipe, [name]):
+                events.append(("start", name, self.pipe.model.active))
+                started.set()
+                time.sleep(0.1)
+                events.append(("end", name, self.pipe.model.active))
+
+        first = threading.Thread(target=generate, args=("support",))
+        first.start()
+        started.wait(1)
+        second = threading.Thread(target=generate, args=("sales",))
+        second.start()
+        first.join(2)
+        second.join(2)
+
+        assert events == [("start", "support", "support"), ("end", "support", "support"), ("start", "sales", "sales"), ("end", "sales", "sales")]
+
+    def test_generate_while_other_adapter_is_loaded(self):
+        """Test that the generations with a loaded adapter do not wait for the adapters that are being loaded."""
+
+        with self.manager.use(self.pipe, ["support"]):
+            pass
+
+        model = self.pipe.model
+        loading = threading.Event()
+        release = threading.Event()
+        load_adapter = model.load_adapter
+
+        def slow_load_adapter(source, adapter_name):
+            loading.set()
+            release.wait(2)
+            load_adapter(source, adapter_name)
+
+        def generate():
+            with self.manager.use(self.pipe, [None, "sales"]):
+                pass
+
+        model.load_adapter = slow_load_adapter
+        loaders = [threading.Thread(target=generate) for _ in range(2)]
+        for loader in loaders:
+            loader.start()
+        assert loading.wait(1)
+
+        start = time.monotonic()
+        with self.manager.use(self.pipe, ["support"]):
+            assert model.active == "support"
+        assert time.monotonic() - start < 0.5
+
+        release.set()
+        for loader in loaders:
+            loader.join(2)
+        # The adapter is loaded once, although two generations need it
+        assert self.manager.metrics()["loads"] == 2
+        assert set(model.adapters) == {"support", "sales"}
+
+    def test_forget_adapters_of_replaced_model(self):
+        """Test that the adapters are loaded again when the model of the pipeline is replaced."""
+
+        with self.manager.use(self.pipe, ["support"]):
+            pass
+
+        other_model = MagicMock()
+        self.pipe.model = other_model
+        with self.manager.use(self.pipe, ["support"]):
+            assert self.pipe.model.base_model is other_model
+
+        assert self.peft.PeftModel.from_pretrained.call_count == 2
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,51 @@
+# 
+# This file is part of the C1_llm_email_replier distribution (https://github.com/VALAWAI/C1_llm_email_replier).
+# Copyright (c) 2022-2026 VALAWAI (https://valawai.eu/).
+# 
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+# 
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+# 
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import asyncio
+import json
+import threading
+import unittest
+from unittest.mock import MagicMock
+
+from c1_llm_email_replier.async_change_parameters_handler import AsyncChangeParametersHandler
+from c1_llm_email_replier.async_message_service import AsyncMessageService
+from c1_llm_email_replier.async_mov import AsyncMOV
+from c1_llm_email_replier.component_config import ConfigStore
+
+
+class TestAsyncChangeParametersHandler(unittest.TestCase):
+    """Class to test the changes of the parameters from an asyncio event loop."""
+
+    def test_change_parameters_out_of_the_event_loop(self):
+        """Test that the parameters are changed and persisted on a worker thread."""
+
+        config_store = ConfigStore()
+        threads = []
+        config_store.save = lambda: threads.append(threading.current_thread())
+        mov = MagicMock(spec=AsyncMOV)
+        handler = AsyncChangeParametersHandler(MagicMock(spec=AsyncMessageService), mov, config_store=config_store)
+
+        asyncio.run(handler.handle_message(None, None, None, json.dumps({"temperature": 0.2}).encode('utf-8')))
+
+        assert config_store.current.temperature == 0.2
+        assert len(threads) == 1
+        assert threads[0] is not threading.main_thread()
+        mov.info.assert_called_once()
+
+
+if __name__ == '__main__':
+    unittest.main()
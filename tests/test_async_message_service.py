@@ -0,0 +1,201 @@
+# 
+# This file is part of the C1_llm_email_replier distribution (https://github.com/VALAWAI/C1_llm_email_replier).
+# Copyright (c) 2022-2026 VALAWAI (https://valawai.eu/).
+# 
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+# 
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+# 
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+
+import asyncio
+import json
+import time
+import unittest
+from unittest.mock import MagicMock
+
+import pika
+
+from amqp_broker_stand_in import AMQPBrokerStandIn
+
+from c1_llm_email_replier.async_message_service import AsyncMessageService
+
+
+class TestAsyncMessageService(unittest.TestCase):
+    """Class to test the asyncio service to interact with the rabbitMQ"""
+
+    def setUp(self):
+        """Create the message service."""
+
+        self.message_service=AsyncMessageService()
+
+    def tearDown(self):
+        """Stops the message service."""
+
+        self.message_service.close()
+
+    def test_should_not_initilize_to_an_undefined_server(self):
+        """Test that can not register to an undefined server"""
+
+        error=None
+        before_test=int(time.time())
+        retry_sleep_seconds=1
+        max_retries=3
+        try:
+
+            AsyncMessageService(host='undefined',max_retries=max_retries,retry_sleep_seconds=retry_sleep_seconds)
+
+        except ValueError as e:
+            # Ignored
+            error=e
+
+        after_test=int(time.time())
+        assert error is not None
+        expected_test_time=before_test+retry_sleep_seconds*max_retries
+        assert abs(expected_test_time-after_test) <= retry_sleep_seconds
+
+    def test_publish_and_listen(self):
+        """Test that is publish and listen for messages with a plain callback."""
+
+        queue="Queue_to_test_async_message_service"
+        msgs=[]
+        def callback(_ch, _method, _properties, body):
+            return msgs.append(body)
+        self.message_service.listen_for(queue,callback)
+        self.message_service.start_consuming_and_forget()
+        msg={
+            "id": 1,
+            "name": "name"
+        }
+        self.message_service.publish_to(queue,msg)
+        for _i in range(10):
+
+            if len(msgs) != 0:
+                break
+
+            time.sleep(1)
+
+        assert len(msgs) == 1
+        assert msg == json.loads(msgs[0])
+
+    def test_publish_and_listen_with_coroutines(self):
+        """Test that the coroutine listeners process the messages concurrently."""
+
+        queue="Queue_to_test_async_message_service_coroutines"
+        msgs=[]
+        async def callback(_ch, _method, _properties, body):
+            await asyncio.sleep(1)
+            msgs.append(body)
+        self.message_service.listen_for(queue,callback)
+        self.message_service.start_consuming_and_forget()
+        for i in range(100):
+            self.message_service.publish_to(queue,{"id": i})
+
+        for _i in range(10):
+
+            if len(msgs) == 100:
+                break
+
+            time.sleep(1)
+
+        # All the messages sleep at the same time
+        assert len(msgs) == 100
+
+
+class TestAsyncMessageServiceFailures(unittest.TestCase):
+    """Class to test how the asyncio service to interact with the rabbitMQ reacts to failures."""
+
+    def setUp(self):
+        """Create the message service connected to a stand-in broker."""
+
+        self.broker=AMQPBrokerStandIn(heartbeat=1)
+        self.message_service=AsyncMessageService(host='127.0.0.1',port=self.broker.port,heartbeat=1,max_retries=3,retry_sleep_seconds=1)
+        self.msgs=[]
+        async def callback(_ch, _method, _properties, body):
+            self.msgs.append(json.loads(body))
+        self.message_service.listen_for("Queue_to_test_async_failures",callback)
+
+    def tearDown(self):
+        """Stops the message service and the broker."""
+
+        self.message_service.close()
+        self.broker.stop()
+
+    def __assert_received(self, msg):
+        """Check that a message is received."""
+
+        for _i in range(50):
+
+            if msg in self.msgs:
+                return
+
+            time.sleep(0.1)
+
+        self.fail(f"Not received {msg}")
+
+    def test_heartbeats_before_start_consuming(self):
+        """Test that the connection survives while the caller is busy and does not consume."""
+
+        time.sleep(8)
+
+        self.message_service.publish_to("Queue_to_test_async_failures",{"id": 1})
+        self.__assert_received({"id": 1})
+        assert self.broker.accepted_connections == 1
+
+    def test_reconnect_fast_after_a_network_partition(self):
+        """Test that a dead connection is detected by the heartbeats and recovered."""
+
+        self.message_service.publish_to("Queue_to_test_async_failures",{"id": 1})
+        self.__assert_received({"id": 1})
+
+        partition_at=time.time()
+        self.broker.freeze()
+        for _i in range(300):
+
+            if self.broker.accepted_connections > 1:
+                break
+
+            time.sleep(0.1)
+
+        recovered_in=time.time()-partition_at
+        assert self.broker.accepted_connections == 2
+        assert recovered_in < 20, f"Recovered after {recovered_in}s"
+        time.sleep(1)
+        self.message_service.publish_to("Queue_to_test_async_failures",{"id": 2})
+        self.__assert_received({"id": 2})
+
+    def test_fail_the_actions_of_a_closed_channel(self):
+        """Test that waiting for an action fails when its channel is closed."""
+
+        channel=MagicMock()
+        async def declare():
+            declared=self.message_service.loop.create_future()
+            waiting=asyncio.ensure_future(self.message_service._wait_for(channel,declared,"declare a queue"))
+            await asyncio.sleep(0)
+            on_close=channel.add_on_close_callback.call_args.args[0]
+            on_close(channel,pika.exceptions.ChannelClosedByBroker(404,"NOT_FOUND"))
+            return await waiting
+
+        with self.assertRaises(pika.exceptions.ChannelClosedByBroker):
+            asyncio.run_coroutine_threadsafe(declare(),self.message_service.loop).result(timeout=5)
+
+    def test_fail_the_actions_that_are_not_completed_on_time(self):
+        """Test that waiting for an action fails when the broker does not complete it."""
+
+        self.message_service.operation_timeout=0.1
+        async def declare():
+            return await self.message_service._wait_for(MagicMock(),self.message_service.loop.create_future(),"declare a queue")
+
+        with self.assertRaises(TimeoutError):
+            asyncio.run_coroutine_threadsafe(declare(),self.message_service.loop).result(timeout=5)
+
+if __name__ == '__main__':
+    unittest.main()
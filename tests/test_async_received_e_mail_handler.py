@@ -0,0 +1,166 @@
+# 
+# This file is part of the C1_llm_email_replier distribution (https://github.com/VALAWAI/C1_llm_email_replier).
+# Copyright (c) 2022-2026 VALAWAI (https://valawai.eu/).
+# 
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+# 
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+# 
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+
+import asyncio
+import os
+import time
+import unittest
+from unittest.mock import patch, MagicMock
+
+from c1_llm_email_replier.async_message_service import AsyncMessageService
+from c1_llm_email_replier.async_mov import AsyncMOV
+from c1_llm_email_replier.async_received_e_mail_handler import AsyncReceivedEMailHandler
+from c1_llm_email_replier.received_e_mail_payload import ReceivedEMailPayload
+from c1_llm_email_replier.sender_fairness import SenderFairness
+from c1_llm_email_replier.thread_coalescer import ThreadCoalescer
+
+
+class TestAsyncReceivedEMailHandler(unittest.TestCase):
+    """Unit tests for AsyncReceivedEMailHandler using a mocked generator and mocked services."""
+
+    def setUp(self):
+        self.mock_message_service = MagicMock(spec=AsyncMessageService)
+        self.mock_mov = MagicMock(spec=AsyncMOV)
+
+        with patch('c1_llm_email_replier.received_e_mail_handler.EMailReplierGenerator') as mock_gen_class, \
+                patch.dict(os.environ, {'REPLY_MAX_WORKERS': '4'}):
+            self.mock_generator = mock_gen_class.return_value
+            self.handler = AsyncReceivedEMailHandler(self.mock_message_service, self.mock_mov)
+
+        self.mock_generator.generate_reply.return_value = ("Re: Test", "Default reply content")
+
+    def tearDown(self):
+        self.handler.executor.shutdown(wait=True)
+
+    def test_listen_with_a_coroutine(self):
+        """The handler must register a coroutine as listener."""
+        self.mock_message_service.listen_for.assert_called_once()
+        callback = self.mock_message_service.listen_for.call_args[0][1]
+        assert asyncio.iscoroutinefunction(callback)
+
+    def test_not_reply_if_not_exist_an_address_to_reply(self):
+        """Handler should log an ERROR when there is no FROM or CC/BCC address to reply to."""
+        e_mail = ReceivedEMailPayload(**
+            {
+                'subject': 'Subject',
+                'addresses': [{'type': 'TO', 'address': 'jabe@doe.eu'}]
+            }
+        )
+        asyncio.run(self.handler.handle_message(None, None, None, e_mail.model_dump_json().encode('utf-8')))
+        self.mock_mov.error.assert_called()
+        self.mock_generator.generate_reply.assert_not_called()
+
+    def test_capture_bad_message(self):
+        """Handler should log an ERROR when the message is not a valid e-mail."""
+        asyncio.run(self.handler.handle_message(None, None, None, b'{'))
+        self.mock_mov.error.assert_called()
+
+    def test_reply_logic_with_mocked_gen(self):
+        """The reply is generated on the executor and published."""
+        e_mail = ReceivedEMailPayload(**
+            {
+                'subject': "Test Subject",
+                'content': "Test Body",
+                'addresses': [{'type': 'FROM', 'address': 'from@valawai.eu'}]
+            }
+        )
+        asyncio.run(self.handler.handle_message(None, None, None, e_mail.model_dump_json().encode('utf-8')))
+        self.mock_generator.generate_reply.assert_called_once_with("Test Subject", "Test Body", None)
+        self.mock_message_service.publish_to.assert_called_once()
+
+    def test_acknowledge_the_message_after_processing(self):
+        """The message is acknowledged even if it can not be processed."""
+        channel = MagicMock()
+        method = MagicMock(delivery_tag=3)
+        asyncio.run(self.handler.handle_message(channel, method, None, b'{'))
+        self.mock_message_service.ack.assert_called_once_with(channel, 3)
+
+    def test_delay_e_mails_over_quota(self):
+        """The message of a sender over its quota is acknowledged and published again to be delivered when the quota is restored."""
+        self.handler.fairness = SenderFairness(quota_tokens=1, over_quota="defer")
+        self.handler.fairness.consume('from@valawai.eu', 1)
+        e_mail = ReceivedEMailPayload(**
+            {
+                'subject': "Test Subject",
+                'content': "Test Body",
+                'addresses': [{'type': 'FROM', 'address': 'from@valawai.eu'}]
+            }
+        )
+        channel = MagicMock()
+        asyncio.run(self.handler.handle_message(channel, MagicMock(delivery_tag=4), None, e_mail.model_dump_json().encode('utf-8')))
+        self.mock_message_service.ack.assert_called_once_with(channel, 4)
+        self.mock_generator.generate_reply.assert_not_called()
+
+        queue, _msg = self.mock_message_service.publish_to.call_args.args
+        self.assertEqual(queue, AsyncReceivedEMailHandler.RECEIVED_EMAIL_TOPIC)
+        self.assertGreater(self.mock_message_service.publish_to.call_args.kwargs['delay'], 0)
+
+    def test_process_messages_concurrently(self):
+        """Multiple messages are in-flight while the generation is done on the executor."""
+
+        def slow_reply(subject, _content, _parameters):
+            time.sleep(0.2)
+            return f"Re: {subject}", "Reply"
+
+        self.mock_generator.generate_reply.side_effect = slow_reply
+        bodies = [
+            ReceivedEMailPayload(**
+                {
+                    'subject': f"Subject {i}",
+                    'addresses': [{'type': 'FROM', 'address': 'from@valawai.eu'}]
+                }
+            ).model_dump_json().encode('utf-8')
+            for i in range(4)
+        ]
+
+        async def process_all():
+            await asyncio.gather(*(self.handler.handle_message(None, None, None, body) for body in bodies))
+
+        start = time.time()
+        asyncio.run(process_all())
+        assert time.time() - start < 0.7
+        assert self.mock_message_service.publish_to.call_count == 4
+
+    def test_reply_once_to_the_e_mails_of_a_conversation(self):
+        """The follow-ups of a sender on the same conversation are replied together."""
+        self.handler.coalescer = ThreadCoalescer(window=0.1)
+        channel = MagicMock()
+        bodies = [
+            ReceivedEMailPayload(**
+                {
+                    'subject': subject,
+                    'content': content,
+                    'addresses': [{'type': 'FROM', 'address': 'from@valawai.eu'}]
+                }
+            ).model_dump_json().encode('utf-8')
+            for subject, content in (("Meeting", "Can we meet?"), ("RE: meeting", "Forgot the agenda"))
+        ]
+
+        async def process_all():
+            for tag, body in enumerate(bodies):
+                await self.handler.handle_message(channel, MagicMock(delivery_tag=tag), None, body)
+            while self.mock_message_service.ack.call_count < 2:
+                await asyncio.sleep(0.05)
+
+        asyncio.run(asyncio.wait_for(process_all(), 5))
+        self.mock_generator.generate_reply.assert_called_once_with("Meeting", "Can we meet?\n\nForgot the agenda", None)
+        self.mock_message_service.publish_to.assert_called_once()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -16,7 +16,6 @@
 # along with this program. If not, see <http://www.gnu.org/licenses/>.
 #
 
-import os
 import random
 import re
 import unittest
@@ -26,6 +25,7 @@ from mov_api import mov_get_log_message_with
 from unittest_parametrize import ParametrizedTestCase, param, parametrize
 
 from c1_llm_email_replier.change_parameters_handler import ChangeParametersHandler
+from c1_llm_email_replier.component_config import ConfigStore
 from c1_llm_email_replier.message_service import MessageService
 from c1_llm_email_replier.mov import MOV
 
@@ -91,12 +91,10 @@ class TestChangeParametersHandler(unittest.TestCase):
       'system_prompt': 'You are a polite email replier who used as contact info the e-mail ' + str(uuid.uuid4()) + '@valawai.eu'
     }
     self.__assert_process_change_parameters('INFO', parameters)
+    config = ConfigStore.default().current
     for param_name in parameters:
 
-      expected = str(parameters[param_name])
-      env_property_name = param_name.upper()
-      env_property = os.getenv(env_property_name)
-      assert expected == env_property
+      assert parameters[param_name] == getattr(config, param_name)
 
 
   def test_not_change_max_new_tokens_with_a_bad_value(self):
@@ -135,7 +133,7 @@ class TestChangeParametersHandler(unittest.TestCase):
       'max_new_tokens':max_new_tokens
     }
     self.__assert_process_change_parameters('INFO', parameters)
-    self.assertEqual(str(max_new_tokens), os.getenv("REPLY_MAX_NEW_TOKENS"))
+    self.assertEqual(int(max_new_tokens), ConfigStore.default().current.max_new_tokens)
 
   def test_not_change_min_new_tokens_with_a_bad_value(self):
     """Check that the handler not change the 'min_new_tokens' when it is not valid
@@ -173,7 +171,7 @@ class TestChangeParametersHandler(unittest.TestCase):
       'min_new_tokens':min_new_tokens
     }
     self.__assert_process_change_parameters('INFO', parameters)
-    self.assertEqual(str(min_new_tokens), os.getenv("REPLY_MIN_NEW_TOKENS"))
+    self.assertEqual(int(min_new_tokens), ConfigStore.default().current.min_new_tokens)
 
   def test_not_change_temperature_with_a_bad_value(self):
     """Check that the handler not change the 'temperature' when it is not valid
@@ -211,7 +209,7 @@ class TestChangeParametersHandler(unittest.TestCase):
       'temperature':temperature
     }
     self.__assert_process_change_parameters('INFO', parameters)
-    self.assertEqual(str(temperature), os.getenv("REPLY_TEMPERATURE"))
+    self.assertEqual(temperature, ConfigStore.default().current.temperature)
 
   def test_not_change_top_k_with_a_bad_value(self):
     """Check that the handler not change the 'top_k' when it is not valid
@@ -249,7 +247,7 @@ class TestChangeParametersHandler(unittest.TestCase):
       'top_k':top_k
     }
     self.__assert_process_change_parameters('INFO', parameters)
-    self.assertEqual(str(top_k), os.getenv("REPLY_TOP_K"))
+    self.assertEqual(int(top_k), ConfigStore.default().current.top_k)
 
   def test_not_change_top_p_with_a_bad_value(self):
     """Check that the handler not change the 'top_p' when it is not valid
@@ -287,7 +285,7 @@ class TestChangeParametersHandler(unittest.TestCase):
       'top_p':top_p
     }
     self.__assert_process_change_parameters('INFO', parameters)
-    self.assertEqual(str(top_p), os.getenv("REPLY_TOP_P"))
+    self.assertEqual(top_p, ConfigStore.default().current.top_p)
 
   def test_not_change_system_prompt_with_a_prompt_length_too_short(self):
     """Check that the handler not change the 'system_prompt' if the value is less than 10 characters
@@ -316,7 +314,7 @@ class TestChangeParametersHandler(unittest.TestCase):
       'system_prompt':system_prompt
     }
     self.__assert_process_change_parameters('INFO', parameters)
-    self.assertEqual(system_prompt, os.getenv("REPLY_SYSTEM_PROMPT"))
+    self.assertEqual(system_prompt, ConfigStore.default().current.system_prompt)
     
   def test_change_parameters(self):
     """Check that the handler change the parameters
@@ -335,8 +333,8 @@ class TestChangeParametersHandler(unittest.TestCase):
       'system_prompt':system_prompt
     }
     self.__assert_process_change_parameters('INFO', parameters)
-    self.assertEqual(str(max_new_tokens), os.getenv("REPLY_MAX_NEW_TOKENS"))
-    self.assertEqual(str(temperature), os.getenv("REPLY_TEMPERATURE"))
-    self.assertEqual(str(top_k), os.getenv("REPLY_TOP_K"))
-    self.assertEqual(str(top_p), os.getenv("REPLY_TOP_P"))
-    self.assertEqual(system_prompt, os.getenv("REPLY_SYSTEM_PROMPT"))
+    self.assertEqual(int(max_new_tokens), ConfigStore.default().current.max_new_tokens)
+    self.assertEqual(temperature, ConfigStore.default().current.temperature)
+    self.assertEqual(int(top_k), ConfigStore.default().current.top_k)
+    self.assertEqual(top_p, ConfigStore.default().current.top_p)
+    self.assertEqual(system_prompt, ConfigStore.default().current.system_prompt)
@@ -70,6 +70,42 @@ class TestChangeParametersPayload(unittest.TestCase):
 		# Can load a change parameters without a bad value
 		assert error
 
+	def test_load_language_profiles(self):
+		"""Test can define the profiles of the languages"""
+
+		change_parameters = ChangeParametersPayload(language_profiles={"ca": {"model_id": "catalan-model", "system_prompt": "Respon sempre en català", "max_new_tokens": 200}})
+		profile = change_parameters.language_profiles["ca"]
+		assert profile.model_id == "catalan-model"
+		assert profile.system_prompt == "Respon sempre en català"
+		assert math.isclose(profile.max_new_tokens, 200)
+
+		with self.assertRaises(ValidationError):
+			ChangeParametersPayload(language_profiles={"catalan": {"model_id": "catalan-model"}})
+
+		with self.assertRaises(ValidationError):
+			ChangeParametersPayload(language_profiles={"nl": {"model_id": "dutch-model"}})
+
+		with self.assertRaises(ValidationError):
+			ChangeParametersPayload(language_profiles={"ca": {"user_prompt": "Short"}})
+
+	def test_load_adapter(self):
+		"""Test can select the adapter of the component, or the base model"""
+
+		assert ChangeParametersPayload(adapter="support_persona").adapter == "support_persona"
+		assert ChangeParametersPayload(adapter="").adapter == ""
+		assert ChangeParametersPayload(language_profiles={"ca": {"adapter": "catalan.v2"}}).language_profiles["ca"].adapter == "catalan.v2"
+
+		with self.assertRaises(ValidationError):
+			ChangeParametersPayload(adapter="../adapters/other")
+
+	def test_load_kv_cache(self):
+		"""Test can select the implementation of the KV cache"""
+
+		assert ChangeParametersPayload(kv_cache="quantized").kv_cache == "quantized"
+
+		with self.assertRaises(ValidationError):
+			ChangeParametersPayload(kv_cache="paged")
+
 
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,203 @@
+# 
+# This file is part of the C1_llm_email_replier distribution (https://github.com/VALAWAI/C1_llm_email_replier).
+# Copyright (c) 2022-2026 VALAWAI (https://valawai.eu/).
+# 
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+# 
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+# 
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import json
+import os
+import tempfile
+import threading
+import unittest
+from unittest.mock import patch
+
+from c1_llm_email_replier.component_config import ComponentConfig, ConfigStore
+
+
+class TestComponentConfig(unittest.TestCase):
+    """Class to test the snapshots of the parameters of the component."""
+
+    def test_create_from_environment(self):
+        """Test create the first snapshot from the environment variables."""
+
+        with patch.dict(os.environ, {"LLM_MODEL": "model", "REPLY_MAX_NEW_TOKENS": "256.", "REPLY_TEMPERATURE": "0.5", "MOV_LOG_SAMPLING": '{"INFO": 0.5}', "REPLY_TOP_K": "undefined"}):
+            config = ComponentConfig.from_env()
+
+        assert config.version == 0
+        assert config.model_id == "model"
+        assert config.max_new_tokens == 256
+        assert config.temperature == 0.5
+        assert config.mov_log_sampling == {"INFO": 0.5}
+        assert config.top_k == 50
+
+    def test_snapshot_is_immutable(self):
+        """Test that a snapshot can not be modified."""
+
+        config = ComponentConfig()
+        with self.assertRaises(AttributeError):
+            config.temperature = 0.1
+
+        with self.assertRaises(TypeError):
+            config.mov_log_sampling["INFO"] = 0.1
+
+    def test_publish_changes(self):
+        """Test that the changes are published in a new version."""
+
+        config_store = ConfigStore(ComponentConfig())
+        first = config_store.current
+        config = config_store.publish(max_new_tokens=300.0, top_k=10.0, system_prompt=None)
+
+        assert config is config_store.current
+        assert config.version == 1
+        assert config.max_new_tokens == 300
+        assert config.top_k == 10
+        assert config.system_prompt == first.system_prompt
+        assert first.version == 0
+        assert first.max_new_tokens == 256
+
+    def test_fail_publish_undefined_parameter(self):
+        """Test that can not publish a parameter that is not defined."""
+
+        config_store = ConfigStore(ComponentConfig())
+        with self.assertRaises(ValueError):
+            config_store.publish(undefined=1)
+
+        with self.assertRaises(ValueError):
+            config_store.publish(max_new_tokens="undefined")
+
+        assert config_store.current.version == 0
+
+    def test_publish_from_multiple_threads(self):
+        """Test that each publication obtains its own version."""
+
+        config_store = ConfigStore(ComponentConfig())
+        def publish():
+            for _i in range(100):
+                config_store.publish(temperature=0.5)
+        threads = [threading.Thread(target=publish) for _i in range(10)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        assert config_store.current.version == 1000
+
+    def test_share_default_store(self):
+        """Test that the default store is shared."""
+
+        assert ConfigStore.default() is ConfigStore.default()
+
+    def test_save_and_restore_parameters(self):
+        """Test that the persisted parameters are restored by a new store."""
+
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "parameters.json")
+            config_store = ConfigStore(ComponentConfig())
+            config_store.publish(model_id="test-model", top_k=10, mov_log_sampling={"DEBUG": 0.5})
+            assert config_store.save(path)
+            assert os.listdir(directory) == ["parameters.json"]
+
+            restored = ConfigStore(ComponentConfig()).restore(path)
+
+        assert restored.model_id == "test-model"
+        assert restored.top_k == 10
+        assert restored.mov_log_sampling == {"DEBUG": 0.5}
+        assert restored.to_dict() == config_store.current.to_dict()
+
+    def test_language_profiles(self):
+        """Test that the language profiles are validated, read-only and persisted."""
+
+        with patch.dict(os.environ, {"LANGUAGE_PROFILES": '{"ES": {"system_prompt": "Responde siempre en castellano"}}'}):
+            config = ComponentConfig.from_env()
+
+        assert config.language_profiles == {"es": {"system_prompt": "Responde siempre en castellano"}}
+        with self.assertRaises(TypeError):
+            config.language_profiles["es"]["model_id"] = "other"
+
+        config_store = ConfigStore(config)
+        with self.assertRaises(ValueError):
+            config_store.publish(language_profiles={"ca": {"temperature": 2.0}})
+        with self.assertRaises(ValueError):
+            config_store.publish(language_profiles={"xx": {"system_prompt": "Reply in a language without samples"}})
+
+        config = config_store.publish(language_profiles={"ca": {"model_id": "catalan-model", "top_k": 10.0}})
+        assert config.language_profiles == {"ca": {"model_id": "catalan-model", "top_k": 10}}
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "parameters.json")
+            assert config_store.save(path)
+            restored = ConfigStore(ComponentConfig()).restore(path)
+
+        assert restored.language_profiles == config.language_profiles
+
+    def test_adapter(self):
+        """Test that the adapter is read from the environment and that the base model is used by default."""
+
+        assert ComponentConfig().adapter == ""
+        with patch.dict(os.environ, {"REPLY_ADAPTER": "support_persona"}):
+            config = ComponentConfig.from_env()
+
+        assert config.adapter == "support_persona"
+        assert ConfigStore(config).publish(adapter="").adapter == ""
+
+    def test_kv_cache(self):
+        """Test that the KV cache implementation is read from the environment and that the dynamic one is used by default."""
+
+        assert ComponentConfig().kv_cache == 'dynamic'
+        with patch.dict(os.environ, {"KV_CACHE": "Quantized"}):
+            config = ComponentConfig.from_env()
+
+        assert config.kv_cache == 'quantized'
+        assert ConfigStore(config).publish(kv_cache='offloaded').kv_cache == 'offloaded'
+
+    def test_restore_without_persisted_parameters(self):
+        """Test that the parameters do not change if they have not been persisted."""
+
+        with tempfile.TemporaryDirectory() as directory:
+            config_store = ConfigStore(ComponentConfig())
+            config = config_store.restore(os.path.join(directory, "parameters.json"))
+
+        assert config is config_store.current
+        assert config.version == 0
+
+    def test_restore_ignore_bad_persisted_parameters(self):
+        """Test that a bad parameters file does not stop the component."""
+
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "parameters.json")
+            with open(path, "w") as parameters_file:
+                parameters_file.write("{bad json")
+            config_store = ConfigStore(ComponentConfig())
+            config = config_store.restore(path)
+
+            with open(path, "w") as parameters_file:
+                json.dump({"top_k": 5, "undefined": 1}, parameters_file)
+            restored = config_store.restore(path)
+
+        assert config.version == 0
+        assert restored.top_k == 5
+
+    def test_save_parameters_into_log_dir(self):
+        """Test that by default the parameters are persisted next to the component identifier."""
+
+        with tempfile.TemporaryDirectory() as directory, patch.dict(os.environ, {"LOG_DIR": directory}):
+            config_store = ConfigStore(ComponentConfig())
+            config_store.publish(temperature=0.1)
+            assert config_store.save()
+
+            with open(os.path.join(directory, "parameters.json")) as parameters_file:
+                assert json.load(parameters_file)["temperature"] == 0.1
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,113 @@
+# 
+# This file is part of the C1_llm_email_replier distribution (https://github.com/VALAWAI/C1_llm_email_replier).
+# Copyright (c) 2022-2026 VALAWAI (https://valawai.eu/).
+# 
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+# 
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+# 
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import threading
+import unittest
+from unittest.mock import MagicMock, patch
+
+from c1_llm_email_replier.concurrency_controller import ConcurrencyController
+
+
+@patch('c1_llm_email_replier.concurrency_controller.torch')
+class TestConcurrencyController(unittest.TestCase):
+    """Class to test the adaptive concurrency of the generations."""
+
+    def run_window(self, controller, latency, seconds):
+        """Simulate a window of generations that take some seconds."""
+
+        with patch('c1_llm_email_replier.concurrency_controller.time.monotonic') as monotonic:
+            start = controller._window_start
+            monotonic.side_effect = [start, start + latency] * (controller.window - 1) + [start, start + latency, start + seconds]
+            for _i in range(controller.window):
+                with controller.slot():
+                    pass
+
+    def test_increase_while_latency_is_below_target(self, torch):
+        """Test that the concurrency increases additively up to the bounds."""
+
+        torch.get_num_threads.return_value = 8
+        batcher = MagicMock()
+        mov = MagicMock()
+        controller = ConcurrencyController(batcher, max_workers=3, max_batch_size=2, max_threads=8, target_latency=1.0, window=2, mov=mov)
+        assert (controller.workers, controller.batch_size, controller.threads) == (1, 1, 8)
+
+        for _i in range(4):
+            self.run_window(controller, 0.5, 1.0)
+
+        assert (controller.workers, controller.batch_size, controller.threads) == (3, 2, 2)
+        assert batcher.max_batch_size == 2
+        torch.set_num_threads.assert_called_with(2)
+        assert mov.debug.call_count == 2
+        assert mov.debug.call_args.args[1]["action"] == "increase"
+
+    def test_decrease_when_latency_exceeds_target(self, torch):
+        """Test that the concurrency is halved when the generations are too slow."""
+
+        torch.get_num_threads.return_value = 8
+        controller = ConcurrencyController(max_workers=8, max_batch_size=8, max_threads=8, target_latency=1.0, window=2)
+        for _i in range(5):
+            self.run_window(controller, 0.5, 1.0)
+        assert controller.workers == 6
+
+        self.run_window(controller, 2.0, 4.0)
+
+        assert (controller.workers, controller.batch_size, controller.threads) == (3, 3, 2)
+        assert controller.last_action == "decrease"
+
+    def test_decrease_when_throughput_drops(self, torch):
+        """Test that an increase that reduces the throughput is undone."""
+
+        torch.get_num_threads.return_value = 4
+        controller = ConcurrencyController(max_workers=4, max_threads=4, window=2)
+        self.run_window(controller, 0.5, 1.0)
+        assert controller.workers == 2
+
+        self.run_window(controller, 1.5, 3.0)
+
+        assert controller.workers == 1
+        assert controller.threads == 4
+
+    def test_limit_the_generations_that_run_at_the_same_time(self, torch):
+        """Test that no more generations than workers run at the same time."""
+
+        torch.get_num_threads.return_value = 1
+        controller = ConcurrencyController(max_workers=4, max_threads=1, window=100)
+        started = threading.Event()
+        release = threading.Event()
+
+        def generation():
+            with controller.slot():
+                started.set()
+                release.wait(5)
+
+        first = threading.Thread(target=generation)
+        first.start()
+        assert started.wait(5)
+        started.clear()
+        second = threading.Thread(target=generation)
+        second.start()
+        assert not started.wait(0.2)
+
+        release.set()
+        first.join(5)
+        second.join(5)
+        assert started.is_set()
+        assert controller.active == 0
+
+
+if __name__ == '__main__':
+    unittest.main()
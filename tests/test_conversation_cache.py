@@ -0,0 +1,109 @@
+# 
+# This file is part of the C1_llm_email_replier distribution (https://github.com/VALAWAI/C1_llm_email_replier).
+# Copyright (c) 2022-2026 VALAWAI (https://valawai.eu/).
+# 
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+# 
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+# 
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import unittest
+
+import torch
+from transformers import DynamicCache
+
+from c1_llm_email_replier.conversation_cache import MEGABYTE, ConversationCache, ConversationState, cache_bytes
+
+
+def kv_cache(tokens: int, layers: int = 2) -> DynamicCache:
+    """Create a KV cache of float32 with 2 heads of dimension 8 for some tokens."""
+
+    cache = DynamicCache()
+    for layer in range(layers):
+        cache.update(torch.rand(1, 2, tokens, 8), torch.rand(1, 2, tokens, 8), layer)
+    return cache
+
+
+def state(tokens: int) -> ConversationState:
+    """Create the state of a conversation with some tokens."""
+
+    return ConversationState(model_id="test-model", messages=[{"role": "system", "content": "Be brief"}], token_ids=list(range(tokens)), past_key_values=kv_cache(tokens))
+
+
+class TestConversationCache(unittest.TestCase):
+    """Class to test the cache of the KV of the conversations."""
+
+    def test_cache_bytes(self):
+        """Test the memory of the keys and the values of all the layers."""
+
+        assert cache_bytes(kv_cache(10)) == 2 * 2 * 2 * 10 * 8 * 4
+        assert cache_bytes(None) == 0
+
+    def test_prefix_length(self):
+        """Test the tokens of a prompt that can be reused from the cache."""
+
+        conversation = state(10)
+        assert conversation.prefix_length(list(range(20))) == 10
+        assert conversation.prefix_length([0, 1, 2, 7, 8]) == 3
+        assert conversation.prefix_length([5, 6]) == 0
+        # The last token of the prompt must be prefilled
+        assert conversation.prefix_length(list(range(5))) == 4
+
+    def test_reusable_cache_is_a_cropped_copy(self):
+        """Test that the cache of the conversation is not modified when it is reused."""
+
+        conversation = state(10)
+        past_key_values, reused = conversation.reusable_cache([0, 1, 2, 3, 99, 100])
+
+        assert reused == 4
+        assert past_key_values.get_seq_length() == 4
+        assert conversation.past_key_values.get_seq_length() == 10
+        assert conversation.reusable_cache([99, 100]) == (None, 0)
+
+    def test_disabled(self):
+        """Test that by default the conversations are not cached."""
+
+        assert not ConversationCache(max_memory=0).enabled
+        assert ConversationCache(max_memory=1).enabled
+
+    def test_evict_least_recently_used(self):
+        """Test that the least recently used conversations are evicted when the memory is exceeded."""
+
+        size = cache_bytes(kv_cache(100))
+        cache = ConversationCache(max_memory=2.5 * size / MEGABYTE)
+        assert cache.put("a", state(100))
+        assert cache.put("b", state(100))
+        assert cache.get("a") is not None
+        assert cache.put("c", state(100))
+
+        assert cache.get("b") is None
+        assert cache.get("a") is not None
+        assert cache.get("c") is not None
+        assert cache.size == 2 * size
+        assert cache.metrics()["evictions"] == 1
+        assert cache.metrics()["hits"] == 3
+        assert cache.metrics()["misses"] == 1
+
+    def test_replace_and_reject_large_conversations(self):
+        """Test that a conversation replaces its previous turn and that it is not cached if it does not fit."""
+
+        cache = ConversationCache(max_memory=cache_bytes(kv_cache(100)) / MEGABYTE)
+        assert cache.put("a", state(50))
+        assert cache.put("a", state(100))
+        assert cache.size == cache_bytes(kv_cache(100))
+
+        assert not cache.put("a", state(101))
+        assert cache.get("a") is None
+        assert cache.size == 0
+
+
+if __name__ == '__main__':
+    unittest.main()
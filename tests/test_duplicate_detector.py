@@ -0,0 +1,132 @@
+# 
+# This file is part of the C1_llm_email_replier distribution (https://github.com/VALAWAI/C1_llm_email_replier).
+# Copyright (c) 2022-2026 VALAWAI (https://valawai.eu/).
+# 
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+# 
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+# 
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import unittest
+
+from c1_llm_email_replier.duplicate_detector import DuplicateDetector, e_mail_fingerprint
+from c1_llm_email_replier.received_e_mail_payload import ReceivedEMailPayload
+
+
+class Clock:
+    """A clock that only advances when the test wants."""
+
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def e_mail(index: int = 0, **changes) -> ReceivedEMailPayload:
+    """Create an e-mail."""
+
+    values = {
+        'subject': f"Test {index}",
+        'content': "Test body",
+        'received_at': 1715342664,
+        'addresses': [{'type': 'FROM', 'address': 'jane@valawai.eu'}, {'type': 'TO', 'address': 'info@valawai.eu'}]
+    }
+    values.update(changes)
+    return ReceivedEMailPayload(**values)
+
+
+class TestDuplicateDetector(unittest.TestCase):
+    """Class to test the detection of the e-mails delivered several times."""
+
+    def test_fingerprint(self):
+        """Test that the fingerprint identifies the same e-mail."""
+
+        first = e_mail()
+        same = e_mail(addresses=[{'type': 'TO', 'address': 'INFO@valawai.eu'}, {'type': 'FROM', 'address': 'jane@valawai.eu'}])
+        assert e_mail_fingerprint(first) == e_mail_fingerprint(same)
+        assert e_mail_fingerprint(first) != e_mail_fingerprint(e_mail(content="Other body"))
+        assert e_mail_fingerprint(first) != e_mail_fingerprint(e_mail(received_at=1715342665))
+
+    def test_detect_duplicates(self):
+        """Test that only the first delivery of an e-mail is not a duplicate."""
+
+        detector = DuplicateDetector()
+        assert not detector.seen(e_mail())
+        assert detector.seen(e_mail())
+        assert not detector.seen(e_mail(1))
+        assert detector.duplicates == 1
+
+    def test_detect_duplicates_not_in_exact_set(self):
+        """Test that the Bloom filters remember the e-mails forgotten by the exact set."""
+
+        detector = DuplicateDetector(exact_size=2)
+        for index in range(10):
+            assert not detector.seen(e_mail(index))
+
+        assert len(detector._recent) == 2
+        assert detector.seen(e_mail(0))
+
+    def test_forget_after_the_window(self):
+        """Test that the e-mails are forgotten after two windows."""
+
+        clock = Clock()
+        detector = DuplicateDetector(window=60, clock=clock)
+        assert not detector.seen(e_mail())
+        clock.now = 90
+        assert detector.seen(e_mail())
+
+        clock.now = 200
+        assert not detector.seen(e_mail(1))
+        assert not detector.seen(e_mail())
+
+    def test_confirm_the_hits_of_the_filters(self):
+        """Test that the false positives of the filters are not duplicates while the exact set has all their e-mails."""
+
+        bloom_only = DuplicateDetector(capacity=10, false_positive_rate=0.5, exact_size=0)
+        assert sum(bloom_only.seen(e_mail(index)) for index in range(200)) > 0
+
+        detector = DuplicateDetector(capacity=10, false_positive_rate=0.5, exact_size=1000)
+        assert sum(detector.seen(e_mail(index)) for index in range(200)) == 0
+        assert detector.seen(e_mail(150))
+
+    def test_fixed_memory(self):
+        """Test that the memory does not grow with the e-mails received."""
+
+        detector = DuplicateDetector(capacity=100, exact_size=10)
+        arrays = (id(detector._current.array), id(detector._previous.array))
+        sizes = (len(detector._current.array), len(detector._previous.array))
+        false_positives = sum(detector.seen(e_mail(index)) for index in range(1000))
+
+        assert {id(detector._current.array), id(detector._previous.array)} == set(arrays)
+        assert (len(detector._current.array), len(detector._previous.array)) == sizes
+        assert len(detector._recent) == 10
+        assert false_positives < 5
+
+    def test_accept_expected_delivery(self):
+        """Test that an e-mail published again by the component is not a duplicate."""
+
+        detector = DuplicateDetector()
+        assert not detector.seen(e_mail())
+        detector.expect(e_mail())
+        assert not detector.seen(e_mail())
+        assert detector.seen(e_mail())
+
+    def test_disabled(self):
+        """Test that without window the duplicates are not detected."""
+
+        detector = DuplicateDetector(window=0)
+        assert not detector.seen(e_mail())
+        assert not detector.seen(e_mail())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,130 @@
+# 
+# This file is part of the C1_llm_email_replier distribution (https://github.com/VALAWAI/C1_llm_email_replier).
+# Copyright (c) 2022-2026 VALAWAI (https://valawai.eu/).
+# 
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+# 
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+# 
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import unittest
+
+from c1_llm_email_replier.e_mail_classifier import AUTO_REPLY, AUTOMATED, BOUNCE, NO_REPLY_SENDER, OWN_REPLY, THREAD_LOOP, EMailClassifier
+
+
+class Clock:
+    """A clock that only advances when the test wants."""
+
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+class TestEMailClassifier(unittest.TestCase):
+    """Class to test the detection of the e-mails that must not be replied by the LLM."""
+
+    def test_reply_human_e_mails(self):
+        """Test that the e-mails written by people are replied."""
+
+        classifier = EMailClassifier()
+        assert classifier.classify("jane.doe@valawai.eu", "How to create a VALAWAI component?", "Can you help me?") is None
+
+    def test_detect_no_reply_senders(self):
+        """Test detect the addresses that do not accept replies."""
+
+        classifier = EMailClassifier()
+        for sender in ("noreply@valawai.eu", "No-Reply@valawai.eu", "do_not_reply@valawai.eu", "MAILER-DAEMON@valawai.eu", "bounces+123@valawai.eu"):
+            assert classifier.classify(sender, "Hello", "Hello") == NO_REPLY_SENDER, sender
+
+        assert classifier.classify("noreplyjane@valawai.eu", "Hello", "Hello") is None
+
+    def test_detect_by_subject(self):
+        """Test detect the bounces and the automatic replies by their subject."""
+
+        classifier = EMailClassifier()
+        assert classifier.classify("jane@valawai.eu", "Undeliverable: Re: Test", "") == BOUNCE
+        assert classifier.classify("jane@valawai.eu", "Delivery Status Notification (Failure)", "") == BOUNCE
+        assert classifier.classify("jane@valawai.eu", "Out of Office: Test", "") == AUTO_REPLY
+        assert classifier.classify("jane@valawai.eu", "Automatic reply: Test", "") == AUTO_REPLY
+        assert classifier.classify("jane@valawai.eu", "Réponse automatique : Test", "") == AUTO_REPLY
+        assert classifier.classify("jane@valawai.eu", "Abwesenheitsnotiz: Test", "") == AUTO_REPLY
+
+    def test_reply_e_mails_about_absences(self):
+        """Test that the e-mails written by people about an absence or a vacation are replied."""
+
+        classifier = EMailClassifier()
+        assert classifier.classify("jane@valawai.eu", "Vacation request", "Can I take next week off?") is None
+        assert classifier.classify("jane@valawai.eu", "Absence of the team lead", "Who approves the components?") is None
+
+    def test_detect_own_replies(self):
+        """Test detect the e-mails that contain a reply sent by the component."""
+
+        classifier = EMailClassifier()
+        classifier.remember_reply(["jane@valawai.eu"], "Re: Test", "Thanks for your e-mail.\nYou can create a component with the template.")
+
+        assert classifier.classify("jon@valawai.eu", "Fwd: Test", "> Thanks for your   e-mail.\n> You can create a component with the template.") == OWN_REPLY
+        assert classifier.classify("jon@valawai.eu", "Test", "Thanks for your e-mail.") is None
+        assert classifier.classify("jon@valawai.eu", "Test", "") is None
+
+    def test_not_detect_thread_loops_by_default(self):
+        """Test that by default the e-mails that a person writes on a thread are always replied."""
+
+        classifier = EMailClassifier()
+        for index in range(5):
+            assert classifier.classify("jane@valawai.eu", "Re: Test", f"Answer {index}") is None
+            classifier.remember_reply(["jane@valawai.eu"], "Re: Test", f"Reply {index}")
+
+    def test_detect_thread_loops(self):
+        """Test detect the threads that the component has replied too many times."""
+
+        clock = Clock()
+        classifier = EMailClassifier(loop_max_replies=2, loop_window=60, clock=clock)
+        classifier.remember_reply(["jane@valawai.eu"], "Re: Test", "First reply")
+        assert classifier.classify("jane@valawai.eu", "Re: Re: Test", "Answer") is None
+
+        classifier.remember_reply(["jane@valawai.eu"], "Re: Re: Test", "Second reply")
+        assert classifier.classify("Jane@valawai.eu", "RE: test", "Answer") == THREAD_LOOP
+        assert classifier.classify("jon@valawai.eu", "Re: Test", "Answer") is None
+
+        clock.now = 61
+        assert classifier.classify("jane@valawai.eu", "Re: Test", "Answer") is None
+        assert len(classifier._threads) == 0
+
+    def test_detect_automated_content(self):
+        """Test detect the e-mails with phrases of the automatically generated e-mails."""
+
+        classifier = EMailClassifier()
+        assert classifier.classify("news@valawai.eu", "News", "This is an automatically generated message.") == AUTOMATED
+        assert classifier.classify("news@valawai.eu", "News", "Please do not reply. To unsubscribe click here.") == AUTOMATED
+        assert classifier.classify("jane@valawai.eu", "News", "How I unsubscribe from the list?") is None
+
+    def test_disabled(self):
+        """Test that when it is disabled all the e-mails are replied."""
+
+        classifier = EMailClassifier(enabled=False)
+        classifier.remember_reply(["jane@valawai.eu"], "Re: Test", "Reply")
+        assert classifier.classify("noreply@valawai.eu", "Out of office", "Reply") is None
+
+    def test_count_saved_generation_time(self):
+        """Test count the e-mails not replied and the generation time saved."""
+
+        classifier = EMailClassifier()
+        classifier.count_skipped(BOUNCE, 10.0)
+        classifier.count_skipped(BOUNCE, 12.0)
+        classifier.count_skipped(AUTO_REPLY, 8.0)
+        assert classifier.counters == {BOUNCE: 2, AUTO_REPLY: 1}
+        assert classifier.saved_seconds == 30.0
+
+
+if __name__ == '__main__':
+    unittest.main()
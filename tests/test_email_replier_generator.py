@@ -15,12 +15,39 @@
 # You should have received a copy of the GNU General Public License
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 #
+import contextlib
+import threading
+import time
 import unittest
 import os
 import sys
+from types import SimpleNamespace
 from unittest.mock import patch, MagicMock
 
+import torch
+from transformers import LlamaConfig
+
+from c1_llm_email_replier.component_config import ConfigStore
+from c1_llm_email_replier.conversation_cache import ConversationCache
 from c1_llm_email_replier.email_replier_generator import EMailReplierGenerator
+from c1_llm_email_replier.generation_parameters_payload import GenerationParametersPayload
+from c1_llm_email_replier.quantized_kv_cache import QuantizedKVCache
+
+class CharacterTokenizer:
+    """A tokenizer with a token by character, to generate with a tiny model."""
+
+    chat_template = None
+    eos_token_id = 0
+
+    def apply_chat_template(self, messages, **kwargs):
+        return "".join(f"<{message['role']}>{message['content']}" for message in messages) + "<assistant>"
+
+    def __call__(self, prompt, add_special_tokens=True):
+        return {"input_ids": [1 + ord(character) % 120 for character in prompt]}
+
+    def decode(self, token_ids, skip_special_tokens=False):
+        return "".join(chr(97 + int(token) % 26) for token in token_ids)
+
 
 class TestEMailReplierGenerator(unittest.TestCase):
     """Class to test the e-mail replier generator with mocking.
@@ -33,6 +60,7 @@ class TestEMailReplierGenerator(unittest.TestCase):
                     'REPLY_TOP_K', 'REPLY_TOP_P', 'REPLY_SYSTEM_PROMPT', 'REPLY_USER_PROMPT']:
             if key in os.environ:
                 del os.environ[key]
+        self.config_store = ConfigStore()
 
     def tearDown(self):
         """Restore the environment variables to their default values.
@@ -45,38 +73,128 @@ class TestEMailReplierGenerator(unittest.TestCase):
     @patch('c1_llm_email_replier.email_replier_generator.pipeline')
     @patch('c1_llm_email_replier.email_replier_generator.AutoConfig')
     def test_dynamic_parameter_updates(self, mock_config, mock_pipeline):
-        """Test that parameters are correctly updated from environment variables."""
-        generator = EMailReplierGenerator(model_id="test-model")
+        """Test that parameters are correctly updated when new parameters are published."""
+        generator = EMailReplierGenerator(model_id="test-model", config_store=self.config_store)
         
         # Default values
         self.assertEqual(generator.max_new_tokens, 256)
         self.assertEqual(generator.temperature, 0.7)
         
-        # Update env
-        os.environ['REPLY_MAX_NEW_TOKENS'] = '512'
-        os.environ['REPLY_MIN_NEW_TOKENS'] = '50'
-        os.environ['REPLY_TEMPERATURE'] = '0.9'
+        # Publish the new parameters
+        self.config_store.publish(max_new_tokens=512, min_new_tokens=50, temperature=0.9)
         
         generator.refresh_parameters()
         
         self.assertEqual(generator.max_new_tokens, 512)
         self.assertEqual(generator.min_new_tokens, 50)
         self.assertEqual(generator.temperature, 0.9)
+        # The model is not reloaded if it does not change
+        self.assertEqual(generator.model_id, "test-model")
+        self.assertEqual(mock_pipeline.call_count, 1)
+
+    @patch('c1_llm_email_replier.email_replier_generator.pipeline')
+    @patch('c1_llm_email_replier.email_replier_generator.AutoConfig')
+    def test_initialize_parameters_from_environment(self, mock_config, mock_pipeline):
+        """Test that the initial parameters are obtained from the environment variables."""
+        os.environ['LLM_MODEL'] = 'env-model'
+        os.environ['REPLY_MAX_NEW_TOKENS'] = '256.'
+        os.environ['REPLY_TOP_K'] = '10'
+        generator = EMailReplierGenerator(config_store=ConfigStore())
+
+        self.assertEqual(generator.model_id, 'env-model')
+        self.assertEqual(generator.max_new_tokens, 256)
+        self.assertEqual(generator.top_k, 10)
+
+    @patch('c1_llm_email_replier.email_replier_generator.pipeline')
+    @patch('c1_llm_email_replier.email_replier_generator.AutoConfig')
+    def test_not_refresh_if_version_not_changed(self, mock_config, mock_pipeline):
+        """Test that the environment variables are not read when refreshing the parameters."""
+        generator = EMailReplierGenerator(model_id="test-model", config_store=self.config_store)
+        
+        os.environ['REPLY_MAX_NEW_TOKENS'] = '512'
+        with patch('os.getenv') as getenv:
+            generator.refresh_parameters()
+            getenv.assert_not_called()
+
+        self.assertEqual(generator.max_new_tokens, 256)
 
     @patch('c1_llm_email_replier.email_replier_generator.pipeline')
     @patch('c1_llm_email_replier.email_replier_generator.AutoConfig')
     def test_model_id_switch_reloads_pipeline(self, mock_config, mock_pipeline):
-        """Test that changing LLM_MODEL env var triggers a pipeline re-initialization."""
-        generator = EMailReplierGenerator(model_id="model-1")
+        """Test that changing the model_id parameter triggers a pipeline re-initialization."""
+        generator = EMailReplierGenerator(model_id="model-1", config_store=self.config_store)
         generator.pipe = MagicMock() # Simulate loaded pipe
         
-        os.environ['LLM_MODEL'] = 'model-2'
+        self.config_store.publish(model_id='model-2')
         generator.refresh_parameters()
         
         self.assertEqual(generator.model_id, 'model-2')
         # Pipeline should have been called again (once in __init__/lazy check, once here)
         self.assertEqual(mock_pipeline.call_count, 2)
 
+    @patch('c1_llm_email_replier.email_replier_generator.pipeline')
+    @patch('c1_llm_email_replier.email_replier_generator.AutoConfig')
+    def test_fixed_model_is_not_switched(self, mock_config, mock_pipeline):
+        """Test that the generator of a model tier keeps its model when the model of the component changes."""
+        generator = EMailReplierGenerator(model_id="small-model", config_store=self.config_store, fixed_model=True)
+
+        self.config_store.publish(model_id='bigger-model', temperature=0.2)
+        generator.refresh_parameters()
+
+        self.assertEqual(generator.model_id, 'small-model')
+        self.assertEqual(generator.temperature, 0.2)
+        self.assertEqual(mock_pipeline.call_count, 1)
+
+    @patch('c1_llm_email_replier.email_replier_generator.pipeline')
+    @patch('c1_llm_email_replier.email_replier_generator.AutoConfig')
+    def test_refresh_from_several_threads(self, mock_config, mock_pipeline):
+        """Test that the model is reloaded once when several threads refresh the parameters."""
+        def load(*args, **kwargs):
+            time.sleep(0.05)
+            return MagicMock()
+
+        mock_pipeline.side_effect = load
+        generator = EMailReplierGenerator(model_id="model-1", config_store=self.config_store)
+
+        self.config_store.publish(model_id='model-2')
+        threads = [threading.Thread(target=generator.refresh_parameters) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(generator.model_id, 'model-2')
+        self.assertEqual(mock_pipeline.call_count, 2)
+
+    @patch('c1_llm_email_replier.email_replier_generator.pipeline')
+    @patch('c1_llm_email_replier.email_replier_generator.AutoConfig')
+    def test_generate_with_the_model_of_its_start(self, mock_config, mock_pipeline):
+        """Test that a generation keeps its model when the model is replaced while it generates."""
+        first_pipe = MagicMock()
+        second_pipe = MagicMock()
+        mock_pipeline.side_effect = [first_pipe, second_pipe]
+        first_pipe.tokenizer.apply_chat_template.side_effect = lambda messages, **kwargs: messages[1]['content']
+        generator = EMailReplierGenerator(model_id="model-1", config_store=self.config_store)
+
+        def generate(prompts, **kwargs):
+            if isinstance(prompts, list):
+                # Another thread replaces the model while this one generates, and the batch does not fit in memory
+                self.config_store.publish(model_id='model-2')
+                replacing = threading.Thread(target=generator.refresh_parameters)
+                replacing.start()
+                replacing.join()
+                raise torch.cuda.OutOfMemoryError("CUDA out of memory")
+            return [{"generated_text": "Subject: Reply\nBody"}]
+
+        first_pipe.side_effect = generate
+        replies = generator.generate_replies([("First", "Body", None), ("Second", "Body", None)])
+
+        # The smaller batches are retried with the model of the start
+        self.assertEqual(replies, [("Reply", "Body"), ("Reply", "Body")])
+        self.assertEqual(first_pipe.call_count, 3)
+        self.assertIs(generator.pipe, second_pipe)
+        second_pipe.assert_not_called()
+
     @patch('c1_llm_email_replier.email_replier_generator.pipeline')
     @patch('c1_llm_email_replier.email_replier_generator.AutoConfig')
     def test_generate_reply_with_mock(self, mock_config, mock_pipeline):
@@ -88,9 +206,240 @@ class TestEMailReplierGenerator(unittest.TestCase):
         mock_pipe.return_value = [{"generated_text": "Subject: Test\nContent of the reply"}]
         mock_pipe.tokenizer.apply_chat_template.return_value = "Mocked prompt"
         
-        generator = EMailReplierGenerator(model_id="test-model")
+        generator = EMailReplierGenerator(model_id="test-model", config_store=self.config_store)
         subject, content = generator.generate_reply(subject="Query", content="Help me")
         
         self.assertEqual(subject, "Test")
         self.assertEqual(content, "Content of the reply")
-        mock_pipe.assert_called()
\ No newline at end of file
+        mock_pipe.assert_called()
+    @patch('c1_llm_email_replier.email_replier_generator.pipeline')
+    @patch('c1_llm_email_replier.email_replier_generator.AutoConfig')
+    def test_generate_reply_with_overridden_parameters(self, mock_config, mock_pipeline):
+        """Test that the parameters of an e-mail override the component ones."""
+        mock_pipe = MagicMock()
+        mock_pipeline.return_value = mock_pipe
+        mock_pipe.return_value = [{"generated_text": "Subject: Test\nContent of the reply"}]
+        mock_pipe.tokenizer.apply_chat_template.return_value = "Mocked prompt"
+
+        generator = EMailReplierGenerator(model_id="test-model", config_store=self.config_store)
+        generator.generate_reply("Query", "Help me", GenerationParametersPayload(max_new_tokens=100, temperature=0.2))
+
+        kwargs = mock_pipe.call_args.kwargs
+        self.assertEqual(kwargs['max_new_tokens'], 100)
+        self.assertEqual(kwargs['temperature'], 0.2)
+        self.assertEqual(kwargs['top_k'], 50)
+        self.assertEqual(generator.max_new_tokens, 256)
+
+    @patch('c1_llm_email_replier.email_replier_generator.pipeline')
+    @patch('c1_llm_email_replier.email_replier_generator.AutoConfig')
+    def test_generate_replies_group_by_parameters(self, mock_config, mock_pipeline):
+        """Test that the e-mails with the same parameters are generated in the same batch."""
+        mock_pipe = MagicMock()
+        mock_pipeline.return_value = mock_pipe
+        mock_pipe.tokenizer.apply_chat_template.side_effect = lambda messages, **kwargs: messages[1]['content']
+        mock_pipe.tokenizer.pad_token = "<pad>"
+
+        def generate(prompts, **kwargs):
+            if isinstance(prompts, list):
+                return [[{"generated_text": f"Subject: Batch\n{len(prompts)}"}] for _prompt in prompts]
+            return [{"generated_text": "Subject: Single\n1"}]
+
+        mock_pipe.side_effect = generate
+
+        generator = EMailReplierGenerator(model_id="test-model", config_store=self.config_store)
+        replies = generator.generate_replies([
+            ("First", "Body", None),
+            ("Second", "Body", GenerationParametersPayload(temperature=0.1)),
+            ("Third", "Body", GenerationParametersPayload(system_prompt="Reply as a pirate, please"))
+        ])
+
+        self.assertEqual(replies, [("Batch", "2"), ("Single", "1"), ("Batch", "2")])
+        self.assertEqual(mock_pipe.call_count, 2)
+
+    @patch('c1_llm_email_replier.email_replier_generator.pipeline')
+    @patch('c1_llm_email_replier.email_replier_generator.AutoConfig')
+    def test_generate_replies_mixing_adapters(self, mock_config, mock_pipeline):
+        """Test that the e-mails that only differ on the adapter are generated in the same batch."""
+        mock_pipe = MagicMock()
+        mock_pipeline.return_value = mock_pipe
+        mock_pipe.tokenizer.apply_chat_template.side_effect = lambda messages, **kwargs: messages[1]['content']
+        mock_pipe.tokenizer.pad_token = "<pad>"
+
+        def generate(prompts, **kwargs):
+            if isinstance(prompts, list) and len(prompts) > 2:
+                raise torch.cuda.OutOfMemoryError("CUDA out of memory")
+            if isinstance(prompts, list):
+                return [[{"generated_text": f"Subject: Batch\n{name}"}] for name in kwargs['adapter_names']]
+            return [{"generated_text": "Subject: Single\nsingle"}]
+
+        mock_pipe.side_effect = generate
+        used = []
+
+        @contextlib.contextmanager
+        def use(pipe, names):
+            used.append(names)
+            yield {'adapter_names': [name or "__base__" for name in names]} if len(set(names)) > 1 else {}
+
+        adapters = MagicMock(enabled=True)
+        adapters.use.side_effect = use
+        generator = EMailReplierGenerator(model_id="test-model", config_store=self.config_store, adapters=adapters)
+        replies = generator.generate_replies([
+            ("First", "Body", GenerationParametersPayload(adapter="support")),
+            ("Second", "Body", None),
+            ("Third", "Body", GenerationParametersPayload(adapter="sales"))
+        ])
+
+        # The batch exhausts the memory, so it is split keeping the adapter of each e-mail
+        self.assertEqual(replies, [("Single", "single"), ("Batch", "__base__"), ("Batch", "sales")])
+        self.assertEqual(used, [["support", "", "sales"], ["support"], ["", "sales"]])
+
+        generator.adapters = None
+        mock_pipe.reset_mock()
+        generator.generate_replies([("First", "Body", GenerationParametersPayload(adapter="support")), ("Second", "Body", None)])
+        self.assertEqual(mock_pipe.call_count, 2)
+
+    @patch('c1_llm_email_replier.email_replier_generator.pipeline')
+    @patch('c1_llm_email_replier.email_replier_generator.AutoConfig')
+    def test_retry_smaller_batches_when_out_of_memory(self, mock_config, mock_pipeline):
+        """Test that a batch that exhausts the memory is generated in smaller batches."""
+        mock_pipe = MagicMock()
+        mock_pipeline.return_value = mock_pipe
+        mock_pipe.tokenizer.apply_chat_template.side_effect = lambda messages, **kwargs: messages[1]['content']
+
+        def generate(prompts, **kwargs):
+            if isinstance(prompts, list) and len(prompts) > 2:
+                raise torch.cuda.OutOfMemoryError("CUDA out of memory")
+            if isinstance(prompts, list):
+                return [[{"generated_text": f"Subject: Batch\n{len(prompts)}"}] for _prompt in prompts]
+            return [{"generated_text": "Subject: Single\n1"}]
+
+        mock_pipe.side_effect = generate
+
+        generator = EMailReplierGenerator(model_id="test-model", config_store=self.config_store)
+        replies = generator.generate_replies([(f"Subject {index}", "Body", None) for index in range(5)])
+
+        self.assertEqual(replies, [("Batch", "2"), ("Batch", "2"), ("Single", "1"), ("Batch", "2"), ("Batch", "2")])
+
+    @patch('c1_llm_email_replier.email_replier_generator.pipeline')
+    @patch('c1_llm_email_replier.email_replier_generator.AutoConfig')
+    def test_retry_shorter_budget_when_out_of_memory(self, mock_config, mock_pipeline):
+        """Test that a reply that exhausts the memory is generated with fewer tokens."""
+        mock_pipe = MagicMock()
+        mock_pipeline.return_value = mock_pipe
+        mock_pipe.tokenizer.apply_chat_template.return_value = "Mocked prompt"
+
+        def generate(prompt, max_new_tokens, **kwargs):
+            if max_new_tokens > 100:
+                raise RuntimeError("[enforce fail at alloc_cpu.cpp:114] DefaultCPUAllocator: can't allocate memory")
+            return [{"generated_text": f"Subject: Test\n{max_new_tokens}"}]
+
+        mock_pipe.side_effect = generate
+
+        generator = EMailReplierGenerator(model_id="test-model", config_store=self.config_store)
+        self.assertEqual(generator.generate_reply("Query", "Help me"), ("Test", "64"))
+
+        mock_pipe.side_effect = RuntimeError("Other error")
+        with self.assertRaises(RuntimeError):
+            generator.generate_reply("Query", "Help me")
+
+    @patch('c1_llm_email_replier.email_replier_generator.pipeline')
+    @patch('c1_llm_email_replier.email_replier_generator.AutoConfig')
+    def test_estimate_kv_cache(self, mock_config, mock_pipeline):
+        """Test the estimation of the memory of the KV cache."""
+        mock_pipe = MagicMock()
+        mock_pipeline.return_value = mock_pipe
+        mock_pipe.model.config = SimpleNamespace(num_hidden_layers=2, num_attention_heads=4, num_key_value_heads=2, hidden_size=64)
+        mock_pipe.model.dtype = torch.bfloat16
+        mock_pipe.tokenizer.return_value = {"input_ids": [[1] * 10, [1] * 30]}
+
+        generator = EMailReplierGenerator(model_id="test-model", config_store=self.config_store)
+
+        self.assertEqual(generator.kv_cache_bytes(["First", "Second"], 70), 2 * 2 * 2 * 16 * 2 * 100 * 2)
+
+    @patch('c1_llm_email_replier.email_replier_generator.pipeline')
+    @patch('c1_llm_email_replier.email_replier_generator.AutoConfig')
+    def test_kv_cache_implementation(self, mock_config, mock_pipeline):
+        """Test that the batches are generated with the KV cache implementation of the parameters."""
+        mock_pipe = MagicMock()
+        mock_pipeline.return_value = mock_pipe
+        mock_pipe.model.config = LlamaConfig(vocab_size=128, hidden_size=64, intermediate_size=128, num_hidden_layers=2, num_attention_heads=4, num_key_value_heads=2)
+        mock_pipe.model.dtype = torch.float32
+        mock_pipe.model.device = torch.device('cpu')
+        mock_pipe.tokenizer.return_value = {"input_ids": [[1] * 30]}
+        mock_pipe.return_value = [{"generated_text": "Subject: Reply\nBody"}]
+
+        generator = EMailReplierGenerator(model_id="test-model", config_store=self.config_store)
+        self.assertEqual(generator.kv_cache, 'dynamic')
+        dynamic_bytes = generator.kv_cache_bytes("Prompt", 70)
+        generator.generate_reply("Subject", "Content")
+        self.assertNotIn('past_key_values', mock_pipe.call_args.kwargs)
+
+        self.config_store.publish(kv_cache='quantized')
+        generator.refresh_parameters()
+        self.assertLess(generator.kv_cache_bytes("Prompt", 70), dynamic_bytes / 3)
+        generator.generate_reply("Subject", "Content")
+        self.assertIsInstance(mock_pipe.call_args.kwargs['past_key_values'], QuantizedKVCache)
+
+        # The offloaded cache only changes something when the model is not on the CPU
+        self.config_store.publish(kv_cache='offloaded')
+        generator.refresh_parameters()
+        generator.generate_reply("Subject", "Content")
+        self.assertNotIn('cache_implementation', mock_pipe.call_args.kwargs)
+        mock_pipe.model.device = torch.device('cuda')
+        generator.generate_reply("Subject", "Content")
+        self.assertEqual(mock_pipe.call_args.kwargs['cache_implementation'], 'offloaded')
+
+        # The models that the quantized cache does not support use the dynamic one
+        mock_pipe.model.config.layer_types = ["full_attention", "sliding_attention"]
+        self.config_store.publish(kv_cache='quantized')
+        generator.refresh_parameters()
+        generator.generate_reply("Subject", "Content")
+        self.assertNotIn('past_key_values', mock_pipe.call_args.kwargs)
+        self.assertEqual(generator.kv_cache, 'dynamic')
+
+    @patch('c1_llm_email_replier.email_replier_generator.pipeline')
+    @patch('c1_llm_email_replier.email_replier_generator.AutoConfig')
+    def test_reuse_the_kv_cache_of_the_conversation(self, mock_config, mock_pipeline):
+        """Test that a follow-up of a conversation only prefills the tokens of the new e-mail."""
+        from transformers import LlamaConfig, LlamaForCausalLM
+
+        torch.manual_seed(0)
+        model = LlamaForCausalLM(LlamaConfig(vocab_size=128, hidden_size=32, intermediate_size=64, num_hidden_layers=2, num_attention_heads=4, num_key_value_heads=2))
+        mock_pipeline.return_value = SimpleNamespace(model=model, tokenizer=CharacterTokenizer())
+        conversations = ConversationCache(max_memory=10)
+        generator = EMailReplierGenerator(model_id="test-model", max_new_tokens=8, config_store=self.config_store, conversation_cache=conversations)
+
+        generator.generate_reply("Meeting", "Can we meet on Monday?", conversation=("jane@valawai.eu", "meeting"))
+        first = conversations.metrics()
+        self.assertEqual(first["reused_tokens"], 0)
+        self.assertEqual(first["conversations"], 1)
+
+        _subject, content = generator.generate_reply("Re: Meeting", "Sorry, I meant Tuesday", conversation=("jane@valawai.eu", "meeting"))
+        second = conversations.metrics()
+        state = conversations.get(("jane@valawai.eu", "meeting"))
+        self.assertEqual([message["role"] for message in state.messages], ["system", "user", "assistant", "user", "assistant"])
+        self.assertEqual(state.messages[-1]["content"], content)
+        # The system prompt, the first e-mail and the start of its reply are not prefilled again
+        self.assertGreaterEqual(second["reused_tokens"], first["prefilled_tokens"])
+        self.assertLess(second["prefilled_tokens"] - first["prefilled_tokens"], second["reused_tokens"])
+
+        # The other conversations do not reuse it
+        generator.generate_reply("Budget", "Is it approved?", conversation=("john@valawai.eu", "budget"))
+        self.assertEqual(conversations.metrics()["reused_tokens"], second["reused_tokens"])
+
+    @patch('c1_llm_email_replier.email_replier_generator.pipeline')
+    @patch('c1_llm_email_replier.email_replier_generator.AutoConfig')
+    def test_derive_a_generator_with_other_parameters(self, mock_config, mock_pipeline):
+        """Test that a derived generator shares the model unless its parameters define another one."""
+        generator = EMailReplierGenerator(model_id="test-model", config_store=self.config_store)
+
+        derived = generator.derive(ConfigStore(self.config_store.current.with_changes(model_id="test-model", system_prompt="Respon sempre en català")))
+        self.assertIs(derived.pipe, generator.pipe)
+        self.assertEqual(derived.system_prompt, "Respon sempre en català")
+        self.assertNotEqual(generator.system_prompt, derived.system_prompt)
+        self.assertEqual(mock_pipeline.call_count, 1)
+
+        other = generator.derive(ConfigStore(self.config_store.current.with_changes(model_id="other-model")))
+        self.assertEqual(other.model_id, "other-model")
+        self.assertEqual(generator.model_id, "test-model")
+        self.assertEqual(mock_pipeline.call_count, 2)
@@ -19,6 +19,7 @@
 import unittest
 import os
 import logging
+from c1_llm_email_replier.component_config import ConfigStore
 from c1_llm_email_replier.email_replier_generator import EMailReplierGenerator
 
 class TestEMailReplierGeneratorIntegration(unittest.TestCase):
@@ -34,7 +35,7 @@ class TestEMailReplierGeneratorIntegration(unittest.TestCase):
         """
         # Set a small model for integration testing to save time and memory
         os.environ['LLM_MODEL'] = os.getenv('INTEGRATION_TEST_MODEL', "facebook/opt-125m")
-        cls.generator = EMailReplierGenerator()
+        cls.generator = EMailReplierGenerator(config_store=ConfigStore())
 
     @classmethod
     def tearDownClass(cls):
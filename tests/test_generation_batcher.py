@@ -0,0 +1,97 @@
+# 
+# This file is part of the C1_llm_email_replier distribution (https://github.com/VALAWAI/C1_llm_email_replier).
+# Copyright (c) 2022-2026 VALAWAI (https://valawai.eu/).
+# 
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+# 
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+# 
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import threading
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+from unittest.mock import MagicMock
+
+from c1_llm_email_replier.generation_batcher import GenerationBatcher
+
+
+class TestGenerationBatcher(unittest.TestCase):
+    """Class to test the batcher of the generation of the replies."""
+
+    def test_generate_single_e_mail(self):
+        """Test that an e-mail alone is generated without batching."""
+
+        generator = MagicMock()
+        generator.generate_reply.return_value = ("Subject", "Content")
+        batcher = GenerationBatcher(generator, max_batch_size=4, max_wait=0.01)
+
+        self.assertEqual(batcher.generate("Subject", "Body"), ("Subject", "Content"))
+        generator.generate_reply.assert_called_once_with("Subject", "Body", None)
+        generator.generate_replies.assert_not_called()
+        generator.refresh_parameters.assert_called_once()
+
+    def test_generate_concurrent_e_mails_in_a_batch(self):
+        """Test that the e-mails that wait at the same time are generated together."""
+
+        started = threading.Event()
+        release = threading.Event()
+        generator = MagicMock()
+
+        def generate_reply(subject, content, parameters):
+            started.set()
+            release.wait(5)
+            return (subject, content)
+
+        generator.generate_reply.side_effect = generate_reply
+        generator.generate_replies.side_effect = lambda e_mails: [(subject, content) for subject, content, _parameters in e_mails]
+        batcher = GenerationBatcher(generator, max_batch_size=3, max_wait=1.0)
+
+        with ThreadPoolExecutor(max_workers=4) as executor:
+            first = executor.submit(batcher.generate, "First", "1")
+            self.assertTrue(started.wait(5))
+            others = [executor.submit(batcher.generate, f"Subject {index}", str(index)) for index in range(3)]
+            release.set()
+
+            self.assertEqual(first.result(5), ("First", "1"))
+            self.assertEqual(sorted(other.result(5) for other in others), [("Subject 0", "0"), ("Subject 1", "1"), ("Subject 2", "2")])
+
+        generator.generate_replies.assert_called_once()
+        self.assertEqual(len(generator.generate_replies.call_args.args[0]), 3)
+
+    def test_close(self):
+        """Test that the thread of the batcher stops when it is closed."""
+
+        generator = MagicMock()
+        generator.generate_reply.return_value = ("Subject", "Content")
+        batcher = GenerationBatcher(generator, max_batch_size=4, max_wait=0.01)
+        self.assertEqual(batcher.generate("Subject", "Body"), ("Subject", "Content"))
+
+        batcher.close()
+        batcher._thread.join(5)
+        self.assertFalse(batcher._thread.is_alive())
+
+    def test_generation_error_is_raised_to_the_callers(self):
+        """Test that an error generating a batch is raised in the threads that wait for it."""
+
+        generator = MagicMock()
+        generator.generate_reply.side_effect = RuntimeError("Out of memory")
+        batcher = GenerationBatcher(generator, max_batch_size=2, max_wait=0.01)
+
+        with self.assertRaises(RuntimeError):
+            batcher.generate("Subject", "Body")
+
+        generator.generate_reply.side_effect = None
+        generator.generate_reply.return_value = ("Subject", "Content")
+        self.assertEqual(batcher.generate("Subject", "Body"), ("Subject", "Content"))
+
+
+if __name__ == '__main__':
+    unittest.main()
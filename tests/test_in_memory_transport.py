@@ -0,0 +1,276 @@
+# 
+# This file is part of the C1_llm_email_replier distribution (https://github.com/VALAWAI/C1_llm_email_replier).
+# Copyright (c) 2022-2026 VALAWAI (https://valawai.eu/).
+# 
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+# 
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+# 
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+
+import json
+import os
+import tempfile
+import threading
+import time
+import unittest
+from unittest.mock import patch
+
+from c1_llm_email_replier.change_parameters_handler import ChangeParametersHandler
+from c1_llm_email_replier.component_config import ComponentConfig, ConfigStore
+from c1_llm_email_replier.in_memory_transport import InMemoryBroker, InMemoryTransport
+from c1_llm_email_replier.message_service import MessageService
+from c1_llm_email_replier.mov import MOV
+from c1_llm_email_replier.received_e_mail_handler import ReceivedEMailHandler
+from c1_llm_email_replier.reply_e_mail_payload import ReplyEMailPayload
+
+
+class TestInMemoryTransport(unittest.TestCase):
+    """Class to test the transport that uses an in-memory broker."""
+
+    def setUp(self):
+        """Create the broker and the transports."""
+
+        self.broker=InMemoryBroker()
+        self.transport=InMemoryTransport(self.broker)
+
+    def tearDown(self):
+        """Close the transports."""
+
+        self.transport.close()
+
+    def __wait_until(self, condition):
+        """Wait until a condition is true."""
+
+        for _i in range(50):
+
+            if condition():
+                return
+
+            time.sleep(0.1)
+
+        self.fail("The condition is not satisfied")
+
+    def test_publish_and_listen(self):
+        """Test that is publish and listen for messages."""
+
+        msgs=[]
+        self.transport.listen_for("queue",lambda _ch, _method, _properties, body: msgs.append(body))
+        self.transport.publish("queue",json.dumps({"id": 1}))
+        self.__wait_until(lambda: len(msgs) == 1)
+        assert json.loads(msgs[0]) == {"id": 1}
+
+    def test_durable_queue_keeps_messages_until_consumed(self):
+        """Test that the messages published before listening are not lost."""
+
+        self.transport.publish("queue","1")
+        self.transport.publish("queue","2")
+        assert self.broker.message_count("queue") == 2
+
+        msgs=[]
+        self.transport.listen_for("queue",lambda _ch, _method, _properties, body: msgs.append(body))
+        self.__wait_until(lambda: msgs == [b"1", b"2"])
+        assert self.broker.message_count("queue") == 0
+
+    def test_deliver_the_delayed_messages_after_their_delay(self):
+        """Test that the broker keeps the delayed messages out of the queue until their delay expires."""
+
+        self.transport.publish("queue","1",delay=0.3)
+        assert self.transport.message_count("queue") == 0
+
+        self.__wait_until(lambda: self.transport.message_count("queue") == 1)
+
+    def test_prefetch_limits_the_messages_not_acknowledged(self):
+        """Test that a consumer does not receive more messages than its prefetch until it acknowledges them."""
+
+        deliveries=[]
+        self.transport.listen_for("queue",lambda ch, method, _properties, body: deliveries.append((ch, method.delivery_tag)),prefetch_count=2,auto_ack=False)
+        for i in range(5):
+            self.transport.publish("queue",str(i))
+
+        self.__wait_until(lambda: len(deliveries) == 2)
+        time.sleep(0.2)
+        assert len(deliveries) == 2
+        assert self.broker.message_count("queue") == 3
+
+        channel, delivery_tag = deliveries[0]
+        self.transport.ack(channel,delivery_tag)
+        self.__wait_until(lambda: len(deliveries) == 3)
+
+    def test_requeue_messages_not_acknowledged_when_closed(self):
+        """Test that the messages that are not acknowledged are delivered again."""
+
+        self.transport.listen_for("queue",lambda _ch, _method, _properties, _body: None,prefetch_count=1,auto_ack=False)
+        self.transport.publish("queue","1")
+        self.__wait_until(lambda: self.broker.message_count("queue") == 0)
+        self.transport.close()
+        assert self.broker.message_count("queue") == 1
+
+        redelivered=[]
+        other=InMemoryTransport(self.broker)
+        try:
+            other.listen_for("queue",lambda _ch, method, _properties, body: redelivered.append((method.redelivered, body)))
+            self.__wait_until(lambda: redelivered == [(True, b"1")])
+        finally:
+            other.close()
+
+    def test_requeue_the_rejected_messages(self):
+        """Test that a rejected message is delivered again, unless it is not requeued."""
+
+        deliveries=[]
+        self.transport.listen_for("queue",lambda ch, method, _properties, body: deliveries.append((ch, method, body)),prefetch_count=1,auto_ack=False)
+        self.transport.publish("queue","1")
+        self.transport.publish("queue","2")
+        self.__wait_until(lambda: len(deliveries) == 1)
+
+        channel, method, _body = deliveries[0]
+        self.transport.nack(channel,method.delivery_tag)
+        self.__wait_until(lambda: len(deliveries) == 2)
+        channel, method, body = deliveries[1]
+        assert (method.redelivered, body) == (True, b"1")
+
+        self.transport.nack(channel,method.delivery_tag,requeue=False)
+        self.__wait_until(lambda: len(deliveries) == 3)
+        assert deliveries[2][2] == b"2"
+        assert self.broker.message_count("queue") == 0
+
+    def test_deliver_first_to_the_consumers_with_more_priority(self):
+        """Test that the consumer with more priority receives the messages."""
+
+        low=[]
+        high=[]
+        self.transport.listen_for("queue",lambda _ch, _method, _properties, body: low.append(body))
+        self.transport.listen_for("queue",lambda _ch, _method, _properties, body: high.append(body),priority=10)
+        for i in range(10):
+            self.transport.publish("queue",str(i))
+
+        self.__wait_until(lambda: len(high) == 10)
+        assert len(low) == 0
+
+    def test_publish_from_multiple_threads(self):
+        """Test that the broker can be used from multiple threads."""
+
+        msgs=[]
+        self.transport.listen_for("queue",lambda _ch, _method, _properties, body: msgs.append(body))
+        def publish(thread_id):
+            for i in range(100):
+                self.transport.publish("queue",f"{thread_id}-{i}")
+        threads=[threading.Thread(target=publish,args=(i,)) for i in range(10)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.__wait_until(lambda: len(msgs) == 1000)
+        assert len(set(msgs)) == 1000
+
+
+
+class TestInProcessComponent(unittest.TestCase):
+    """Class to test the whole component without RabbitMQ, the MOV or the LLM."""
+
+    def setUp(self):
+        """Create the component over an in-memory broker."""
+
+        self.log_dir=tempfile.TemporaryDirectory()
+        self.env=patch.dict(os.environ,{"LOG_DIR": self.log_dir.name})
+        self.env.start()
+        self.broker=InMemoryBroker()
+        self.message_service=MessageService(transport=InMemoryTransport(self.broker))
+        self.config_store=ConfigStore()
+        self.mov=MOV(self.message_service,self.config_store)
+        with patch('c1_llm_email_replier.received_e_mail_handler.EMailReplierGenerator') as mock_gen_class:
+            self.generator=mock_gen_class.return_value
+            self.generator.generate_reply.return_value=("Re: Test", "Reply content")
+            self.received_e_mail_handler=ReceivedEMailHandler(self.message_service,self.mov,self.config_store)
+        ChangeParametersHandler(self.message_service,self.mov,self.config_store)
+
+        # The test plays the role of the MOV and of the other components
+        self.test_transport=InMemoryTransport(self.broker)
+        self.received=[]
+        for queue in ('valawai/component/register','valawai/component/unregister','valawai/log/add',ReceivedEMailHandler.REPLY_EMAIL_TOPIC):
+            self.test_transport.listen_for(queue,lambda _ch, method, _properties, body: self.received.append((method.routing_key, json.loads(body))))
+
+    def tearDown(self):
+        """Stop the component."""
+
+        self.received_e_mail_handler.executor.shutdown(wait=True)
+        self.mov.close()
+        self.message_service.close()
+        self.test_transport.close()
+        self.env.stop()
+        self.log_dir.cleanup()
+
+    def __wait_for(self, queue):
+        """Wait until a message is received on a queue."""
+
+        for _i in range(50):
+
+            for routing_key, msg in self.received:
+                if routing_key == queue:
+                    return msg
+
+            time.sleep(0.1)
+
+        self.fail(f"Not received any message on {queue}")
+
+    def test_register_reply_and_unregister(self):
+        """Test the life cycle of the component."""
+
+        self.mov.register_component()
+        register_msg=self.__wait_for('valawai/component/register')
+        assert register_msg['name'] == 'c1_llm_email_replier'
+
+        self.test_transport.publish('valawai/c1/llm_email_replier/control/registered',json.dumps({"id": "component_1"}))
+        for _i in range(50):
+            if self.mov.component_id is not None:
+                break
+            time.sleep(0.1)
+        assert self.mov.component_id == "component_1"
+
+        self.test_transport.publish(ReceivedEMailHandler.RECEIVED_EMAIL_TOPIC,json.dumps({
+            'subject': "Test",
+            'content': "Test body",
+            'addresses': [{'type': 'FROM', 'address': 'from@valawai.eu'}]
+        }))
+        reply=ReplyEMailPayload(**self.__wait_for(ReceivedEMailHandler.REPLY_EMAIL_TOPIC))
+        assert reply.subject == "Re: Test"
+        assert reply.content == "Reply content"
+        assert reply.addresses[0].address == 'from@valawai.eu'
+
+        self.mov.unregister_component()
+        unregister_msg=self.__wait_for('valawai/component/unregister')
+        assert unregister_msg == {"component_id": "component_1"}
+
+    def test_change_parameters(self):
+        """Test change the parameters of the component."""
+
+        self.test_transport.publish('valawai/c1/llm_email_replier/control/parameters',json.dumps({"max_new_tokens": 321, "mov_log_level": "ERROR"}))
+        for _i in range(50):
+            if self.config_store.current.version > 0:
+                break
+            time.sleep(0.1)
+        assert self.config_store.current.version == 1
+        assert self.config_store.current.max_new_tokens == 321
+        assert self.config_store.current.mov_log_level == "ERROR"
+
+        # The parameters are restored when the component restarts
+        for _i in range(50):
+            if os.path.isfile(os.path.join(self.log_dir.name,"parameters.json")):
+                break
+            time.sleep(0.1)
+        restored=ConfigStore(ComponentConfig()).restore()
+        assert restored.max_new_tokens == 321
+        assert restored.mov_log_level == "ERROR"
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,115 @@
+# 
+# This file is part of the C1_llm_email_replier distribution (https://github.com/VALAWAI/C1_llm_email_replier).
+# Copyright (c) 2022-2026 VALAWAI (https://valawai.eu/).
+# 
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+# 
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+# 
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import json
+import unittest
+from unittest.mock import patch
+
+from pydantic import ValidationError
+
+from c1_llm_email_replier import json_codec
+from c1_llm_email_replier.received_e_mail_payload import ReceivedEMailPayload
+
+
+class TestJSONCodec(unittest.TestCase):
+    """Class to test the codec used to encode and decode the messages."""
+
+    E_MAIL = {
+        'subject': "Test subject",
+        'content': "Test content with \"quotes\" and ñ",
+        'addresses': [{'type': 'FROM', 'address': 'from@valawai.eu'}]
+    }
+
+    def test_decode_model(self):
+        """Test decode a model from a JSON document."""
+
+        e_mail = json_codec.decode_model(ReceivedEMailPayload, json.dumps(self.E_MAIL).encode('utf-8'))
+        assert e_mail.subject == self.E_MAIL['subject']
+        assert e_mail.content == self.E_MAIL['content']
+
+    def test_decode_double_encoded_model(self):
+        """Test decode a model that has been encoded twice."""
+
+        body = json.dumps(json.dumps(self.E_MAIL)).encode('utf-8')
+        e_mail = json_codec.decode_model(ReceivedEMailPayload, body)
+        assert e_mail.content == self.E_MAIL['content']
+
+        e_mail = json_codec.decode_model(ReceivedEMailPayload, "  \n" + json.dumps(json.dumps(self.E_MAIL)))
+        assert e_mail.content == self.E_MAIL['content']
+
+    def test_decode_double_encoded_model_with_many_white_spaces(self):
+        """Test decode a model that has been encoded twice and starts with many white spaces."""
+
+        body = (" " * 100 + json.dumps(json.dumps(self.E_MAIL))).encode('utf-8')
+        e_mail = json_codec.decode_model(ReceivedEMailPayload, body)
+        assert e_mail.content == self.E_MAIL['content']
+
+    def test_fail_decode_invalid_model(self):
+        """Test that can not decode a document that is not a model."""
+
+        with self.assertRaises(ValueError):
+            json_codec.decode_model(ReceivedEMailPayload, b'{"addresses":"undefined"}')
+
+        with self.assertRaises(ValidationError):
+            json_codec.decode_model(ReceivedEMailPayload, b'"[1,2]"')
+
+        with self.assertRaises(ValueError):
+            json_codec.decode_model(ReceivedEMailPayload, b'"undefined')
+
+    def test_dumps_and_loads(self):
+        """Test encode and decode values."""
+
+        value = {"key": "value", "list": [1, 2.5, True, None], "text": "ñ\n\""}
+        assert json_codec.loads(json_codec.dumps(value)) == value
+        assert json_codec.loads(json_codec.dumps(value).encode('utf-8')) == value
+
+    def test_dumps_values_not_supported_by_orjson(self):
+        """Test encode values that only can be encoded by the json module."""
+
+        assert json.loads(json_codec.dumps({1: "one"})) == {"1": "one"}
+        assert json.loads(json_codec.dumps(2 ** 70)) == 2 ** 70
+
+    def test_not_serialize_again_raw_json(self):
+        """Test that the serialized models are not serialized again."""
+
+        e_mail = ReceivedEMailPayload(**self.E_MAIL)
+        raw = json_codec.encode_model(e_mail)
+        assert raw == e_mail.model_dump_json()
+        with patch.object(ReceivedEMailPayload, 'model_dump_json') as model_dump_json:
+            assert json_codec.dumps(raw) is raw
+            assert json_codec.payload_to_str(raw) is raw
+            model_dump_json.assert_not_called()
+
+    def test_payload_to_str(self):
+        """Test obtain the payload of a log message."""
+
+        e_mail = ReceivedEMailPayload(**self.E_MAIL)
+        assert json_codec.payload_to_str(e_mail) == e_mail.model_dump_json()
+        assert json.loads(json_codec.payload_to_str({"key": "value"})) == {"key": "value"}
+        assert json_codec.payload_to_str(b'body \xff') == 'body �'
+        assert json_codec.payload_to_str("text") == "text"
+        assert json_codec.payload_to_str({1, 2}) in ("{1, 2}", "{2, 1}")
+
+    def test_use_json_module_when_configured(self):
+        """Test that the standard json module is used when it is configured."""
+
+        with patch.dict('os.environ', {"JSON_BACKEND": "json"}):
+            assert not json_codec._use_orjson()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,71 @@
+# 
+# This file is part of the C1_llm_email_replier distribution (https://github.com/VALAWAI/C1_llm_email_replier).
+# Copyright (c) 2022-2026 VALAWAI (https://valawai.eu/).
+# 
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+# 
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+# 
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import unittest
+
+from c1_llm_email_replier.language_identifier import LanguageIdentifier
+
+
+class TestLanguageIdentifier(unittest.TestCase):
+    """Class to test the identification of the language of the e-mails."""
+
+    def setUp(self):
+        self.identifier = LanguageIdentifier()
+
+    def test_identify_languages(self):
+        """Test the identification of the language of short e-mails."""
+
+        e_mails = {
+            'en': "Hi, can you tell me when my package will arrive? Thanks",
+            'es': "Hola, ¿me pueden decir cuándo llegará mi paquete? Gracias",
+            'ca': "Hola, em podeu dir quan arribarà el meu paquet? Gràcies",
+            'fr': "Bonjour, pouvez-vous me dire quand mon colis arrivera? Merci",
+            'de': "Hallo, können Sie mir sagen, wann mein Paket ankommt? Danke",
+            'it': "Ciao, potete dirmi quando arriverà il mio pacco? Grazie",
+            'pt': "Olá, podem dizer-me quando chegará a minha encomenda? Obrigado"
+        }
+        for language, e_mail in e_mails.items():
+            self.assertEqual(self.identifier.identify(e_mail), language, e_mail)
+
+    def test_ignore_quotes_links_and_numbers(self):
+        """Test that the quoted replies, the links and the numbers do not change the language."""
+
+        e_mail = (
+            "El servidor es penja després de l'última actualització, ajudeu-me si us plau.\n"
+            "Vegeu https://valawai.eu/logs/2024-05-10 o escriviu a suport@valawai.eu 555 123 456\n"
+            "> On Monday you wrote: please tell us what happened with the server and the update\n"
+            "> Thanks and best regards from the support team"
+        )
+        self.assertEqual(self.identifier.identify(e_mail), 'ca')
+
+    def test_not_identify_short_texts(self):
+        """Test that the language of the texts without enough letters is not identified."""
+
+        self.assertIsNone(self.identifier.identify("Thanks!"))
+        self.assertIsNone(self.identifier.identify("1234 5678 https://valawai.eu"))
+        self.assertIsNone(self.identifier.identify(None))
+
+    def test_restrict_the_languages(self):
+        """Test that only the configured languages are identified."""
+
+        identifier = LanguageIdentifier(languages="en, es, xx")
+        self.assertEqual(identifier.languages, ['en', 'es'])
+        self.assertEqual(set(identifier.scores("Bon dia, volia preguntar pel preu del servei")), {'en', 'es'})
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,105 @@
+# 
+# This file is part of the C1_llm_email_replier distribution (https://github.com/VALAWAI/C1_llm_email_replier).
+# Copyright (c) 2022-2026 VALAWAI (https://valawai.eu/).
+# 
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+# 
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+# 
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import unittest
+from unittest.mock import MagicMock
+
+from c1_llm_email_replier.component_config import ComponentConfig, ConfigStore
+from c1_llm_email_replier.conversation_cache import ConversationCache
+from c1_llm_email_replier.language_router import LanguageRouter
+
+CATALAN = "Hola, em podeu dir quan arribarà el meu paquet? Gràcies"
+SPANISH = "Hola, ¿me pueden decir cuándo llegará mi paquete? Gracias"
+
+
+class TestLanguageRouter(unittest.TestCase):
+    """Class to test the routing of the e-mails to the profiles of their language."""
+
+    def setUp(self):
+        self.config_store = ConfigStore(ComponentConfig(model_id="base-model"))
+        self.generator = MagicMock(model_id="base-model", config_store=self.config_store)
+        self.generator.generate_reply.return_value = ("Re: Base", "Base reply")
+        self.lanes = []
+
+        def derive(config_store, conversation_cache=None):
+            lane = MagicMock(model_id=config_store.current.model_id, config_store=config_store, conversation_cache=conversation_cache)
+            lane.generate_reply.return_value = (f"Re: {config_store.current.system_prompt}", "Lane reply")
+            self.lanes.append(lane)
+            return lane
+
+        self.generator.derive.side_effect = derive
+        self.mov = MagicMock()
+        self.conversations = ConversationCache(max_memory=1)
+        self.router = LanguageRouter(self.generator, batch_size=1, conversations=self.conversations, mov=self.mov)
+
+    def test_disabled_without_profiles(self):
+        """Test that without profiles the e-mails are not routed."""
+
+        assert not self.router.enabled
+        assert self.router.route("Paquet", CATALAN) is None
+
+    def test_route_to_the_profile_of_the_language(self):
+        """Test that the e-mails of a language with profile are replied with its parameters."""
+
+        self.config_store.publish(language_profiles={"ca": {"system_prompt": "Respon sempre en català", "top_k": 10}})
+        assert self.router.enabled
+        assert self.router.route("Paquet", SPANISH) is None
+        assert self.router.route("Paquet", CATALAN) == "ca"
+
+        assert self.router.generate_reply("ca", "Paquet", CATALAN) == ("Re: Respon sempre en català", "Lane reply")
+        assert self.router.generate_reply("ca", "Paquet", CATALAN) == ("Re: Respon sempre en català", "Lane reply")
+        assert len(self.lanes) == 1
+        lane = self.lanes[0].config_store.current
+        assert lane.top_k == 10
+        assert lane.model_id == "base-model"
+        # The lane shares the model and the conversations of the component
+        assert self.lanes[0].pipe is self.generator.pipe
+        assert self.lanes[0].conversation_cache is self.conversations
+        self.generator.generate_reply.assert_not_called()
+
+        metrics = self.router.metrics()
+        assert metrics["identified"] == {"es": 1, "ca": 1}
+        assert metrics["lanes"]["ca"]["replies"] == 2
+
+    def test_follow_the_changes_of_the_profiles(self):
+        """Test that the lanes change when the profiles or the component parameters change."""
+
+        self.config_store.publish(language_profiles={"ca": {"system_prompt": "Respon sempre en català"}})
+        self.router.generate_reply("ca", "Paquet", CATALAN)
+
+        self.config_store.publish(temperature=0.1, kv_cache='quantized')
+        self.router.generate_reply("ca", "Paquet", CATALAN)
+        assert self.lanes[0].config_store.current.temperature == 0.1
+        assert self.lanes[0].config_store.current.kv_cache == 'quantized'
+        assert self.lanes[0].config_store.current.system_prompt == "Respon sempre en català"
+
+        self.config_store.publish(language_profiles={"ca": {"model_id": "catalan-model"}})
+        self.router.generate_reply("ca", "Paquet", CATALAN)
+        assert len(self.lanes) == 2
+        assert self.lanes[1].model_id == "catalan-model"
+        assert self.lanes[1].config_store.current.system_prompt == self.config_store.current.system_prompt
+        # The lanes do not add memory to the conversations cache of the component
+        assert self.lanes[1].conversation_cache is self.conversations
+
+        self.config_store.publish(language_profiles={})
+        assert not self.router.enabled
+        self.router._lane("es")
+        assert list(self.router.metrics()["lanes"]) == ["es"]
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,100 @@
+# 
+# This file is part of the C1_llm_email_replier distribution (https://github.com/VALAWAI/C1_llm_email_replier).
+# Copyright (c) 2022-2026 VALAWAI (https://valawai.eu/).
+# 
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+# 
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+# 
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import threading
+import time
+import unittest
+from unittest.mock import MagicMock, patch
+
+from c1_llm_email_replier.memory_watchdog import MEGABYTE, MemoryWatchdog
+
+
+@patch('c1_llm_email_replier.memory_watchdog.process_rss', return_value=500 * MEGABYTE)
+class TestMemoryWatchdog(unittest.TestCase):
+    """Class to test the watchdog of the memory of the process."""
+
+    def test_disabled_without_limit(self, _process_rss):
+        """Test that without a limit any generation is admitted."""
+
+        watchdog = MemoryWatchdog(limit=0)
+        assert not watchdog.enabled
+        with watchdog.admit(10000 * MEGABYTE):
+            assert watchdog.reserved == 0
+
+    def test_admit_the_generations_that_fit(self, _process_rss):
+        """Test that the generations wait until there is memory for them."""
+
+        watchdog = MemoryWatchdog(limit=1000, high_watermark=0.8, interval=0.01, report_interval=0)
+        try:
+            assert watchdog.headroom == 300 * MEGABYTE
+            admitted = threading.Event()
+
+            def second_generation():
+                with watchdog.admit(200 * MEGABYTE):
+                    admitted.set()
+
+            with watchdog.admit(200 * MEGABYTE):
+                assert watchdog.metrics()["headroom"] == 100
+                thread = threading.Thread(target=second_generation)
+                thread.start()
+                assert not admitted.wait(0.2)
+
+            assert admitted.wait(5)
+            thread.join()
+            assert watchdog.reserved == 0
+
+        finally:
+            watchdog.close()
+
+    def test_admit_alone_generation_greater_than_limit(self, _process_rss):
+        """Test that a generation that alone exceeds the limit is not blocked forever."""
+
+        watchdog = MemoryWatchdog(limit=1000, interval=0.01, report_interval=0)
+        try:
+            with watchdog.admit(2000 * MEGABYTE):
+                assert watchdog.reserved == 2000 * MEGABYTE
+
+        finally:
+            watchdog.close()
+
+    def test_report_memory_pressure(self, process_rss):
+        """Test that the MOV is notified when the memory is near the limit and when it recovers."""
+
+        mov = MagicMock()
+        watchdog = MemoryWatchdog(limit=1000, high_watermark=0.9, interval=0.01, report_interval=0, mov=mov)
+        try:
+            process_rss.return_value = 950 * MEGABYTE
+            for _i in range(100):
+                if mov.warn.called:
+                    break
+                time.sleep(0.01)
+            assert watchdog.under_pressure
+            assert mov.warn.call_args.args[1]["headroom"] == -50
+
+            process_rss.return_value = 500 * MEGABYTE
+            for _i in range(100):
+                if mov.info.called:
+                    break
+                time.sleep(0.01)
+            assert not watchdog.under_pressure
+
+        finally:
+            watchdog.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
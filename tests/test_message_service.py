@@ -18,6 +18,7 @@
 import json
 import time
 import unittest
+from concurrent.futures import ThreadPoolExecutor
 
 from c1_llm_email_replier.message_service import MessageService
 
@@ -79,5 +80,44 @@ class TestMessageService(unittest.TestCase):
         assert len(msgs) == 1
         assert msg == json.loads(msgs[0])
 
+    def test_control_messages_are_not_delayed_by_a_data_backlog(self):
+        """Test that a control message is processed while the data queue is saturated."""
+
+        data_queue="Queue_to_test_message_service_data_backlog"
+        control_queue="Queue_to_test_message_service_control"
+        executor=ThreadPoolExecutor(max_workers=1)
+        processed_data=[]
+        def process_data(channel, delivery_tag, body):
+            time.sleep(0.1)
+            processed_data.append(body)
+            self.message_service.ack(channel, delivery_tag)
+        def data_callback(ch, method, _properties, body):
+            executor.submit(process_data, ch, method.delivery_tag, body)
+        control_received_at=[]
+        def control_callback(_ch, _method, _properties, _body):
+            control_received_at.append(time.time())
+        self.message_service.listen_for(data_queue,data_callback,prefetch_count=2,auto_ack=False)
+        self.message_service.listen_for(control_queue,control_callback,priority=10)
+        self.message_service.start_consuming_and_forget()
+
+        for i in range(100):
+            self.message_service.publish_to(data_queue,{"id": i})
+
+        sent_at=time.time()
+        self.message_service.publish_to(control_queue,{"id": "control"})
+        for _i in range(100):
+
+            if len(control_received_at) != 0:
+                break
+
+            time.sleep(0.1)
+
+        executor.shutdown(wait=False, cancel_futures=True)
+        assert len(control_received_at) == 1
+        latency=control_received_at[0]-sent_at
+        # The data backlog needs at least 10 seconds to be processed
+        assert latency < 1.0, f"The control message has been delayed {latency}s"
+        assert len(processed_data) < 100
+
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,103 @@
+# 
+# This file is part of the C1_llm_email_replier distribution (https://github.com/VALAWAI/C1_llm_email_replier).
+# Copyright (c) 2022-2026 VALAWAI (https://valawai.eu/).
+# 
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+# 
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+# 
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import threading
+import unittest
+from unittest.mock import MagicMock, patch
+
+from c1_llm_email_replier.model_router import ModelRouter, complexity
+
+TIERS = '[{"name": "large", "workers": 2}, {"name": "small", "model_id": "small-model", "max_complexity": 50}]'
+
+
+class TestModelRouter(unittest.TestCase):
+    """Class to test the routing of the e-mails to the model tiers."""
+
+    def setUp(self):
+        self.generator = MagicMock(model_id="large-model")
+        self.generator.generate_reply.return_value = ("Re: Large", "Large reply")
+        with patch('c1_llm_email_replier.model_router.EMailReplierGenerator') as mock_generator_class:
+            self.small_generator = mock_generator_class.return_value
+            self.small_generator.model_id = "small-model"
+            self.small_generator.generate_reply.return_value = ("Re: Small", "Small reply")
+            self.mov = MagicMock()
+            self.router = ModelRouter(self.generator, tiers=TIERS, mov=self.mov)
+            self.loaded = mock_generator_class.call_args
+
+    def tearDown(self):
+        self.router.close()
+
+    def test_complexity(self):
+        """Test that the complexity grows with the size, the questions, the technical terms and the language."""
+
+        simple = complexity("Thanks", "Thanks, received. " * 10)
+        assert simple == 180 // 4 + 1
+        assert complexity("Thanks", "Thanks, received? " * 10) == 2 * simple
+        assert complexity("Thanks", "Thanks, received. " * 9 + "Error 1.2 crash") > simple
+        assert complexity("Gràcies", "Gràcies, rebut. " * 10) > simple
+
+    def test_disabled(self):
+        """Test that by default the e-mails are not routed."""
+
+        assert not ModelRouter(self.generator, tiers="").enabled
+        assert not ModelRouter(self.generator, tiers="[{").enabled
+
+    def test_load_the_tiers(self):
+        """Test that each tier has its model and its workers, sorted by complexity."""
+
+        assert [tier.name for tier in self.router.tiers] == ["small", "large"]
+        assert self.router.tiers[0].generator is self.small_generator
+        assert self.loaded.kwargs['model_id'] == "small-model"
+        assert self.loaded.kwargs['fixed_model']
+        assert self.router.tiers[1].generator is self.generator
+        assert self.router.workers == 3
+
+    def test_route_by_complexity(self):
+        """Test that the simple e-mails are replied by the small model and the complex ones by the large one."""
+
+        assert self.router.generate_reply("Thanks", "Thanks, received") == ("Re: Small", "Small reply")
+        assert self.router.generate_reply("Problem", "Why does it fail? " * 30) == ("Re: Large", "Large reply")
+        self.generator.generate_reply.assert_called_once()
+
+        metrics = self.router.metrics()
+        assert metrics["small"]["routed"] == 1
+        assert metrics["small"]["model_id"] == "small-model"
+        assert metrics["large"]["routed"] == 1
+        assert metrics["large"]["max_complexity"] is None
+        assert metrics["large"]["latency_p95"] >= 0
+        assert self.mov.debug.call_args.args[0] == "Routed an e-mail to the large tier"
+
+    def test_tiers_do_not_wait_for_each_other(self):
+        """Test that the simple e-mails are replied while the large model is busy."""
+
+        release = threading.Event()
+
+        def slow_reply(*args):
+            release.wait(5)
+            return "Re: Large", "Large reply"
+
+        self.generator.generate_reply.side_effect = slow_reply
+        large = threading.Thread(target=self.router.generate_reply, args=("Problem", "Why does it fail? " * 30))
+        large.start()
+
+        assert self.router.generate_reply("Thanks", "Thanks, received") == ("Re: Small", "Small reply")
+        release.set()
+        large.join(5)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,170 @@
+# 
+# This file is part of the C1_llm_email_replier distribution (https://github.com/VALAWAI/C1_llm_email_replier).
+# Copyright (c) 2022-2026 VALAWAI (https://valawai.eu/).
+# 
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+# 
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+# 
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import json
+import os
+import tempfile
+import unittest
+from unittest.mock import MagicMock, patch
+
+from c1_llm_email_replier.change_parameters_handler import ChangeParametersHandler
+from c1_llm_email_replier.component_config import ComponentConfig, ConfigStore
+from c1_llm_email_replier.model_switcher import ModelSwitcher
+
+
+def mock_pipe():
+    """Create a text-generation pipeline that does not use any model."""
+
+    pipe = MagicMock()
+    pipe.tokenizer.return_value = {"input_ids": [1] * 20}
+    pipe.tokenizer.eos_token_id = 0
+    pipe.return_value = [{"generated_text": "Reply"}]
+    return pipe
+
+
+class TestModelSwitcher(unittest.TestCase):
+    """Class to test the validation of the models before using them."""
+
+    def setUp(self):
+        """Create the switcher of a generator that does not use any model."""
+
+        self.log_dir = tempfile.TemporaryDirectory()
+        self.env = patch.dict(os.environ, {"LOG_DIR": self.log_dir.name})
+        self.env.start()
+        self.config_store = ConfigStore(ComponentConfig(model_id="model-1"))
+        self.generator = MagicMock()
+        self.generator.model_id = "model-1"
+        self.mov = MagicMock()
+
+    def tearDown(self):
+        """Remove the persisted parameters."""
+
+        self.env.stop()
+        self.log_dir.cleanup()
+
+    @patch('c1_llm_email_replier.model_switcher.load_pipeline')
+    def test_switch_to_valid_model(self, load_pipeline):
+        """Test that a model that fits the limits is used by the generator."""
+
+        pipe = mock_pipe()
+        load_pipeline.return_value = pipe
+        switcher = ModelSwitcher(self.generator, self.mov, self.config_store, max_memory=1000, max_latency=60)
+
+        assert switcher.stage("model-2").result(10)
+
+        self.generator.use_pipeline.assert_called_once_with("model-2", pipe)
+        assert self.config_store.current.model_id == "model-2"
+        results = self.mov.info.call_args_list[1].args[1]
+        assert results["model_id"] == "model-2"
+        assert results["prompt_tokens"] == 20
+        for name in ("load_time", "memory", "prompt_tokens_per_second", "decode_tokens_per_second", "latency"):
+            assert results[name] >= 0
+        with open(os.path.join(self.log_dir.name, "parameters.json")) as parameters_file:
+            assert json.load(parameters_file)["model_id"] == "model-2"
+
+    @patch('c1_llm_email_replier.model_switcher.process_rss')
+    @patch('c1_llm_email_replier.model_switcher.load_pipeline')
+    def test_keep_model_when_exceed_memory(self, load_pipeline, process_rss):
+        """Test that a model that uses too much memory is not used."""
+
+        load_pipeline.return_value = mock_pipe()
+        process_rss.side_effect = [0, 2048 * 1048576]
+        switcher = ModelSwitcher(self.generator, self.mov, self.config_store, max_memory=1024)
+
+        assert not switcher.stage("model-2").result(10)
+
+        self.generator.use_pipeline.assert_not_called()
+        assert self.config_store.current.model_id == "model-1"
+        assert "2048 MB" in self.mov.error.call_args.args[0]
+
+    @patch('c1_llm_email_replier.model_switcher.device_memory_allocated')
+    @patch('c1_llm_email_replier.model_switcher.process_rss')
+    @patch('c1_llm_email_replier.model_switcher.load_pipeline')
+    def test_keep_model_when_exceed_device_memory(self, load_pipeline, process_rss, device_memory_allocated):
+        """Test that the memory of the model on the GPUs counts in the limit."""
+
+        load_pipeline.return_value = mock_pipe()
+        process_rss.side_effect = [0, 512 * 1048576]
+        device_memory_allocated.side_effect = [0, 1536 * 1048576]
+        switcher = ModelSwitcher(self.generator, self.mov, self.config_store, max_memory=1024)
+
+        assert not switcher.stage("model-2").result(10)
+
+        self.generator.use_pipeline.assert_not_called()
+        assert "2048 MB" in self.mov.error.call_args.args[0]
+        assert self.mov.error.call_args.args[1]["device_memory"] == 1536
+
+    @patch('c1_llm_email_replier.model_switcher.load_pipeline')
+    def test_keep_model_when_exceed_latency(self, load_pipeline):
+        """Test that a model that is too slow is not used."""
+
+        load_pipeline.return_value = mock_pipe()
+        switcher = ModelSwitcher(self.generator, self.mov, self.config_store, max_latency=1.0)
+        with patch('c1_llm_email_replier.model_switcher.time.perf_counter', side_effect=[0.0, 1.0, 1.0, 1.5, 2.0, 4.0]):
+            assert not switcher.stage("model-2").result(10)
+
+        self.generator.use_pipeline.assert_not_called()
+        assert "replies in 2.00 s" in self.mov.error.call_args.args[0]
+
+    @patch('c1_llm_email_replier.model_switcher.load_pipeline')
+    def test_keep_model_when_cannot_load(self, load_pipeline):
+        """Test that a model that can not be loaded is not used."""
+
+        load_pipeline.side_effect = OSError("undefined-model is not a valid model identifier")
+        switcher = ModelSwitcher(self.generator, self.mov, self.config_store)
+
+        assert not switcher.stage("undefined-model").result(10)
+
+        assert self.config_store.current.model_id == "model-1"
+        self.mov.error.assert_called_once()
+        assert switcher.staged_model_id is None
+
+    def test_ignore_current_model(self):
+        """Test that the model in use is not validated again."""
+
+        switcher = ModelSwitcher(self.generator, self.mov, self.config_store)
+        assert switcher.stage("model-1") is None
+
+    def test_change_parameters_stage_the_model(self):
+        """Test that the model received on the parameters is validated before it is published."""
+
+        switcher = MagicMock()
+        handler = ChangeParametersHandler(MagicMock(), self.mov, self.config_store, model_switcher=switcher)
+
+        handler.handle_message(None, None, None, json.dumps({"model_id": "model-2", "temperature": 0.2}).encode())
+
+        switcher.stage.assert_called_once_with("model-2")
+        assert self.config_store.current.model_id == "model-1"
+        assert self.config_store.current.temperature == 0.2
+
+    def test_not_stage_the_model_of_invalid_changes(self):
+        """Test that the model is not validated when the other parameters can not be changed."""
+
+        switcher = MagicMock()
+        handler = ChangeParametersHandler(MagicMock(), self.mov, self.config_store, model_switcher=switcher)
+
+        with patch.object(ComponentConfig, 'with_changes', side_effect=ValueError("Bad value for the parameter temperature")):
+            handler.handle_message(None, None, None, json.dumps({"model_id": "model-2", "temperature": 0.2}).encode())
+
+        switcher.stage.assert_not_called()
+        self.mov.error.assert_called_once()
+        assert self.config_store.current.model_id == "model-1"
+        assert self.config_store.current.version == 0
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,131 @@
+# 
+# This file is part of the C1_llm_email_replier distribution (https://github.com/VALAWAI/C1_llm_email_replier).
+# Copyright (c) 2022-2026 VALAWAI (https://valawai.eu/).
+# 
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+# 
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+# 
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import hashlib
+import json
+import os
+import unittest
+from unittest.mock import MagicMock, patch
+
+from c1_llm_email_replier import json_codec
+from c1_llm_email_replier.component_config import ComponentConfig, ConfigStore
+from c1_llm_email_replier.message_service import MessageService
+from c1_llm_email_replier.mov import MOV
+from c1_llm_email_replier.mov_log_policy import MOVLogPolicy
+
+
+class TestMOVLogPolicy(unittest.TestCase):
+    """Class to test the policy of the log messages sent to the MOV."""
+
+    def test_default_policy_accepts_all(self):
+        """Test that by default all the log messages are sent."""
+
+        with patch.dict(os.environ, clear=True):
+            policy = MOVLogPolicy(ConfigStore())
+
+        for level in ('DEBUG', 'INFO', 'WARN', 'ERROR'):
+            assert policy.accepts(level, "Message")
+
+    def test_gate_by_level(self):
+        """Test that the messages below the level are not sent."""
+
+        with patch.dict(os.environ, {"MOV_LOG_LEVEL": "WARN"}):
+            policy = MOVLogPolicy(ConfigStore())
+
+        assert not policy.accepts('DEBUG', "Message")
+        assert not policy.accepts('INFO', "Message")
+        assert policy.accepts('WARN', "Message")
+        assert policy.accepts('ERROR', "Message")
+
+    def test_sample_messages(self):
+        """Test that the messages are sampled by message and by level."""
+
+        with patch.dict(os.environ, {"MOV_LOG_SAMPLING": json.dumps({"Received an e-mail": 0.0, "INFO": 0.5, "Changed": 1.0})}):
+            policy = MOVLogPolicy(ConfigStore())
+
+        assert not any(policy.accepts('INFO', "Received an e-mail") for _i in range(100))
+        assert all(policy.accepts('INFO', "Changed") for _i in range(100))
+        assert all(policy.accepts('ERROR', "Other") for _i in range(100))
+        sampled = sum(1 for _i in range(10000) if policy.accepts('INFO', "Other"))
+        assert 4000 < sampled < 6000
+
+    def test_rebuild_when_the_parameters_change(self):
+        """Test that the policy changes when a new version of the parameters is published."""
+
+        config_store = ConfigStore(ComponentConfig())
+        policy = MOVLogPolicy(config_store)
+        assert policy.accepts('INFO', "Message")
+
+        config_store.publish(mov_log_level="WARN", mov_log_payload_max_size=10, mov_log_payload_mode="hash")
+        assert not policy.accepts('INFO', "Message")
+        assert policy.payload_max_size == 10
+        assert policy.payload_mode == 'hash'
+
+    def test_ignore_bad_configuration(self):
+        """Test that the bad values do not change the policy."""
+
+        with patch.dict(os.environ, {"MOV_LOG_LEVEL": "undefined", "MOV_LOG_SAMPLING": "[1]", "MOV_LOG_PAYLOAD_MAX_SIZE": "undefined", "MOV_LOG_PAYLOAD_MODE": "undefined"}):
+            policy = MOVLogPolicy(ConfigStore())
+
+        assert policy.level == 'DEBUG'
+        assert policy.sampling == {}
+        assert policy.payload_max_size == 65536
+        assert policy.payload_mode == 'truncate'
+
+    def test_truncate_big_payloads(self):
+        """Test that the payloads greater than the maximum size are truncated."""
+
+        with patch.dict(os.environ, {"MOV_LOG_PAYLOAD_MAX_SIZE": "10", "MOV_LOG_PAYLOAD_MODE": "truncate"}):
+            policy = MOVLogPolicy(ConfigStore())
+
+        assert policy.payload_to_str("0123456789") == "0123456789"
+        assert json.loads(policy.payload_to_str("0123456789abc")) == {"size": 13, "truncated": "0123456789"}
+
+    def test_hash_big_payloads(self):
+        """Test that the payloads greater than the maximum size are hashed."""
+
+        with patch.dict(os.environ, {"MOV_LOG_PAYLOAD_MAX_SIZE": "10", "MOV_LOG_PAYLOAD_MODE": "hash"}):
+            policy = MOVLogPolicy(ConfigStore())
+
+        payload = {"content": "x" * 100}
+        text = json_codec.dumps(payload)
+        assert json.loads(policy.payload_to_str(payload)) == {"size": len(text), "sha256": hashlib.sha256(text.encode('utf-8')).hexdigest()}
+
+    def test_not_serialize_the_payload_of_gated_messages(self):
+        """Test that the MOV does not serialize the payloads of the messages that are not sent."""
+
+        config_store = ConfigStore(ComponentConfig(mov_log_level="ERROR"))
+        message_service = MagicMock(spec=MessageService)
+        mov = MOV(message_service, config_store)
+        payload = MagicMock()
+        try:
+            mov.info("Received an e-mail", payload)
+            mov.log_shipper.flush(timeout=5)
+            payload.model_dump_json.assert_not_called()
+            assert not any(call[0][0] == 'valawai/log/add' for call in message_service.publish_to.call_args_list)
+
+            config_store.publish(mov_log_level="INFO")
+            mov.info("Received an e-mail", {"id": 1})
+            mov.log_shipper.flush(timeout=5)
+            assert any(call[0][0] == 'valawai/log/add' for call in message_service.publish_to.call_args_list)
+
+        finally:
+            mov.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,149 @@
+# 
+# This file is part of the C1_llm_email_replier distribution (https://github.com/VALAWAI/C1_llm_email_replier).
+# Copyright (c) 2022-2026 VALAWAI (https://valawai.eu/).
+# 
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+# 
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+# 
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import json
+import threading
+import time
+import unittest
+from unittest.mock import MagicMock
+
+from c1_llm_email_replier.message_service import MessageService
+from c1_llm_email_replier.mov_log_shipper import LOG_ADD_TOPIC, MOVLogShipper
+from c1_llm_email_replier.reply_e_mail_payload import ReplyEMailPayload
+
+
+class TestMOVLogShipper(unittest.TestCase):
+    """Class to test the shipper of the log messages to the MOV."""
+
+    def setUp(self):
+        """Create the message service to capture the shipped messages."""
+
+        self.message_service = MagicMock(spec=MessageService)
+        self.shipper = None
+
+    def tearDown(self):
+        """Close the shipper."""
+
+        if self.shipper is not None:
+            self.shipper.close()
+
+    def shipped_messages(self):
+        """Return the messages published to the MOV."""
+
+        msgs = []
+        for call in self.message_service.publish_to.call_args_list:
+            queue, msg = call[0]
+            assert queue == LOG_ADD_TOPIC
+            msgs.append(msg)
+        return msgs
+
+    def test_ship_log_messages(self):
+        """Test that the log messages are shipped with the payload serialized."""
+
+        self.shipper = MOVLogShipper(self.message_service, flush_interval=0.1)
+        reply = ReplyEMailPayload(subject="Subject", content="Content {with braces}", addresses=[{"type": "TO", "address": "to@valawai.eu"}])
+        self.shipper.add('INFO', "Sent {reply}", reply, "component_1")
+        assert self.shipper.flush(timeout=5)
+
+        msgs = self.shipped_messages()
+        assert len(msgs) == 1
+        assert msgs[0]['level'] == 'INFO'
+        assert msgs[0]['message'] == "Sent [reply]"
+        assert msgs[0]['component_id'] == "component_1"
+        assert ReplyEMailPayload(**json.loads(msgs[0]['payload'])) == reply
+        assert self.shipper.shipped == 1
+
+    def test_ship_after_the_flush_interval(self):
+        """Test that the records are shipped when the interval has passed."""
+
+        self.shipper = MOVLogShipper(self.message_service, batch_size=100, flush_interval=0.2)
+        self.shipper.add('INFO', "Message")
+        for _i in range(50):
+            if self.message_service.publish_to.called:
+                break
+            time.sleep(0.1)
+
+        assert len(self.shipped_messages()) == 1
+
+    def test_not_block_the_caller_while_shipping(self):
+        """Test that the slow publications do not block the threads that log."""
+
+        released = threading.Event()
+        self.message_service.publish_to.side_effect = lambda _queue, _msg: released.wait(5)
+        self.shipper = MOVLogShipper(self.message_service, flush_interval=0)
+        start = time.time()
+        for i in range(100):
+            self.shipper.add('INFO', f"Message {i}")
+        assert time.time() - start < 1.0
+        released.set()
+        assert self.shipper.flush(timeout=5)
+        assert self.shipper.shipped == 100
+
+    def test_coalesce_repeated_messages(self):
+        """Test that a burst of the same message is shipped as a single message."""
+
+        self.shipper = MOVLogShipper(self.message_service, flush_interval=10)
+        for _i in range(5):
+            self.shipper.add('WARN', "Reconnecting", {"host": "mov-mq"})
+        self.shipper.add('INFO', "Reconnected")
+        assert self.shipper.flush(timeout=5)
+
+        msgs = self.shipped_messages()
+        assert [msg['message'] for msg in msgs] == ["Reconnecting (repeated 5 times)", "Reconnected"]
+        assert self.shipper.coalesced == 4
+
+    def test_drop_debug_first_when_full(self):
+        """Test that the DEBUG records are dropped before the others when the buffer is full."""
+
+        released = threading.Event()
+        self.message_service.publish_to.side_effect = lambda _queue, _msg: released.wait(5)
+        self.shipper = MOVLogShipper(self.message_service, buffer_size=3, batch_size=3, flush_interval=10)
+
+        # Block the shipper with a first record
+        self.shipper.add('INFO', "Blocking")
+        self.shipper.flush(timeout=0.5)
+
+        self.shipper.add('DEBUG', "Debug 1")
+        self.shipper.add('INFO', "Info 1")
+        self.shipper.add('DEBUG', "Debug 2")
+        self.shipper.add('ERROR', "Error 1")
+        self.shipper.add('INFO', "Info 2")
+        self.shipper.add('DEBUG', "Debug 3")
+        released.set()
+        assert self.shipper.flush(timeout=5)
+
+        msgs = self.shipped_messages()
+        assert [msg['message'] for msg in msgs[1:]] == ["Info 1", "Error 1", "Info 2"]
+        assert self.shipper.dropped == 3
+        assert self.shipper.shipped == 4
+
+    def test_ship_pending_records_when_closed(self):
+        """Test that the buffered records are shipped when the shipper is closed."""
+
+        shipper = MOVLogShipper(self.message_service, flush_interval=60)
+        for i in range(10):
+            shipper.add('INFO', f"Message {i}")
+        shipper.close()
+
+        assert len(self.shipped_messages()) == 10
+        assert shipper.shipped == 10
+        shipper.add('INFO', "After close")
+        assert shipper.dropped == 1
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,102 @@
+# 
+# This file is part of the C1_llm_email_replier distribution (https://github.com/VALAWAI/C1_llm_email_replier).
+# Copyright (c) 2022-2026 VALAWAI (https://valawai.eu/).
+# 
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+# 
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+# 
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import unittest
+from unittest.mock import MagicMock, patch
+
+from c1_llm_email_replier.overload_policy import CACHED_REPLIES, DEFER_LOW_PRIORITY, FALLBACK_MODEL, NORMAL, SHORTER_REPLIES, OverloadPolicy
+
+
+class TestOverloadPolicy(unittest.TestCase):
+    """Class to test the policy to degrade the replies when the component is overloaded."""
+
+    def test_never_degrade_without_thresholds(self):
+        """Test that without thresholds the replies are never degraded."""
+
+        policy = OverloadPolicy(wait_thresholds="", depth_thresholds="")
+        assert policy.observe(10000.0, 10000) == NORMAL
+
+    def test_rise_and_fall_levels(self):
+        """Test that the level rises at once and falls one level at a time."""
+
+        mov = MagicMock()
+        policy = OverloadPolicy(wait_thresholds="10,20,30,40", smoothing=1.0, recovery_ratio=0.5, mov=mov)
+        assert policy.observe(5.0, 0) == NORMAL
+        assert policy.observe(35.0, 0) == CACHED_REPLIES
+        mov.warn.assert_called_once()
+
+        # Below the threshold of the level, but not below its recovery threshold
+        assert policy.observe(25.0, 0) == CACHED_REPLIES
+        assert policy.observe(12.0, 0) == FALLBACK_MODEL
+        assert policy.observe(0.0, 0) == SHORTER_REPLIES
+        assert policy.observe(0.0, 0) == NORMAL
+        assert mov.info.call_count == 3
+
+    @patch('c1_llm_email_replier.overload_policy.time.monotonic')
+    def test_fall_levels_without_e_mails(self, monotonic):
+        """Test that the level falls when no e-mails are observed for a while."""
+
+        mov = MagicMock()
+        monotonic.return_value = 0.0
+        policy = OverloadPolicy(wait_thresholds="", depth_thresholds="5,10,15,20", recovery_interval=10.0, mov=mov)
+        assert policy.observe(0.0, 20) == DEFER_LOW_PRIORITY
+
+        # Two intervals fall two levels, and the e-mail without load one more
+        monotonic.return_value = 25.0
+        assert policy.observe(0.0, 0) == SHORTER_REPLIES
+        assert mov.info.call_count == 1
+
+        monotonic.return_value = 1000.0
+        assert policy.observe(0.0, 1) == NORMAL
+
+    def test_keep_level_without_recovery_interval(self):
+        """Test that without recovery interval the level only changes with the e-mails."""
+
+        policy = OverloadPolicy(wait_thresholds="", depth_thresholds="5,10,15,20", recovery_interval=0.0)
+        assert policy.observe(0.0, 20) == DEFER_LOW_PRIORITY
+        with patch('c1_llm_email_replier.overload_policy.time.monotonic', return_value=1e9):
+            assert policy.observe(0.0, 0) == CACHED_REPLIES
+
+    def test_depth_thresholds(self):
+        """Test that the number of pending e-mails also rises the level."""
+
+        policy = OverloadPolicy(wait_thresholds="", depth_thresholds="5,10,15,20")
+        assert policy.observe(0.0, 20) == DEFER_LOW_PRIORITY
+        assert policy.metrics()["depth"] == 20
+
+    def test_smooth_the_waits(self):
+        """Test that a single long wait does not degrade the replies."""
+
+        policy = OverloadPolicy(wait_thresholds="10", smoothing=0.2)
+        assert policy.observe(40.0, 0) == NORMAL
+        assert policy.wait == 8.0
+        assert policy.observe(40.0, 0) == SHORTER_REPLIES
+
+    def test_cached_replies(self):
+        """Test that the last replies are remembered and the template is used for the others."""
+
+        policy = OverloadPolicy(cache_size=1, template_reply="We will reply soon")
+        policy.remember_reply("First", "Body", ("Re: First", "First reply"))
+        assert policy.cached_reply("First", "Body") == ("Re: First", "First reply")
+
+        policy.remember_reply("Second", "Body", ("Re: Second", "Second reply"))
+        assert policy.cached_reply("First", "Body") == ("Re: First", "We will reply soon")
+        assert policy.cached_reply("Second", "Body") == ("Re: Second", "Second reply")
+
+
+if __name__ == '__main__':
+    unittest.main()
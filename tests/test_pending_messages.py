@@ -0,0 +1,98 @@
+# 
+# This file is part of the C1_llm_email_replier distribution (https://github.com/VALAWAI/C1_llm_email_replier).
+# Copyright (c) 2022-2026 VALAWAI (https://valawai.eu/).
+# 
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+# 
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+# 
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import unittest
+from unittest.mock import MagicMock
+
+import pika
+
+from c1_llm_email_replier.pending_messages import PendingMessages
+
+
+class TestPendingMessages(unittest.TestCase):
+    """Class to test the messages that wait to be published."""
+
+    def test_limit_the_messages(self):
+        """Test that the messages are dropped when there are too many."""
+
+        messages = PendingMessages(2)
+        assert messages.add("queue", "1")
+        assert messages.add("queue", "2")
+        assert not messages.add("queue", "3")
+        assert len(messages) == 2
+
+    def test_publish_in_order(self):
+        """Test that the messages are published in the order they were added."""
+
+        messages = PendingMessages(10)
+        messages.add("first", "1")
+        messages.add("second", "2")
+        channel = MagicMock()
+        messages.publish(channel)
+
+        assert [call.kwargs['routing_key'] for call in channel.basic_publish.call_args_list] == ["first", "second"]
+        assert [call.kwargs['body'] for call in channel.basic_publish.call_args_list] == ["1", "2"]
+        assert len(messages) == 0
+
+    def test_publish_the_delayed_messages_to_their_delay_queue(self):
+        """Test that the delayed messages expire on a queue that dead-letters them to their queue."""
+
+        messages = PendingMessages(10)
+        messages.add("queue", "1", delay=2.5)
+        channel = MagicMock()
+        messages.publish(channel)
+
+        declare = channel.queue_declare.call_args.kwargs
+        assert declare['queue'] == "queue/delayed"
+        assert declare['arguments'] == {"x-dead-letter-exchange": "", "x-dead-letter-routing-key": "queue"}
+        publish = channel.basic_publish.call_args.kwargs
+        assert publish['routing_key'] == "queue/delayed"
+        assert publish['properties'].expiration == "2500"
+        assert len(messages) == 0
+
+    def test_keep_the_messages_of_a_lost_channel(self):
+        """Test that the message being published when the channel is lost is published later."""
+
+        messages = PendingMessages(10)
+        messages.add("queue", "1")
+        messages.add("queue", "2")
+        lost = MagicMock()
+        lost.basic_publish.side_effect = pika.exceptions.ChannelWrongStateError()
+        with self.assertRaises(pika.exceptions.AMQPError):
+            messages.publish(lost)
+        assert len(messages) == 2
+
+        recovered = MagicMock()
+        messages.publish(recovered)
+        assert recovered.basic_publish.call_count == 2
+
+    def test_drop_the_messages_refused_by_the_broker(self):
+        """Test that the messages that the broker does not route are not published again."""
+
+        messages = PendingMessages(10)
+        messages.add("unknown", "1")
+        messages.add("queue", "2")
+        channel = MagicMock()
+        channel.basic_publish.side_effect = [pika.exceptions.UnroutableError([]), None]
+        messages.publish(channel)
+
+        assert channel.basic_publish.call_count == 2
+        assert len(messages) == 0
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,130 @@
+# 
+# This file is part of the C1_llm_email_replier distribution (https://github.com/VALAWAI/C1_llm_email_replier).
+# Copyright (c) 2022-2026 VALAWAI (https://valawai.eu/).
+# 
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+# 
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+# 
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import json
+import time
+import unittest
+from unittest.mock import MagicMock, patch
+
+import pika
+
+from amqp_broker_stand_in import AMQPBrokerStandIn
+
+from c1_llm_email_replier.pika_transport import PikaTransport
+
+class TestPikaTransportFailures(unittest.TestCase):
+    """Class to test how the transport to interact with the rabbitMQ reacts to failures."""
+
+    def setUp(self):
+        """Create the transport connected to a stand-in broker."""
+
+        self.broker=AMQPBrokerStandIn(heartbeat=1)
+        self.transport=PikaTransport(host='127.0.0.1',port=self.broker.port,heartbeat=1,max_retries=3,retry_sleep_seconds=1)
+        self.msgs=[]
+        self.transport.listen_for("Queue_to_test_failures",self.callback)
+
+    def tearDown(self):
+        """Stops the transport and the broker."""
+
+        self.transport.close()
+        self.broker.stop()
+
+    def callback(self, _ch, _method, _properties, body):
+        """Called when a message is received."""
+
+        self.msgs.append(json.loads(body))
+
+    def __assert_received(self, msg):
+        """Check that a message is received."""
+
+        for _i in range(50):
+
+            if msg in self.msgs:
+                return
+
+            time.sleep(0.1)
+
+        self.fail(f"Not received {msg}")
+
+    def test_heartbeats_do_not_depend_on_the_listeners(self):
+        """Test that the connection survives while the caller is busy and does not consume."""
+
+        self.transport.publish("Queue_to_test_failures",json.dumps({"id": 1}))
+        self.__assert_received({"id": 1})
+
+        # Busy for more than the heartbeat timeout plus the check interval
+        time.sleep(8)
+
+        self.transport.publish("Queue_to_test_failures",json.dumps({"id": 2}))
+        self.__assert_received({"id": 2})
+        assert self.broker.accepted_connections == 1
+
+    def test_reconnect_fast_after_a_network_partition(self):
+        """Test that a dead connection is detected by the heartbeats and recovered."""
+
+        self.transport.publish("Queue_to_test_failures",json.dumps({"id": 1}))
+        self.__assert_received({"id": 1})
+
+        partition_at=time.time()
+        self.broker.freeze()
+        # Published while the connection is dead, so it has to wait the reconnection
+        self.transport.publish("Queue_to_test_failures",json.dumps({"id": 2}))
+        for _i in range(300):
+
+            if self.broker.accepted_connections > 1:
+                break
+
+            time.sleep(0.1)
+
+        recovered_in=time.time()-partition_at
+        assert self.broker.accepted_connections == 2
+        # The old heartbeat of 600 seconds took 10 minutes to detect it
+        assert recovered_in < 20, f"Recovered after {recovered_in}s"
+        self.__assert_received({"id": 2})
+
+
+class TestPikaTransportReconnection(unittest.TestCase):
+    """Class to test how the transport replaces the connections that fail."""
+
+    def test_close_the_connection_that_fails(self):
+        """Test that a connection that fails while it is open is closed before reconnecting."""
+
+        failed=MagicMock(is_open=True)
+        failed.process_data_events.side_effect=pika.exceptions.ChannelClosedByBroker(406,"PRECONDITION_FAILED")
+        failed.close.side_effect=pika.exceptions.ConnectionWrongStateError()
+        recovered=MagicMock(is_open=True)
+        recovered.process_data_events.side_effect=lambda time_limit: time.sleep(0.01)
+        with patch('c1_llm_email_replier.pika_transport.pika.BlockingConnection',side_effect=[failed,recovered]) as connection:
+            transport=PikaTransport(host='127.0.0.1',max_retries=1,retry_sleep_seconds=0)
+            try:
+                for _i in range(50):
+
+                    if transport.listen_connection is recovered:
+                        break
+
+                    time.sleep(0.1)
+
+                assert connection.call_count == 2
+                assert transport.listen_connection is recovered
+                failed.close.assert_called_once()
+
+            finally:
+                transport.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,101 @@
+# 
+# This file is part of the C1_llm_email_replier distribution (https://github.com/VALAWAI/C1_llm_email_replier).
+# Copyright (c) 2022-2026 VALAWAI (https://valawai.eu/).
+# 
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+# 
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+# 
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import unittest
+
+import torch
+from transformers import LlamaConfig, LlamaForCausalLM
+
+from c1_llm_email_replier.conversation_cache import cache_bytes
+from c1_llm_email_replier.quantized_kv_cache import QuantizedKVCache
+
+
+def tiny_config(**kwargs):
+    """Create the configuration of a tiny Llama."""
+
+    return LlamaConfig(
+        vocab_size=128, hidden_size=64, intermediate_size=128, num_hidden_layers=2,
+        num_attention_heads=4, num_key_value_heads=2, max_position_embeddings=256, **kwargs
+    )
+
+
+class TestQuantizedKVCache(unittest.TestCase):
+    """Class to test the KV cache quantized with torch."""
+
+    def test_quantize_and_dequantize(self):
+        """Test that the values are packed in bytes and recovered within the error of their bits."""
+
+        torch.manual_seed(0)
+        tensor = torch.randn(2, 2, 40, 16)
+        errors = []
+        for nbits in (8, 4, 2):
+            layer = QuantizedKVCache(tiny_config(), nbits=nbits, q_group_size=16).layers[0]
+            quantized = layer._quantize(tensor, axis=0)
+            assert quantized[0].dtype == torch.uint8
+            assert quantized[0].numel() == tensor.numel() * nbits // 8
+            recovered = layer._dequantize(quantized)
+            assert recovered.shape == tensor.shape
+            errors.append((recovered - tensor).abs().max().item())
+
+        assert errors[0] < 0.02
+        assert errors[0] < errors[1] < errors[2]
+
+    def test_group_of_the_whole_dimension(self):
+        """Test that the dimensions that are not multiple of the group size are quantized as a single group."""
+
+        layer = QuantizedKVCache(tiny_config(), nbits=4, q_group_size=64).layers[0]
+        tensor = torch.linspace(-1, 1, 2 * 10 * 6).reshape(1, 2, 10, 6)
+        quantized = layer._quantize(tensor, axis=0)
+        assert quantized[1].shape == (1, 2, 10, 1, 1)
+        assert (layer._dequantize(quantized) - tensor).abs().max().item() < 0.1
+
+    def test_generate_with_less_memory(self):
+        """Test that the model generates the same tokens with the 8 bits cache, that needs less memory."""
+
+        torch.manual_seed(0)
+        config = tiny_config()
+        model = LlamaForCausalLM(config).eval()
+        input_ids = torch.randint(1, 128, (2, 40))
+        outputs = []
+        for past_key_values in (None, QuantizedKVCache(config, nbits=8, q_group_size=16, residual_length=8)):
+            outputs.append(model.generate(
+                input_ids=input_ids, attention_mask=torch.ones_like(input_ids), past_key_values=past_key_values,
+                max_new_tokens=20, min_new_tokens=20, do_sample=False, pad_token_id=0, return_dict_in_generate=True
+            ))
+
+        assert torch.equal(outputs[0].sequences, outputs[1].sequences)
+        assert outputs[1].past_key_values.get_seq_length() == outputs[0].past_key_values.get_seq_length()
+        assert cache_bytes(outputs[1].past_key_values) < cache_bytes(outputs[0].past_key_values) / 2
+
+    def test_fail_unsupported_configuration(self):
+        """Test that the cache is not created with bad bits or with layers that are not of full attention."""
+
+        with self.assertRaises(ValueError):
+            QuantizedKVCache(tiny_config(), nbits=3)
+
+        with self.assertRaises(ValueError):
+            QuantizedKVCache(tiny_config(layer_types=["full_attention", "sliding_attention"]))
+
+    def test_compression(self):
+        """Test the fraction of the memory of the full precision cache that the quantized one needs."""
+
+        assert QuantizedKVCache.compression(2, nbits=8, q_group_size=64) == (1 + 4 / 64) / 2
+        assert QuantizedKVCache.compression(4, nbits=4, q_group_size=64) == (0.5 + 8 / 64) / 4
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,112 @@
+# 
+# This file is part of the C1_llm_email_replier distribution (https://github.com/VALAWAI/C1_llm_email_replier).
+# Copyright (c) 2022-2026 VALAWAI (https://valawai.eu/).
+# 
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+# 
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+# 
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import logging
+import queue
+import threading
+import unittest
+from unittest.mock import patch
+
+from c1_llm_email_replier.queue_logging import LazyQueueHandler, RepeatedMessageFilter, start_queue_logging
+
+
+class CaptureHandler(logging.Handler):
+    """Handler that captures the formatted records and the thread that has written them."""
+
+    def __init__(self):
+        super().__init__()
+        self.lines = []
+        self.threads = set()
+
+    def emit(self, record):
+        self.lines.append(self.format(record))
+        self.threads.add(threading.current_thread().name)
+
+
+class TestQueueLogging(unittest.TestCase):
+    """Class to test the logging through a queue."""
+
+    def test_not_format_the_record_when_enqueued(self):
+        """Test that the records are enqueued without formatting them."""
+
+        records = queue.SimpleQueue()
+        handler = LazyQueueHandler(records)
+        logger = logging.getLogger("test_not_format_the_record_when_enqueued")
+        logger.propagate = False
+        logger.addHandler(handler)
+        with patch.object(logging.Formatter, 'format') as format_method:
+            logger.warning("Message %s", "argument")
+            format_method.assert_not_called()
+
+        record = records.get_nowait()
+        assert record.msg == "Message %s"
+        assert record.getMessage() == "Message argument"
+
+    def test_write_records_from_a_background_thread(self):
+        """Test that the records are written by the thread of the listener."""
+
+        root = logging.getLogger()
+        previous_handlers = list(root.handlers)
+        capture = CaptureHandler()
+        for handler in previous_handlers:
+            root.removeHandler(handler)
+        root.addHandler(capture)
+        try:
+            listener = start_queue_logging()
+            assert capture not in root.handlers
+            logging.warning("Message %d", 1)
+            listener.stop()
+
+            assert capture.lines == ["Message 1"]
+            assert threading.current_thread().name not in capture.threads
+
+        finally:
+            for handler in list(root.handlers):
+                root.removeHandler(handler)
+            for handler in previous_handlers:
+                root.addHandler(handler)
+
+    def test_limit_repeated_warnings(self):
+        """Test that the repeated warnings are suppressed and reported."""
+
+        rate_limit = RepeatedMessageFilter(max_repetitions=3, interval=60)
+        records = [logging.LogRecord("test", logging.WARNING, __file__, 1, "Reconnecting to %s", ("mov-mq",), None) for _i in range(10)]
+        accepted = [record for record in records if rate_limit.filter(record)]
+        assert len(accepted) == 3
+        assert rate_limit.suppressed == 7
+
+        # Other messages and lower levels are not limited
+        assert rate_limit.filter(logging.LogRecord("test", logging.WARNING, __file__, 1, "Other", (), None))
+        assert all(rate_limit.filter(logging.LogRecord("test", logging.INFO, __file__, 1, "Reconnecting to %s", ("mov-mq",), None)) for _i in range(10))
+
+    def test_report_suppressed_when_interval_finishes(self):
+        """Test that the next record after the interval reports the suppressed messages."""
+
+        rate_limit = RepeatedMessageFilter(max_repetitions=1, interval=60)
+        with patch('c1_llm_email_replier.queue_logging.time.monotonic', return_value=100.0):
+            for _i in range(5):
+                rate_limit.filter(logging.LogRecord("test", logging.ERROR, __file__, 1, "Connection lost", (), None))
+
+        record = logging.LogRecord("test", logging.ERROR, __file__, 1, "Connection lost", (), None)
+        with patch('c1_llm_email_replier.queue_logging.time.monotonic', return_value=161.0):
+            assert rate_limit.filter(record)
+
+        assert record.getMessage() == "Connection lost (suppressed 4 similar messages)"
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -25,11 +25,20 @@ from unittest.mock import patch, MagicMock
 
 from mov_api import mov_get_log_message_with
 
+from c1_llm_email_replier import json_codec
+from c1_llm_email_replier.component_config import ConfigStore
+from c1_llm_email_replier.conversation_cache import ConversationCache
 from c1_llm_email_replier.mov import MOV
+from c1_llm_email_replier.e_mail_classifier import EMailClassifier
+from c1_llm_email_replier.overload_policy import OverloadPolicy
+from c1_llm_email_replier.sender_fairness import SenderFairness
+from c1_llm_email_replier.thread_coalescer import ThreadCoalescer
+from c1_llm_email_replier.in_memory_transport import InMemoryBroker, InMemoryTransport
 from c1_llm_email_replier.message_service import MessageService
 from c1_llm_email_replier.received_e_mail_handler import ReceivedEMailHandler
 from c1_llm_email_replier.received_e_mail_payload import ReceivedEMailPayload
 from c1_llm_email_replier.received_e_mail_address_payload import ReceivedEMailAddressType
+from c1_llm_email_replier.reply_scheduler import ReplyScheduler
 from c1_llm_email_replier.reply_e_mail_payload import ReplyEMailPayload
 from c1_llm_email_replier.reply_e_mail_address_payload import ReplyEMailAddressType
 
@@ -116,6 +125,11 @@ class TestReceivedEMailHandlerUnit(BaseTestReceivedEMailHandler):
         # Configure standard mock behavior
         self.mock_generator.generate_reply.return_value = ("Re: Test", "Default reply content")
 
+    def _handle_message(self, body: bytes):
+        """Process a message and wait until the executor has finished with it."""
+        self.handler.handle_message(None, None, None, body)
+        self.handler.executor.shutdown(wait=True)
+
     def test_capture_message_without_addresses(self):
         """Handler should log an ERROR when the received e-mail has no valid addresses."""
         e_mail_data = {'subject': str(uuid.uuid4())}
@@ -124,7 +138,7 @@ class TestReceivedEMailHandlerUnit(BaseTestReceivedEMailHandler):
         # We need to manually call the handle_message with the body
         # Since it's a unit test, we don't publish to a real topic
         import json
-        self.handler.handle_message(None, None, None, json.dumps(e_mail_data).encode('utf-8'))
+        self._handle_message(json.dumps(e_mail_data).encode('utf-8'))
         
         self.mock_mov.error.assert_called()
 
@@ -136,7 +150,7 @@ class TestReceivedEMailHandlerUnit(BaseTestReceivedEMailHandler):
                 'addresses': [{'type': 'TO', 'address': 'jabe@doe.eu'}]
             }
         )
-        self.handler.handle_message(None, None, None, e_mail.model_dump_json().encode('utf-8'))
+        self._handle_message(e_mail.model_dump_json().encode('utf-8'))
         self.mock_mov.error.assert_called()
 
     def test_reply_logic_with_mocked_gen(self):
@@ -149,11 +163,422 @@ class TestReceivedEMailHandlerUnit(BaseTestReceivedEMailHandler):
             }
         )
         
-        self.handler.handle_message(None, None, None, e_mail.model_dump_json().encode('utf-8'))
+        self._handle_message(e_mail.model_dump_json().encode('utf-8'))
         
         self.mock_generator.generate_reply.assert_called_once()
         self.mock_message_service.publish_to.assert_called_once()
 
+    def test_acknowledge_the_message_after_processing(self):
+        """The e-mails are consumed with a limited prefetch and acknowledged when they are processed."""
+        _queue, _callback = self.mock_message_service.listen_for.call_args[0]
+        options = self.mock_message_service.listen_for.call_args[1]
+        self.assertFalse(options['auto_ack'])
+        self.assertGreater(options['prefetch_count'], 0)
+
+        e_mail = ReceivedEMailPayload(**
+            {
+                'subject': "Test Subject",
+                'content': "Test Body",
+                'addresses': [{'type': 'FROM', 'address': 'from@valawai.eu'}]
+            }
+        )
+        channel = MagicMock()
+        method = MagicMock(delivery_tag=7)
+        self.handler.handle_message(channel, method, None, e_mail.model_dump_json().encode('utf-8'))
+        self.handler.executor.shutdown(wait=True)
+
+        self.mock_message_service.ack.assert_called_once_with(channel, 7)
+
+    def test_acknowledge_the_duplicates_when_received(self):
+        """The e-mails delivered again are acknowledged when they are received, without coalescing or replying them."""
+        self.handler.coalescer = ThreadCoalescer(window=60, max_messages=2)
+        e_mail = ReceivedEMailPayload(**
+            {
+                'subject': "Test Subject",
+                'content': "Test Body",
+                'addresses': [{'type': 'FROM', 'address': 'from@valawai.eu'}]
+            }
+        )
+        channel = MagicMock()
+        body = e_mail.model_dump_json().encode('utf-8')
+        self.handler.handle_message(channel, MagicMock(delivery_tag=1), None, body)
+        self.handler.handle_message(channel, MagicMock(delivery_tag=2), None, body)
+
+        self.mock_message_service.ack.assert_called_once_with(channel, 2)
+        self.assertEqual(self.handler.duplicates.duplicates, 1)
+        self.handler.coalescer.flush_all()
+        self.handler.executor.shutdown(wait=True)
+        self.mock_generator.generate_reply.assert_called_once()
+        self.assertEqual(self.mock_message_service.ack.call_count, 2)
+
+    def test_reply_the_coalesced_e_mails_when_stopped(self):
+        """The conversations that are being coalesced are replied when the component stops."""
+        self.handler.coalescer = ThreadCoalescer(window=60, max_messages=10)
+        e_mail = ReceivedEMailPayload(**
+            {
+                'subject': "Meeting",
+                'content': "Can we meet on Monday?",
+                'addresses': [{'type': 'FROM', 'address': 'jane@valawai.eu'}]
+            }
+        )
+        channel = MagicMock()
+        self.handler.handle_message(channel, MagicMock(delivery_tag=5), None, e_mail.model_dump_json().encode('utf-8'))
+        self.mock_generator.generate_reply.assert_not_called()
+
+        self.handler.stop()
+        self.handler.executor.shutdown(wait=True)
+        self.mock_generator.generate_reply.assert_called_once()
+        self.mock_message_service.ack.assert_called_once_with(channel, 5)
+
+    def _overloaded_e_mail(self, level: int, priority: int = 0, overload=None):
+        """Process an e-mail when the component is overloaded at a level."""
+        self.handler.overload = overload or OverloadPolicy(wait_thresholds="1,2,3,4", smoothing=1.0, max_new_tokens=120)
+        self.mock_generator.max_new_tokens = 256
+        e_mail = ReceivedEMailPayload(**
+            {
+                'subject': "Test Subject",
+                'content': "Test Body",
+                'priority': priority,
+                'addresses': [{'type': 'FROM', 'address': 'from@valawai.eu'}]
+            }
+        )
+        with patch('c1_llm_email_replier.received_e_mail_handler.time.monotonic', return_value=100.0 + level):
+            return self.handler._reply_under_load(e_mail, e_mail.model_dump_json().encode('utf-8'), 100.0)
+
+    def test_shorter_replies_when_overloaded(self):
+        """The replies are generated with fewer tokens when the e-mails wait too much."""
+        reply = self._overloaded_e_mail(1)
+
+        self.assertEqual(reply, ("Re: Test", "Default reply content"))
+        parameters = self.mock_generator.generate_reply.call_args.args[2]
+        self.assertEqual(parameters.max_new_tokens, 120)
+
+    def test_template_replies_when_overloaded(self):
+        """The template is used instead of generating the replies of the e-mails without a cached reply."""
+        reply = self._overloaded_e_mail(3)
+
+        self.assertEqual(reply[0], "Re: Test Subject")
+        self.assertEqual(reply[1], self.handler.overload.template_reply)
+        self.mock_generator.generate_reply.assert_not_called()
+
+    def test_cached_replies_when_overloaded(self):
+        """The reply remembered for an e-mail is used instead of generating it again."""
+        overload = OverloadPolicy(wait_thresholds="1,2,3,4", smoothing=1.0)
+        overload.remember_reply("Test Subject", "Test Body", ("Re: Cached", "Cached reply"))
+
+        self.assertEqual(self._overloaded_e_mail(3, overload=overload), ("Re: Cached", "Cached reply"))
+        self.mock_generator.generate_reply.assert_not_called()
+
+    def test_measure_the_wait_from_the_reception(self):
+        """The wait of an e-mail is its age, without the time that the component has delayed it."""
+        self.handler.overload = OverloadPolicy(wait_thresholds="60", smoothing=1.0, max_new_tokens=120)
+        self.mock_generator.max_new_tokens = 256
+        e_mail = ReceivedEMailPayload(**
+            {
+                'subject': "Test Subject",
+                'content': "Test Body",
+                'received_at': int(time.time()) - 120,
+                'addresses': [{'type': 'FROM', 'address': 'from@valawai.eu'}]
+            }
+        )
+        body = e_mail.model_dump_json().encode('utf-8')
+
+        self.handler._reply_under_load(e_mail, body, time.monotonic())
+        self.assertEqual(self.mock_generator.generate_reply.call_args.args[2].max_new_tokens, 120)
+        self.assertGreaterEqual(self.handler.overload.wait, 120)
+
+        self.handler._reply_under_load(e_mail, body, time.monotonic(), delayed=100)
+        self.assertLess(self.handler.overload.wait, 30)
+        self.assertEqual(self.handler.overload.level, 0)
+
+    def test_measure_the_backlog_on_the_broker(self):
+        """The e-mails that wait on the queue of the broker count for the load, even when they are more than the prefetch."""
+        broker = InMemoryBroker()
+        message_service = MessageService(transport=InMemoryTransport(broker))
+        for index in range(10):
+            e_mail = ReceivedEMailPayload(**
+                {
+                    'subject': f"Backlog {index}",
+                    'content': "Test Body",
+                    'addresses': [{'type': 'FROM', 'address': f'backlog{index}@valawai.eu'}]
+                }
+            )
+            message_service.publish_to(self.RECEIVED_TOPIC, e_mail)
+
+        with patch('c1_llm_email_replier.received_e_mail_handler.EMailReplierGenerator') as mock_gen_class, \
+                patch('c1_llm_email_replier.received_e_mail_handler.OverloadPolicy', side_effect=lambda mov: OverloadPolicy(depth_thresholds="5", max_new_tokens=120, mov=mov)), \
+                patch.dict(os.environ, {'REPLY_MAX_WORKERS': '1', 'REPLY_PREFETCH_COUNT': '1'}):
+            generator = mock_gen_class.return_value
+            generator.generate_reply.return_value = ("Re: Test", "Reply")
+            generator.max_new_tokens = 256
+            handler = ReceivedEMailHandler(message_service, self.mock_mov)
+
+        try:
+            deadline = time.monotonic() + 10
+            while generator.generate_reply.call_count < 10 and time.monotonic() < deadline:
+                time.sleep(0.01)
+
+            self.assertEqual(generator.generate_reply.call_count, 10)
+            self.assertEqual(generator.generate_reply.call_args_list[0].args[2].max_new_tokens, 120)
+
+        finally:
+            message_service.close()
+            handler.executor.shutdown(wait=True)
+
+    def test_defer_low_priority_e_mails_when_overloaded(self):
+        """The low priority e-mails are published again to reply them when the load drops."""
+        self.assertIsNone(self._overloaded_e_mail(4))
+
+        queue, msg = self.mock_message_service.publish_to.call_args.args
+        self.assertEqual(queue, ReceivedEMailHandler.RECEIVED_EMAIL_TOPIC)
+        self.assertEqual(json_codec.loads(str(msg))['subject'], "Test Subject")
+        self.mock_generator.generate_reply.assert_not_called()
+
+        self.assertIsNotNone(self._overloaded_e_mail(4, priority=5))
+
+    def test_skip_e_mails_that_must_not_be_replied(self):
+        """The e-mails sent by machines, or the replies of the component, are not generated."""
+        e_mail = ReceivedEMailPayload(**
+            {
+                'subject': "Test Subject",
+                'content': "Test Body",
+                'addresses': [{'type': 'FROM', 'address': 'from@valawai.eu'}]
+            }
+        )
+        self._handle_message(e_mail.model_dump_json().encode('utf-8'))
+        self.mock_generator.generate_reply.assert_called_once()
+
+        # The reply comes back to the component
+        echo = ReceivedEMailPayload(**
+            {
+                'subject': "Re: Test Subject",
+                'content': "Default reply content",
+                'addresses': [{'type': 'FROM', 'address': 'from@valawai.eu'}]
+            }
+        )
+        self.assertIsNone(self.handler._reply_under_load(echo, echo.model_dump_json().encode('utf-8')))
+        self.mock_generator.generate_reply.assert_called_once()
+        self.assertEqual(self.handler.classifier.counters, {'own_reply': 1})
+        self.assertIn("own_reply", self.mock_mov.info.call_args.args[0])
+
+    def test_classify_by_the_from_address(self):
+        """The e-mails are classified by their FROM address even when the senders are their domains."""
+        self.handler.fairness = SenderFairness(key="domain")
+        self.handler.classifier = EMailClassifier(loop_max_replies=1)
+        e_mail = ReceivedEMailPayload(**
+            {
+                'subject': "Test Subject",
+                'content': "Test Body",
+                'addresses': [{'type': 'FROM', 'address': 'noreply@valawai.eu'}]
+            }
+        )
+        self.assertIsNone(self.handler._reply_under_load(e_mail, e_mail.model_dump_json().encode('utf-8')))
+        self.assertEqual(self.handler.classifier.counters, {'noreply_sender': 1})
+
+        self.handler.classifier.remember_reply(["jane@valawai.eu"], "Re: Loop", "First reply")
+        e_mail = ReceivedEMailPayload(**
+            {
+                'subject': "Re: Loop",
+                'content': "Answer",
+                'addresses': [{'type': 'FROM', 'address': 'jane@valawai.eu'}]
+            }
+        )
+        self.assertIsNone(self.handler._reply_under_load(e_mail, e_mail.model_dump_json().encode('utf-8')))
+        self.assertEqual(self.handler.classifier.counters, {'noreply_sender': 1, 'thread_loop': 1})
+        self.mock_generator.generate_reply.assert_not_called()
+
+    def test_reject_e_mails_over_quota(self):
+        """The e-mails of the senders that are over their quota are not replied."""
+        self.handler.fairness = SenderFairness(quota_tokens=300)
+        self.mock_generator.max_new_tokens = 256
+        e_mail = ReceivedEMailPayload(**
+            {
+                'subject': "Test Subject",
+                'content': "Test Body",
+                'addresses': [{'type': 'FROM', 'address': 'loop@valawai.eu'}]
+            }
+        )
+        body = e_mail.model_dump_json().encode('utf-8')
+
+        self.assertIsNotNone(self.handler._reply_under_load(e_mail, body))
+        self.assertIsNone(self.handler._reply_under_load(e_mail, body))
+
+        self.mock_generator.generate_reply.assert_called_once()
+        self.assertIn("loop@valawai.eu is over its quota", self.mock_mov.warn.call_args.args[0])
+
+    def test_delay_e_mails_over_quota_until_it_is_restored(self):
+        """The e-mails of the senders over their quota are acknowledged and published again to be delivered when it is restored."""
+        clock = MagicMock(return_value=0.0)
+        self.handler.fairness = SenderFairness(quota_tokens=300, quota_window=60, over_quota="defer", clock=clock)
+        self.mock_generator.max_new_tokens = 256
+        e_mail = ReceivedEMailPayload(**
+            {
+                'subject': "Test Subject",
+                'content': "Test Body",
+                'addresses': [{'type': 'FROM', 'address': 'loop@valawai.eu'}]
+            }
+        )
+        body = e_mail.model_dump_json().encode('utf-8')
+        self.assertIsNotNone(self.handler._reply_under_load(e_mail, body))
+
+        clock.return_value = 45
+        channel = MagicMock()
+        self.handler.handle_message(channel, MagicMock(delivery_tag=8), None, body)
+        self.handler.executor.shutdown(wait=True)
+
+        self.mock_message_service.ack.assert_called_once_with(channel, 8)
+        queue, msg = self.mock_message_service.publish_to.call_args.args
+        self.assertEqual(queue, ReceivedEMailHandler.RECEIVED_EMAIL_TOPIC)
+        self.assertEqual(str(msg), body.decode('utf-8'))
+        self.assertEqual(self.mock_message_service.publish_to.call_args.kwargs, {'delay': 15})
+        self.mock_generator.generate_reply.assert_called_once()
+        self.assertFalse(self.handler.duplicates.seen(e_mail))
+
+    def test_reply_other_senders_while_e_mails_over_quota_are_delayed(self):
+        """The delayed e-mails do not count for the prefetch, so the e-mails of the other senders are still delivered."""
+        broker = InMemoryBroker()
+        message_service = MessageService(transport=InMemoryTransport(broker))
+        with patch('c1_llm_email_replier.received_e_mail_handler.EMailReplierGenerator') as mock_gen_class, \
+                patch.dict(os.environ, {'REPLY_PREFETCH_COUNT': '1'}):
+            mock_gen_class.return_value.generate_reply.return_value = ("Re: Test", "Default reply content")
+            mock_gen_class.return_value.max_new_tokens = 256
+            handler = ReceivedEMailHandler(message_service, self.mock_mov)
+
+        handler.fairness = SenderFairness(quota_tokens=300, over_quota="defer")
+        handler.fairness.consume('loop@valawai.eu', 300)
+        replies = []
+        observer = InMemoryTransport(broker)
+        observer.listen_for(self.REPLY_TOPIC, lambda _ch, _method, _properties, body: replies.append(json_codec.loads(body)))
+        try:
+            for sender in ('loop@valawai.eu', 'loop@valawai.eu', 'jane@valawai.eu'):
+                e_mail = ReceivedEMailPayload(**
+                    {
+                        'subject': f"Message of {sender}",
+                        'content': "Test Body",
+                        'addresses': [{'type': 'FROM', 'address': sender}]
+                    }
+                )
+                message_service.publish_to(self.RECEIVED_TOPIC, e_mail)
+
+            deadline = time.monotonic() + 5
+            while not replies and time.monotonic() < deadline:
+                time.sleep(0.01)
+
+            self.assertEqual([address['address'] for reply in replies for address in reply['addresses']], ['jane@valawai.eu'])
+            self.assertEqual(broker.message_count(self.RECEIVED_TOPIC), 0)
+
+        finally:
+            observer.close()
+            message_service.close()
+            handler.executor.shutdown(wait=True)
+
+
+    def test_reply_first_the_e_mails_of_the_backlog_with_earlier_deadline(self):
+        """The scheduler receives a window of the backlog on the queue, so it replies first the e-mails with earlier deadline."""
+        broker = InMemoryBroker()
+        message_service = MessageService(transport=InMemoryTransport(broker))
+        now = int(time.time())
+        for index in range(8):
+            e_mail = ReceivedEMailPayload(**
+                {
+                    'subject': f"Backlog {index}",
+                    'content': "Test Body",
+                    'received_at': now,
+                    'addresses': [{'type': 'FROM', 'address': f'backlog{index}@valawai.eu'}]
+                }
+            )
+            message_service.publish_to(self.RECEIVED_TOPIC, e_mail)
+        urgent = ReceivedEMailPayload(**
+            {
+                'subject': "Urgent",
+                'content': "Test Body",
+                'received_at': now - 3000,
+                'addresses': [{'type': 'FROM', 'address': 'urgent@valawai.eu'}]
+            }
+        )
+        message_service.publish_to(self.RECEIVED_TOPIC, urgent)
+
+        replied = []
+        def generate_reply(subject, _content, _parameters=None):
+            # Wait until the backlog has been delivered, so the first reply does not depend on the delivery order
+            deadline = time.monotonic() + 5
+            while not replied and broker.message_count(self.RECEIVED_TOPIC) > 0 and time.monotonic() < deadline:
+                time.sleep(0.01)
+            replied.append(subject)
+            return f"Re: {subject}", "Reply"
+
+        with patch('c1_llm_email_replier.received_e_mail_handler.EMailReplierGenerator') as mock_gen_class, \
+                patch('c1_llm_email_replier.received_e_mail_handler.ReplyScheduler', side_effect=lambda executor: ReplyScheduler(executor, policy='edf')), \
+                patch.dict(os.environ, {'REPLY_MAX_WORKERS': '1', 'REPLY_PREFETCH_COUNT': '2', 'REPLY_SCHEDULER_WINDOW': '16'}):
+            mock_gen_class.return_value.generate_reply.side_effect = generate_reply
+            mock_gen_class.return_value.max_new_tokens = 256
+            handler = ReceivedEMailHandler(message_service, self.mock_mov)
+
+        try:
+            deadline = time.monotonic() + 10
+            while len(replied) < 9 and time.monotonic() < deadline:
+                time.sleep(0.01)
+
+            self.assertEqual(len(replied), 9)
+            self.assertEqual(replied[1], "Urgent")
+
+        finally:
+            message_service.close()
+            handler.executor.shutdown(wait=True)
+
+    def test_reply_once_to_the_e_mails_of_a_conversation(self):
+        """The follow-ups of a sender on the same conversation are replied together."""
+        self.handler.coalescer = ThreadCoalescer(window=60, max_messages=2)
+        channel = MagicMock()
+        for tag, (subject, content) in enumerate((("Meeting", "Can we meet on Monday?"), ("Re: Meeting", "Sorry, I meant Tuesday"))):
+            e_mail = ReceivedEMailPayload(**
+                {
+                    'subject': subject,
+                    'content': content,
+                    'addresses': [{'type': 'FROM', 'address': 'from@valawai.eu'}, {'type': 'CC', 'address': f'cc{tag}@valawai.eu'}]
+                }
+            )
+            self.handler.handle_message(channel, MagicMock(delivery_tag=tag), None, e_mail.model_dump_json().encode('utf-8'))
+        self.handler.executor.shutdown(wait=True)
+
+        self.mock_generator.generate_reply.assert_called_once()
+        subject, content = self.mock_generator.generate_reply.call_args.args[:2]
+        self.assertEqual(subject, "Meeting")
+        self.assertEqual(content, "Can we meet on Monday?\n\nSorry, I meant Tuesday")
+        reply = json_codec.loads(str(self.mock_message_service.publish_to.call_args.args[1]))
+        self.assertEqual({address['address'] for address in reply['addresses']}, {'from@valawai.eu', 'cc0@valawai.eu', 'cc1@valawai.eu'})
+        self.assertEqual(self.mock_message_service.ack.call_count, 2)
+
+    def test_generate_on_the_conversation_when_cached(self):
+        """The conversation of the e-mail is passed to the generator when the conversations are cached."""
+        self.handler.conversations = ConversationCache(max_memory=1)
+        e_mail = ReceivedEMailPayload(**
+            {
+                'subject': "RE: Test Subject",
+                'content': "Test Body",
+                'addresses': [{'type': 'FROM', 'address': 'From@valawai.eu'}]
+            }
+        )
+        self._handle_message(e_mail.model_dump_json().encode('utf-8'))
+
+        self.mock_generator.generate_reply.assert_called_once_with("RE: Test Subject", "Test Body", None, ("from@valawai.eu", "test subject"))
+
+    def test_route_to_the_model_tiers(self):
+        """The replies are generated by the router when there are model tiers."""
+        self.handler.router = MagicMock(enabled=True)
+        self.handler.router.generate_reply.return_value = ("Re: Routed", "Routed reply")
+        e_mail = ReceivedEMailPayload(**
+            {
+                'subject': "Test Subject",
+                'content': "Test Body",
+                'addresses': [{'type': 'FROM', 'address': 'from@valawai.eu'}]
+            }
+        )
+        self._handle_message(e_mail.model_dump_json().encode('utf-8'))
+
+        self.handler.router.generate_reply.assert_called_once_with("Test Subject", "Test Body", None, None)
+        self.mock_generator.generate_reply.assert_not_called()
+        self.assertEqual(json_codec.loads(str(self.mock_message_service.publish_to.call_args.args[1]))['content'], "Routed reply")
 
 class TestReceivedEMailHandlerIntegration(BaseTestReceivedEMailHandler):
     """Integration tests for ReceivedEMailHandler using the real generator and real services."""
@@ -162,11 +587,12 @@ class TestReceivedEMailHandlerIntegration(BaseTestReceivedEMailHandler):
     def setUpClass(cls):
         # Set a small model for testing
         os.environ['LLM_MODEL'] = os.getenv('INTEGRATION_TEST_MODEL', "facebook/opt-125m")
+        cls.config_store = ConfigStore()
         cls.message_service = MessageService()
-        cls.mov = MOV(cls.message_service)
+        cls.mov = MOV(cls.message_service, cls.config_store)
         cls.msgs: list[ReplyEMailPayload] = []
         cls.message_service.listen_for(BaseTestReceivedEMailHandler.REPLY_TOPIC, cls.callback)
-        cls.handler = ReceivedEMailHandler(cls.message_service, cls.mov)
+        cls.handler = ReceivedEMailHandler(cls.message_service, cls.mov, cls.config_store)
         cls.message_service.start_consuming_and_forget()
         time.sleep(1)
 
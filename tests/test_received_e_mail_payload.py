@@ -47,6 +47,9 @@ class TestReceivedEMailPayload(unittest.TestCase):
 		assert received_e_mail_payload.mime_type == "text/plain"
 		assert received_e_mail_payload.content == "Hi Jane,\n\nCan you inform me how to create a VALAWAI component\n\nBest regards,\nJon"
 		assert received_e_mail_payload.received_at == 1715342664
+		assert received_e_mail_payload.generation_parameters.max_new_tokens == 100
+		assert received_e_mail_payload.generation_parameters.system_prompt == "You are a VALAWAI expert that replies briefly"
+		assert received_e_mail_payload.generation_parameters.adapter == "support_persona"
 
 	def test_save_json(self):
 		"""Test can obtain a received_e_mail_address_payload from a json"""
@@ -57,6 +60,22 @@ class TestReceivedEMailPayload(unittest.TestCase):
 		json_output = received_e_mail_payload.model_dump_json()
 		assert json_dict == json.loads(json_output)
 
+	def test_fail_load_generation_parameters_out_of_bounds(self):
+		"""Test can not load a received e-mail with generation parameters out of the bounds of the component parameters"""
+
+		json_dict = load_received_e_mail_payload_json()
+		json_dict['generation_parameters']['max_new_tokens'] = 50
+		with self.assertRaises(ValidationError):
+			ReceivedEMailPayload(**json_dict)
+
+	def test_load_without_generation_parameters(self):
+		"""Test can load a received e-mail without generation parameters"""
+
+		json_dict = load_received_e_mail_payload_json()
+		del json_dict['generation_parameters']
+		received_e_mail_payload = ReceivedEMailPayload(**json_dict)
+		assert received_e_mail_payload.generation_parameters is None
+
 	def test_fail_load_empty_json(self):
 		"""Test can not load a treatment from an empty json"""
 
@@ -0,0 +1,129 @@
+# 
+# This file is part of the C1_llm_email_replier distribution (https://github.com/VALAWAI/C1_llm_email_replier).
+# Copyright (c) 2022-2026 VALAWAI (https://valawai.eu/).
+# 
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+# 
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+# 
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import threading
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+
+from c1_llm_email_replier.reply_scheduler import ReplyScheduler, estimate_tokens
+
+
+class Clock:
+    """A clock that only advances when the test wants."""
+
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+class TestReplyScheduler(unittest.TestCase):
+    """Class to test the scheduler of the replies."""
+
+    def pop_all(self, scheduler):
+        """Return the first argument of the jobs in the order they are served."""
+
+        names = []
+        while len(scheduler) > 0:
+            names.append(scheduler.pop().args[0])
+        return names
+
+    def test_first_in_first_out(self):
+        """Test that by default the jobs are served in arrival order."""
+
+        scheduler = ReplyScheduler(policy='fifo', clock=Clock())
+        scheduler.put(str, "first", received_at=10.0, cost=100)
+        scheduler.put(str, "second", received_at=5.0, cost=1)
+        assert self.pop_all(scheduler) == ["first", "second"]
+        assert scheduler.pop() is None
+
+    def test_earliest_deadline_first(self):
+        """Test that the e-mails received earlier are served first."""
+
+        clock = Clock()
+        scheduler = ReplyScheduler(policy='edf', sla=60, clock=clock)
+        scheduler.put(str, "recent", received_at=990.0)
+        scheduler.put(str, "old", received_at=100.0)
+        scheduler.put(str, "unknown")
+        assert self.pop_all(scheduler) == ["old", "recent", "unknown"]
+
+    def test_shortest_job_first(self):
+        """Test that the e-mails with shorter prompts are served first."""
+
+        scheduler = ReplyScheduler(policy='sjf', clock=Clock())
+        scheduler.put(str, "long", cost=500)
+        scheduler.put(str, "short", cost=10)
+        scheduler.put(str, "medium", cost=100)
+        assert self.pop_all(scheduler) == ["short", "medium", "long"]
+
+    def test_weighted_fair_queuing(self):
+        """Test that a sender with many e-mails does not delay the ones of the other senders."""
+
+        scheduler = ReplyScheduler(policy='fair', max_wait=0, clock=Clock())
+        for index in range(4):
+            scheduler.put(str, f"loop {index}", cost=99, sender="loop@doe.com")
+        scheduler.put(str, "jane", cost=99, sender="jane@doe.com")
+        scheduler.put(str, "boss 1", cost=99, sender="boss@valawai.eu", weight=2)
+        scheduler.put(str, "boss 2", cost=99, sender="boss@valawai.eu", weight=2)
+
+        assert self.pop_all(scheduler) == ["boss 1", "loop 0", "jane", "boss 2", "loop 1", "loop 2", "loop 3"]
+
+    def test_starvation_protection(self):
+        """Test that the jobs that have waited too much are served first."""
+
+        clock = Clock()
+        scheduler = ReplyScheduler(policy='sjf', max_wait=60, clock=clock)
+        scheduler.put(str, "long", cost=500)
+        clock.now += 61
+        scheduler.put(str, "short", cost=10)
+        assert self.pop_all(scheduler) == ["long", "short"]
+        assert scheduler.starved == 1
+
+    def test_undefined_policy(self):
+        """Test that an undefined policy is replaced by first in first out."""
+
+        assert ReplyScheduler(policy='undefined').policy == 'fifo'
+
+    def test_run_the_jobs_on_the_executor(self):
+        """Test that the jobs run on the executor in the order of the policy."""
+
+        release = threading.Event()
+        served = []
+        with ThreadPoolExecutor(max_workers=1) as executor:
+            scheduler = ReplyScheduler(executor, policy='sjf')
+            blocker = scheduler.submit(release.wait, 5)
+            futures = [scheduler.submit(served.append, name, cost=cost) for name, cost in (("long", 50), ("short", 5))]
+            failure = scheduler.submit(int, "not a number", cost=100)
+            release.set()
+
+            assert blocker.result(5)
+            for future in futures:
+                future.result(5)
+            with self.assertRaises(ValueError):
+                failure.result(5)
+
+        assert served == ["short", "long"]
+
+    def test_estimate_tokens(self):
+        """Test the estimation of the tokens of a prompt."""
+
+        assert estimate_tokens("a" * 40, None, "b" * 20) == 15
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,93 @@
+# 
+# This file is part of the C1_llm_email_replier distribution (https://github.com/VALAWAI/C1_llm_email_replier).
+# Copyright (c) 2022-2026 VALAWAI (https://valawai.eu/).
+# 
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+# 
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+# 
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import unittest
+
+from c1_llm_email_replier.received_e_mail_address_payload import ReceivedEMailAddressPayload
+from c1_llm_email_replier.sender_fairness import DEFER, REJECT, SenderFairness
+
+
+class Clock:
+    """A clock that only advances when the test wants."""
+
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+class TestSenderFairness(unittest.TestCase):
+    """Class to test the identification and the quotas of the senders."""
+
+    def test_sender_of_e_mail(self):
+        """Test obtain the sender from the addresses of an e-mail."""
+
+        addresses = [{"type": "TO", "address": "info@valawai.eu"}, {"type": "FROM", "address": " Jane.Doe@Valawai.eu"}]
+        assert SenderFairness(key="address").sender_of(addresses) == "jane.doe@valawai.eu"
+        assert SenderFairness(key="domain").sender_of(addresses) == "valawai.eu"
+        assert SenderFairness().sender_of([ReceivedEMailAddressPayload(**address) for address in addresses]) == "jane.doe@valawai.eu"
+        assert SenderFairness().sender_of(addresses[:1]) is None
+
+    def test_weights(self):
+        """Test that the weights are defined by address or by domain."""
+
+        fairness = SenderFairness(weights='{"boss@valawai.eu": 4, "valawai.eu": 2}')
+        assert fairness.weight("boss@valawai.eu") == 4
+        assert fairness.weight("jane@valawai.eu") == 2
+        assert fairness.weight("jon@doe.com") == 1
+        assert fairness.weight(None) == 1
+        assert SenderFairness(weights="bad").weights == {}
+
+    def test_quota_by_window(self):
+        """Test that the senders can only consume their quota on each window."""
+
+        clock = Clock()
+        fairness = SenderFairness(weights='{"boss@valawai.eu": 2}', quota_tokens=100, quota_window=60, clock=clock)
+        assert fairness.consume("jon@doe.com", 80)
+        assert not fairness.consume("jon@doe.com", 80)
+        assert fairness.consume("jane@doe.com", 80)
+        assert fairness.consume("boss@valawai.eu", 150)
+        assert not fairness.consume("boss@valawai.eu", 100)
+
+        clock.now = 70
+        assert fairness.remaining_window() == 50
+        assert fairness.consume("jon@doe.com", 80)
+
+    def test_first_e_mail_within_quota(self):
+        """Test that an e-mail greater than the quota is accepted if the sender has not consumed anything."""
+
+        fairness = SenderFairness(quota_tokens=100)
+        assert fairness.consume("jon@doe.com", 500)
+        assert not fairness.consume("jon@doe.com", 1)
+
+    def test_without_quota(self):
+        """Test that without quota any sender can consume any tokens."""
+
+        fairness = SenderFairness(quota_tokens=0)
+        for _i in range(10):
+            assert fairness.consume("jon@doe.com", 10000)
+
+    def test_over_quota_action(self):
+        """Test the action to do with the e-mails over quota."""
+
+        assert SenderFairness(over_quota="DEFER").over_quota == DEFER
+        assert SenderFairness(over_quota="undefined").over_quota == REJECT
+
+
+if __name__ == '__main__':
+    unittest.main()
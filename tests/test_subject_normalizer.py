@@ -0,0 +1,47 @@
+# 
+# This file is part of the C1_llm_email_replier distribution (https://github.com/VALAWAI/C1_llm_email_replier).
+# Copyright (c) 2022-2026 VALAWAI (https://valawai.eu/).
+# 
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+# 
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+# 
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import unittest
+
+from c1_llm_email_replier.subject_normalizer import normalize_subject
+
+
+class TestSubjectNormalizer(unittest.TestCase):
+    """Class to test the normalization of the subjects of the e-mails."""
+
+    def test_remove_reply_and_forward_prefixes(self):
+        """Test that the prefixes added by the mail clients are removed."""
+
+        assert normalize_subject("Re: Fwd: RE[2]:  How to create a  VALAWAI component?") == "how to create a valawai component?"
+        assert normalize_subject("AW: WG: Test") == "test"
+        assert normalize_subject("FW:Test") == "test"
+
+    def test_keep_words_that_start_like_prefixes(self):
+        """Test that the words that start like a prefix are not removed."""
+
+        assert normalize_subject("Recipe: cake") == "recipe: cake"
+        assert normalize_subject("Forward planning") == "forward planning"
+
+    def test_empty_subject(self):
+        """Test normalize an undefined subject."""
+
+        assert normalize_subject(None) == ""
+        assert normalize_subject("  Re:  ") == ""
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,80 @@
+# 
+# This file is part of the C1_llm_email_replier distribution (https://github.com/VALAWAI/C1_llm_email_replier).
+# Copyright (c) 2022-2026 VALAWAI (https://valawai.eu/).
+# 
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+# 
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+# 
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import threading
+import unittest
+
+from c1_llm_email_replier.received_e_mail_payload import ReceivedEMailPayload
+from c1_llm_email_replier.thread_coalescer import ThreadCoalescer, thread_key
+
+
+class TestThreadCoalescer(unittest.TestCase):
+    """Class to test the coalescing of the messages of the same conversation."""
+
+    def _flush(self, items):
+        """Record the messages that have been flushed together."""
+        self.flushed.append(items)
+        self.done.set()
+
+    def setUp(self):
+        self.flushed = []
+        self.done = threading.Event()
+
+    def test_thread_key(self):
+        """Test that the key identifies the sender and the conversation."""
+
+        e_mail = ReceivedEMailPayload(subject="Re: Fwd: The  Budget", addresses=[{'type': 'TO', 'address': 'info@valawai.eu'}, {'type': 'FROM', 'address': 'Jane@valawai.eu'}])
+        assert thread_key(e_mail.addresses, e_mail.subject) == ("jane@valawai.eu", "the budget")
+        assert thread_key([{'type': 'FROM', 'address': 'jane@valawai.eu'}], "the budget") == ("jane@valawai.eu", "the budget")
+        assert thread_key([{'type': 'TO', 'address': 'info@valawai.eu'}], "The budget") is None
+
+    def test_disabled(self):
+        """Test that by default the messages are not coalesced."""
+
+        assert not ThreadCoalescer(window=0).enabled
+        assert not ThreadCoalescer(window=10, max_messages=1).enabled
+        assert ThreadCoalescer(window=10).enabled
+
+    def test_flush_after_the_window(self):
+        """Test that the messages of a conversation are flushed together when the window finishes."""
+
+        coalescer = ThreadCoalescer(window=0.2)
+        coalescer.add("a", 1, self._flush)
+        coalescer.add("b", 2, self._flush)
+        coalescer.add("a", 3, self._flush)
+
+        assert self.done.wait(5)
+        coalescer.flush_all()
+        assert sorted(self.flushed) == [[1, 3], [2]]
+        assert coalescer.coalesced == 1
+
+    def test_flush_when_full(self):
+        """Test that a conversation is flushed without waiting when it has the maximum messages."""
+
+        coalescer = ThreadCoalescer(window=60, max_messages=2)
+        coalescer.add("a", 1, self._flush)
+        assert self.flushed == []
+        coalescer.add("a", 2, self._flush)
+        assert self.flushed == [[1, 2]]
+
+        coalescer.add("a", 3, self._flush)
+        coalescer.flush_all()
+        assert self.flushed == [[1, 2], [3]]
+
+
+if __name__ == '__main__':
+    unittest.main()